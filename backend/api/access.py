@@ -0,0 +1,173 @@
+"""
+Politique d'accès aux tâches, déclarée une fois et compilée en SQL.
+
+Une politique est une liste de règles qui accordent l'accès (OU) et de
+règles qui le retirent (appliquées après). Chaque règle fournit :
+- q(contexte) : expression Q sur Tache (contexte = identite(request)) ;
+- test(contexte, tache) : évaluation Python équivalente, référence des tests
+  de parité et du banc d'essai (manage.py bench_task_access) ;
+- raison : raison correspondante de l'index TacheVisibilite (api/visibility.py)
+  pour les règles qu'il matérialise.
+
+Compilation :
+- liste : filtre(contexte) -> un EXISTS sur l'index de visibilité (ou le OU
+  des règles avec index=False), combiné aux refus ;
+- objet : autorise(contexte, tache) -> un seul SELECT EXISTS, quel que soit
+  le nombre de membres ou de services du projet.
+TacheViewSet.get_queryset et IsTaskOwnerOrManagerOrAdmin utilisent la même
+politique : liste et détail ne peuvent plus diverger.
+"""
+from django.db.models import BooleanField, Exists, ExpressionWrapper, OuterRef, Q
+
+from .models import Projet, Tache, TacheVisibilite
+
+TacheAssignees = Tache.assignees.through
+
+AUCUNE = Q(pk__in=[])
+
+
+class Regle:
+    nom = ''
+    raison = None
+    roles = None  # None : s'applique à tous les rôles
+
+    def s_applique(self, contexte):
+        return self.roles is None or contexte.role in self.roles
+
+    def q(self, contexte):
+        raise NotImplementedError
+
+    def test(self, contexte, tache):
+        raise NotImplementedError
+
+
+class Createur(Regle):
+    nom = raison = 'creator'
+
+    def q(self, contexte):
+        return Q(creator_id=contexte.utilisateur_id)
+
+    def test(self, contexte, tache):
+        return tache.creator_id == contexte.utilisateur_id
+
+
+class Assigne(Regle):
+    nom = raison = 'assignee'
+
+    def q(self, contexte):
+        return Q(Exists(TacheAssignees.objects.filter(tache=OuterRef('pk'), utilisateur_id=contexte.utilisateur_id)))
+
+    def test(self, contexte, tache):
+        return any(a.pk == contexte.utilisateur_id for a in tache.assignees.all())
+
+
+class MemeService(Regle):
+    nom = raison = 'service'
+
+    def q(self, contexte):
+        return Q(service_id=contexte.service_id) if contexte.service_id else AUCUNE
+
+    def test(self, contexte, tache):
+        return bool(contexte.service_id) and tache.service_id == contexte.service_id
+
+
+class MembreProjet(Regle):
+    """Chef, membre direct, ou membre du service principal / d'un service secondaire du projet"""
+    nom = raison = 'project'
+
+    def q(self, contexte):
+        condition = Q(chef_id=contexte.utilisateur_id) | Q(membres=contexte.utilisateur_id)
+        if contexte.service_id:
+            condition |= Q(service_id=contexte.service_id) | Q(services=contexte.service_id)
+        return Q(project_id__in=Projet.objects.filter(condition).values('id'))
+
+    def test(self, contexte, tache):
+        return bool(tache.project_id) and tache.project_id in contexte.projets
+
+
+class PersonnelleDAutrui(Regle):
+    """Les tâches personnelles restent privées, même pour un administrateur"""
+    nom = 'personnel_autrui'
+    roles = ('ADMIN',)
+
+    def q(self, contexte):
+        return Q(type='personnel') & ~Q(creator_id=contexte.utilisateur_id)
+
+    def test(self, contexte, tache):
+        return tache.type == 'personnel' and tache.creator_id != contexte.utilisateur_id
+
+
+class Politique:
+    def __init__(self, accorder, refuser=()):
+        self.accorder = tuple(accorder)
+        self.refuser = tuple(refuser)
+
+    def refus(self, contexte):
+        """Q des tâches retirées par les refus applicables, None s'il n'y en a pas"""
+        condition = None
+        for regle in self.refuser:
+            if regle.s_applique(contexte):
+                condition = regle.q(contexte) if condition is None else condition | regle.q(contexte)
+        return condition
+
+    def filtre(self, contexte, index=True, refus=True):
+        """Q des tâches accessibles ; AUCUNE sans profil"""
+        if not contexte.utilisateur_id:
+            return AUCUNE
+        regles = [regle for regle in self.accorder if regle.s_applique(contexte)]
+        if index and all(regle.raison for regle in regles):
+            visibilite = TacheVisibilite.objects.filter(tache=OuterRef('pk'), utilisateur_id=contexte.utilisateur_id)
+            raisons = {regle.raison for regle in regles}
+            if raisons != {choix for choix, _ in TacheVisibilite.RAISON_CHOICES}:
+                visibilite = visibilite.filter(reason__in=raisons)
+            condition = Q(Exists(visibilite))
+        else:
+            condition = AUCUNE
+            for regle in regles:
+                condition |= regle.q(contexte)
+        retirees = self.refus(contexte) if refus else None
+        return condition if retirees is None else condition & ~retirees
+
+    def queryset(self, contexte, queryset=None, index=True):
+        queryset = Tache.objects.all() if queryset is None else queryset
+        return queryset.filter(self.filtre(contexte, index))
+
+    def autorise(self, contexte, tache):
+        """Accès à une tâche : une requête EXISTS"""
+        if not contexte.utilisateur_id:
+            return False
+        pk = getattr(tache, 'pk', tache)
+        return Tache.objects.filter(pk=pk).filter(self.filtre(contexte)).exists()
+
+    def classer(self, contexte, tache_ids):
+        """
+        Version ensembliste pour les opérations groupées, en une requête :
+        (ids accordés par les règles, ids parmi eux retirés par un refus).
+        """
+        if not contexte.utilisateur_id or not tache_ids:
+            return set(), set()
+        queryset = Tache.objects.filter(pk__in=tache_ids).filter(self.filtre(contexte, refus=False))
+        retirees = self.refus(contexte)
+        if retirees is None:
+            return set(queryset.values_list('pk', flat=True)), set()
+        lignes = queryset.annotate(retiree=ExpressionWrapper(retirees, output_field=BooleanField()))
+        accordees, interdites = set(), set()
+        for pk, retiree in lignes.values_list('pk', 'retiree'):
+            accordees.add(pk)
+            if retiree:
+                interdites.add(pk)
+        return accordees, interdites
+
+    def evaluer(self, contexte, tache):
+        """Évaluation Python de référence (parité, banc d'essai)"""
+        if not contexte.utilisateur_id:
+            return False
+        if any(r.test(contexte, tache) for r in self.refuser if r.s_applique(contexte)):
+            return False
+        return any(r.test(contexte, tache) for r in self.accorder if r.s_applique(contexte))
+
+
+ACCES_TACHES = Politique(
+    accorder=[Createur(), Assigne(), MemeService(), MembreProjet()],
+    refuser=[PersonnelleDAutrui()],
+)
@@ -0,0 +1,384 @@
+"""
+Indicateurs du tableau de bord analytique (GET /api/analytics/).
+
+Nombre de requêtes constant, quel que soit le nombre de services :
+- tâches : une requête groupée par (service, statut, priorité) ; les
+  indicateurs de la période sont des Count(filter=...) conditionnels sur la
+  date de création, la charge en cours porte sur toutes les tâches ouvertes.
+  Les lignes sont repliées en Python en totaux globaux, par service, par
+  statut et par priorité ;
+- services (noms, capacités), projets et utilisateurs : une requête chacun ;
+- performances de livraison : une requête (voir ci-dessous).
+
+Périodes : semaine, mois, trimestre ou année calendaire en cours (fuseau
+local), depuis leur premier jour à minuit.
+
+Valeurs calculées :
+- performances de livraison (performances) : sur les tâches terminées
+  pendant la période (completion_date, à défaut date_maj), percentiles du
+  temps de cycle (création -> fin), taux de livraison dans les délais et
+  justesse des estimations (tracked_time / estimated_time). Une seule requête
+  calcule le total, les services, les projets et les utilisateurs assignés :
+  agrégats PERCENTILE_CONT de PostgreSQL sur une CTE, en UNION ALL.
+  L'efficacité affichée (efficiency, globalEfficiency) est le taux dans les
+  délais ;
+- charge système : points de charge des tâches ouvertes rapportés à la
+  capacité (capacity_charge) des services ;
+- disponibilité : secondes écoulées depuis le démarrage du processus.
+
+Cache des réponses (indicateurs_en_cache) : une entrée par (période et date
+de début, service_id, périmètre du rôle), mémorisée avec la version de sa
+source (api/cache_versions.py) : version du service filtré, ou version
+globale sans filtre. Toute écriture sur Tache / Projet incrémente la version
+globale et celles des services concernés (api/signals.py, opérations
+groupées de api/task_bulk.py) ; les données qui ne dépendent pas des écritures
+(échéances dépassées, utilisateurs) sont bornées par le TTL. Un seul
+processus recalcule une entrée donnée (verrou cache.add) : les autres servent
+la réponse précédente si elle existe, sinon attendent le résultat jusqu'à
+WAIT secondes. Statistiques (hit ratio, temps de recalcul) :
+GET /api/analytics/cache-stats/.
+
+Configuration (settings.ANALYTICS_CACHE) :
+    ENABLED       active le cache des réponses
+    TTL           durée de vie maximale d'une entrée (secondes)
+    LOCK_TIMEOUT  durée maximale du verrou de recalcul (secondes)
+    WAIT          attente maximale du recalcul d'un autre processus (secondes)
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from . import cache_versions, tracing
+from .models import Projet, Service, Tache, Utilisateur
+
+PERIODES = ('week', 'month', 'quarter', 'year')
+
+DEFAULTS = {
+    'ENABLED': True,
+    'TTL': 60,
+    'LOCK_TIMEOUT': 30,
+    'WAIT': 2.0,
+}
+
+PREFIXE = 'analytics:'
+VERSION_GLOBALE = 'analytics'
+COMPTEURS = ('hits', 'misses', 'stale', 'waits', 'recomputes', 'recompute_us')
+
+PERCENTILES = (0.5, 0.75, 0.9)
+
+DEMARRAGE = time.monotonic()
+
+
+def configuration():
+    return {**DEFAULTS, **getattr(settings, 'ANALYTICS_CACHE', {})}
+
+
+def debut_periode(periode, maintenant=None):
+    jour = timezone.localtime(maintenant).replace(hour=0, minute=0, second=0, microsecond=0)
+    if periode == 'week':
+        return jour - timedelta(days=jour.weekday())
+    if periode == 'month':
+        return jour.replace(day=1)
+    if periode == 'quarter':
+        return jour.replace(month=3 * ((jour.month - 1) // 3) + 1, day=1)
+    if periode == 'year':
+        return jour.replace(month=1, day=1)
+    raise ValueError(f'Période inconnue : {periode}')
+
+
+def taux(partie, total):
+    return round(100 * partie / total, 1) if total else 0
+
+
+def _compteurs():
+    return {'total': 0, 'terminees': 0, 'ouverts': 0}
+
+
+def _cumuler(compteurs, ligne):
+    compteurs['total'] += ligne['nombre']
+    compteurs['ouverts'] += ligne['points_ouverts'] or 0
+    if ligne['status'] == 'completed':
+        compteurs['terminees'] += ligne['nombre']
+
+
+def indicateurs(periode='month', service_id=None, maintenant=None):
+    """Corps de la réponse de get_analytics_data"""
+    maintenant = maintenant or timezone.now()
+    debut = debut_periode(periode, maintenant)
+    dans_periode = Q(date_creation__gte=debut)
+    terminee = Q(status='completed')
+
+    taches = Tache.objects.all()
+    services = Service.objects.all()
+    projets = Projet.objects.all()
+    if service_id:
+        taches = taches.filter(service_id=service_id)
+        services = services.filter(pk=service_id)
+        projets = projets.filter(Q(service_id=service_id) | Q(services=service_id))
+
+    lignes = taches.values('service_id', 'status', 'priority').annotate(
+        nombre=Count('id', filter=dans_periode),
+        en_retard=Count('id', filter=dans_periode & ~terminee & Q(deadline__lt=maintenant)),
+        points=Sum('workload_points', filter=dans_periode),
+        temps_passe=Sum('tracked_time', filter=dans_periode),
+        points_ouverts=Sum('workload_points', filter=~terminee),
+    ).order_by()
+
+    global_ = _compteurs()
+    global_.update(urgentes=0, en_retard=0, points=0, temps_passe=0)
+    par_service, par_statut, par_priorite = {}, {}, {}
+    for ligne in lignes:
+        _cumuler(global_, ligne)
+        if ligne['service_id']:
+            _cumuler(par_service.setdefault(ligne['service_id'], _compteurs()), ligne)
+        if ligne['priority'] == 'urgent':
+            global_['urgentes'] += ligne['nombre']
+        global_['en_retard'] += ligne['en_retard']
+        global_['points'] += ligne['points'] or 0
+        global_['temps_passe'] += ligne['temps_passe'] or 0
+        if ligne['nombre']:
+            par_statut[ligne['status']] = par_statut.get(ligne['status'], 0) + ligne['nombre']
+            par_priorite[ligne['priority']] = par_priorite.get(ligne['priority'], 0) + ligne['nombre']
+
+    livraison = performances(debut, service_id)
+    performance, capacite = [], 0
+    for service in services.order_by('name').values('id', 'name', 'capacity_charge'):
+        compteurs = par_service.get(service['id'], _compteurs())
+        mesures = livraison['services'].get(str(service['id']), MESURES_VIDES)
+        capacite += service['capacity_charge']
+        performance.append({
+            'id': str(service['id']),
+            'name': service['name'],
+            'totalTasks': compteurs['total'],
+            'completedTasks': compteurs['terminees'],
+            'completionRate': taux(compteurs['terminees'], compteurs['total']),
+            'efficiency': mesures['onTimeRate'],
+            'cycleTimeHours': mesures['cycleTimeHours'],
+            'estimateAccuracy': mesures['estimateAccuracy'],
+            'load': taux(compteurs['ouverts'], service['capacity_charge']),
+        })
+
+    projets = projets.aggregate(
+        actifs=Count('id', filter=Q(status='active'), distinct=True),
+        planification=Count('id', filter=Q(status='planning'), distinct=True),
+    )
+    utilisateurs = User.objects.aggregate(total=Count('id'), actifs=Count('id', filter=Q(is_active=True)))
+
+    return {
+        'period': {'name': periode, 'start': debut.isoformat(), 'end': maintenant.isoformat()},
+        'main_metrics': {
+            'totalTasks': global_['total'],
+            'completedTasks': global_['terminees'],
+            'urgentTasks': global_['urgentes'],
+            'overdueTasks': global_['en_retard'],
+            'completionRate': taux(global_['terminees'], global_['total']),
+            'activeProjects': projets['actifs'],
+            'planningProjects': projets['planification'],
+            'globalEfficiency': livraison['global']['onTimeRate'],
+            'workloadPoints': global_['points'],
+            'trackedTime': global_['temps_passe'],
+        },
+        'delivery_metrics': {
+            'global': livraison['global'],
+            'projects': livraison['projects'],
+            'users': livraison['users'],
+        },
+        'status_breakdown': par_statut,
+        'priority_breakdown': par_priorite,
+        'service_performance': performance,
+        'system_metrics': {
+            'activeUsers': utilisateurs['actifs'],
+            'totalUsers': utilisateurs['total'],
+            'uptimeSeconds': int(time.monotonic() - DEMARRAGE),
+            'systemLoad': taux(global_['ouverts'], capacite),
+        },
+    }
+
+
+# --- Performances de livraison ---
+
+
+MESURES_VIDES = {
+    'completed': 0,
+    'cycleTimeHours': {f'p{int(p * 100)}': None for p in PERCENTILES},
+    'onTimeRate': None,
+    'estimateAccuracy': None,
+    'estimateRatio': None,
+}
+
+
+def _sql_performances(service_id):
+    """Une CTE des tâches terminées, agrégée par total, service, projet et assigné"""
+    tache = Tache._meta.db_table
+    assignes = Tache.assignees.through._meta.db_table
+    fin = 'COALESCE(t.completion_date, t.date_maj)'
+    estimee = 't.estimated_time > 0 AND t.tracked_time > 0'
+    mesures = f"""
+        COUNT(*),
+        PERCENTILE_CONT(ARRAY{list(PERCENTILES)}::float8[]) WITHIN GROUP (ORDER BY t.cycle_h),
+        AVG(CASE WHEN t.a_temps THEN 1.0 ELSE 0.0 END),
+        AVG(GREATEST(0, 1 - ABS(t.tracked_time - t.estimated_time)::float8 / t.estimated_time)) FILTER (WHERE {estimee}),
+        PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY t.tracked_time::float8 / t.estimated_time) FILTER (WHERE {estimee})
+    """
+    return f"""
+        WITH terminees AS (
+            SELECT t.id, t.service_id, t.project_id, t.estimated_time, t.tracked_time,
+                   EXTRACT(EPOCH FROM {fin} - t.date_creation) / 3600.0 AS cycle_h,
+                   t.deadline >= {fin} AS a_temps
+            FROM {tache} t
+            WHERE t.status = 'completed' AND {fin} >= %s{' AND t.service_id = %s' if service_id else ''}
+        )
+        SELECT 'global', NULL, NULL, {mesures} FROM terminees t
+        UNION ALL
+        SELECT 'services', t.service_id::text, NULL, {mesures}
+        FROM terminees t WHERE t.service_id IS NOT NULL GROUP BY t.service_id
+        UNION ALL
+        SELECT 'projects', p.id::text, p.name, {mesures}
+        FROM terminees t JOIN {Projet._meta.db_table} p ON p.id = t.project_id GROUP BY p.id, p.name
+        UNION ALL
+        SELECT 'users', u.id::text, au.username, {mesures}
+        FROM terminees t
+        JOIN {assignes} a ON a.tache_id = t.id
+        JOIN {Utilisateur._meta.db_table} u ON u.id = a.utilisateur_id
+        JOIN {User._meta.db_table} au ON au.id = u.user_id
+        GROUP BY u.id, au.username
+    """
+
+
+def _arrondi(valeur, facteur=1, decimales=1):
+    return None if valeur is None else round(float(valeur) * facteur, decimales)
+
+
+def performances(debut, service_id=None):
+    """
+    Performances de livraison des tâches terminées depuis debut, en une requête :
+    {'global': mesures, 'services': {id: mesures}, 'projects': [...], 'users': [...]}
+    """
+    resultat = {'global': dict(MESURES_VIDES), 'services': {}, 'projects': [], 'users': []}
+    params = [debut, service_id] if service_id else [debut]
+    with connection.cursor() as cursor:
+        cursor.execute(_sql_performances(service_id), params)
+        lignes = cursor.fetchall()
+    for portee_, identifiant, nom, nombre, cycle, a_temps, justesse, ratio in lignes:
+        mesures = {
+            'completed': nombre,
+            'cycleTimeHours': {
+                f'p{int(p * 100)}': _arrondi(v) for p, v in zip(PERCENTILES, cycle or [None] * len(PERCENTILES))
+            },
+            'onTimeRate': _arrondi(a_temps, 100),
+            'estimateAccuracy': _arrondi(justesse, 100),
+            'estimateRatio': _arrondi(ratio, decimales=2),
+        }
+        if portee_ == 'global':
+            resultat['global'] = mesures
+        elif portee_ == 'services':
+            resultat['services'][identifiant] = mesures
+        else:
+            resultat[portee_].append({'id': identifiant, 'name': nom, **mesures})
+    for portee_ in ('projects', 'users'):
+        resultat[portee_].sort(key=lambda m: m['name'])
+    return resultat
+
+
+# --- Cache des réponses ---
+
+
+def version_service(service_id):
+    return f'{VERSION_GLOBALE}:service:{service_id}'
+
+
+def invalider(service_ids=()):
+    """Après une écriture sur Tache / Projet : version globale et versions des services concernés"""
+    cache_versions.incrementer_apres_commit(VERSION_GLOBALE)
+    for service_id in {s for s in service_ids if s}:
+        cache_versions.incrementer_apres_commit(version_service(service_id))
+
+
+def portee(contexte):
+    """Périmètre des données selon le rôle : ADMIN, DIRECTOR et MANAGER voient toute l'organisation"""
+    return 'organisation' if contexte.role in ('ADMIN', 'DIRECTOR', 'MANAGER') else contexte.role
+
+
+def compter(nom, n=1):
+    cle = f'{PREFIXE}stats:{nom}'
+    try:
+        cache.incr(cle, n)
+    except ValueError:
+        cache.add(cle, 0, timeout=None)
+        cache.incr(cle, n)
+
+
+def statistiques():
+    valeurs = cache.get_many([f'{PREFIXE}stats:{nom}' for nom in COMPTEURS])
+    stats = {nom: valeurs.get(f'{PREFIXE}stats:{nom}', 0) for nom in COMPTEURS}
+    demandes = stats['hits'] + stats['misses']
+    return {
+        'requests': demandes,
+        'hits': stats['hits'],
+        'misses': stats['misses'],
+        'staleServed': stats['stale'],
+        'waitedForRecompute': stats['waits'],
+        'hitRatio': round(stats['hits'] / demandes, 4) if demandes else None,
+        'recomputes': stats['recomputes'],
+        'avgRecomputeMs': round(stats['recompute_us'] / stats['recomputes'] / 1000, 3) if stats['recomputes'] else None,
+        'lastRecomputeMs': cache.get(f'{PREFIXE}stats:dernier_recalcul_ms'),
+    }
+
+
+def _servir(entree):
+    # Seule valeur qui évolue sans écriture en base
+    donnees = entree['data']
+    return {**donnees, 'system_metrics': {
+        **donnees['system_metrics'], 'uptimeSeconds': int(time.monotonic() - DEMARRAGE),
+    }}
+
+
+def _recalculer(cle, versions, periode, service_id, config):
+    debut = time.perf_counter()
+    entree = {'versions': versions, 'data': indicateurs(periode, service_id)}
+    duree = time.perf_counter() - debut
+    cache.set(cle, entree, config['TTL'])
+    compter('recomputes')
+    compter('recompute_us', int(duree * 1_000_000))
+    cache.set(f'{PREFIXE}stats:dernier_recalcul_ms', round(duree * 1000, 3), timeout=None)
+    tracing.evenement(tracing.INFO, 'analytics.recalcul', cle=cle, ms=round(duree * 1000, 3))
+    return entree
+
+
+def indicateurs_en_cache(periode='month', service_id=None, portee='organisation'):
+    """indicateurs() servi depuis le cache tant que la version de sa source est inchangée"""
+    config = configuration()
+    if not config['ENABLED']:
+        return indicateurs(periode, service_id)
+    cle = f"{PREFIXE}reponse:{periode}:{debut_periode(periode).date().isoformat()}:{service_id or 'all'}:{portee}"
+    versions = [cache_versions.version(version_service(service_id) if service_id else VERSION_GLOBALE)]
+    entree = cache.get(cle)
+    if entree is not None and entree['versions'] == versions:
+        compter('hits')
+        return _servir(entree)
+    compter('misses')
+
+    verrou = cle + ':recalcul'
+    if cache.add(verrou, 1, config['LOCK_TIMEOUT']):
+        try:
+            return _servir(_recalculer(cle, versions, periode, service_id, config))
+        finally:
+            cache.delete(verrou)
+    # Recalcul en cours dans un autre processus / thread
+    if entree is not None:
+        compter('stale')
+        return _servir(entree)
+    limite = time.monotonic() + config['WAIT']
+    while time.monotonic() < limite:
+        time.sleep(0.05)
+        entree = cache.get(cle)
+        if entree is not None and entree['versions'] == versions:
+            compter('waits')
+            return _servir(entree)
+    return _servir(_recalculer(cle, versions, periode, service_id, config))
@@ -0,0 +1,49 @@
+"""
+Chargement groupé des pièces jointes génériques (related_to / related_id).
+
+PieceJointe n'a pas de relation inverse exploitable par prefetch_related :
+on charge les pièces jointes de toute une page en une seule requête
+`related_to = %s AND related_id IN (...)` puis on les répartit en mémoire.
+"""
+from collections import defaultdict
+
+from rest_framework import serializers
+
+from .models import PieceJointe
+
+CACHE_ATTR = '_pieces_jointes_chargees'
+
+
+def charger_pieces_jointes(objets, related_to):
+    """Attache à chaque objet la liste de ses pièces jointes (une requête pour tous)"""
+    a_charger = {obj.pk: obj for obj in objets if not hasattr(obj, CACHE_ATTR)}
+    if not a_charger:
+        return
+    par_objet = defaultdict(list)
+    pieces = PieceJointe.objects.filter(
+        related_to=related_to, related_id__in=list(a_charger)
+    ).select_related('telecharge_par__user')
+    for piece in pieces:
+        par_objet[piece.related_id].append(piece)
+    for pk, obj in a_charger.items():
+        setattr(obj, CACHE_ATTR, par_objet.get(pk, []))
+
+
+def pieces_jointes_de(obj, related_to):
+    """Pièces jointes d'un objet, chargées à la demande si la page ne l'a pas fait"""
+    if not hasattr(obj, CACHE_ATTR):
+        charger_pieces_jointes([obj], related_to)
+    return getattr(obj, CACHE_ATTR)
+
+
+class PiecesJointesListSerializer(serializers.ListSerializer):
+    """
+    ListSerializer qui précharge les pièces jointes de toute la liste avant
+    la sérialisation. Le sérialiseur enfant déclare `related_to_pieces_jointes`.
+    """
+
+    def to_representation(self, data):
+        objets = list(data.all() if hasattr(data, 'all') else data)
+        if 'attachments' in self.child.fields:
+            charger_pieces_jointes(objets, self.child.related_to_pieces_jointes)
+        return super().to_representation(objets)
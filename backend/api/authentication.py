@@ -0,0 +1,143 @@
+"""
+Authentification JWT sans état (optionnelle) : JWT_CLAIMS_AUTH=1.
+
+Le jeton d'accès porte le rôle, le service, les groupes et le statut admin
+de l'utilisateur (revendications ajoutées à l'émission et au rafraîchissement).
+ClaimsJWTAuthentication construit request.user à partir du jeton, sans
+requête : un User partiellement chargé (id, username, is_active, is_staff,
+is_superuser ; les autres champs sont différés et lus à la demande) portant
+les revendications, que identite(request) utilise pour le rôle, le service
+et les groupes.
+
+Révocation : Utilisateur.version_jeton est incrémenté quand le rôle, le
+service, les groupes, le statut ou le mot de passe changent (api/signals.py).
+- lecture (GET, HEAD, OPTIONS) : le jeton fait foi jusqu'à son expiration ;
+- écriture : la version est comparée en base (une requête) ; un jeton
+  périmé est refusé (401, code token_stale) et le client le rafraîchit ;
+- rafraîchissement : les revendications sont toujours relues en base.
+Un changement de droits prend donc effet au plus tard au prochain
+rafraîchissement, et immédiatement pour les écritures.
+"""
+import uuid
+
+from django.contrib.auth.models import User
+from django.db import router
+from django.db.models import F
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import Utilisateur
+
+# Champs du User reconstruits depuis le jeton (les autres restent différés)
+CHAMPS_USER = ('id', 'username', 'is_active', 'is_staff', 'is_superuser')
+
+
+def revendications(user, groupes=None):
+    """
+    Revendications du jeton pour un User dont le profil est chargé (None sans
+    profil) ; `groupes` : noms des groupes s'ils sont déjà connus.
+    """
+    from .identity import Identite
+
+    utilisateur = getattr(user, 'utilisateur', None)
+    if utilisateur is None:
+        return None
+    contexte = Identite(user)
+    if groupes is not None:
+        contexte.groupes = frozenset(groupes)
+    return {
+        'uid': str(utilisateur.id),
+        'usr': user.username,
+        'role': utilisateur.role,
+        'sid': str(utilisateur.service_id) if utilisateur.service_id else None,
+        'grp': sorted(contexte.groupes),
+        'adm': contexte.est_admin,
+        'stf': user.is_staff,
+        'su': user.is_superuser,
+        'tv': utilisateur.version_jeton,
+    }
+
+
+def ajouter_revendications(jeton, user, groupes=None):
+    donnees = revendications(user, groupes)
+    if donnees:
+        for cle, valeur in donnees.items():
+            jeton[cle] = valeur
+    return jeton
+
+
+def revoquer_jetons(user_ids):
+    """Rend périmés les jetons d'accès émis pour ces utilisateurs (User.id)"""
+    Utilisateur.objects.filter(user_id__in=user_ids).update(version_jeton=F('version_jeton') + 1)
+
+
+def user_depuis_jeton(jeton):
+    """User partiellement chargé depuis les revendications, sans requête"""
+    valeurs = (
+        jeton[api_settings.USER_ID_CLAIM], jeton['usr'], True, jeton['stf'], jeton['su'],
+    )
+    user = User.from_db(router.db_for_read(User), CHAMPS_USER, valeurs)
+    user.revendications = {
+        'uid': uuid.UUID(jeton['uid']),
+        'role': jeton['role'],
+        'sid': uuid.UUID(jeton['sid']) if jeton['sid'] else None,
+        'grp': frozenset(jeton['grp']),
+        'adm': jeton['adm'],
+        'tv': jeton['tv'],
+    }
+    return user
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication sans chargement du User sur les lectures"""
+
+    def authenticate(self, request):
+        resultat = super().authenticate(request)
+        if resultat is None:
+            return None
+        user, jeton = resultat
+        if getattr(user, 'revendications', None) is not None and request.method not in SAFE_METHODS:
+            self.verifier_version(user)
+        return resultat
+
+    def get_user(self, validated_token):
+        if 'tv' not in validated_token:
+            # Jeton émis avant l'activation des revendications
+            return super().get_user(validated_token)
+        try:
+            return user_depuis_jeton(validated_token)
+        except (KeyError, ValueError, TypeError):
+            return super().get_user(validated_token)
+
+    def verifier_version(self, user):
+        version = (
+            Utilisateur.objects.filter(pk=user.revendications['uid'], user__is_active=True)
+            .values_list('version_jeton', flat=True)
+            .first()
+        )
+        if version != user.revendications['tv']:
+            raise AuthenticationFailed(
+                {'detail': "Droits modifiés depuis l'émission du jeton, rafraîchissez-le.", 'code': 'token_stale'},
+                code='token_stale',
+            )
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """Rafraîchissement : revendications relues en base (rôle, service, groupes à jour)"""
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        acces = AccessToken(data['access'])
+        user = (
+            User.objects.select_related('utilisateur')
+            .filter(**{api_settings.USER_ID_FIELD: acces[api_settings.USER_ID_CLAIM]})
+            .first()
+        )
+        if user is not None:
+            ajouter_revendications(acces, user)
+            data['access'] = str(acces)
+        return data
@@ -0,0 +1,267 @@
+"""
+Diffusion d'événements temps réel vers les flux SSE (api/streaming.py).
+
+Les producteurs publient de courts messages après validation de la
+transaction ; chaque processus ASGI tient le registre de ses utilisateurs
+connectés et ne livre qu'à ceux-ci. Backend (settings.EVENT_BROKER) :
+- 'memory' : livraison dans le processus (développement, tests, serveur unique) ;
+- 'postgres' : pg_notify sur un canal ; un thread par processus écoute
+  (LISTEN) sur une connexion dédiée et redistribue aux abonnés locaux.
+
+Un message 'notification' n'est qu'un signal de réveil : le flux relit les
+lignes Notification à partir de son curseur, un NOTIFY perdu (redémarrage,
+coupure) ne fait donc que retarder la livraison jusqu'à la reconnexion.
+Formats : {'k': 'notification', 'u': [ids]} et {'k': 'task', 't': [[id, statut], ...]}.
+"""
+import asyncio
+import json
+import logging
+import re
+import select
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, connection, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'BACKEND': 'memory',
+    'CHANNEL': 'gptc_events',
+    'HEARTBEAT': 20,
+    'RETRY_MS': 3000,
+    'QUEUE_SIZE': 256,
+}
+
+# Limite d'une charge utile NOTIFY : 8000 octets
+TAILLE_MAX_MESSAGE = 7500
+
+
+def configuration():
+    return {**DEFAULTS, **getattr(settings, 'EVENT_BROKER', {})}
+
+
+class Abonnement:
+    """File d'événements d'une connexion SSE, alimentée depuis n'importe quel thread"""
+
+    def __init__(self, utilisateur_id, taille):
+        self.utilisateur_id = str(utilisateur_id)
+        self.boucle = asyncio.get_running_loop()
+        self.file = asyncio.Queue(maxsize=taille)
+        # File pleine : le client devra se resynchroniser
+        self.debordement = False
+
+    def livrer(self, evenement):
+        try:
+            self.boucle.call_soon_threadsafe(self._deposer, evenement)
+        except RuntimeError:
+            # Boucle fermée : la connexion est en cours de fermeture
+            pass
+
+    def _deposer(self, evenement):
+        try:
+            self.file.put_nowait(evenement)
+        except asyncio.QueueFull:
+            self.debordement = True
+
+
+class Broker:
+    """Registre des abonnés du processus et distribution locale"""
+
+    def __init__(self, config):
+        self.config = config
+        self._abonnements = defaultdict(set)
+        self._verrou = threading.Lock()
+
+    def abonner(self, utilisateur_id):
+        abonnement = Abonnement(utilisateur_id, self.config['QUEUE_SIZE'])
+        with self._verrou:
+            self._abonnements[abonnement.utilisateur_id].add(abonnement)
+        self.demarrer()
+        return abonnement
+
+    def desabonner(self, abonnement):
+        with self._verrou:
+            abonnements = self._abonnements.get(abonnement.utilisateur_id)
+            if abonnements is not None:
+                abonnements.discard(abonnement)
+                if not abonnements:
+                    del self._abonnements[abonnement.utilisateur_id]
+
+    def connectes(self):
+        with self._verrou:
+            return set(self._abonnements)
+
+    def _livrer(self, utilisateur_id, evenement):
+        with self._verrou:
+            abonnements = list(self._abonnements.get(utilisateur_id, ()))
+        for abonnement in abonnements:
+            abonnement.livrer(evenement)
+
+    def distribuer(self, message):
+        """Livre un message aux abonnés locaux concernés (contexte synchrone)"""
+        connectes = self.connectes()
+        if not connectes:
+            return
+        if message['k'] == 'notification':
+            for utilisateur_id in connectes.intersection(message['u']):
+                self._livrer(utilisateur_id, ('notification', None))
+        elif message['k'] == 'task':
+            statuts = dict(message['t'])
+            from .models import TacheVisibilite
+            audience = TacheVisibilite.objects.filter(
+                tache_id__in=list(statuts), utilisateur_id__in=list(connectes)
+            ).values_list('utilisateur_id', 'tache_id').distinct()
+            for utilisateur_id, tache_id in audience:
+                self._livrer(str(utilisateur_id), ('task', {'id': str(tache_id), 'status': statuts[str(tache_id)]}))
+
+    def publier(self, message):
+        raise NotImplementedError
+
+    def demarrer(self):
+        pass
+
+
+class BrokerMemoire(Broker):
+
+    def publier(self, message):
+        self.distribuer(message)
+
+
+class BrokerPostgres(Broker):
+    """pg_notify pour publier, LISTEN sur une connexion dédiée pour recevoir"""
+
+    def __init__(self, config):
+        super().__init__(config)
+        if not re.fullmatch(r'[a-z_][a-z0-9_]*', config['CHANNEL']):
+            raise ValueError(f"Canal NOTIFY invalide : {config['CHANNEL']!r}")
+        self._ecouteur = None
+
+    def publier(self, message):
+        with connection.cursor() as cursor:
+            for morceau in decouper(message):
+                cursor.execute('SELECT pg_notify(%s, %s)', [self.config['CHANNEL'], morceau])
+
+    def demarrer(self):
+        with self._verrou:
+            if self._ecouteur is not None and self._ecouteur.is_alive():
+                return
+            self._ecouteur = threading.Thread(target=self._ecouter, name='event-broker-listen', daemon=True)
+            self._ecouteur.start()
+
+    def _connexion_ecoute(self):
+        base = connections['default']
+        brute = base.get_new_connection(base.get_connection_params())
+        brute.autocommit = True
+        with brute.cursor() as cursor:
+            cursor.execute(f'LISTEN {self.config["CHANNEL"]}')
+        return brute
+
+    def _ecouter(self):
+        delai = 1
+        reprise = False
+        while True:
+            brute = None
+            try:
+                brute = self._connexion_ecoute()
+                delai = 1
+                if reprise:
+                    # Messages perdus pendant la coupure : réveiller tous les flux
+                    self._recevoir(json.dumps({'k': 'notification', 'u': sorted(self.connectes())}))
+                while True:
+                    if select.select([brute], [], [], self.config['HEARTBEAT']) == ([], [], []):
+                        continue
+                    brute.poll()
+                    while brute.notifies:
+                        self._recevoir(brute.notifies.pop(0).payload)
+            except Exception:
+                logger.exception("Écoute du canal %s interrompue", self.config['CHANNEL'])
+            finally:
+                if brute is not None:
+                    try:
+                        brute.close()
+                    except Exception:
+                        pass
+            reprise = True
+            time.sleep(delai)
+            delai = min(delai * 2, 30)
+
+    def _recevoir(self, charge):
+        try:
+            self.distribuer(json.loads(charge))
+        except Exception:
+            logger.exception("Message du broker ignoré : %.200s", charge)
+        finally:
+            close_old_connections()
+
+
+def decouper(message):
+    """Sérialise un message en charges utiles NOTIFY de taille bornée"""
+    cle = 'u' if message['k'] == 'notification' else 't'
+    elements = message[cle]
+    charges, morceau = [], []
+    taille_base = len(json.dumps({**message, cle: []}, separators=(',', ':')))
+    taille = taille_base
+    for element in elements:
+        taille_element = len(json.dumps(element, separators=(',', ':'))) + 1
+        if morceau and taille + taille_element > TAILLE_MAX_MESSAGE:
+            charges.append(json.dumps({**message, cle: morceau}, separators=(',', ':')))
+            morceau, taille = [], taille_base
+        morceau.append(element)
+        taille += taille_element
+    if morceau:
+        charges.append(json.dumps({**message, cle: morceau}, separators=(',', ':')))
+    return charges
+
+
+BACKENDS = {
+    'memory': BrokerMemoire,
+    'postgres': BrokerPostgres,
+}
+
+_broker = None
+_verrou_broker = threading.Lock()
+
+
+def broker():
+    """Broker du processus, créé à la première utilisation"""
+    global _broker
+    if _broker is None:
+        with _verrou_broker:
+            if _broker is None:
+                config = configuration()
+                _broker = BACKENDS[config['BACKEND']](config)
+    return _broker
+
+
+def reinitialiser():
+    """Oublie le broker courant (changement de configuration, tests)"""
+    global _broker
+    with _verrou_broker:
+        _broker = None
+
+
+def _publier_apres_validation(message):
+    def publier():
+        try:
+            broker().publier(message)
+        except Exception:
+            # Le temps réel ne doit jamais faire échouer l'écriture
+            logger.exception("Publication %s impossible", message['k'])
+    transaction.on_commit(publier)
+
+
+def publier_notifications(utilisateur_ids):
+    """Signale de nouvelles notifications aux destinataires (après commit)"""
+    ids = sorted({str(i) for i in utilisateur_ids})
+    if ids:
+        _publier_apres_validation({'k': 'notification', 'u': ids})
+
+
+def publier_statuts_taches(taches):
+    """Signale les changements de statut aux utilisateurs qui voient les tâches (après commit)"""
+    statuts = [[str(tache.id), tache.status] for tache in taches]
+    if statuts:
+        _publier_apres_validation({'k': 'task', 't': statuts})
@@ -0,0 +1,74 @@
+"""
+Invalidation de caches par numéro de version.
+
+Une valeur dérivée (carte des permissions par rôle, agrégats...) est
+mémorisée avec la version de sa source ; toute modification de la source
+incrémente la version dans le cache Django (settings.CACHES), ce qui rend
+caduques toutes les copies de tous les processus sans avoir à les énumérer.
+La version initiale est horodatée : si la clé est évincée du cache, la
+nouvelle version ne peut pas coïncider avec une ancienne.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+PREFIXE = 'version:'
+
+
+def _initiale():
+    return time.time_ns() // 1000
+
+
+def version(nom):
+    cle = PREFIXE + nom
+    valeur = cache.get(cle)
+    if valeur is None:
+        cache.add(cle, _initiale(), timeout=None)
+        valeur = cache.get(cle)
+    return valeur
+
+
+def incrementer(nom):
+    cle = PREFIXE + nom
+    try:
+        return cache.incr(cle)
+    except ValueError:
+        # Clé absente (évincée) : repartir d'une nouvelle version horodatée
+        cache.add(cle, _initiale(), timeout=None)
+        return cache.incr(cle)
+
+
+def incrementer_apres_commit(nom):
+    """Incrémente après validation : aucun processus ne recalcule sur des données non validées"""
+    transaction.on_commit(lambda: incrementer(nom))
+
+
+class ValeurVersionnee:
+    """
+    Valeur calculée une fois par version de sa source et mémorisée dans le
+    processus ; seul le numéro de version est relu à chaque accès.
+    """
+
+    def __init__(self, nom, calcul):
+        self.nom = nom
+        self.calcul = calcul
+        # (version, valeur) remplacés ensemble : un lecteur ne voit jamais
+        # la valeur d'une version associée au numéro d'une autre
+        self._instantane = (None, None)
+        self._verrou = threading.Lock()
+
+    def instantane(self):
+        """(version, valeur) issus d'une seule lecture du numéro de version"""
+        courante = version(self.nom)
+        instantane = self._instantane
+        if instantane[0] != courante:
+            with self._verrou:
+                instantane = self._instantane
+                if instantane[0] != courante:
+                    instantane = self._instantane = (courante, self.calcul())
+        return instantane
+
+    def get(self):
+        return self.instantane()[1]
@@ -0,0 +1,103 @@
+"""
+Capacité effective par service et par jour, compte tenu des prêts d'employés.
+
+Un prêt approuvé ou en cours (PretEmploye, statut 'approved' / 'active')
+retire impact_charge points par jour à service_source et les ajoute à
+service_destination, du date_debut au date_fin inclus. La capacité de base
+est Service.capacity_charge.
+
+Balayage : chaque prêt qui recoupe l'horizon produit deux événements
+(+/- impact_charge au premier jour, inverse au lendemain du dernier) par
+service ; les événements sont triés une fois (O(n log n)) puis parcourus
+avec les jours de l'horizon en maintenant le solde courant de chaque service.
+Les prêts sont lus en une requête, les services en une autre.
+
+Le résultat est mis en cache par horizon (settings.CACHES), indexé par une
+version incrémentée après toute écriture sur PretEmploye ou Service
+(api/signals.py). Utilisé par GET /api/services/capacity/ et par la charge
+de travail (api/workload.py).
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+
+from . import cache_versions
+from .models import PretEmploye, Service
+
+STATUTS_ACTIFS = ('approved', 'active')
+VERSION = 'capacite'
+PREFIXE = 'capacite:'
+DUREE_CACHE = 24 * 3600
+# Horizon maximal d'un calcul (jours) : le balayage produit jours x services valeurs
+FENETRE_MAX = 366
+
+
+def invalider():
+    cache_versions.incrementer_apres_commit(VERSION)
+
+
+def evenements(debut, fin):
+    """Événements (jour, service_id, variation) des prêts actifs recoupant [debut, fin], triés par jour"""
+    liste = []
+    prets = PretEmploye.objects.filter(
+        statut__in=STATUTS_ACTIFS, date_debut__lte=fin, date_fin__gte=debut,
+    ).values_list('service_source_id', 'service_destination_id', 'date_debut', 'date_fin', 'impact_charge')
+    for source, destination, date_debut, date_fin, impact in prets:
+        premier, lendemain = max(date_debut, debut), date_fin + timedelta(days=1)
+        liste.append((premier, source, -impact))
+        liste.append((premier, destination, impact))
+        if lendemain <= fin:
+            liste.append((lendemain, source, impact))
+            liste.append((lendemain, destination, -impact))
+    liste.sort(key=lambda e: e[0])
+    return liste
+
+
+def calculer(debut, fin):
+    """{service_id: {'name', 'base', 'capacity': [capacité par jour de debut à fin]}}"""
+    nb_jours = (fin - debut).days + 1
+    services = {
+        str(s['id']): {'name': s['name'], 'base': s['capacity_charge'], 'capacity': []}
+        for s in Service.objects.order_by('name').values('id', 'name', 'capacity_charge')
+    }
+    soldes = dict.fromkeys(services, 0)
+    a_traiter = evenements(debut, fin)
+    i = 0
+    for n in range(nb_jours):
+        jour = debut + timedelta(days=n)
+        while i < len(a_traiter) and a_traiter[i][0] <= jour:
+            _, service_id, variation = a_traiter[i]
+            if str(service_id) in soldes:
+                soldes[str(service_id)] += variation
+            i += 1
+        for service_id, service in services.items():
+            service['capacity'].append(service['base'] + soldes[service_id])
+    return services
+
+
+def capacites(debut, fin):
+    """calculer(debut, fin), depuis le cache tant que prêts et services sont inchangés"""
+    cle = f'{PREFIXE}{debut.isoformat()}:{fin.isoformat()}:{cache_versions.version(VERSION)}'
+    resultat = cache.get(cle)
+    if resultat is None:
+        resultat = calculer(debut, fin)
+        cache.set(cle, resultat, DUREE_CACHE)
+    return resultat
+
+
+def rapport(debut, fin):
+    return {
+        'start': debut.isoformat(),
+        'end': fin.isoformat(),
+        'services': [
+            {
+                'id': service_id,
+                'name': service['name'],
+                'baseCapacity': service['base'],
+                'minCapacity': min(service['capacity']),
+                'maxCapacity': max(service['capacity']),
+                'capacity': service['capacity'],
+            }
+            for service_id, service in capacites(debut, fin).items()
+        ],
+    }
@@ -0,0 +1,103 @@
+"""
+Sélection de champs (« sparse fieldsets ») et extension à la demande.
+
+    GET /api/tasks/?fields=id,title,status,priority,deadline
+    GET /api/tasks/?expand=creatorDetails,comments
+
+- sans `fields` ni `expand` : forme historique complète ;
+- `fields` : seuls les champs listés (plus `id`) sont sérialisés ;
+- `expand` seul : tous les champs simples, plus les relations listées ;
+- les relations déclarées dans `champs_extensibles` ne sont incluses que
+  si elles sont nommées dans `fields` ou `expand`.
+
+Les champs retenus déterminent aussi les select_related / prefetch_related /
+annotate appliqués au queryset : une relation non demandée n'est jamais requêtée.
+Seules les méthodes de lecture (GET, HEAD, OPTIONS) sont concernées.
+"""
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def _liste_param(request, nom):
+    valeur = request.query_params.get(nom)
+    if valeur is None:
+        return None
+    return {champ.strip() for champ in valeur.split(',') if champ.strip()}
+
+
+def champs_demandes(request, serializer_class):
+    """
+    Retourne l'ensemble des champs à exposer pour la requête,
+    ou None pour conserver la forme complète.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    fields = _liste_param(request, FIELDS_PARAM)
+    expand = _liste_param(request, EXPAND_PARAM)
+    if fields is None and expand is None:
+        return None
+
+    declares = list(serializer_class.Meta.fields)
+    if fields is not None:
+        retenus = (fields | (expand or set()) | {'id'})
+    else:
+        retenus = (set(declares) - set(serializer_class.champs_extensibles)) | expand
+    return {champ for champ in declares if champ in retenus}
+
+
+class ChampsSelectifsSerializerMixin:
+    """
+    À placer avant ModelSerializer. Le sérialiseur déclare :
+    - `champs_extensibles` : relations coûteuses, exclues si non demandées ;
+    - `chargements` : {champ: {'select_related': (...), 'prefetch_related': (...),
+      'annotate': {...}}} décrivant ce qu'il faut charger pour chaque champ.
+    """
+    champs_extensibles = ()
+    chargements = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        champs = champs_demandes(self.context.get('request'), type(self))
+        if champs is not None:
+            for nom in set(self.fields) - champs:
+                self.fields.pop(nom)
+
+    @classmethod
+    def optimiser_queryset(cls, queryset, champs=None):
+        """Applique les chargements nécessaires aux champs (tous si champs=None)"""
+        if champs is None:
+            champs = cls.Meta.fields
+        select, prefetch, annotations = [], [], {}
+        for champ in champs:
+            chargement = cls.chargements.get(champ, {})
+            select.extend(chargement.get('select_related', ()))
+            prefetch.extend(chargement.get('prefetch_related', ()))
+            annotations.update(chargement.get('annotate', {}))
+        if select:
+            queryset = queryset.select_related(*dict.fromkeys(select))
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        if annotations:
+            queryset = queryset.annotate(**annotations)
+        return queryset
+
+
+class ChampsSelectifsViewSetMixin:
+    """
+    Applique au queryset les chargements correspondant à la forme demandée.
+    Passe par filter_queryset, donc couvre list, retrieve et les actions
+    qui appellent self.filter_queryset(self.get_queryset()).
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+        serializer_class = self.get_serializer_class()
+        if not hasattr(serializer_class, 'optimiser_queryset'):
+            return queryset
+        return serializer_class.optimiser_queryset(
+            queryset, champs_demandes(self.request, serializer_class)
+        )
@@ -0,0 +1,100 @@
+"""
+Contexte d'identité de la requête.
+
+Les classes de permission et les get_queryset lisent le rôle, le service,
+les groupes, les services dirigés et les projets de l'utilisateur courant
+via identite(request) : chaque information est chargée au premier accès
+puis réutilisée pour toute la durée de la requête (une requête SQL pour le
+profil et son service, une pour les groupes, etc.), au lieu d'un
+user.groups.filter(...).exists() par vérification.
+
+Avec ClaimsJWTAuthentication (api/authentication.py), rôle, service et
+groupes sont lus dans les revendications du jeton, sans requête ; le profil
+complet n'est chargé que s'il est demandé.
+"""
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from .models import Projet, Service, Utilisateur
+
+
+class Identite:
+    """Identité paresseuse d'un utilisateur authentifié (ou anonyme)"""
+
+    def __init__(self, user):
+        self.user = user
+        self.authentifie = bool(user and user.is_authenticated)
+        self.revendications = getattr(user, 'revendications', None) if self.authentifie else None
+
+    @cached_property
+    def utilisateur(self):
+        if not self.authentifie:
+            return None
+        if type(self.user).utilisateur.is_cached(self.user):
+            # Déjà chargé (ou affecté) sur l'utilisateur : pas de requête
+            return getattr(self.user, 'utilisateur', None)
+        utilisateur = Utilisateur.objects.select_related('service').filter(user=self.user).first()
+        if utilisateur is not None:
+            # Le descripteur met aussi en cache user.utilisateur pour le code existant
+            self.user.utilisateur = utilisateur
+        return utilisateur
+
+    @property
+    def utilisateur_id(self):
+        if self.revendications is not None:
+            return self.revendications['uid']
+        return self.utilisateur.id if self.utilisateur else None
+
+    @property
+    def role(self):
+        if self.revendications is not None:
+            return self.revendications['role']
+        return self.utilisateur.role if self.utilisateur else None
+
+    @property
+    def service_id(self):
+        if self.revendications is not None:
+            return self.revendications['sid']
+        return self.utilisateur.service_id if self.utilisateur else None
+
+    @cached_property
+    def groupes(self):
+        if not self.authentifie:
+            return frozenset()
+        if self.revendications is not None:
+            return self.revendications['grp']
+        return frozenset(self.user.groups.values_list('name', flat=True))
+
+    def a_role(self, *roles):
+        """Rôle du profil ou appartenance au groupe du même nom"""
+        return self.role in roles or not self.groupes.isdisjoint(roles)
+
+    @property
+    def est_admin(self):
+        return self.a_role('ADMIN')
+
+    @cached_property
+    def services_diriges(self):
+        if not self.utilisateur_id:
+            return frozenset()
+        return frozenset(Service.objects.filter(chef_id=self.utilisateur_id).values_list('id', flat=True))
+
+    @cached_property
+    def projets(self):
+        """Projets dont l'utilisateur est chef, membre, ou dont son service fait partie"""
+        if not self.utilisateur_id:
+            return frozenset()
+        condition = Q(chef_id=self.utilisateur_id) | Q(membres=self.utilisateur_id)
+        if self.service_id:
+            condition |= Q(service_id=self.service_id) | Q(services=self.service_id)
+        return frozenset(Projet.objects.filter(condition).values_list('id', flat=True).distinct())
+
+
+def identite(request):
+    """Contexte d'identité de la requête (DRF ou Django), créé au premier appel"""
+    user = getattr(request, 'user', None)
+    contexte = getattr(request, '_identite', None)
+    if contexte is None or contexte.user is not user:
+        contexte = Identite(user)
+        request._identite = contexte
+    return contexte
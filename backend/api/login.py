@@ -0,0 +1,274 @@
+"""
+Mode « débit de connexion » de POST /api/token/ (LOGIN_THROUGHPUT=1).
+
+Vue asynchrone remplaçant CustomTokenObtainPairView, même réponse :
+- l'utilisateur, son profil et son service sont lus en une requête ;
+- la vérification du mot de passe (PBKDF2, coûteuse en CPU mais qui libère
+  le GIL) s'exécute dans un pool de threads borné : la boucle ASGI continue
+  de servir les autres requêtes ; au-delà de MAX_PENDING vérifications en
+  attente, la connexion est refusée (503, Retry-After) plutôt que d'empiler ;
+- permissions et groupes viennent du cache partagé (settings.CACHES),
+  indexés par les versions qui les invalident : carte des permissions
+  (api/role_permissions.py), version des jetons du profil
+  (api/authentication.py) et statut superutilisateur ;
+- last_login et derniere_connexion ne sont pas écrits pendant la requête :
+  ils sont mis en file et écrits par lots (toutes les FLUSH_EVERY connexions
+  ou FLUSH_INTERVAL secondes, même sans nouvelle connexion) par le thread
+  d'écriture différée de api/write_behind.py, en deux UPDATE. Les dates des
+  FLUSH_INTERVAL dernières secondes peuvent être perdues si le processus est tué.
+
+Servie par un serveur ASGI (gptc_oddl.asgi:application) ; sous WSGI la vue
+fonctionne mais sans concurrence. Banc d'essai : manage.py bench_login.
+
+Configuration (settings.LOGIN_THROUGHPUT) :
+    ENABLED              route /api/token/ vers cette vue
+    WORKERS              threads de hachage par processus
+    MAX_PENDING          vérifications en attente avant de répondre 503
+    FLUSH_EVERY          écriture des dates de connexion toutes les N connexions...
+    FLUSH_INTERVAL       ... ou toutes les N secondes
+    PERMISSIONS_TIMEOUT  durée de vie des permissions en cache (secondes)
+"""
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.http import HttpResponseNotAllowed, JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework_simplejwt.serializers import TokenObtainSerializer
+
+from . import cache_versions, role_permissions
+from .authentication import ajouter_revendications
+from .models import Utilisateur
+from .write_behind import EcrivainDiffere
+
+DEFAULTS = {
+    'ENABLED': False,
+    'WORKERS': 4,
+    'MAX_PENDING': 64,
+    'FLUSH_EVERY': 200,
+    'FLUSH_INTERVAL': 10,
+    'PERMISSIONS_TIMEOUT': 3600,
+}
+
+PREFIXE_DROITS = 'login:droits:'
+
+
+def configuration():
+    return {**DEFAULTS, **getattr(settings, 'LOGIN_THROUGHPUT', {})}
+
+
+class Sature(Exception):
+    """Trop de vérifications de mot de passe en attente"""
+
+
+def _verifier(mot_de_passe, encode):
+    """(mot de passe correct, hachage à mettre à jour) ; exécuté dans le pool"""
+    if encode is None:
+        # Compte inconnu : même coût qu'une vérification (pas d'énumération par le temps)
+        make_password(mot_de_passe)
+        return False, False
+    a_mettre_a_jour = []
+    correct = check_password(mot_de_passe, encode, setter=lambda _: a_mettre_a_jour.append(True))
+    return correct, bool(a_mettre_a_jour)
+
+
+class PoolHachage:
+    """Pool de threads borné pour les vérifications de mot de passe"""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self._executeur = None
+        self._threads = 0
+        self.en_attente = 0
+
+    def executeur(self, config):
+        with self._verrou:
+            if self._executeur is None or self._threads != config['WORKERS']:
+                if self._executeur is not None:
+                    self._executeur.shutdown(wait=False)
+                self._executeur = ThreadPoolExecutor(config['WORKERS'], thread_name_prefix='login-hachage')
+                self._threads = config['WORKERS']
+            return self._executeur
+
+    async def verifier(self, mot_de_passe, encode, config):
+        with self._verrou:
+            if self.en_attente >= config['MAX_PENDING']:
+                raise Sature()
+            self.en_attente += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executeur(config), _verifier, mot_de_passe, encode
+            )
+        finally:
+            with self._verrou:
+                self.en_attente -= 1
+
+
+pool = PoolHachage()
+
+
+class DernieresConnexions:
+    """Dates de connexion en attente d'écriture (la plus récente par utilisateur)"""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self._instants = {}
+        self._dernier_flush = time.monotonic()
+
+    def enregistrer(self, user_id, instant):
+        with self._verrou:
+            self._instants[user_id] = max(instant, self._instants.get(user_id, instant))
+
+    def flush_necessaire(self, config):
+        return bool(self._instants) and (
+            len(self._instants) >= config['FLUSH_EVERY']
+            or time.monotonic() - self._dernier_flush >= config['FLUSH_INTERVAL']
+        )
+
+    def extraire(self):
+        with self._verrou:
+            instants, self._instants = self._instants, {}
+            self._dernier_flush = time.monotonic()
+        return instants
+
+    def restituer(self, instants):
+        """Remet en file un lot dont l'écriture a échoué"""
+        with self._verrou:
+            for user_id, instant in instants.items():
+                self._instants[user_id] = max(instant, self._instants.get(user_id, instant))
+
+    def flush(self):
+        """Écrit les dates en attente : un UPDATE pour User, un pour Utilisateur"""
+        instants = self.extraire()
+        if not instants:
+            return 0
+        ids = sorted(instants)
+        try:
+            with transaction.atomic():
+                User.objects.filter(pk__in=ids).update(last_login=Case(
+                    *[When(pk=i, then=Value(instants[i])) for i in ids], output_field=DateTimeField()
+                ))
+                Utilisateur.objects.filter(user_id__in=ids).update(derniere_connexion=Case(
+                    *[When(user_id=i, then=Value(instants[i])) for i in ids], output_field=DateTimeField()
+                ))
+        except Exception:
+            self.restituer(instants)
+            raise
+        return len(ids)
+
+
+connexions = DernieresConnexions()
+ecrivain = EcrivainDiffere('login-ecriture', connexions, configuration)
+
+
+def invalider_droits(user_ids):
+    """
+    Oublie les droits en cache de ces utilisateurs (User.id). Appelé par les
+    signaux m2m_changed de User.groups / User.user_permissions ; tout code qui
+    écrit directement dans ces tables de liaison (bulk_create, delete sur
+    .through) doit l'appeler lui-même. Effacés tout de suite puis de nouveau
+    après la validation : une connexion concurrente a pu remettre en cache
+    l'état d'avant la transaction.
+    """
+    cles = [PREFIXE_DROITS + str(i) for i in user_ids]
+    cache.delete_many(cles)
+    transaction.on_commit(lambda: cache.delete_many(cles))
+
+
+def droits(user, utilisateur, config):
+    """{'permissions', 'groups'} de l'utilisateur, via le cache partagé"""
+    versions = [
+        cache_versions.version(role_permissions.VERSION_PERMISSIONS),
+        utilisateur.version_jeton if utilisateur else None,
+        user.is_superuser,
+    ]
+    cle = PREFIXE_DROITS + str(user.pk)
+    entree = cache.get(cle)
+    if entree is not None and entree['versions'] == versions:
+        return entree
+    entree = {
+        'versions': versions,
+        'permissions': sorted(user.get_all_permissions()),
+        'groups': sorted(user.groups.values_list('name', flat=True)),
+    }
+    cache.set(cle, entree, config['PERMISSIONS_TIMEOUT'])
+    return entree
+
+
+def charger(username):
+    return User.objects.select_related('utilisateur__service').filter(**{User.USERNAME_FIELD: username}).first()
+
+
+def reponse(user, mot_de_passe, rehacher, config):
+    """Corps de la réponse de CustomTokenObtainPairSerializer, sans écriture de last_login"""
+    from .views import CustomTokenObtainPairSerializer
+
+    if rehacher:
+        # Hachage obsolète (paramètres du hasher modifiés) : mis à jour comme le ferait user.check_password
+        user.set_password(mot_de_passe)
+        user.save(update_fields=['password'])
+    utilisateur = getattr(user, 'utilisateur', None)
+    service = utilisateur.service if utilisateur else None
+    acces = droits(user, utilisateur, config)
+    refresh = CustomTokenObtainPairSerializer.token_class.for_user(user)
+    ajouter_revendications(refresh, user, groupes=acces['groups'])
+    return {
+        'refresh': str(refresh),
+        'access': str(refresh.access_token),
+        'user_id': str(utilisateur.id) if utilisateur else '',
+        'username': user.username,
+        'email': user.email,
+        'role': utilisateur.role if utilisateur else '',
+        'service_id': str(service.id) if service else None,
+        'service_nom': service.name if service else None,
+        'permissions': acces['permissions'],
+        'is_staff': user.is_staff,
+        'groups': acces['groups'],
+    }
+
+
+# Identifiants dans le corps, pas de cookie de session : pas de contrôle CSRF (comme la vue DRF remplacée)
+@csrf_exempt
+async def connexion(request):
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    try:
+        donnees = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'detail': 'JSON invalide.'}, status=400)
+    erreurs = {
+        champ: ['Ce champ est obligatoire.']
+        for champ in (User.USERNAME_FIELD, 'password')
+        if not isinstance(donnees, dict) or not donnees.get(champ)
+    }
+    if erreurs:
+        return JsonResponse(erreurs, status=400)
+
+    config = configuration()
+    user = await sync_to_async(charger)(donnees[User.USERNAME_FIELD])
+    try:
+        correct, rehacher = await pool.verifier(donnees['password'], user.password if user else None, config)
+    except Sature:
+        reponse_503 = JsonResponse({'detail': 'Trop de connexions simultanées, réessayez.'}, status=503)
+        reponse_503['Retry-After'] = '1'
+        return reponse_503
+    if not correct or not user.is_active:
+        return JsonResponse({
+            'detail': str(TokenObtainSerializer.default_error_messages['no_active_account']),
+            'code': 'no_active_account',
+        }, status=401)
+
+    corps = await sync_to_async(reponse)(user, donnees['password'], rehacher, config)
+    connexions.enregistrer(user.pk, timezone.now())
+    ecrivain.signaler()
+    return JsonResponse(corps)
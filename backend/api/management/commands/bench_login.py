@@ -0,0 +1,75 @@
+import asyncio
+import json
+import time
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+from api import login
+from api.models import Utilisateur
+from api.views import CustomTokenObtainPairView
+
+PREFIXE = 'bench_login_'
+MOT_DE_PASSE = 'bench-login-mot-de-passe'
+
+
+class Command(BaseCommand):
+    help = "Mesure le débit de connexion (connexions/s par processus) : vue DRF synchrone et mode LOGIN_THROUGHPUT"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help="Comptes de test créés (puis supprimés)")
+        parser.add_argument('--logins', type=int, default=200, help="Connexions par mesure")
+        parser.add_argument('--concurrency', type=int, default=16, help="Connexions simultanées en mode asynchrone")
+
+    def corps(self, i, nombre):
+        return json.dumps({'username': f'{PREFIXE}{i % nombre}', 'password': MOT_DE_PASSE})
+
+    def handle(self, *args, **options):
+        nombre, connexions = options['users'], options['logins']
+        fabrique = RequestFactory()
+        users = [User.objects.create_user(f'{PREFIXE}{i}', password=MOT_DE_PASSE) for i in range(nombre)]
+        for user in users:
+            Utilisateur.objects.create(user=user)
+        config = login.configuration()
+        try:
+            vue = CustomTokenObtainPairView.as_view()
+            debut = time.perf_counter()
+            for i in range(connexions):
+                reponse = vue(fabrique.post('/api/token/', self.corps(i, nombre), content_type='application/json'))
+                if reponse.status_code != 200:
+                    raise CommandError(f"Connexion refusée par la vue DRF : {reponse.status_code}")
+            synchrone = connexions / (time.perf_counter() - debut)
+            self.stdout.write(f"Vue DRF synchrone        : {synchrone:8.1f} connexions/s")
+
+            async def mesurer():
+                limite = asyncio.Semaphore(options['concurrency'])
+
+                async def une(i):
+                    async with limite:
+                        requete = fabrique.post('/api/token/', self.corps(i, nombre), content_type='application/json')
+                        reponse = await login.connexion(requete)
+                        if reponse.status_code != 200:
+                            raise CommandError(f"Connexion refusée en mode débit : {reponse.status_code}")
+
+                debut = time.perf_counter()
+                await asyncio.gather(*(une(i) for i in range(connexions)))
+                return connexions / (time.perf_counter() - debut)
+
+            for passe in ('cache froid', 'cache chaud'):
+                if passe == 'cache froid':
+                    login.invalider_droits([u.pk for u in users])
+                # async_to_sync : les accès à la base reviennent dans le thread de la commande
+                debit = async_to_sync(mesurer)()
+                self.stdout.write(
+                    f"Mode débit ({passe}) : {debit:8.1f} connexions/s "
+                    f"({config['WORKERS']} threads de hachage, {options['concurrency']} simultanées, "
+                    f"x{debit / synchrone:.1f})"
+                )
+            debut = time.perf_counter()
+            ecrites = login.connexions.flush()
+            self.stdout.write(f"Écriture différée : {ecrites} date(s) de connexion en {1000 * (time.perf_counter() - debut):.1f} ms")
+        finally:
+            login.connexions.extraire()
+            User.objects.filter(username__startswith=PREFIXE).delete()
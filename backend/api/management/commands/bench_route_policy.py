@@ -0,0 +1,54 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.urls import resolve
+
+from api.middleware import RoutePolicyMiddleware
+
+
+class Command(BaseCommand):
+    help = "Mesure le surcoût par requête de la politique de routes compilée (RoutePolicyMiddleware)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000, help="Requêtes simulées par chemin")
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        middleware = RoutePolicyMiddleware(lambda request: None)
+        identifiant = uuid.uuid4()
+        chemins = (
+            ('GET', '/api/tasks/'),
+            ('GET', f'/api/tasks/{identifiant}/'),
+            ('GET', f'/api/conversations/{identifiant}/messages/{uuid.uuid4()}/'),
+            ('GET', f'/api/tasks/{str(identifiant).upper()}/'),
+            ('GET', '/api/tasks/pas-un-uuid/'),
+            ('POST', '/api/tasks/'),
+            ('GET', '/api/check-username/'),
+        )
+        fabrique = RequestFactory()
+        self.stdout.write(f"{len(middleware.table)} route(s) compilée(s), {iterations} itérations par chemin")
+        total_resolution = total_politique = 0.0
+        for methode, chemin in chemins:
+            request = getattr(fabrique, methode.lower())(chemin)
+            debut = time.perf_counter()
+            for _ in range(iterations):
+                correspondance = resolve(chemin)
+            resolution = (time.perf_counter() - debut) / iterations
+            request.resolver_match = correspondance
+            debut = time.perf_counter()
+            for _ in range(iterations):
+                reponse = middleware.process_view(request, correspondance.func, correspondance.args, correspondance.kwargs)
+            politique = (time.perf_counter() - debut) / iterations
+            total_resolution += resolution
+            total_politique += politique
+            verdict = 'continue' if reponse is None else reponse.status_code
+            self.stdout.write(
+                f"  {methode:<4} {chemin:<60} résolution {1e6 * resolution:7.2f} µs"
+                f"  politique {1e6 * politique:6.2f} µs  ({verdict})"
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Surcoût moyen : {1e6 * total_politique / len(chemins):.2f} µs/requête "
+            f"({100 * total_politique / total_resolution:.1f} % de la résolution d'URL, faite une seule fois)"
+        ))
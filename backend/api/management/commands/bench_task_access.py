@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.access import ACCES_TACHES
+from api.identity import Identite
+from api.models import Tache, Utilisateur
+
+
+class Command(BaseCommand):
+    help = "Mesure la politique d'accès aux tâches : liste, contrôle d'objet compilé (EXISTS) et évaluation Python"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help="Nombre d'utilisateurs échantillonnés")
+        parser.add_argument('--tasks', type=int, default=50, help="Tâches contrôlées par utilisateur")
+
+    def mesurer(self, fonction):
+        with CaptureQueriesContext(connection) as requetes:
+            debut = time.perf_counter()
+            resultat = fonction()
+            duree = time.perf_counter() - debut
+        return resultat, duree, len(requetes)
+
+    def handle(self, *args, **options):
+        utilisateurs = list(Utilisateur.objects.select_related('user').order_by('?')[:options['users']])
+        taches = list(Tache.objects.order_by('?')[:options['tasks']])
+        if not utilisateurs or not taches:
+            self.stdout.write(self.style.WARNING("Aucun utilisateur ou aucune tâche à mesurer."))
+            return
+
+        totaux = {'liste': [0.0, 0], 'objet': [0.0, 0], 'python': [0.0, 0]}
+        ecarts = 0
+        for utilisateur in utilisateurs:
+            contexte = Identite(utilisateur.user)
+            _, duree, nb = self.mesurer(lambda: ACCES_TACHES.queryset(contexte).count())
+            totaux['liste'][0] += duree
+            totaux['liste'][1] += nb
+            compile_, duree, nb = self.mesurer(lambda: [ACCES_TACHES.autorise(contexte, t) for t in taches])
+            totaux['objet'][0] += duree
+            totaux['objet'][1] += nb
+            # Référence : règles évaluées en Python, avec les mêmes chargements que l'ancienne permission
+            contexte = Identite(utilisateur.user)
+            python, duree, nb = self.mesurer(lambda: [ACCES_TACHES.evaluer(contexte, t) for t in taches])
+            totaux['python'][0] += duree
+            totaux['python'][1] += nb
+            ecarts += sum(a != b for a, b in zip(compile_, python))
+
+        controles = len(utilisateurs) * len(taches)
+        self.stdout.write(f"{len(utilisateurs)} utilisateurs x {len(taches)} tâches")
+        duree, nb = totaux['liste']
+        self.stdout.write(f"  liste (EXISTS index)   : {1000 * duree / len(utilisateurs):.2f} ms/utilisateur, {nb / len(utilisateurs):.1f} requête(s)")
+        for cle, libelle in (('objet', 'objet (EXISTS)        '), ('python', 'objet (Python)        ')):
+            duree, nb = totaux[cle]
+            self.stdout.write(f"  {libelle} : {1000 * duree / controles:.3f} ms/contrôle, {nb / controles:.2f} requête(s)")
+        style = self.style.SUCCESS if not ecarts else self.style.ERROR
+        self.stdout.write(style(f"{ecarts} écart(s) entre la politique compilée et l'évaluation Python."))
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import Utilisateur
+from api.visibility import (
+    verifier_coherence, synchroniser_taches, taches_visibles_reference
+)
+
+
+class Command(BaseCommand):
+    help = "Vérifie la cohérence de l'index de visibilité des tâches avec les règles d'accès"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20, help="Nombre d'exemples d'écarts affichés")
+        parser.add_argument('--fix', action='store_true', help="Resynchronise les tâches en écart")
+        parser.add_argument(
+            '--reference', type=int, default=0, metavar='N',
+            help="Compare aussi N utilisateurs avec la requête de référence (OR de jointures)"
+        )
+
+    def handle(self, *args, **options):
+        manquantes, en_trop, ex_manquantes, ex_en_trop = verifier_coherence(options['limit'])
+        for tache_id, utilisateur_id, raison in ex_manquantes:
+            self.stdout.write(f"  manquante : tâche {tache_id} / utilisateur {utilisateur_id} ({raison})")
+        for tache_id, utilisateur_id, raison in ex_en_trop:
+            self.stdout.write(f"  en trop   : tâche {tache_id} / utilisateur {utilisateur_id} ({raison})")
+
+        ecarts_reference = 0
+        if options['reference']:
+            for utilisateur in Utilisateur.objects.order_by('?')[:options['reference']]:
+                attendues = set(taches_visibles_reference(utilisateur).values_list('id', flat=True))
+                indexees = set(utilisateur.visibilites_taches.values_list('tache_id', flat=True))
+                if attendues != indexees:
+                    ecarts_reference += 1
+                    self.stdout.write(
+                        f"  utilisateur {utilisateur.id} : {len(attendues - indexees)} manquante(s), "
+                        f"{len(indexees - attendues)} en trop"
+                    )
+
+        if not (manquantes or en_trop or ecarts_reference):
+            self.stdout.write(self.style.SUCCESS("Index de visibilité cohérent."))
+            return
+
+        if options['fix']:
+            taches = {ligne[0] for ligne in ex_manquantes + ex_en_trop}
+            if manquantes + en_trop > options['limit'] or ecarts_reference:
+                raise CommandError(
+                    f"{manquantes} manquante(s), {en_trop} en trop : trop d'écarts, "
+                    "lancez rebuild_task_visibility."
+                )
+            crees, supprimees = synchroniser_taches(taches)
+            self.stdout.write(self.style.SUCCESS(f"Corrigé : {crees} ligne(s) ajoutée(s), {supprimees} supprimée(s)."))
+            return
+
+        raise CommandError(f"Index incohérent : {manquantes} ligne(s) manquante(s), {en_trop} en trop.")
@@ -0,0 +1,60 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.provisioning import FORMATS, TAILLE_LOT, Import, detecter_format, lire_lignes
+
+
+class Command(BaseCommand):
+    help = "Importe des comptes utilisateurs depuis un fichier CSV ou JSON lines (« - » : entrée standard)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichier', help="Colonnes : username, email, password, first_name, last_name, role, service, phone")
+        parser.add_argument('--format', choices=FORMATS, help="Déduit de l'extension par défaut")
+        parser.add_argument('--batch-size', type=int, default=TAILLE_LOT, help="Lignes par transaction")
+        parser.add_argument('--workers', type=int, help="Processus de hachage des mots de passe (défaut : nombre de CPU)")
+        parser.add_argument('--dry-run', action='store_true', help="Valide sans rien créer")
+        parser.add_argument('--errors', help="Écrit toutes les lignes en erreur dans ce fichier (JSON lines)")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size doit être strictement positif.")
+        format_ = options['format'] or detecter_format(options['fichier'])
+        if options['fichier'] == '-':
+            flux = sys.stdin
+        else:
+            try:
+                flux = open(options['fichier'], encoding='utf-8-sig', newline='')
+            except OSError as exc:
+                raise CommandError(f"Fichier illisible : {exc}")
+
+        debut = time.monotonic()
+        import_ = Import(processus=options['workers'], simulation=options['dry_run'])
+        try:
+            for numero_lot, crees in enumerate(import_.executer(lire_lignes(flux, format_), options['batch_size']), 1):
+                if options['verbosity'] > 1:
+                    self.stdout.write(
+                        f"  lot {numero_lot} : {crees} compte(s), {import_.crees} au total "
+                        f"({time.monotonic() - debut:.1f}s)"
+                    )
+        finally:
+            if flux is not sys.stdin:
+                flux.close()
+        duree = time.monotonic() - debut
+
+        for erreur in import_.erreurs[:20]:
+            self.stdout.write(self.style.WARNING(
+                f"  ligne {erreur['line']} ({erreur['username'] or '?'}) : {json.dumps(erreur['errors'], ensure_ascii=False)}"
+            ))
+        if len(import_.erreurs) > 20:
+            self.stdout.write(self.style.WARNING(f"  ... {len(import_.erreurs) - 20} autre(s) erreur(s)"))
+        if options['errors']:
+            with open(options['errors'], 'w', encoding='utf-8') as sortie:
+                for erreur in import_.erreurs:
+                    sortie.write(json.dumps(erreur, ensure_ascii=False) + '\n')
+        prefixe = "[simulation] " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefixe}{import_.crees} compte(s) importé(s), {len(import_.erreurs)} ligne(s) en erreur en {duree:.1f}s."
+        ))
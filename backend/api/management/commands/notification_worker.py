@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import outbox
+from api.models import EvenementNotification
+from api.notifications import configuration
+
+
+class Command(BaseCommand):
+    help = "Diffuse les événements de l'outbox en notifications (plusieurs workers possibles)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help="Événements réservés par lot (défaut : NOTIFICATION_OUTBOX['BATCH_SIZE'])")
+        parser.add_argument('--once', action='store_true', help="Vide la file puis s'arrête")
+        parser.add_argument('--stats', action='store_true', help="Affiche les métriques de retard et s'arrête")
+        parser.add_argument('--stats-every', type=float, default=60, metavar='S', help="Intervalle d'affichage des métriques (secondes)")
+        parser.add_argument('--retry-failed', action='store_true', help="Remet en file les événements en échec définitif")
+
+    def afficher_stats(self):
+        stats = outbox.statistiques()
+        self.stdout.write(
+            f"en attente={stats['pending']} (prêts={stats['ready']}, en réessai={stats['retrying']}) "
+            f"échecs={stats['failed']} plus ancien={stats['oldest_pending_age_s']:.1f}s | "
+            f"dernière heure : diffusés={stats['delivered_last_window']} "
+            f"retard moyen={stats['avg_lag_s']:.2f}s max={stats['max_lag_s']:.2f}s"
+        )
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.afficher_stats()
+            return
+        if options['retry_failed']:
+            n = EvenementNotification.objects.filter(statut='failed').update(statut='pending', tentatives=0)
+            self.stdout.write(f"{n} événement(s) remis en file.")
+
+        if options['once']:
+            diffuses, creees, echecs = outbox.vider(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{diffuses} événement(s) diffusé(s), {creees} notification(s), {echecs} échec(s)."
+            ))
+            return
+
+        attente = configuration()['POLL_INTERVAL']
+        dernier_affichage = time.monotonic()
+        self.stdout.write("Worker de notifications démarré (Ctrl+C pour arrêter).")
+        try:
+            while True:
+                diffuses, creees, echecs = outbox.traiter_lot(options['batch_size'])
+                if echecs:
+                    self.stdout.write(self.style.WARNING(f"{echecs} événement(s) en échec, replanifié(s)."))
+                if time.monotonic() - dernier_affichage >= options['stats_every']:
+                    self.afficher_stats()
+                    dernier_affichage = time.monotonic()
+                if not diffuses and not echecs:
+                    time.sleep(attente)
+        except KeyboardInterrupt:
+            self.stdout.write("Worker arrêté.")
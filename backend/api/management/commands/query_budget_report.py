@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import StatistiqueRequetesVue
+from api.query_accounting import percentile_histogramme
+
+TRIS = {
+    'time': lambda s: s.total_temps_ms,
+    'queries': lambda s: s.total_requetes,
+    'avg': lambda s: s.total_requetes / s.nombre_appels if s.nombre_appels else 0,
+    'calls': lambda s: s.nombre_appels,
+    'duplicates': lambda s: sum(s.doublons.values()),
+}
+
+
+class Command(BaseCommand):
+    help = "Classe les vues par coût SQL (statistiques de QueryAccountingMiddleware)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sort', choices=sorted(TRIS), default='time', help="Critère de classement (défaut : temps SQL total)")
+        parser.add_argument('--limit', type=int, default=20, help="Nombre de vues affichées")
+        parser.add_argument('--view', help="Filtre sur le nom de vue (sous-chaîne)")
+        parser.add_argument('--duplicates', type=int, default=1, metavar='N', help="Formes SQL dupliquées affichées par vue")
+        parser.add_argument(
+            '--budget', type=float, metavar='N',
+            help="Échoue si une vue dépasse N requêtes en moyenne par appel"
+        )
+        parser.add_argument('--reset', action='store_true', help="Efface les statistiques après affichage")
+
+    def handle(self, *args, **options):
+        stats = StatistiqueRequetesVue.objects.filter(nombre_appels__gt=0)
+        if options['view']:
+            stats = stats.filter(vue__icontains=options['view'])
+        stats = sorted(stats, key=TRIS[options['sort']], reverse=True)
+        if not stats:
+            self.stdout.write("Aucune statistique enregistrée.")
+            return
+
+        temps_global = sum(s.total_temps_ms for s in stats) or 1
+        self.stdout.write(
+            f"{'vue':<45} {'appels':>8} {'moy':>7} {'p95':>6} {'max':>6} {'ms/appel':>9} {'% SQL':>6} {'doublons':>9}"
+        )
+        hors_budget = [
+            s.vue for s in stats
+            if options['budget'] is not None and s.total_requetes / s.nombre_appels > options['budget']
+        ]
+        for s in stats[:options['limit']]:
+            moyenne = s.total_requetes / s.nombre_appels
+            self.stdout.write(
+                f"{s.vue[:45]:<45} {s.nombre_appels:>8} {moyenne:>7.1f} "
+                f"{percentile_histogramme(s.histogramme, 0.95) or '-':>6} {s.max_requetes:>6} "
+                f"{s.total_temps_ms / s.nombre_appels:>9.1f} {100 * s.total_temps_ms / temps_global:>6.1f} "
+                f"{sum(s.doublons.values()):>9}"
+            )
+            doublons = sorted(s.doublons.items(), key=lambda item: item[1], reverse=True)
+            for forme, nombre in doublons[:options['duplicates']]:
+                self.stdout.write(f"    {nombre}x {forme[:150]}")
+
+        if options['reset']:
+            StatistiqueRequetesVue.objects.all().delete()
+            self.stdout.write(self.style.WARNING("Statistiques effacées."))
+        if hors_budget:
+            raise CommandError(f"{len(hors_budget)} vue(s) hors budget : {', '.join(hors_budget)}")
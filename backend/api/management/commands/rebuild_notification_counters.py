@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.notification_counters import reconstruire, verifier
+
+
+class Command(BaseCommand):
+    help = "Recalcule (ou contrôle avec --check) les compteurs de notifications non lues"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Contrôle uniquement, échoue en cas d'écart")
+        parser.add_argument('--limit', type=int, default=20, help="Nombre d'exemples d'écarts affichés")
+
+    def handle(self, *args, **options):
+        if options['check']:
+            total, exemples = verifier(options['limit'])
+            for utilisateur_id, type_, priorite, attendu, actuel in exemples:
+                self.stdout.write(f"  utilisateur {utilisateur_id} {type_}/{priorite} : {actuel} au lieu de {attendu}")
+            if total:
+                raise CommandError(f"{total} compteur(s) incohérent(s) : lancez rebuild_notification_counters.")
+            self.stdout.write(self.style.SUCCESS("Compteurs de notifications cohérents."))
+            return
+
+        debut = time.monotonic()
+        total = reconstruire()
+        duree = time.monotonic() - debut
+        self.stdout.write(self.style.SUCCESS(f"Compteurs recalculés : {total} lignes en {duree:.2f}s."))
@@ -0,0 +1,15 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.visibility import reconstruire_tout
+
+
+class Command(BaseCommand):
+    help = "Reconstruit entièrement l'index de visibilité des tâches (TacheVisibilite)"
+
+    def handle(self, *args, **kwargs):
+        debut = time.monotonic()
+        total = reconstruire_tout()
+        duree = time.monotonic() - debut
+        self.stdout.write(self.style.SUCCESS(f"Index de visibilité reconstruit : {total} lignes en {duree:.2f}s."))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.workload import reconstruire, verifier
+
+
+class Command(BaseCommand):
+    help = "Recalcule (ou contrôle avec --check) les compteurs de charge de travail des services et utilisateurs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help="Contrôle uniquement, échoue en cas d'écart")
+        parser.add_argument('--limit', type=int, default=20, help="Nombre d'exemples d'écarts affichés")
+
+    def handle(self, *args, **options):
+        if options['check']:
+            total, exemples = verifier(options['limit'])
+            for (service_id, utilisateur_id, jour), attendu, actuel in exemples:
+                self.stdout.write(
+                    f"  {'service ' + service_id if service_id else 'utilisateur ' + utilisateur_id} {jour} : "
+                    f"{actuel} au lieu de {attendu}"
+                )
+            if total:
+                raise CommandError(f"{total} compteur(s) de charge incohérent(s) : lancez rebuild_workload.")
+            self.stdout.write(self.style.SUCCESS("Compteurs de charge cohérents."))
+            return
+
+        debut = time.monotonic()
+        total = reconstruire()
+        duree = time.monotonic() - debut
+        self.stdout.write(self.style.SUCCESS(f"Compteurs de charge recalculés : {total} lignes en {duree:.2f}s."))
@@ -0,0 +1,41 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.rollups import CHEVAUCHEMENT, TAILLE_LOT, mettre_a_jour, reconstruire, verifier
+
+
+class Command(BaseCommand):
+    help = "Met à jour les rollups quotidiens des tâches depuis le dernier passage (--rebuild : depuis zéro)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help="Vide les rollups et relit toutes les tâches")
+        parser.add_argument('--check', action='store_true', help="Contrôle uniquement, échoue en cas d'écart")
+        parser.add_argument('--batch-size', type=int, default=TAILLE_LOT, help="Tâches lues par lot")
+        parser.add_argument(
+            '--overlap', type=int, default=int(CHEVAUCHEMENT.total_seconds()),
+            help="Secondes relues avant le curseur (transactions validées en retard)",
+        )
+        parser.add_argument('--limit', type=int, default=20, help="Nombre d'exemples d'écarts affichés")
+
+    def handle(self, *args, **options):
+        if options['check']:
+            total, exemples = verifier(options['limit'])
+            for cle, attendu, actuel in exemples:
+                self.stdout.write(f"  {cle} : {actuel} au lieu de {attendu}")
+            if total:
+                raise CommandError(f"{total} ligne(s) de rollup incohérente(s) : lancez rollup_task_stats --rebuild.")
+            self.stdout.write(self.style.SUCCESS("Rollups des tâches cohérents."))
+            return
+
+        debut = time.monotonic()
+        if options['rebuild']:
+            resultat = reconstruire(options['batch_size'])
+        else:
+            resultat = mettre_a_jour(options['batch_size'], timedelta(seconds=options['overlap']))
+        duree = time.monotonic() - debut
+        self.stdout.write(self.style.SUCCESS(
+            f"Rollups mis à jour : {resultat['taches']} tâche(s) intégrée(s), "
+            f"{resultat['supprimees']} supprimée(s), {resultat['lignes']} ligne(s) ajustée(s) en {duree:.2f}s."
+        ))
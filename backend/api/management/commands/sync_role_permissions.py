@@ -1,29 +1,50 @@
-from django.core.management.base import BaseCommand
-from django.contrib.auth.models import Permission
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
 from api.models import Utilisateur
-from api.role_permissions import build_role_permissions
+from api.role_permissions import (
+    TAILLE_LOT_SYNCHRO, permissions_attendues_par_role, synchroniser_permissions_utilisateurs,
+)
 
-class Command(BaseCommand):
-    help = "Synchronise les permissions Django pour chaque utilisateur selon son rôle"
 
-    def handle(self, *args, **kwargs):
-        role_permissions = build_role_permissions()  # Appel dynamique ici
-        total_updated = 0
+class Command(BaseCommand):
+    help = "Synchronise les permissions Django pour chaque utilisateur selon son rôle (par différence)"
 
-        for utilisateur in Utilisateur.objects.select_related('user').all():
-            user = utilisateur.user
-            role = utilisateur.role
-            perms = role_permissions.get(role, [])
-            # Nettoyer les permissions existantes
-            user.user_permissions.clear()
-            # Ajouter les permissions du rôle
-            for codename in perms:
-                try:
-                    perm = Permission.objects.get(codename=codename)
-                    user.user_permissions.add(perm)
-                except Permission.DoesNotExist:
-                    self.stdout.write(self.style.WARNING(f"Permission '{codename}' non trouvée pour le rôle {role}"))
-            user.save()
-            total_updated += 1
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--role', action='append', choices=Utilisateur.Role.values, dest='roles',
+            help="Limiter aux utilisateurs de ce rôle (répétable)",
+        )
+        parser.add_argument('--dry-run', action='store_true', help="Affiche les écarts sans rien modifier")
+        parser.add_argument(
+            '--chunk-size', type=int, default=TAILLE_LOT_SYNCHRO,
+            help="Utilisateurs traités par transaction",
+        )
 
-        self.stdout.write(self.style.SUCCESS(f"Permissions synchronisées pour {total_updated} utilisateurs.")) 
\ No newline at end of file
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size doit être strictement positif.")
+        debut = time.monotonic()
+        utilisateurs = ajoutees = supprimees = 0
+        par_role, manquantes = permissions_attendues_par_role(options['roles'] or Utilisateur.Role.values)
+        for role, codenames in manquantes.items():
+            for codename in codenames:
+                self.stdout.write(self.style.WARNING(f"Permission '{codename}' non trouvée pour le rôle {role}"))
+        for stats in synchroniser_permissions_utilisateurs(
+            par_role, options['chunk_size'], simulation=options['dry_run']
+        ):
+            utilisateurs += stats['utilisateurs']
+            ajoutees += stats['ajoutees']
+            supprimees += stats['supprimees']
+            if options['verbosity'] > 1:
+                self.stdout.write(
+                    f"  lot de {stats['utilisateurs']} utilisateurs : "
+                    f"+{stats['ajoutees']} / -{stats['supprimees']} ({time.monotonic() - debut:.2f}s)"
+                )
+        duree = time.monotonic() - debut
+        prefixe = "[simulation] " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefixe}Permissions synchronisées pour {utilisateurs} utilisateurs : "
+            f"{ajoutees} ajoutée(s), {supprimees} supprimée(s) en {duree:.2f}s."
+        ))
@@ -1,148 +1,120 @@
-import uuid
-from django.http import JsonResponse
-from django.urls import resolve
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connection
 
-class UUIDValidationMiddleware:
+from . import query_accounting, route_policy, tracing
+
+class MiddlewareHybride:
     """
-    Middleware pour vérifier et valider les UUIDs dans les URLs et paramètres
+    Base des middlewares utilisables en WSGI comme en ASGI : sous ASGI, la
+    chaîne reste asynchrone (pas de passage par un thread pour chaque
+    middleware, ce qui sérialiserait les vues asynchrones comme api/login.py).
     """
-    
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        return await self.get_response(request)
+
+
+class CorrelationIdMiddleware(MiddlewareHybride):
+    """
+    Identifiant de corrélation et trace de la requête (voir api/tracing.py).
+    L'en-tête X-Request-ID est toujours renvoyé ; si la requête est tracée,
+    un événement 'requete' résume la durée et les spans à la fin.
+    """
 
     def __call__(self, request):
-        # Ne pas valider les UUID pour les URLs d'ajout dans l'admin
-        if request.path.startswith('/admin/') and request.path.endswith('/add/'):
-            return self.get_response(request)
-        # Traitement de la requête avant la vue
-        
-        # Liste des modèles qui utilisent des UUIDs et leurs URLs correspondantes
-        uuid_patterns = [
-            'service', 
-            'utilisateur', 
-            'projet', 
-            'tache', 
-            'assignation', 
-            'commentaire',
-            'notification',
-            'pretemploye',
-            'modeurgence'
-        ]
-        
-        # Récupérer le chemin de la requête et vérifier s'il correspond à un pattern UUID
-        path_parts = request.path.strip('/').split('/')
-        
-        # Vérifier si l'URL correspond à un modèle avec UUID et contient un ID
-        for pattern in uuid_patterns:
-            if pattern in path_parts and len(path_parts) > 1:
-                # Trouver l'indice du pattern dans le chemin
-                pattern_index = path_parts.index(pattern)
-                
-                # Vérifier si nous avons un ID après le nom du modèle
-                if pattern_index + 1 < len(path_parts) and path_parts[pattern_index + 1]:
-                    potential_uuid = path_parts[pattern_index + 1]
-                    
-                    # Si l'ID contient un caractère '/' ou '?' ou a une extension, tronquer
-                    if '/' in potential_uuid:
-                        potential_uuid = potential_uuid.split('/')[0]
-                    if '?' in potential_uuid:
-                        potential_uuid = potential_uuid.split('?')[0]
-                    if '.' in potential_uuid:
-                        potential_uuid = potential_uuid.split('.')[0]
-                    
-                    # Vérifier si c'est un UUID valide
-                    try:
-                        uuid_obj = uuid.UUID(potential_uuid)
-                        
-                        # Normaliser l'UUID en minuscules
-                        normalized_uuid = str(uuid_obj).lower()
-                        
-                        # Si l'UUID est différent de sa version normalisée, rediriger
-                        if normalized_uuid != potential_uuid.lower():
-                            corrected_path = request.path.replace(potential_uuid, normalized_uuid)
-                            return JsonResponse({
-                                'error': 'Format d\'UUID invalide',
-                                'message': 'Les UUIDs doivent être au format RFC4122 standard',
-                                'corrected_url': corrected_path
-                            }, status=400)
-                    except ValueError:
-                        # Si l'ID n'est pas un UUID valide et que c'est une route API
-                        if 'api' in path_parts:
-                            return JsonResponse({
-                                'error': 'UUID invalide',
-                                'message': f'L\'identifiant fourni "{potential_uuid}" n\'est pas un UUID valide'
-                            }, status=400)
-        
-        # Continuer avec la requête
-        response = self.get_response(request)
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        jetons, trace = tracing.debuter(request.headers.get(tracing.ENTETE))
+        try:
+            return self.terminer(request, self.get_response(request), trace)
+        finally:
+            tracing.terminer(jetons)
+
+    async def __acall__(self, request):
+        jetons, trace = tracing.debuter(request.headers.get(tracing.ENTETE))
+        try:
+            return self.terminer(request, await self.get_response(request), trace)
+        finally:
+            tracing.terminer(jetons)
+
+    def terminer(self, request, response, trace):
+        if trace is not None:
+            champs = {
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round((time.perf_counter() - trace.debut) * 1000, 3),
+                'spans': trace.resume,
+                'spans_ignored': trace.spans_ignores,
+            }
+            if tracing.actif(tracing.DEBUG):
+                champs['spans_detail'] = trace.spans
+            tracing.evenement(tracing.INFO, 'requete', **champs)
+        response[tracing.ENTETE] = trace.correlation if trace is not None else tracing.correlation_id()
         return response
 
-class RolePermissionMiddleware:
+
+class QueryAccountingMiddleware(MiddlewareHybride):
     """
-    Middleware pour vérifier les permissions basées sur le rôle de l'utilisateur.
-    Empêche l'accès aux vues si l'utilisateur n'a pas les permissions nécessaires.
+    Middleware de comptabilité SQL (voir api/query_accounting.py).
+    Mesure chaque requête HTTP, l'agrège par vue et, si HEADERS est actif,
+    expose X-Query-Count, X-Query-Time-Ms, X-Query-Duplicates et X-Query-Top.
+    Sous ASGI, les requêtes SQL s'exécutent dans d'autres threads que le
+    middleware : la mesure ne s'applique qu'en WSGI.
     """
-    
-    def __init__(self, get_response):
-        self.get_response = get_response
-    
+
     def __call__(self, request):
-        # Si l'utilisateur n'est pas authentifié, on passe à la vue (qui gérera l'authentification)
-        if not request.user.is_authenticated:
-            return self.get_response(request)
-        
-        # Pour les requêtes admin, on laisse Django gérer les permissions
-        if request.path.startswith('/admin/'):
-            return self.get_response(request)
-        
-        # Pour la page d'accueil, on laisse passer
-        if request.path == '/' or request.path == '':
-            return self.get_response(request)
-        
-        # Correction : autoriser analytics à ADMIN, MANAGER, DIRECTOR
-        if request.path.startswith('/api/analytics'):
-            utilisateur = getattr(request.user, 'utilisateur', None)
-            if utilisateur and utilisateur.role in ['ADMIN', 'MANAGER', 'DIRECTOR']:
-                return self.get_response(request)
-        
-        # Correction : autoriser tous les utilisateurs authentifiés à accéder à leur profil
-        if request.path.startswith('/api/users/me/') or request.path == '/api/users/me':
-            return self.get_response(request)
-        
-        # Pour les autres requêtes API
-        if request.path.startswith('/api/'):
-            # Récupérer l'information sur la vue cible
-            view_func, args, kwargs = resolve(request.path)
-            
-            # Essayer de récupérer l'utilisateur avec son profil
-            try:
-                utilisateur = request.user.utilisateur
-                
-                # Si c'est un admin, permettre toutes les actions
-                if utilisateur.role == 'ADMIN':
-                    return self.get_response(request)
-                
-                # Pour les tâches - laisser les ViewSets gérer les permissions d'objet
-                # Le middleware ne vérifie que les permissions générales
-                if 'taches' in request.path:
-                    # POST pour créer une tâche - vérifier si l'utilisateur peut créer des tâches
-                    if request.method == 'POST':
-                        # Seuls les ADMIN et MANAGER peuvent créer des tâches
-                        if utilisateur.role not in ['ADMIN', 'MANAGER']:
-                            return JsonResponse({
-                                'error': 'Permission refusée',
-                                'message': "Vous n'avez pas la permission de créer une tâche"
-                            }, status=403)
-                    
-                    # Pour les modifications et suppressions, laisser les ViewSets gérer
-                    # car ils ont accès à l'objet et peuvent vérifier les permissions spécifiques
-                    if request.method in ['PUT', 'PATCH', 'DELETE']:
-                        # Laisser passer - les ViewSets géreront les permissions d'objet
-                        pass
-                        
-            except Exception as e:
-                print(f"DEBUG: Middleware error: {e}")
-                # Si on ne peut pas récupérer le profil utilisateur, on laisse la vue gérer
-                pass
-        
-        return self.get_response(request)
+        config = query_accounting.configuration()
+        if iscoroutinefunction(self) or not config['ENABLED']:
+            return super().__call__(request)
+
+        compteur = query_accounting.CompteurRequetes()
+        with connection.execute_wrapper(compteur):
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            vue = f'{request.method} {match.view_name or match._func_path}'
+            query_accounting.agregat.enregistrer(vue, compteur, config['TOP_DUPLICATES'])
+            # Écriture en base par le thread d'écriture différée, hors de la réponse
+            query_accounting.ecrivain.signaler()
+
+        if config['HEADERS']:
+            response['X-Query-Count'] = str(compteur.nombre)
+            response['X-Query-Time-Ms'] = f'{compteur.temps_ms:.1f}'
+            response['X-Query-Duplicates'] = str(compteur.requetes_redondantes)
+            top = compteur.doublons(config['TOP_DUPLICATES'])
+            if top:
+                response['X-Query-Top'] = ' | '.join(f'{n}x {forme[:120]}' for forme, n in top)
+        return response
+
+
+class RoutePolicyMiddleware(MiddlewareHybride):
+    """
+    Politique par route (voir api/route_policy.py) : segments UUID vérifiés
+    sur la table compilée, après la résolution de l'URL par Django. Les rôles
+    sont vérifiés par la vue (permission RolesDeLaRoute).
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.table = route_policy.table()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        route = self.table.get(request.resolver_match.view_name)
+        if route is None:
+            return None
+        return route.verifier(request, view_kwargs)
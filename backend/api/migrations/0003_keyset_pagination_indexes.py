@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_notification_related_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['utilisateur', 'date_creation', 'id'], name='api_notific_utilisa_8bda85_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='piecejointe',
+            index=models.Index(fields=['date_creation', 'id'], name='api_piecejo_date_cr_c5d61d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='projet',
+            index=models.Index(fields=['date_creation', 'id'], name='api_projet_date_cr_b4ddd1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tache',
+            index=models.Index(fields=['date_creation', 'id'], name='api_tache_date_cr_f6e07d_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Remplissage initial de l'index à partir des tables existantes
+# (même définition que api.visibility._sql_lignes_attendues au moment de la migration).
+REMPLIR_VISIBILITE = """
+INSERT INTO api_tachevisibilite (tache_id, utilisateur_id, reason)
+SELECT t.id, t.creator_id, 'creator' FROM api_tache t
+UNION
+SELECT a.tache_id, a.utilisateur_id, 'assignee' FROM api_tache_assignees a
+UNION
+SELECT t.id, u.id, 'service' FROM api_tache t
+    JOIN api_utilisateur u ON u.service_id = t.service_id
+UNION
+SELECT t.id, pm.utilisateur_id, 'project' FROM api_tache t
+    JOIN (
+        SELECT p.id AS projet_id, p.chef_id AS utilisateur_id FROM api_projet p WHERE p.chef_id IS NOT NULL
+        UNION
+        SELECT m.projet_id, m.utilisateur_id FROM api_projet_membres m
+        UNION
+        SELECT p.id, u.id FROM api_projet p JOIN api_utilisateur u ON u.service_id = p.service_id
+        UNION
+        SELECT s.projet_id, u.id FROM api_projet_services s JOIN api_utilisateur u ON u.service_id = s.service_id
+    ) pm ON pm.projet_id = t.project_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TacheVisibilite',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reason', models.CharField(choices=[('creator', 'Créateur'), ('assignee', 'Assigné'), ('service', 'Membre du service'), ('project', 'Membre du projet')], max_length=10)),
+                ('tache', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visibilites', to='api.tache')),
+                ('utilisateur', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='visibilites_taches', to='api.utilisateur')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('utilisateur', 'tache', 'reason'), name='unique_tache_visibilite')],
+            },
+        ),
+        migrations.RunSQL(REMPLIR_VISIBILITE, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_tache_visibilite'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='piecejointe',
+            name='api_piecejo_related_7d55a4_idx',
+        ),
+        migrations.AddIndex(
+            model_name='piecejointe',
+            index=models.Index(fields=['related_to', 'related_id'], name='api_piecejo_related_cacd7d_idx'),
+        ),
+    ]
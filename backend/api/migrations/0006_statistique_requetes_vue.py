@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-17 01:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_piecejointe_related_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatistiqueRequetesVue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vue', models.CharField(max_length=200, unique=True)),
+                ('nombre_appels', models.BigIntegerField(default=0)),
+                ('total_requetes', models.BigIntegerField(default=0)),
+                ('total_temps_ms', models.FloatField(default=0)),
+                ('max_requetes', models.IntegerField(default=0)),
+                ('histogramme', models.JSONField(default=dict)),
+                ('doublons', models.JSONField(default=dict)),
+                ('date_maj', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
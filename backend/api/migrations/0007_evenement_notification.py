@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:01
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_statistique_requetes_vue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EvenementNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(max_length=50)),
+                ('titre', models.CharField(max_length=255)),
+                ('message', models.TextField()),
+                ('priorite', models.CharField(choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High')], default='medium', max_length=10)),
+                ('related_id', models.UUIDField(blank=True, null=True)),
+                ('destinataires', models.JSONField(default=list, help_text='Ids of the recipient Utilisateur rows')),
+                ('statut', models.CharField(choices=[('pending', 'Pending'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('tentatives', models.PositiveIntegerField(default=0)),
+                ('prochaine_tentative', models.DateTimeField(default=django.utils.timezone.now)),
+                ('derniere_erreur', models.TextField(blank=True, default='')),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_traitement', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('statut', 'pending')), fields=['prochaine_tentative', 'id'], name='outbox_pending_idx')],
+            },
+        ),
+    ]
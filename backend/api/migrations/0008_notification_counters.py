@@ -0,0 +1,36 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_evenement_notification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompteurNotifications',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(max_length=50)),
+                ('priorite', models.CharField(max_length=10)),
+                ('non_lues', models.IntegerField(default=0)),
+                ('utilisateur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='compteurs_notifications', to='api.utilisateur')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('utilisateur', 'type', 'priorite'), name='compteur_notifications_unique')],
+            },
+        ),
+        # Compteurs initiaux à partir des notifications existantes
+        migrations.RunSQL(
+            sql=(
+                'INSERT INTO api_compteurnotifications (utilisateur_id, type, priorite, non_lues) '
+                'SELECT utilisateur_id, type, priorite, COUNT(*) FROM api_notification '
+                'WHERE NOT est_lue GROUP BY utilisateur_id, type, priorite'
+            ),
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
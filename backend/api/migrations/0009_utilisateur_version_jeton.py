@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 02:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_notification_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='utilisateur',
+            name='version_jeton',
+            field=models.PositiveIntegerField(default=0, help_text='Access token version, incremented when role, service, groups or account status change'),
+        ),
+    ]
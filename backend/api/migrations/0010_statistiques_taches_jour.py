@@ -0,0 +1,56 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_utilisateur_version_jeton'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CurseurRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=50, unique=True)),
+                ('date_maj', models.DateTimeField(blank=True, null=True)),
+                ('date_execution', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EtatRollupTache',
+            fields=[
+                ('tache_id', models.UUIDField(primary_key=True, serialize=False)),
+                ('service_id', models.UUIDField(blank=True, null=True)),
+                ('status', models.CharField(max_length=20)),
+                ('priority', models.CharField(max_length=10)),
+                ('type', models.CharField(max_length=20)),
+                ('jour_creation', models.DateField()),
+                ('jour_terminee', models.DateField(blank=True, null=True)),
+                ('jour_retard', models.DateField(blank=True, null=True)),
+                ('points', models.IntegerField(default=0)),
+                ('temps_passe', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StatistiqueTachesJour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('service_id', models.UUIDField(blank=True, null=True)),
+                ('status', models.CharField(max_length=20)),
+                ('priority', models.CharField(max_length=10)),
+                ('type', models.CharField(max_length=20)),
+                ('crees', models.IntegerField(default=0)),
+                ('terminees', models.IntegerField(default=0)),
+                ('en_retard', models.IntegerField(default=0)),
+                ('points', models.BigIntegerField(default=0)),
+                ('temps_passe', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('jour', 'service_id', 'status', 'priority', 'type'), name='statistique_taches_jour_unique', nulls_distinct=False)],
+            },
+        ),
+    ]
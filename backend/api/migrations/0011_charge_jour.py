@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-17 03:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_statistiques_taches_jour'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContributionCharge',
+            fields=[
+                ('tache_id', models.UUIDField(primary_key=True, serialize=False)),
+                ('service_id', models.UUIDField(blank=True, null=True)),
+                ('utilisateurs', models.JSONField(default=list)),
+                ('debut', models.DateField()),
+                ('fin', models.DateField()),
+                ('points', models.IntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChargeJour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('service_id', models.UUIDField(blank=True, null=True)),
+                ('utilisateur_id', models.UUIDField(blank=True, null=True)),
+                ('jour', models.DateField()),
+                ('delta', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('service_id', 'utilisateur_id', 'jour'), name='charge_jour_unique', nulls_distinct=False)],
+            },
+        ),
+    ]
@@ -1,7 +1,7 @@
 import uuid
 import os
 import hashlib
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User, Group, Permission
 from django.core.exceptions import ValidationError
 from django.conf import settings
@@ -10,6 +10,8 @@ from django.core.files.storage import default_storage
 from django.db.models import Q, Index
 from django.contrib.postgres.indexes import GinIndex
 
+from . import tracing
+
 def upload_attachment_path(instance, filename):
     """
     Generates the storage path for attachments
@@ -30,6 +32,33 @@ class UUIDModel(models.Model):
     class Meta:
         abstract = True
 
+class SuiviChampsMixin:
+    """
+    Mémorise la valeur de certains champs au chargement et après chaque
+    sauvegarde, pour que les signaux détectent un changement sans requête.
+    """
+    champs_suivis = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.memoriser_etat()
+        return instance
+
+    def memoriser_etat(self):
+        self._etat_initial = {nom: self.__dict__.get(nom) for nom in self.champs_suivis}
+
+    def champs_modifies(self):
+        """Retourne les champs suivis modifiés depuis le chargement (tous si nouvel objet)"""
+        initial = getattr(self, '_etat_initial', None)
+        if initial is None:
+            return set(self.champs_suivis)
+        return {nom for nom in self.champs_suivis if self.__dict__.get(nom) != initial[nom]}
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.memoriser_etat()
+
 class Service(UUIDModel):
     """Service/Department of the organization"""
     name = models.CharField(max_length=100, unique=True)
@@ -50,6 +79,8 @@ class Service(UUIDModel):
     @property
     def nombre_membres(self):
         """Retourne le nombre de membres du service"""
+        if hasattr(self, 'nb_membres'):  # annotation posée par le queryset
+            return self.nb_membres
         return self.utilisateurs.count()  # type: ignore[attr-defined]
 
     class Meta:
@@ -57,8 +88,10 @@ class Service(UUIDModel):
             Index(fields=['chef']),
         ]
 
-class Utilisateur(UUIDModel):
+class Utilisateur(SuiviChampsMixin, UUIDModel):
     """User of the system with extended information"""
+    champs_suivis = ('service_id', 'role', 'est_actif', 'is_admin')
+
     class Role(models.TextChoices):
         ADMIN = 'ADMIN', 'Administrator'
         DIRECTOR = 'DIRECTOR', 'Director'
@@ -80,6 +113,10 @@ class Utilisateur(UUIDModel):
     photo_profil = models.ImageField(upload_to='profils/', blank=True, null=True)
     est_actif = models.BooleanField(default=True)
     derniere_connexion = models.DateTimeField(null=True, blank=True)
+    version_jeton = models.PositiveIntegerField(
+        default=0,
+        help_text="Access token version, incremented when role, service, groups or account status change",
+    )
 
     def save(self, *args, **kwargs):
         is_new = self.pk is None
@@ -87,18 +124,29 @@ class Utilisateur(UUIDModel):
         if self.role == self.Role.MANAGER and not self.service:
             from django.core.exceptions import ValidationError
             raise ValidationError("Un manager doit obligatoirement être associé à un service.")
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # version_jeton is only incremented in SQL (api/authentication.py):
+            # saving a stale in-memory copy must not roll it back
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name != 'version_jeton' and f.attname not in deferred
+            ]
         super().save(*args, **kwargs)
         
         # Synchronize groups with role
         if self.user:
-            # Remove user from all role groups
-            for role in self.Role.values:
-                group, created = Group.objects.get_or_create(name=role)
-                self.user.groups.remove(group)
+            # Only touch memberships that differ: every m2m write invalidates
+            # the user's access tokens (see api/authentication.py)
+            current = set(self.user.groups.filter(name__in=self.Role.values).values_list('name', flat=True))
+            stale = current - {self.role}
+            if stale:
+                self.user.groups.remove(*Group.objects.filter(name__in=stale))
             
             # Add user to the group corresponding to their role
-            group, created = Group.objects.get_or_create(name=self.role)
-            self.user.groups.add(group)
+            if self.role not in current:
+                group, created = Group.objects.get_or_create(name=self.role)
+                self.user.groups.add(group)
             
             # If it's an admin, set staff status
             self.user.is_staff = self.role == self.Role.ADMIN
@@ -108,9 +156,9 @@ class Utilisateur(UUIDModel):
             if self.role == self.Role.MANAGER and self.service:
                 self.service.chef = self
                 self.service.save()
-                print(f"DEBUG: Manager {self.user.username} assigned as chef of service {self.service.name}")
+                tracing.evenement(tracing.DEBUG, 'utilisateur.chef_service', utilisateur_id=self.pk, service_id=self.service_id)
             elif self.role == self.Role.MANAGER and not self.service:
-                print(f"DEBUG: Manager {self.user.username} has no service assigned")
+                tracing.evenement(tracing.DEBUG, 'utilisateur.manager_sans_service', utilisateur_id=self.pk)
     
     def has_perm(self, perm):
         """Checks if the user has a specific permission"""
@@ -192,8 +240,10 @@ class Utilisateur(UUIDModel):
             models.UniqueConstraint(fields=['service'], condition=Q(role='MANAGER'), name='unique_manager_per_service')
         ]
 
-class Projet(UUIDModel):
+class Projet(SuiviChampsMixin, UUIDModel):
     """Project of the organization with harmonized French/English"""
+    champs_suivis = ('chef_id', 'service_id')
+
     # Harmonized statuses 
     STATUT_CHOICES = [
         ('planning', 'Planning'),  # planning
@@ -259,11 +309,15 @@ class Projet(UUIDModel):
     @property
     def nombre_taches(self):
         """Returns the total number of tasks"""
+        if hasattr(self, 'nb_taches'):  # annotated by the queryset
+            return self.nb_taches
         return self.taches.count()  # type: ignore[attr-defined]
     
     @property
     def taches_terminees(self):
         """Returns the number of completed tasks"""
+        if hasattr(self, 'nb_taches_terminees'):  # annotated by the queryset
+            return self.nb_taches_terminees
         return self.taches.filter(status='completed').count()  # type: ignore[attr-defined]
     
     @property
@@ -325,12 +379,15 @@ class Projet(UUIDModel):
             Index(fields=['creator']),
             Index(fields=['chef']),
             Index(fields=['status']),
+            Index(fields=['date_creation', 'id']),
             # GinIndex(fields=['name']),  # SUPPRIMÉ (CharField)
             GinIndex(fields=['description'], opclasses=["gin_trgm_ops"], name="projet_descr_gin_trgm_idx"),  # OK si description est TextField, nécessite pg_trgm
         ]
 
-class Tache(UUIDModel):
+class Tache(SuiviChampsMixin, UUIDModel):
     """Task of the organization with support for attachments and multiple assignments"""
+    champs_suivis = ('creator_id', 'service_id', 'project_id')
+
     STATUT_CHOICES = [
         ('todo', 'To Do'),
         ('in_progress', 'In Progress'),
@@ -475,6 +532,37 @@ class Tache(UUIDModel):
         self.clean()
         super().save(*args, **kwargs)
 
+    class Meta:
+        indexes = [
+            # Pagination keyset (date_creation, id)
+            Index(fields=['date_creation', 'id']),
+        ]
+
+class TacheVisibilite(models.Model):
+    """
+    Index dénormalisé (tâche, utilisateur, raison) des tâches visibles par
+    chaque utilisateur. Maintenu incrémentalement par api.signals ; voir
+    api.visibility pour les règles et la reconstruction complète.
+    """
+    RAISON_CHOICES = [
+        ('creator', 'Créateur'),
+        ('assignee', 'Assigné'),
+        ('service', 'Membre du service'),
+        ('project', 'Membre du projet'),
+    ]
+    tache = models.ForeignKey(Tache, on_delete=models.CASCADE, related_name='visibilites')
+    # Indexé par la contrainte d'unicité (utilisateur, tache, reason)
+    utilisateur = models.ForeignKey(Utilisateur, on_delete=models.CASCADE, related_name='visibilites_taches', db_index=False)
+    reason = models.CharField(max_length=10, choices=RAISON_CHOICES)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['utilisateur', 'tache', 'reason'], name='unique_tache_visibilite')
+        ]
+
+    def __str__(self):
+        return f"{self.tache_id} -> {self.utilisateur_id} ({self.reason})"
+
 class Commentaire(UUIDModel):
     tache = models.ForeignKey('Tache', on_delete=models.CASCADE, related_name='commentaires')
     auteur = models.ForeignKey('Utilisateur', on_delete=models.CASCADE)
@@ -482,7 +570,44 @@ class Commentaire(UUIDModel):
     mentions = models.JSONField(null=True, blank=True)
     est_modifie = models.BooleanField(default=False)
 
-class Notification(UUIDModel):
+class NotificationQuerySet(models.QuerySet):
+    """
+    Écritures groupées qui maintiennent CompteurNotifications dans la même
+    transaction (voir api/notification_counters.py).
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from .notification_counters import ajuster, deltas_objets
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            ajuster(deltas_objets(objs))
+        return objs
+
+    def update(self, **kwargs):
+        from .notification_counters import CHAMPS_COMPTES, marquer, mettre_a_jour
+        champs = set(kwargs) & CHAMPS_COMPTES
+        if not champs:
+            return super().update(**kwargs)
+        if self.query.is_sliced:
+            raise TypeError("Cannot update a query once a slice has been taken.")
+        if set(kwargs) == {'est_lue'} and isinstance(kwargs['est_lue'], bool):
+            return marquer(self, kwargs['est_lue'])
+        return mettre_a_jour(self, kwargs)
+
+    def delete(self):
+        from .notification_counters import supprimer
+        if self.query.is_sliced:
+            raise TypeError("Cannot use 'limit' or 'offset' with delete().")
+        nombre = supprimer(self)
+        return nombre, {self.model._meta.label: nombre}
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+class Notification(SuiviChampsMixin, UUIDModel):
+    champs_suivis = ('utilisateur_id', 'type', 'priorite', 'est_lue')
+
     PRIORITE_CHOICES = [
         ('low', 'Low'),
         ('medium', 'Medium'),
@@ -496,6 +621,76 @@ class Notification(UUIDModel):
     priorite = models.CharField(max_length=10, choices=PRIORITE_CHOICES)
     related_id = models.UUIDField(null=True, blank=True, help_text="UUID de l'entité liée (tâche, projet, etc.)")
 
+    class Meta:
+        indexes = [
+            # Liste paginée des notifications d'un utilisateur
+            Index(fields=['utilisateur', 'date_creation', 'id']),
+        ]
+
+    objects = NotificationQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        # Verrou de la ligne (pre_save) et ajustement des compteurs (post_save) dans la même transaction
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        # Passe par NotificationQuerySet.delete() pour tenir les compteurs à jour
+        return type(self).objects.filter(pk=self.pk).delete()
+
+
+class CompteurNotifications(models.Model):
+    """
+    Unread notification counter per (user, type, priority), kept in sync
+    with Notification writes in the same transaction
+    (api/notification_counters.py). Read by GET /api/notifications/summary/.
+    """
+    utilisateur = models.ForeignKey('Utilisateur', on_delete=models.CASCADE, related_name='compteurs_notifications')
+    type = models.CharField(max_length=50)
+    priorite = models.CharField(max_length=10)
+    non_lues = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['utilisateur', 'type', 'priorite'], name='compteur_notifications_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.utilisateur_id} {self.type}/{self.priorite} : {self.non_lues}"
+
+class EvenementNotification(models.Model):
+    """
+    Notification outbox: one compact row per event, written in the same
+    transaction as the change, then fanned out into Notification rows
+    by the notification_worker command.
+    """
+    STATUT_CHOICES = [
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    type = models.CharField(max_length=50)
+    titre = models.CharField(max_length=255)
+    message = models.TextField()
+    priorite = models.CharField(max_length=10, choices=Notification.PRIORITE_CHOICES, default='medium')
+    related_id = models.UUIDField(null=True, blank=True)
+    destinataires = models.JSONField(default=list, help_text="Ids of the recipient Utilisateur rows")
+    statut = models.CharField(max_length=10, choices=STATUT_CHOICES, default='pending')
+    tentatives = models.PositiveIntegerField(default=0)
+    prochaine_tentative = models.DateTimeField(default=timezone.now)
+    derniere_erreur = models.TextField(blank=True, default='')
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_traitement = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Worker queue: pending events ready for delivery, oldest first
+            Index(fields=['prochaine_tentative', 'id'], condition=Q(statut='pending'), name='outbox_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.type} ({self.statut})"
+
 class PretEmploye(UUIDModel):
     STATUT_CHOICES = [
         ('pending', 'Pending'),
@@ -607,9 +802,11 @@ class PieceJointe(UUIDModel):
         verbose_name_plural = "Pièces jointes"
         ordering = ['-date_creation']
         indexes = [
-            Index(fields=['related_to']),
+            # Chargement groupé : related_to = %s AND related_id IN (...)
+            Index(fields=['related_to', 'related_id']),
             Index(fields=['related_id']),
             Index(fields=['telecharge_par']),
+            Index(fields=['date_creation', 'id']),
         ]
 
 class ModeUrgence(models.Model):
@@ -642,4 +839,113 @@ class ModeUrgence(models.Model):
         db_table = 'api_modeurgence'
         
     def __str__(self):
-        return f"{self.titre} ({self.severite})"
\ No newline at end of file
+        return f"{self.titre} ({self.severite})"
+
+class StatistiqueRequetesVue(models.Model):
+    """
+    Query statistics aggregated per view ("GET tache-list"),
+    flushed periodically by QueryAccountingMiddleware.
+    """
+    vue = models.CharField(max_length=200, unique=True)
+    nombre_appels = models.BigIntegerField(default=0)
+    total_requetes = models.BigIntegerField(default=0)
+    total_temps_ms = models.FloatField(default=0)
+    max_requetes = models.IntegerField(default=0)
+    # Histogram of the query count per call: {"upper bound": number of calls}
+    histogramme = models.JSONField(default=dict)
+    # Duplicated SQL shapes: {"shape": number of redundant queries}
+    doublons = models.JSONField(default=dict)
+    date_maj = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.vue
+
+class StatistiqueTachesJour(models.Model):
+    """
+    Daily task rollup per (day, service, status, priority, type), updated
+    incrementally by the rollup_task_stats command (api/rollups.py).
+    Read by GET /api/analytics/timeseries/ instead of the Tache table.
+    """
+    jour = models.DateField()
+    # Plain UUID (no FK): rows must outlive deleted services until the next rollup run
+    service_id = models.UUIDField(null=True, blank=True)
+    status = models.CharField(max_length=20)
+    priority = models.CharField(max_length=10)
+    type = models.CharField(max_length=20)
+    # Tasks created that day
+    crees = models.IntegerField(default=0)
+    # Tasks completed that day
+    terminees = models.IntegerField(default=0)
+    # Tasks whose deadline fell that day and that were not completed on time
+    en_retard = models.IntegerField(default=0)
+    # Workload points and tracked time (minutes) of the tasks created that day
+    points = models.BigIntegerField(default=0)
+    temps_passe = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also serves day-range reads (leading column)
+            models.UniqueConstraint(
+                fields=['jour', 'service_id', 'status', 'priority', 'type'],
+                name='statistique_taches_jour_unique', nulls_distinct=False,
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.jour} {self.service_id} {self.status}/{self.priority}/{self.type}"
+
+class EtatRollupTache(models.Model):
+    """
+    Last contribution of each task to StatistiqueTachesJour: the rollup run
+    subtracts it and adds the new one, so a task is never counted twice.
+    """
+    tache_id = models.UUIDField(primary_key=True)
+    service_id = models.UUIDField(null=True, blank=True)
+    status = models.CharField(max_length=20)
+    priority = models.CharField(max_length=10)
+    type = models.CharField(max_length=20)
+    jour_creation = models.DateField()
+    jour_terminee = models.DateField(null=True, blank=True)
+    jour_retard = models.DateField(null=True, blank=True)
+    points = models.IntegerField(default=0)
+    temps_passe = models.IntegerField(default=0)
+
+class CurseurRollup(models.Model):
+    """High-water mark of an incremental rollup on its source's date_maj"""
+    nom = models.CharField(max_length=50, unique=True)
+    date_maj = models.DateTimeField(null=True, blank=True)
+    date_execution = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.nom} : {self.date_maj}"
+
+class ChargeJour(models.Model):
+    """
+    Workload difference array (api/workload.py): change of the daily open
+    workload of a service or of a user (exactly one of the two) from `jour` on.
+    Values are milli-points per day; the load of a day is the running sum.
+    """
+    service_id = models.UUIDField(null=True, blank=True)
+    utilisateur_id = models.UUIDField(null=True, blank=True)
+    jour = models.DateField()
+    delta = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['service_id', 'utilisateur_id', 'jour'], name='charge_jour_unique', nulls_distinct=False,
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.service_id or self.utilisateur_id} {self.jour} : {self.delta:+d}"
+
+class ContributionCharge(models.Model):
+    """Last contribution of an open task to ChargeJour, subtracted before the new one is added"""
+    tache_id = models.UUIDField(primary_key=True)
+    service_id = models.UUIDField(null=True, blank=True)
+    # Assignee ids (the task points are split evenly between them)
+    utilisateurs = models.JSONField(default=list)
+    debut = models.DateField()
+    fin = models.DateField()
+    points = models.IntegerField()
@@ -0,0 +1,234 @@
+"""
+Compteurs de notifications non lues par (utilisateur, type, priorité).
+
+Tenus à jour dans la transaction de chaque écriture sur Notification :
+- save() unitaire (création, changement de est_lue) : signaux pre_save /
+  post_save ; l'état précédent est relu en base, ligne verrouillée, et non
+  pris dans l'instance, qui peut être périmée (lue avant une écriture
+  concurrente) ;
+- bulk_create, update(...) et delete() : NotificationQuerySet (api/models.py).
+Les ajustements sont des incréments INSERT ... ON CONFLICT DO UPDATE, sans
+lecture préalable ; marquer() et supprimer() modifient les notifications et
+les compteurs en une seule instruction (CTE UPDATE/DELETE ... RETURNING), ce
+qui reste exact en cas de requêtes concurrentes.
+
+Le résumé (GET /api/notifications/summary/) lit au plus
+types x priorités lignes, quel que soit le nombre de notifications.
+Reconstruction / contrôle : manage.py rebuild_notification_counters.
+"""
+from collections import Counter, defaultdict
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connection, transaction
+from django.db.models import Count, QuerySet
+from django.utils import timezone
+
+from .models import CompteurNotifications, Notification
+
+CHAMPS_COMPTES = {'utilisateur', 'utilisateur_id', 'type', 'priorite', 'est_lue'}
+
+TAILLE_LOT = 1000
+
+
+def _upsert(table):
+    return (
+        f'ON CONFLICT (utilisateur_id, type, priorite) '
+        f'DO UPDATE SET non_lues = {table}.non_lues + EXCLUDED.non_lues'
+    )
+
+
+def cle(notification):
+    return str(notification.utilisateur_id), notification.type, notification.priorite
+
+
+def deltas_objets(notifications, signe=1):
+    """Deltas des notifications non lues d'une liste d'instances"""
+    return Counter({
+        k: signe * n
+        for k, n in Counter(cle(notif) for notif in notifications if not notif.est_lue).items()
+    })
+
+
+def deltas_queryset(queryset, signe=1):
+    """Deltas des notifications non lues d'un queryset (agrégé en base)"""
+    lignes = (
+        queryset.filter(est_lue=False).order_by()
+        .values_list('utilisateur_id', 'type', 'priorite').annotate(n=Count('id'))
+    )
+    return Counter({(str(u), t, p): signe * n for u, t, p, n in lignes})
+
+
+def ajuster(deltas):
+    """Applique des deltas {(utilisateur_id, type, priorite): n} aux compteurs"""
+    lignes = sorted((k, n) for k, n in deltas.items() if n)
+    if not lignes:
+        return
+    table = CompteurNotifications._meta.db_table
+    with connection.cursor() as cursor:
+        # Ordre de clés constant : pas d'interblocage entre transactions concurrentes
+        for debut in range(0, len(lignes), TAILLE_LOT):
+            lot = lignes[debut:debut + TAILLE_LOT]
+            valeurs = ', '.join(['(%s, %s, %s, %s)'] * len(lot))
+            cursor.execute(
+                f'INSERT INTO {table} (utilisateur_id, type, priorite, non_lues) VALUES {valeurs} {_upsert(table)}',
+                [valeur for (u, t, p), n in lot for valeur in (u, t, p, n)],
+            )
+
+
+def _sous_requete_ids(queryset):
+    """SQL des ids du queryset, None s'il est vide par construction (.none(), id__in=[])"""
+    try:
+        return queryset.order_by().values('pk').query.sql_with_params()
+    except EmptyResultSet:
+        return None
+
+
+def marquer(queryset, est_lue):
+    """
+    Passe est_lue à la valeur donnée pour les notifications du queryset qui
+    ne l'ont pas déjà ; retourne le nombre de notifications modifiées.
+    """
+    table = Notification._meta.db_table
+    compteurs = CompteurNotifications._meta.db_table
+    sous_requete = _sous_requete_ids(queryset)
+    if sous_requete is None:
+        return 0
+    sql_ids, params = sous_requete
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'''
+            WITH modifiees AS (
+                UPDATE {table} SET est_lue = %s, date_maj = %s
+                WHERE id IN ({sql_ids}) AND est_lue = %s
+                RETURNING utilisateur_id, type, priorite
+            ), ajustes AS (
+                INSERT INTO {compteurs} (utilisateur_id, type, priorite, non_lues)
+                SELECT utilisateur_id, type, priorite, %s * COUNT(*) FROM modifiees
+                GROUP BY utilisateur_id, type, priorite
+                ORDER BY utilisateur_id, type, priorite
+                {_upsert(compteurs)}
+            )
+            SELECT COUNT(*) FROM modifiees
+            ''',
+            [est_lue, timezone.now(), *params, not est_lue, -1 if est_lue else 1],
+        )
+        return cursor.fetchone()[0]
+
+
+def supprimer(queryset):
+    """Supprime les notifications du queryset ; retourne le nombre supprimé"""
+    table = Notification._meta.db_table
+    compteurs = CompteurNotifications._meta.db_table
+    sous_requete = _sous_requete_ids(queryset)
+    if sous_requete is None:
+        return 0
+    sql_ids, params = sous_requete
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'''
+            WITH supprimees AS (
+                DELETE FROM {table} WHERE id IN ({sql_ids})
+                RETURNING utilisateur_id, type, priorite, est_lue
+            ), ajustes AS (
+                INSERT INTO {compteurs} (utilisateur_id, type, priorite, non_lues)
+                SELECT utilisateur_id, type, priorite, -COUNT(*) FROM supprimees
+                WHERE NOT est_lue
+                GROUP BY utilisateur_id, type, priorite
+                ORDER BY utilisateur_id, type, priorite
+                {_upsert(compteurs)}
+            )
+            SELECT COUNT(*) FROM supprimees
+            ''',
+            params,
+        )
+        return cursor.fetchone()[0]
+
+
+def mettre_a_jour(queryset, kwargs):
+    """update() touchant type / priorité / destinataire : recompte avant et après"""
+    with transaction.atomic():
+        ids = list(queryset.select_for_update().values_list('id', flat=True))
+        cibles = Notification.objects.filter(id__in=ids)
+        deltas = deltas_queryset(cibles, -1)
+        nombre = QuerySet.update(cibles, **kwargs)
+        deltas.update(deltas_queryset(cibles))
+        ajuster(deltas)
+    return nombre
+
+
+def verrouiller_instance(notification, update_fields=None):
+    """
+    Avant save() d'une instance existante (signal pre_save) : état en base,
+    ligne verrouillée jusqu'à la fin de la transaction de Notification.save().
+    """
+    notification._etat_base = None
+    if notification._state.adding or (update_fields is not None and not set(update_fields) & CHAMPS_COMPTES):
+        return
+    notification._etat_base = (
+        Notification.objects.select_for_update().filter(pk=notification.pk)
+        .values('utilisateur_id', 'type', 'priorite', 'est_lue').first()
+    )
+
+
+def ajuster_instance(notification, created):
+    """Ajustement après save() d'une instance (signal post_save), depuis l'état verrouillé"""
+    if created:
+        initial = {}
+    else:
+        initial = getattr(notification, '_etat_base', None) or getattr(notification, '_etat_initial', None) or {}
+    deltas = Counter()
+    if initial and not initial['est_lue']:
+        deltas[(str(initial['utilisateur_id']), initial['type'], initial['priorite'])] -= 1
+    if not notification.est_lue:
+        deltas[cle(notification)] += 1
+    ajuster(deltas)
+
+
+def resume(utilisateur):
+    """Non lues de l'utilisateur : total, par type et par priorité"""
+    par_type, par_priorite = defaultdict(int), defaultdict(int)
+    for type_, priorite, n in CompteurNotifications.objects.filter(
+        utilisateur=utilisateur, non_lues__gt=0
+    ).values_list('type', 'priorite', 'non_lues'):
+        par_type[type_] += n
+        par_priorite[priorite] += n
+    return {
+        'unread': sum(par_type.values()),
+        'by_type': dict(par_type),
+        'by_priority': dict(par_priorite),
+    }
+
+
+def _sql_attendus():
+    return (
+        f'SELECT utilisateur_id, type, priorite, COUNT(*) FROM {Notification._meta.db_table} '
+        f'WHERE NOT est_lue GROUP BY utilisateur_id, type, priorite'
+    )
+
+
+def reconstruire():
+    """Recalcule tous les compteurs en une instruction INSERT ... SELECT"""
+    table = CompteurNotifications._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {table} IN EXCLUSIVE MODE')
+        cursor.execute(f'DELETE FROM {table}')
+        cursor.execute(f'INSERT INTO {table} (utilisateur_id, type, priorite, non_lues) {_sql_attendus()}')
+        return cursor.rowcount
+
+
+def verifier(limite=20):
+    """Compteurs en écart avec Notification : (nombre, exemples (utilisateur, type, priorité, attendu, actuel))"""
+    table = CompteurNotifications._meta.db_table
+    requete = f'''
+        SELECT COALESCE(a.utilisateur_id, c.utilisateur_id), COALESCE(a.type, c.type),
+               COALESCE(a.priorite, c.priorite), COALESCE(a.n, 0), COALESCE(c.non_lues, 0)
+        FROM ({_sql_attendus().replace('COUNT(*)', 'COUNT(*) AS n')}) a
+        FULL OUTER JOIN {table} c
+          ON c.utilisateur_id = a.utilisateur_id AND c.type = a.type AND c.priorite = a.priorite
+        WHERE COALESCE(a.n, 0) <> COALESCE(c.non_lues, 0)
+    '''
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT COUNT(*) FROM ({requete}) d')
+        total = cursor.fetchone()[0]
+        cursor.execute(f'{requete} LIMIT %s', [limite])
+        return total, cursor.fetchall()
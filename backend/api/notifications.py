@@ -0,0 +1,105 @@
+"""
+Production des notifications.
+
+Les vues accumulent des événements dans un LotNotifications puis appellent
+envoyer(). Selon settings.NOTIFICATION_OUTBOX['MODE'] :
+- 'outbox' : un EvenementNotification par événement, inséré en une requête
+  dans la transaction courante ; le worker (manage.py notification_worker)
+  se charge de la diffusion en lignes Notification. Le coût de la requête
+  HTTP ne dépend plus du nombre de destinataires ;
+- 'inline' : diffusion immédiate en lignes Notification (développement, tests).
+Les destinataires connectés au flux SSE sont prévenus après commit (api/broker.py).
+"""
+from django.conf import settings
+from django.db.models import QuerySet
+
+from .broker import publier_notifications
+from .models import EvenementNotification, Notification
+
+TAILLE_LOT = 500
+
+DEFAULTS = {
+    'MODE': 'outbox',
+    'BATCH_SIZE': 100,
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_BASE': 2,
+    'BACKOFF_MAX': 300,
+    'POLL_INTERVAL': 1.0,
+}
+
+
+def configuration():
+    return {**DEFAULTS, **getattr(settings, 'NOTIFICATION_OUTBOX', {})}
+
+
+def construire_notifications(evenements):
+    """Lignes Notification (non enregistrées) correspondant aux événements"""
+    return [
+        Notification(
+            utilisateur_id=destinataire,
+            type=evenement.type,
+            titre=evenement.titre,
+            message=evenement.message,
+            priorite=evenement.priorite,
+            related_id=evenement.related_id,
+        )
+        for evenement in evenements
+        for destinataire in evenement.destinataires
+    ]
+
+
+class LotNotifications:
+    """Accumule des événements de notification et les enregistre en une fois"""
+
+    def __init__(self):
+        self.evenements = []
+
+    def ajouter(self, destinataires, type, titre, message, priorite='medium', related_id=None):
+        """Ajoute un événement pour les destinataires (instances, ids ou queryset d'Utilisateur)"""
+        if isinstance(destinataires, QuerySet):
+            ids = list(destinataires.values_list('id', flat=True))
+        else:
+            ids = [getattr(d, 'pk', d) for d in destinataires]
+        # Dédoublonnage en conservant l'ordre
+        ids = [str(i) for i in dict.fromkeys(ids) if i is not None]
+        if ids:
+            self.evenements.append(EvenementNotification(
+                type=type, titre=titre, message=message, priorite=priorite,
+                related_id=related_id, destinataires=ids,
+            ))
+
+    def envoyer(self):
+        """Enregistre les événements accumulés (outbox ou diffusion immédiate) et vide le lot"""
+        evenements, self.evenements = self.evenements, []
+        if not evenements:
+            return evenements
+        if configuration()['MODE'] == 'inline':
+            notifications = construire_notifications(evenements)
+            Notification.objects.bulk_create(notifications, batch_size=TAILLE_LOT)
+            publier_notifications(n.utilisateur_id for n in notifications)
+        else:
+            EvenementNotification.objects.bulk_create(evenements, batch_size=TAILLE_LOT)
+        return evenements
+
+    def __len__(self):
+        return len(self.evenements)
+
+
+def notifier_assignation(lot, tache, destinataires):
+    lot.ajouter(
+        destinataires,
+        type='task_assigned',
+        titre='Nouvelle tâche assignée',
+        message=f'La tâche "{tache.title}" vous a été assignée.',
+        related_id=tache.id,
+    )
+
+
+def notifier_changement_statut(lot, tache, destinataires):
+    lot.ajouter(
+        destinataires,
+        type='status_update',
+        titre='Statut de tâche modifié',
+        message=f'Le statut de la tâche "{tache.title}" est passé à {tache.status}.',
+        related_id=tache.id,
+    )
@@ -0,0 +1,128 @@
+"""
+Diffusion des événements de l'outbox de notifications (EvenementNotification).
+
+Chaque worker réserve un lot d'événements prêts avec
+SELECT ... FOR UPDATE SKIP LOCKED : plusieurs workers peuvent tourner en
+parallèle sans se marcher dessus. La création des lignes Notification et le
+passage de l'événement à 'done' sont validés dans la même transaction.
+
+En cas d'erreur sur le lot, chaque événement est retenté isolément (point de
+sauvegarde) : un événement défaillant est replanifié avec un délai
+exponentiel, puis marqué 'failed' après MAX_ATTEMPTS tentatives.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Avg, Count, F, Max, Min, Q
+from django.utils import timezone
+
+from .broker import publier_notifications
+from .models import EvenementNotification, Notification, Utilisateur
+from .notifications import TAILLE_LOT, configuration, construire_notifications
+
+
+def _diffuser(evenements):
+    """Crée les notifications des événements (destinataires encore existants)"""
+    ids = {d for evenement in evenements for d in evenement.destinataires}
+    existants = {str(i) for i in Utilisateur.objects.filter(id__in=ids).values_list('id', flat=True)}
+    for evenement in evenements:
+        evenement.destinataires = [d for d in evenement.destinataires if d in existants]
+    notifications = construire_notifications(evenements)
+    Notification.objects.bulk_create(notifications, batch_size=TAILLE_LOT)
+    publier_notifications(n.utilisateur_id for n in notifications)
+    return len(notifications)
+
+
+def delai_nouvelle_tentative(tentatives, config):
+    return min(config['BACKOFF_BASE'] ** tentatives, config['BACKOFF_MAX'])
+
+
+def traiter_lot(taille=None):
+    """
+    Réserve et diffuse un lot d'événements.
+    Retourne (événements diffusés, notifications créées, événements en échec).
+    """
+    config = configuration()
+    taille = taille or config['BATCH_SIZE']
+    maintenant = timezone.now()
+    diffuses = creees = echecs = 0
+    with transaction.atomic():
+        evenements = list(
+            EvenementNotification.objects
+            .filter(statut='pending', prochaine_tentative__lte=maintenant)
+            .order_by('prochaine_tentative', 'id')
+            .select_for_update(skip_locked=True)[:taille]
+        )
+        if not evenements:
+            return 0, 0, 0
+        try:
+            with transaction.atomic():
+                creees = _diffuser(evenements)
+            reussis, en_erreur = evenements, []
+        except Exception:
+            # Isoler le ou les événements fautifs
+            reussis, en_erreur = [], []
+            for evenement in evenements:
+                try:
+                    with transaction.atomic():
+                        creees += _diffuser([evenement])
+                    reussis.append(evenement)
+                except Exception as e:
+                    en_erreur.append((evenement, e))
+
+        if reussis:
+            EvenementNotification.objects.filter(id__in=[e.id for e in reussis]).update(
+                statut='done', date_traitement=timezone.now(), tentatives=F('tentatives') + 1
+            )
+            diffuses = len(reussis)
+        for evenement, erreur in en_erreur:
+            evenement.tentatives += 1
+            evenement.derniere_erreur = f'{type(erreur).__name__}: {erreur}'[:2000]
+            if evenement.tentatives >= config['MAX_ATTEMPTS']:
+                evenement.statut = 'failed'
+            else:
+                evenement.prochaine_tentative = timezone.now() + timedelta(
+                    seconds=delai_nouvelle_tentative(evenement.tentatives, config)
+                )
+            evenement.save(update_fields=['tentatives', 'derniere_erreur', 'statut', 'prochaine_tentative'])
+            echecs += 1
+    return diffuses, creees, echecs
+
+
+def vider(taille=None):
+    """Diffuse tous les événements prêts (tests, commandes ponctuelles)"""
+    totaux = (0, 0, 0)
+    while True:
+        resultat = traiter_lot(taille)
+        if not any(resultat):
+            return totaux
+        totaux = tuple(a + b for a, b in zip(totaux, resultat))
+
+
+def statistiques(fenetre=timedelta(hours=1)):
+    """Métriques de retard de l'outbox"""
+    maintenant = timezone.now()
+    en_attente = EvenementNotification.objects.filter(statut='pending').aggregate(
+        nombre=Count('id'),
+        plus_ancien=Min('date_creation'),
+        prets=Count('id', filter=Q(prochaine_tentative__lte=maintenant)),
+        en_reessai=Count('id', filter=Q(tentatives__gt=0)),
+    )
+    recents = EvenementNotification.objects.filter(
+        statut='done', date_traitement__gte=maintenant - fenetre
+    ).aggregate(
+        nombre=Count('id'),
+        retard_moyen=Avg(F('date_traitement') - F('date_creation')),
+        retard_max=Max(F('date_traitement') - F('date_creation')),
+    )
+    plus_ancien = en_attente['plus_ancien']
+    return {
+        'pending': en_attente['nombre'],
+        'ready': en_attente['prets'],
+        'retrying': en_attente['en_reessai'],
+        'failed': EvenementNotification.objects.filter(statut='failed').count(),
+        'oldest_pending_age_s': (maintenant - plus_ancien).total_seconds() if plus_ancien else 0.0,
+        'delivered_last_window': recents['nombre'],
+        'avg_lag_s': recents['retard_moyen'].total_seconds() if recents['retard_moyen'] else 0.0,
+        'max_lag_s': recents['retard_max'].total_seconds() if recents['retard_max'] else 0.0,
+    }
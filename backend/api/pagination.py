@@ -0,0 +1,213 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def encoder_curseur(valeurs, inverse=False):
+    """
+    Encode une position de keyset en curseur opaque (base64 url-safe).
+    """
+    payload = {'p': [None if v is None else str(v) for v in valeurs]}
+    if inverse:
+        payload['r'] = 1
+    brut = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(brut).decode('ascii').rstrip('=')
+
+
+def decoder_curseur(curseur, model, ordering):
+    """
+    Décode un curseur opaque et convertit chaque valeur dans le type du champ.
+    Retourne (valeurs, inverse). Lève ValueError si le curseur est invalide.
+    """
+    try:
+        padding = '=' * (-len(curseur) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(curseur + padding).decode('utf-8'))
+        brutes = payload['p']
+        inverse = bool(payload.get('r'))
+    except (TypeError, KeyError, ValueError, binascii.Error, UnicodeDecodeError):
+        raise ValueError('curseur illisible')
+    if not isinstance(brutes, list) or len(brutes) != len(ordering):
+        raise ValueError('curseur incompatible avec le tri')
+    valeurs = []
+    for nom, brute in zip(ordering, brutes):
+        field = model._meta.get_field(nom.lstrip('-'))
+        try:
+            valeurs.append(field.to_python(brute))
+        except DjangoValidationError:
+            raise ValueError('valeur de curseur invalide')
+    return valeurs, inverse
+
+
+def inverser_ordering(ordering):
+    return tuple(nom[1:] if nom.startswith('-') else f'-{nom}' for nom in ordering)
+
+
+def filtre_apres(ordering, valeurs):
+    """
+    Construit le prédicat lexicographique « strictement après la position »
+    pour un tri multi-colonnes, ex. (-date_creation, -id) :
+        date_creation < v0 OR (date_creation = v0 AND id < v1)
+    """
+    condition = Q()
+    egalites = {}
+    for nom, valeur in zip(ordering, valeurs):
+        champ = nom.lstrip('-')
+        lookup = 'lt' if nom.startswith('-') else 'gt'
+        condition |= Q(**egalites, **{f'{champ}__{lookup}': valeur})
+        egalites[champ] = valeur
+    return condition
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pagination par keyset (curseur) sur (date_creation, id).
+
+    Aucune requête OFFSET ni COUNT(*) : chaque page est un simple
+    `WHERE (date_creation, id) < position ORDER BY ... LIMIT n+1`.
+    Les ViewSets peuvent surcharger le tri via l'attribut `keyset_ordering`
+    (les champs doivent former une clé unique, l'id servant de départage).
+    Un tri demandé par ?ordering= (OrderingFilter) est repris du queryset
+    filtré, complété par l'id ; il doit porter sur des colonnes non nulles
+    du modèle, hors relations (sinon 400).
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE or 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-date_creation', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = (
+            self.tri_demande(queryset, request)
+            or tuple(getattr(view, 'keyset_ordering', None) or self.ordering)
+        )
+
+        position, inverse = self.decode_cursor(request, queryset.model)
+        ordering = inverser_ordering(self.ordering) if inverse else self.ordering
+
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(filtre_apres(ordering, position))
+
+        # Une ligne de plus pour savoir s'il existe une page suivante, sans COUNT(*)
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if inverse:
+            results.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        self.position = position
+        self.page = results
+        return results
+
+    def tri_demande(self, queryset, request):
+        """Tri ?ordering= appliqué au queryset par OrderingFilter, id en départage (ou None)"""
+        if not request.query_params.get(api_settings.ORDERING_PARAM):
+            return None
+        ordering = []
+        for nom in queryset.query.order_by:
+            champ = nom.lstrip('-') if isinstance(nom, str) else None
+            try:
+                field = queryset.model._meta.get_field('id' if champ == 'pk' else champ) if champ else None
+            except FieldDoesNotExist:
+                field = None
+            if field is None or field.null or not field.concrete or field.is_relation:
+                raise ValidationError({api_settings.ORDERING_PARAM: 'Tri incompatible avec la pagination par curseur.'})
+            ordering.append(nom[:-len(champ)] + field.name)
+        if not ordering:
+            return None
+        if not any(nom.lstrip('-') == 'id' for nom in ordering):
+            ordering.append('-id' if ordering[-1].startswith('-') else 'id')
+        return tuple(ordering)
+
+    def get_page_size(self, request):
+        try:
+            taille = int(request.query_params[self.page_size_query_param])
+            if taille > 0:
+                return min(taille, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return min(self.page_size, self.max_page_size)
+
+    def decode_cursor(self, request, model):
+        curseur = request.query_params.get(self.cursor_query_param)
+        if not curseur:
+            return None, False
+        try:
+            return decoder_curseur(curseur, model, self.ordering)
+        except ValueError:
+            raise NotFound('Curseur invalide.')
+
+    def position_de(self, instance):
+        return [getattr(instance, nom.lstrip('-')) for nom in self.ordering]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.page:
+            position = self.position_de(self.page[-1])
+        else:
+            position = self.position
+        return replace_query_param(self.base_url, self.cursor_query_param, encoder_curseur(position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.page:
+            position = self.position_de(self.page[0])
+        else:
+            position = self.position
+        return replace_query_param(self.base_url, self.cursor_query_param, encoder_curseur(position, inverse=True))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Curseur opaque de pagination.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': f'Nombre de résultats par page (max {self.max_page_size}).',
+                'schema': {'type': 'integer'},
+            },
+        ]
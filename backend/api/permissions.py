@@ -1,16 +1,15 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 
+from . import route_policy
+from .identity import identite
+
 class IsAdminUser(BasePermission):
     """
     Permet l'accès uniquement aux utilisateurs administrateurs.
     Vérifie à la fois le rôle dans le modèle Utilisateur et l'appartenance au groupe ADMIN.
     """
     def has_permission(self, request, view):
-        user = getattr(request, 'user', None)
-        utilisateur = getattr(user, 'utilisateur', None)
-        is_admin_role = utilisateur and getattr(utilisateur, 'role', None) == 'ADMIN'
-        is_in_admin_group = user and user.is_authenticated and user.groups.filter(name='ADMIN').exists()
-        return is_admin_role or is_in_admin_group
+        return identite(request).a_role('ADMIN')
 
 class IsChefServiceUser(BasePermission):
     """
@@ -18,11 +17,7 @@ class IsChefServiceUser(BasePermission):
     Vérifie à la fois le rôle dans le modèle Utilisateur et l'appartenance au groupe MANAGER.
     """
     def has_permission(self, request, view):
-        user = getattr(request, 'user', None)
-        utilisateur = getattr(user, 'utilisateur', None)
-        is_chef_role = utilisateur and getattr(utilisateur, 'role', None) == 'MANAGER'
-        is_in_chef_group = user and user.is_authenticated and user.groups.filter(name='MANAGER').exists()
-        return is_chef_role or is_in_chef_group
+        return identite(request).a_role('MANAGER')
 
 class IsEmployeeUser(BasePermission):
     """
@@ -30,11 +25,7 @@ class IsEmployeeUser(BasePermission):
     Vérifie à la fois le rôle dans le modèle Utilisateur et l'appartenance au groupe EMPLOYEE.
     """
     def has_permission(self, request, view):
-        user = getattr(request, 'user', None)
-        utilisateur = getattr(user, 'utilisateur', None)
-        is_employe_role = utilisateur and getattr(utilisateur, 'role', None) == 'EMPLOYEE'
-        is_in_employe_group = user and user.is_authenticated and user.groups.filter(name='EMPLOYEE').exists()
-        return is_employe_role or is_in_employe_group
+        return identite(request).a_role('EMPLOYEE')
 
 class IsAdminOrReadOnly(BasePermission):
     """
@@ -44,12 +35,7 @@ class IsAdminOrReadOnly(BasePermission):
     def has_permission(self, request, view):
         if request.method in SAFE_METHODS:
             return True
-            
-        user = getattr(request, 'user', None)
-        utilisateur = getattr(user, 'utilisateur', None)
-        is_admin_role = utilisateur and getattr(utilisateur, 'role', None) == 'ADMIN'
-        is_in_admin_group = user and user.is_authenticated and user.groups.filter(name='ADMIN').exists()
-        return is_admin_role or is_in_admin_group
+        return identite(request).a_role('ADMIN')
 
 class IsChefServiceOrReadOnly(BasePermission):
     """
@@ -59,15 +45,7 @@ class IsChefServiceOrReadOnly(BasePermission):
     def has_permission(self, request, view):
         if request.method in SAFE_METHODS:
             return True
-            
-        user = getattr(request, 'user', None)
-        utilisateur = getattr(user, 'utilisateur', None)
-        is_admin_role = utilisateur and getattr(utilisateur, 'role', None) == 'ADMIN'
-        is_in_admin_group = user and user.is_authenticated and user.groups.filter(name='ADMIN').exists()
-        is_chef_role = user and user.is_authenticated and utilisateur and getattr(utilisateur, 'role', None) == 'MANAGER'
-        is_in_chef_group = user and user.is_authenticated and user.groups.filter(name='MANAGER').exists()
-        
-        return (is_admin_role or is_in_admin_group) or (is_chef_role or is_in_chef_group)
+        return identite(request).a_role('ADMIN', 'MANAGER')
 
 class HasSpecificPermission(BasePermission):
     """
@@ -80,13 +58,21 @@ class HasSpecificPermission(BasePermission):
         user = getattr(request, 'user', None)
         return user and user.is_authenticated and user.has_perm(self.required_permission)
 
-# Exemple de correction robuste pour une permission personnalisée
 class IsAdminOrManager(BasePermission):
     def has_permission(self, request, view):
-        user = getattr(request, 'user', None)
-        utilisateur = getattr(user, 'utilisateur', None)
-        is_admin_role = utilisateur and getattr(utilisateur, 'role', None) == 'ADMIN'
-        is_in_admin_group = user and user.is_authenticated and user.groups.filter(name='ADMIN').exists()  # type: ignore[attr-defined]
-        is_manager_role = utilisateur and getattr(utilisateur, 'role', None) == 'MANAGER'
-        is_in_manager_group = user and user.is_authenticated and user.groups.filter(name='MANAGER').exists()  # type: ignore[attr-defined]
-        return is_admin_role or is_in_admin_group or is_manager_role or is_in_manager_group
+        return identite(request).a_role('ADMIN', 'MANAGER')
+
+class RolesDeLaRoute(BasePermission):
+    """
+    Rôles déclarés pour la route dans api/route_policy.py (ROLES), vérifiés
+    après l'authentification de la vue. Non authentifié : DRF répond 401.
+    """
+    message = {'error': 'Permission refusée', 'message': "Votre rôle ne permet pas cette action."}
+
+    def has_permission(self, request, view):
+        correspondance = getattr(request, 'resolver_match', None)
+        route = route_policy.table().get(correspondance.view_name) if correspondance else None
+        roles = route.roles_autorises(request.method) if route is not None and route.roles else None
+        if roles is None:
+            return True
+        return identite(request).role in roles
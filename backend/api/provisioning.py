@@ -0,0 +1,198 @@
+"""
+Import en masse de comptes utilisateurs (CSV ou JSON lines).
+
+Utilisé par manage.py import_users et par POST /api/users/import/.
+Les lignes sont lues au fil de l'eau et traitées par lots :
+- groupes de rôle et services résolus une seule fois pour tout l'import ;
+- validation d'un lot en quelques requêtes (noms d'utilisateur existants) ;
+- mots de passe hachés dans un pool de processus (PBKDF2 est coûteux en CPU) ;
+- User, Utilisateur et appartenances aux groupes créés par bulk_create dans
+  une transaction par lot, puis index de visibilité des tâches mis à jour.
+Utilisateur.save() n'est pas appelé : ses effets (groupe du rôle, is_staff
+des admins, chef du service pour un manager) sont reproduits ici.
+Les lignes invalides sont ignorées et signalées avec leur numéro.
+"""
+import csv
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from . import visibility
+from .models import Service, Utilisateur
+
+TAILLE_LOT = 500
+# Processus de hachage pour un import via l'API (le serveur web sert d'autres requêtes)
+PROCESSUS_REQUETE = min(4, os.cpu_count() or 1)
+FORMATS = ('csv', 'jsonl')
+CHAMPS = ('username', 'email', 'password', 'first_name', 'last_name', 'role', 'service', 'phone')
+
+
+def detecter_format(nom):
+    return 'jsonl' if nom and nom.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def lire_lignes(flux, format='csv'):
+    """Produit (numéro de ligne, dict) ; dict=None si la ligne est illisible"""
+    if isinstance(flux, (bytes, bytearray)):
+        flux = io.StringIO(flux.decode('utf-8-sig'), newline='')
+    elif not isinstance(flux, io.TextIOBase):
+        flux = io.TextIOWrapper(flux, encoding='utf-8-sig', newline='')
+    if format == 'csv':
+        lecteur = csv.DictReader(flux)
+        for ligne in lecteur:
+            yield lecteur.line_num, {k.strip(): (v or '').strip() for k, v in ligne.items() if k}
+        return
+    for numero, texte in enumerate(flux, 1):
+        if not texte.strip():
+            continue
+        try:
+            donnees = json.loads(texte)
+        except ValueError:
+            donnees = None
+        yield numero, donnees if isinstance(donnees, dict) else None
+
+
+def hacher(mots_de_passe, processus):
+    """Hachages dans l'ordre ; mot de passe vide : compte sans mot de passe utilisable"""
+    mots_de_passe = [m or None for m in mots_de_passe]
+    if processus <= 1 or len(mots_de_passe) < 2:
+        return [make_password(m) for m in mots_de_passe]
+    with ProcessPoolExecutor(max_workers=processus) as pool:
+        return list(pool.map(make_password, mots_de_passe, chunksize=max(1, len(mots_de_passe) // (4 * processus))))
+
+
+class Import:
+    """Un import : références résolues une fois, puis lots successifs"""
+
+    def __init__(self, processus=None, simulation=False):
+        self.processus = (os.cpu_count() or 1) if processus is None else processus
+        self.simulation = simulation
+        self.crees = 0
+        self.erreurs = []
+        self.services = {}
+        for service_id, nom in Service.objects.values_list('id', 'name'):
+            self.services[str(service_id)] = service_id
+            self.services[nom.strip().lower()] = service_id
+        self.services_avec_manager = set(
+            Utilisateur.objects.filter(role=Utilisateur.Role.MANAGER, service__isnull=False)
+            .values_list('service_id', flat=True)
+        )
+        self.groupes = (
+            {role: Group(name=role) for role in Utilisateur.Role.values}
+            if simulation
+            else {role: Group.objects.get_or_create(name=role)[0] for role in Utilisateur.Role.values}
+        )
+        self.noms_vus = set()
+
+    def erreur(self, numero, ligne, message):
+        self.erreurs.append({'line': numero, 'username': (ligne or {}).get('username') or None, 'errors': message})
+
+    def valider(self, numero, ligne):
+        """Ligne normalisée, ou None (erreur enregistrée)"""
+        if ligne is None:
+            self.erreur(numero, None, {'non_field_errors': 'Ligne illisible.'})
+            return None
+        donnees = {champ: str(ligne.get(champ) or '').strip() for champ in CHAMPS}
+        donnees['password'] = str(ligne.get('password') or '')
+        donnees['role'] = (donnees['role'] or Utilisateur.Role.EMPLOYEE).upper()
+        erreurs = {}
+        if not donnees['username']:
+            erreurs['username'] = 'Champ obligatoire.'
+        elif donnees['username'] in self.noms_vus:
+            erreurs['username'] = "Nom d'utilisateur en double dans le fichier."
+        if donnees['email']:
+            try:
+                validate_email(donnees['email'])
+            except ValidationError:
+                erreurs['email'] = 'Adresse email invalide.'
+        if donnees['role'] not in Utilisateur.Role.values:
+            erreurs['role'] = f"Rôle inconnu : {donnees['role']}."
+        service_id = None
+        if donnees['service']:
+            service_id = self.services.get(donnees['service'].lower())
+            if service_id is None:
+                erreurs['service'] = 'Service inexistant.'
+        if donnees['role'] == Utilisateur.Role.MANAGER:
+            if service_id is None and 'service' not in erreurs:
+                erreurs['service'] = 'Le champ service est obligatoire pour un manager.'
+            elif service_id in self.services_avec_manager:
+                erreurs['service'] = 'Ce service a déjà un manager.'
+        if donnees['role'] == Utilisateur.Role.ADMIN:
+            # Les admins ne peuvent pas avoir de service assigné
+            service_id = None
+        if erreurs:
+            self.erreur(numero, donnees, erreurs)
+            return None
+        self.noms_vus.add(donnees['username'])
+        if donnees['role'] == Utilisateur.Role.MANAGER:
+            self.services_avec_manager.add(service_id)
+        donnees['service_id'] = service_id
+        donnees['line'] = numero
+        return donnees
+
+    def traiter_lot(self, lot):
+        existants = set(
+            User.objects.filter(username__in=[d['username'] for d in lot]).values_list('username', flat=True)
+        )
+        valides = []
+        for donnees in lot:
+            if donnees['username'] in existants:
+                self.erreur(donnees['line'], donnees, {'username': "Ce nom d'utilisateur existe déjà."})
+            else:
+                valides.append(donnees)
+        if not valides or self.simulation:
+            self.crees += len(valides)
+            return len(valides)
+        hachages = hacher([d['password'] for d in valides], self.processus)
+        try:
+            with transaction.atomic():
+                users = User.objects.bulk_create([
+                    User(
+                        username=d['username'], email=d['email'], password=hachage,
+                        first_name=d['first_name'], last_name=d['last_name'],
+                        is_staff=d['role'] == Utilisateur.Role.ADMIN,
+                    )
+                    for d, hachage in zip(valides, hachages)
+                ])
+                profils = Utilisateur.objects.bulk_create([
+                    Utilisateur(user=user, role=d['role'], service_id=d['service_id'], telephone=d['phone'] or None)
+                    for d, user in zip(valides, users)
+                ])
+                User.groups.through.objects.bulk_create([
+                    User.groups.through(user_id=user.pk, group_id=self.groupes[d['role']].pk)
+                    for d, user in zip(valides, users)
+                ])
+                for profil in profils:
+                    if profil.role == Utilisateur.Role.MANAGER:
+                        Service.objects.filter(pk=profil.service_id).update(chef=profil)
+                visibility.synchroniser_utilisateurs([p.pk for p in profils if p.service_id])
+        except IntegrityError:
+            # Conflit concurrent (nom créé entre-temps) : le lot entier est signalé
+            for donnees in valides:
+                self.erreur(donnees['line'], donnees, {'non_field_errors': "Conflit à l'insertion, lot annulé."})
+            return 0
+        self.crees += len(profils)
+        return len(profils)
+
+    def executer(self, lignes, taille_lot=TAILLE_LOT):
+        """Traite les lignes (numéro, dict) par lots ; produit le nombre créé par lot"""
+        lot = []
+        for numero, ligne in lignes:
+            donnees = self.valider(numero, ligne)
+            if donnees is not None:
+                lot.append(donnees)
+            if len(lot) >= taille_lot:
+                yield self.traiter_lot(lot)
+                lot = []
+        if lot:
+            yield self.traiter_lot(lot)
+
+    def resultat(self):
+        return {'created': self.crees, 'errors': self.erreurs, 'dry_run': self.simulation}
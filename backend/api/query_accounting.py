@@ -0,0 +1,187 @@
+"""
+Comptabilité des requêtes SQL par requête HTTP et par vue.
+
+Pour chaque requête HTTP, un CompteurRequetes est branché sur la connexion via
+connection.execute_wrapper : nombre de requêtes, temps SQL cumulé et
+« formes » SQL dupliquées (même SQL à la valeur des paramètres près, typique
+des N+1). Les totaux sont agrégés en mémoire par vue puis écrits
+périodiquement dans StatistiqueRequetesVue, consultable avec
+`python manage.py query_budget_report`. L'écriture se fait dans le thread
+de api/write_behind.py, hors du chemin de la réponse : une erreur ou une
+attente de verrou sur les statistiques ne touche pas la requête de
+l'utilisateur (le lot est remis en mémoire et réessayé au flush suivant).
+
+Configuration (settings.QUERY_ACCOUNTING) :
+    ENABLED          active la mesure et l'agrégation
+    HEADERS          ajoute les en-têtes X-Query-* aux réponses
+    FLUSH_EVERY      écriture en base toutes les N requêtes HTTP...
+    FLUSH_INTERVAL   ... ou toutes les N secondes
+    TOP_DUPLICATES   nombre de formes dupliquées conservées par requête
+"""
+import re
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+
+from .write_behind import EcrivainDiffere
+
+DEFAULTS = {
+    'ENABLED': False,
+    'HEADERS': False,
+    'FLUSH_EVERY': 200,
+    'FLUSH_INTERVAL': 60,
+    'TOP_DUPLICATES': 3,
+}
+
+# Bornes supérieures des classes de l'histogramme (nombre de requêtes par appel)
+BORNES_HISTOGRAMME = (0, 1, 2, 5, 10, 25, 50, 100, 250)
+# Nombre de formes dupliquées conservées par vue en base
+DOUBLONS_PAR_VUE = 20
+
+_LITTERAUX = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTES = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+_ESPACES = re.compile(r'\s+')
+
+
+def configuration():
+    return {**DEFAULTS, **getattr(settings, 'QUERY_ACCOUNTING', {})}
+
+
+def forme_sql(sql):
+    """Normalise un SQL en « forme » : littéraux et listes IN (...) effacés"""
+    forme = _LITTERAUX.sub('?', sql)
+    forme = _LISTES.sub('(...)', forme)
+    return _ESPACES.sub(' ', forme).strip()
+
+
+def classe_histogramme(nombre):
+    for borne in BORNES_HISTOGRAMME:
+        if nombre <= borne:
+            return str(borne)
+    return f'>{BORNES_HISTOGRAMME[-1]}'
+
+
+class CompteurRequetes:
+    """execute_wrapper qui mesure les requêtes d'une requête HTTP"""
+
+    def __init__(self):
+        self.nombre = 0
+        self.temps = 0.0
+        self.formes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        debut = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.temps += time.perf_counter() - debut
+            self.nombre += 1
+            self.formes[forme_sql(sql)] += 1
+
+    @property
+    def temps_ms(self):
+        return self.temps * 1000
+
+    def doublons(self, limite=None):
+        """[(forme, nombre d'exécutions)] pour les formes exécutées plus d'une fois"""
+        return [(forme, n) for forme, n in self.formes.most_common(limite) if n > 1]
+
+    @property
+    def requetes_redondantes(self):
+        return sum(n - 1 for n in self.formes.values() if n > 1)
+
+
+class AgregatVues:
+    """Agrégats par vue en mémoire, écrits périodiquement en base"""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self._vues = {}
+        self._appels = 0
+        self._dernier_flush = time.monotonic()
+
+    def _stats(self, vue):
+        return self._vues.setdefault(vue, {
+            'appels': 0, 'requetes': 0, 'temps_ms': 0.0, 'max': 0,
+            'histogramme': Counter(), 'doublons': Counter(),
+        })
+
+    def enregistrer(self, vue, compteur, top):
+        with self._verrou:
+            stats = self._stats(vue)
+            stats['appels'] += 1
+            stats['requetes'] += compteur.nombre
+            stats['temps_ms'] += compteur.temps_ms
+            stats['max'] = max(stats['max'], compteur.nombre)
+            stats['histogramme'][classe_histogramme(compteur.nombre)] += 1
+            for forme, n in compteur.doublons(top):
+                stats['doublons'][forme] += n - 1
+            self._appels += 1
+
+    def restituer(self, vues):
+        """Remet en mémoire des agrégats dont l'écriture a échoué"""
+        with self._verrou:
+            for vue, ajout in vues.items():
+                stats = self._stats(vue)
+                for cle in ('appels', 'requetes', 'temps_ms'):
+                    stats[cle] += ajout[cle]
+                stats['max'] = max(stats['max'], ajout['max'])
+                stats['histogramme'] += ajout['histogramme']
+                stats['doublons'] += ajout['doublons']
+
+    def flush_necessaire(self, config):
+        return bool(self._vues) and (
+            self._appels >= config['FLUSH_EVERY']
+            or time.monotonic() - self._dernier_flush >= config['FLUSH_INTERVAL']
+        )
+
+    def extraire(self):
+        with self._verrou:
+            vues, self._vues = self._vues, {}
+            self._appels = 0
+            self._dernier_flush = time.monotonic()
+        return vues
+
+    def flush(self):
+        """Fusionne les agrégats en mémoire dans StatistiqueRequetesVue"""
+        from .models import StatistiqueRequetesVue
+
+        vues = self.extraire()
+        restantes = dict(vues)
+        try:
+            for vue, stats in vues.items():
+                with transaction.atomic():
+                    ligne, _ = StatistiqueRequetesVue.objects.select_for_update().get_or_create(vue=vue)
+                    ligne.nombre_appels += stats['appels']
+                    ligne.total_requetes += stats['requetes']
+                    ligne.total_temps_ms += stats['temps_ms']
+                    ligne.max_requetes = max(ligne.max_requetes, stats['max'])
+                    ligne.histogramme = dict(Counter(ligne.histogramme) + stats['histogramme'])
+                    doublons = Counter(ligne.doublons) + stats['doublons']
+                    ligne.doublons = dict(doublons.most_common(DOUBLONS_PAR_VUE))
+                    ligne.save()
+                del restantes[vue]
+        except Exception:
+            self.restituer(restantes)
+            raise
+        return len(vues)
+
+
+agregat = AgregatVues()
+ecrivain = EcrivainDiffere('query-accounting', agregat, configuration)
+
+
+def percentile_histogramme(histogramme, quantile):
+    """Borne supérieure de la classe contenant le quantile demandé"""
+    total = sum(histogramme.values())
+    if not total:
+        return None
+    cumul = 0
+    for classe in [str(b) for b in BORNES_HISTOGRAMME] + [f'>{BORNES_HISTOGRAMME[-1]}']:
+        cumul += histogramme.get(classe, 0)
+        if cumul >= quantile * total:
+            return classe
+    return None
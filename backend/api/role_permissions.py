@@ -1,23 +1,38 @@
+import base64
+from collections import defaultdict
+
 from django.contrib.auth.models import Permission
 from django.apps import apps
+from django.db import transaction
+from rest_framework import serializers
+
+from . import authentication
+from .cache_versions import ValeurVersionnee, incrementer_apres_commit
+from .models import Utilisateur
+
+# Modèles principaux de l'app
+MAIN_MODELS = ['tache', 'projet', 'service', 'utilisateur', 'notification']
+
+# Version incrémentée à chaque modification de Permission / Group (api.signals)
+VERSION_PERMISSIONS = 'permissions'
+
 
 def get_all_permissions_for_models(model_names):
     """
     Retourne la liste des codenames de permissions Django pour les modèles donnés.
     """
-    perms = []
-    for model_name in model_names:
-        model = apps.get_model('api', model_name)
-        perms += list(Permission.objects.filter(content_type__app_label='api', content_type__model=model._meta.model_name).values_list('codename', flat=True))
-    return perms
+    models = [apps.get_model('api', model_name)._meta.model_name for model_name in model_names]
+    return list(
+        Permission.objects.filter(content_type__app_label='api', content_type__model__in=models)
+        .order_by('content_type__model', 'codename')
+        .values_list('codename', flat=True)
+    )
 
 def build_role_permissions():
     """
     Construit dynamiquement le mapping des permissions par rôle.
     """
-    # Modèles principaux de l'app
-    main_models = ['tache', 'projet', 'service', 'utilisateur', 'notification']
-    all_perms = get_all_permissions_for_models(main_models)
+    all_perms = get_all_permissions_for_models(MAIN_MODELS)
 
     return {
         'ADMIN': all_perms,
@@ -34,4 +49,182 @@ def build_role_permissions():
         'DIRECTOR': [
             p for p in all_perms if p.startswith('view_')
         ]
-    } 
\ No newline at end of file
+    }
+
+
+# --- Synchronisation des permissions explicites (manage.py sync_role_permissions) ---
+
+TAILLE_LOT_SYNCHRO = 1000
+
+
+def permissions_attendues_par_role(roles):
+    """({rôle: set(permission_id)}, {rôle: codenames introuvables}) en une requête"""
+    carte = build_role_permissions()
+    ids = dict(
+        Permission.objects.filter(
+            content_type__app_label='api', codename__in={c for role in roles for c in carte.get(role, [])}
+        ).values_list('codename', 'id')
+    )
+    par_role, manquantes = {}, {}
+    for role in roles:
+        codenames = set(carte.get(role, []))
+        par_role[role] = {ids[c] for c in codenames if c in ids}
+        if codenames - ids.keys():
+            manquantes[role] = sorted(codenames - ids.keys())
+    return par_role, manquantes
+
+
+def synchroniser_permissions_utilisateurs(par_role, taille_lot=TAILLE_LOT_SYNCHRO, simulation=False):
+    """
+    Aligne user_permissions des utilisateurs des rôles de par_role
+    (permissions_attendues_par_role) sur les permissions de leur rôle, par
+    différence : par lot d'utilisateurs, les lignes existantes de la
+    table de liaison sont comparées aux lignes attendues, puis seules les
+    lignes en trop sont supprimées et les manquantes insérées (une
+    transaction par lot). Produit un dict de statistiques par lot ;
+    simulation=True calcule les écarts sans rien écrire.
+
+    Les écritures directes ne déclenchent pas m2m_changed : pour les
+    utilisateurs modifiés du lot, jetons à revendications révoqués dans la
+    transaction et droits de connexion en cache oubliés (api/login.py).
+    """
+    from .login import invalider_droits  # api.login importe ce module
+    Liaison = Permission.user_set.through
+    utilisateurs = (
+        Utilisateur.objects.filter(role__in=list(par_role)).order_by('user_id').values_list('user_id', 'role')
+    )
+    dernier = None
+    while True:
+        lot = utilisateurs.filter(user_id__gt=dernier) if dernier is not None else utilisateurs
+        lot = list(lot[:taille_lot])
+        if not lot:
+            return
+        dernier = lot[-1][0]
+        attendues = {(user_id, perm_id) for user_id, role in lot for perm_id in par_role[role]}
+        existantes = {
+            (user_id, perm_id): pk
+            for pk, user_id, perm_id in Liaison.objects.filter(
+                user_id__in=[user_id for user_id, _ in lot]
+            ).values_list('pk', 'user_id', 'permission_id')
+        }
+        a_supprimer = [pk for cle, pk in existantes.items() if cle not in attendues]
+        a_ajouter = [cle for cle in attendues if cle not in existantes]
+        if not simulation and (a_supprimer or a_ajouter):
+            modifies = sorted(
+                {user_id for user_id, _ in a_ajouter}
+                | {cle[0] for cle, pk in existantes.items() if cle not in attendues}
+            )
+            with transaction.atomic():
+                Liaison.objects.filter(pk__in=a_supprimer).delete()
+                Liaison.objects.bulk_create(
+                    [Liaison(user_id=user_id, permission_id=perm_id) for user_id, perm_id in sorted(a_ajouter)],
+                    batch_size=taille_lot,
+                    ignore_conflicts=True,
+                )
+                authentication.revoquer_jetons(modifies)
+                invalider_droits(modifies)
+        yield {'utilisateurs': len(lot), 'ajoutees': len(a_ajouter), 'supprimees': len(a_supprimer)}
+
+
+# --- Carte mise en cache (une construction par version et par processus) ---
+
+
+def _construire_carte():
+    catalogue = tuple(sorted(set(Permission.objects.values_list('codename', flat=True))))
+    roles = {role: frozenset(perms) for role, perms in build_role_permissions().items()}
+    # L'admin reçoit toutes les permissions du système
+    roles['ADMIN'] = frozenset(catalogue)
+    return {
+        'roles': roles,
+        'catalogue': catalogue,
+        'index': {codename: i for i, codename in enumerate(catalogue)},
+    }
+
+
+_carte = ValeurVersionnee(VERSION_PERMISSIONS, _construire_carte)
+
+
+def invalider():
+    incrementer_apres_commit(VERSION_PERMISSIONS)
+
+
+def permissions_du_role(role):
+    """Codenames accordés par le rôle (toutes les permissions pour ADMIN)"""
+    return _carte.get()['roles'].get(role, frozenset())
+
+
+def catalogue():
+    """(version, codenames triés) : index de référence de l'encodage en bits"""
+    version, carte = _carte.instantane()
+    return version, carte['catalogue']
+
+
+def encoder_bits(codenames):
+    """
+    (version, bitset base64 url-safe) : bit i = catalogue[i] du catalogue de
+    cette version. Version et index viennent du même instantané de la carte.
+    """
+    version, carte = _carte.instantane()
+    index = carte['index']
+    valeur = 0
+    for codename in codenames:
+        if codename in index:
+            valeur |= 1 << index[codename]
+    brut = valeur.to_bytes((len(index) + 7) // 8, 'little')
+    return version, base64.urlsafe_b64encode(brut).decode('ascii').rstrip('=')
+
+
+def decoder_bits(bits):
+    catalogue_courant = _carte.get()['catalogue']
+    valeur = int.from_bytes(base64.urlsafe_b64decode(bits + '=' * (-len(bits) % 4)), 'little')
+    return {codename for i, codename in enumerate(catalogue_courant) if valeur >> i & 1}
+
+
+# --- Permissions explicites (utilisateur et groupes), chargées par lot ---
+
+CACHE_ATTR = '_permissions_explicites'
+
+
+def charger_permissions_explicites(utilisateurs):
+    """
+    Équivalent groupé de user.get_all_permissions() (ModelBackend) : deux
+    requêtes pour toute la liste au lieu de deux par utilisateur.
+    """
+    a_charger = {u.user_id: u for u in utilisateurs if not hasattr(u, CACHE_ATTR)}
+    if not a_charger:
+        return
+    par_user = defaultdict(set)
+    for user_id, codename in Permission.objects.filter(user__in=list(a_charger)).values_list('user', 'codename'):
+        par_user[user_id].add(codename)
+    for user_id, codename in Permission.objects.filter(
+        group__user__in=list(a_charger)
+    ).values_list('group__user', 'codename'):
+        par_user[user_id].add(codename)
+    tout = None
+    for user_id, utilisateur in a_charger.items():
+        user = utilisateur.user
+        if not user.is_active:
+            perms = set()
+        elif user.is_superuser:
+            tout = tout if tout is not None else set(_carte.get()['catalogue'])
+            perms = tout
+        else:
+            perms = par_user.get(user_id, set())
+        setattr(utilisateur, CACHE_ATTR, perms)
+
+
+def permissions_utilisateur(utilisateur):
+    """Codenames effectifs : permissions explicites + permissions du rôle"""
+    if not hasattr(utilisateur, CACHE_ATTR):
+        charger_permissions_explicites([utilisateur])
+    return getattr(utilisateur, CACHE_ATTR) | permissions_du_role(utilisateur.role)
+
+
+class PermissionsListSerializer(serializers.ListSerializer):
+    """Précharge les permissions explicites de toute la liste avant la sérialisation"""
+
+    def to_representation(self, data):
+        objets = list(data.all() if hasattr(data, 'all') else data)
+        if 'permissions' in self.child.fields:
+            charger_permissions_explicites(objets)
+        return super().to_representation(objets)
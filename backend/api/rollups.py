@@ -0,0 +1,244 @@
+"""
+Rollups quotidiens des tâches (StatistiqueTachesJour), lus par
+GET /api/analytics/timeseries/ à la place de la table Tache.
+
+Une ligne par (jour, service, statut, priorité, type) :
+- crees, points, temps_passe : tâches créées ce jour (date_creation) ;
+- terminees : tâches terminées ce jour (completion_date, à défaut date_maj) ;
+- en_retard : tâches dont l'échéance tombait ce jour et qui n'ont pas été
+  terminées à temps (la série ne les compte que pour les jours écoulés).
+Les jours sont ceux du fuseau local ; les dimensions sont celles de l'état
+courant de la tâche.
+
+Mise à jour incrémentale (manage.py rollup_task_stats, à planifier) : seules
+les tâches dont date_maj dépasse le curseur (CurseurRollup), moins une marge
+de chevauchement pour les transactions validées en retard, sont relues. La
+dernière contribution de chaque tâche est conservée (EtatRollupTache) : on la
+retranche avant d'ajouter la nouvelle, ce qui rend le traitement idempotent
+et couvre les changements de statut, de service ou de dates. Les tâches
+supprimées sont retranchées de la même façon. Les deltas sont appliqués par
+INSERT ... ON CONFLICT DO UPDATE additifs, dans la transaction qui avance le
+curseur.
+"""
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef, Q, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import CurseurRollup, EtatRollupTache, StatistiqueTachesJour, Tache
+
+NOM_CURSEUR = 'taches'
+TAILLE_LOT = 1000
+CHEVAUCHEMENT = timedelta(minutes=5)
+
+MESURES = ('crees', 'terminees', 'en_retard', 'points', 'temps_passe')
+DIMENSIONS = ('service_id', 'status', 'priority', 'type')
+CHAMPS_TACHE = (
+    'id', 'service_id', 'status', 'priority', 'type', 'date_creation', 'date_maj',
+    'completion_date', 'deadline', 'workload_points', 'tracked_time',
+)
+CHAMPS_ETAT = tuple(f.attname for f in EtatRollupTache._meta.fields)
+
+GRANULARITES = {'day': None, 'week': TruncWeek, 'month': TruncMonth}
+# Fenêtre maximale de serie() par granularité (jours) : au plus ~730 / 260 / 240 périodes
+FENETRE_MAX = {'day': 2 * 366, 'week': 5 * 366, 'month': 20 * 366}
+REGROUPEMENTS = DIMENSIONS
+
+
+def etat(ligne):
+    """Contribution (non enregistrée) d'une ligne de Tache.values(*CHAMPS_TACHE)"""
+    terminee = ligne['status'] == 'completed'
+    fin = ligne['completion_date'] or ligne['date_maj']
+    return EtatRollupTache(
+        tache_id=ligne['id'],
+        service_id=ligne['service_id'],
+        status=ligne['status'],
+        priority=ligne['priority'],
+        type=ligne['type'],
+        jour_creation=timezone.localdate(ligne['date_creation']),
+        jour_terminee=timezone.localdate(fin) if terminee else None,
+        jour_retard=timezone.localdate(ligne['deadline']) if not terminee or fin > ligne['deadline'] else None,
+        points=ligne['workload_points'] or 0,
+        temps_passe=ligne['tracked_time'] or 0,
+    )
+
+
+def _valeurs(contribution):
+    return tuple(getattr(contribution, champ) for champ in CHAMPS_ETAT)
+
+
+def _ajouter(deltas, cle, signe, **mesures):
+    ligne = deltas.setdefault(cle, dict.fromkeys(MESURES, 0))
+    for mesure, valeur in mesures.items():
+        ligne[mesure] += signe * valeur
+
+
+def cumuler(deltas, contribution, signe=1):
+    """Ajoute (signe=1) ou retranche (signe=-1) une contribution aux deltas {clé: mesures}"""
+    dimensions = tuple(getattr(contribution, d) for d in DIMENSIONS)
+    _ajouter(
+        deltas, (contribution.jour_creation, *dimensions), signe,
+        crees=1, points=contribution.points, temps_passe=contribution.temps_passe,
+    )
+    if contribution.jour_terminee:
+        _ajouter(deltas, (contribution.jour_terminee, *dimensions), signe, terminees=1)
+    if contribution.jour_retard:
+        _ajouter(deltas, (contribution.jour_retard, *dimensions), signe, en_retard=1)
+
+
+def _ordre(element):
+    (jour, service_id, *autres), _ = element
+    return (jour, str(service_id or ''), *autres)
+
+
+def appliquer(deltas):
+    """Applique les deltas aux rollups ; retourne les jours touchés"""
+    lignes = sorted(((cle, m) for cle, m in deltas.items() if any(m.values())), key=_ordre)
+    if not lignes:
+        return set()
+    table = StatistiqueTachesJour._meta.db_table
+    colonnes = ('jour', *DIMENSIONS, *MESURES)
+    miseajour = ', '.join(f'{m} = {table}.{m} + EXCLUDED.{m}' for m in MESURES)
+    with connection.cursor() as cursor:
+        # Ordre de clés constant : pas d'interblocage entre exécutions concurrentes
+        for debut in range(0, len(lignes), TAILLE_LOT):
+            lot = lignes[debut:debut + TAILLE_LOT]
+            valeurs = ', '.join(['(' + ', '.join(['%s'] * len(colonnes)) + ')'] * len(lot))
+            cursor.execute(
+                f'INSERT INTO {table} ({", ".join(colonnes)}) VALUES {valeurs} '
+                f'ON CONFLICT (jour, {", ".join(DIMENSIONS)}) DO UPDATE SET {miseajour}',
+                [v for cle, mesures in lot for v in (*cle, *(mesures[m] for m in MESURES))],
+            )
+    return {cle[0] for cle, _ in lignes}
+
+
+def mettre_a_jour(taille_lot=TAILLE_LOT, chevauchement=CHEVAUCHEMENT):
+    """Intègre les tâches modifiées depuis le curseur : {'taches', 'supprimees', 'lignes'}"""
+    with transaction.atomic():
+        # Verrou du curseur : une seule mise à jour à la fois
+        curseur, _ = CurseurRollup.objects.select_for_update().get_or_create(nom=NOM_CURSEUR)
+        taches = Tache.objects.order_by('date_maj', 'id')
+        if curseur.date_maj is not None:
+            taches = taches.filter(date_maj__gte=curseur.date_maj - chevauchement)
+
+        deltas, modifiees, suite = {}, 0, Q()
+        while True:
+            lot = list(taches.filter(suite).values(*CHAMPS_TACHE)[:taille_lot])
+            if not lot:
+                break
+            anciennes = EtatRollupTache.objects.in_bulk([ligne['id'] for ligne in lot])
+            nouvelles = []
+            for ligne in lot:
+                nouvelle, ancienne = etat(ligne), anciennes.get(ligne['id'])
+                if ancienne is not None:
+                    if _valeurs(ancienne) == _valeurs(nouvelle):
+                        continue
+                    cumuler(deltas, ancienne, -1)
+                cumuler(deltas, nouvelle)
+                nouvelles.append(nouvelle)
+            EtatRollupTache.objects.bulk_create(
+                nouvelles, update_conflicts=True, unique_fields=['tache_id'], update_fields=CHAMPS_ETAT[1:],
+            )
+            modifiees += len(nouvelles)
+            dernier = lot[-1]
+            suite = Q(date_maj__gt=dernier['date_maj']) | Q(date_maj=dernier['date_maj'], id__gt=dernier['id'])
+            if curseur.date_maj is None or dernier['date_maj'] > curseur.date_maj:
+                curseur.date_maj = dernier['date_maj']
+
+        orphelines = EtatRollupTache.objects.filter(~Exists(Tache.objects.filter(pk=OuterRef('tache_id'))))
+        supprimees = 0
+        for contribution in orphelines.iterator(chunk_size=taille_lot):
+            cumuler(deltas, contribution, -1)
+            supprimees += 1
+        if supprimees:
+            orphelines.delete()
+
+        jours = appliquer(deltas)
+        if jours:
+            StatistiqueTachesJour.objects.filter(jour__in=jours, **dict.fromkeys(MESURES, 0)).delete()
+        curseur.save()
+    return {'taches': modifiees, 'supprimees': supprimees, 'lignes': len(deltas)}
+
+
+def reconstruire(taille_lot=TAILLE_LOT):
+    """Repart de zéro : vide rollups, contributions et curseur, puis relit toutes les tâches"""
+    with transaction.atomic():
+        StatistiqueTachesJour.objects.all().delete()
+        EtatRollupTache.objects.all().delete()
+        CurseurRollup.objects.filter(nom=NOM_CURSEUR).delete()
+        return mettre_a_jour(taille_lot)
+
+
+def verifier(limite=20):
+    """Rollups en écart avec Tache : (nombre, exemples (clé, attendu, actuel))"""
+    attendus = {}
+    for ligne in Tache.objects.values(*CHAMPS_TACHE).iterator(chunk_size=TAILLE_LOT):
+        cumuler(attendus, etat(ligne))
+    actuels = {
+        (r['jour'], *(r[d] for d in DIMENSIONS)): {m: r[m] for m in MESURES}
+        for r in StatistiqueTachesJour.objects.values('jour', *DIMENSIONS, *MESURES)
+    }
+    vide = dict.fromkeys(MESURES, 0)
+    ecarts = [
+        (cle, attendus.get(cle, vide), actuels.get(cle, vide))
+        for cle in set(attendus) | set(actuels)
+        if attendus.get(cle, vide) != actuels.get(cle, vide)
+    ]
+    return len(ecarts), sorted(ecarts, key=lambda e: _ordre((e[0], None)))[:limite]
+
+
+def _periodes(debut, fin, granularite):
+    if granularite == 'week':
+        courant = debut - timedelta(days=debut.weekday())
+    elif granularite == 'month':
+        courant = debut.replace(day=1)
+    else:
+        courant = debut
+    while courant <= fin:
+        yield courant
+        if granularite == 'week':
+            courant += timedelta(days=7)
+        elif granularite == 'month':
+            courant = (courant + timedelta(days=32)).replace(day=1)
+        else:
+            courant += timedelta(days=1)
+
+
+def serie(debut, fin, service_id=None, granularite='day', regroupement=None):
+    """
+    Série temporelle [{date, (dimension), created, completed, overdue,
+    workloadPoints, trackedTime}] sur [debut, fin] ; sans regroupement, les
+    périodes sans activité sont présentes avec des zéros.
+    """
+    lignes = StatistiqueTachesJour.objects.filter(jour__range=(debut, fin))
+    if service_id:
+        lignes = lignes.filter(service_id=service_id)
+    troncature = GRANULARITES[granularite]
+    lignes = lignes.annotate(periode=troncature('jour') if troncature else F('jour'))
+    champs = ['periode', *([regroupement] if regroupement else [])]
+    lignes = lignes.values(*champs).annotate(
+        created=Sum('crees'),
+        completed=Sum('terminees'),
+        overdue=Sum('en_retard', filter=Q(jour__lt=timezone.localdate())),
+        workloadPoints=Sum('points'),
+        trackedTime=Sum('temps_passe'),
+    ).order_by(*champs)
+
+    resultat = []
+    for ligne in lignes:
+        point = {'date': ligne.pop('periode').isoformat()}
+        if regroupement:
+            valeur = ligne.pop(regroupement)
+            point[regroupement] = str(valeur) if valeur is not None and regroupement == 'service_id' else valeur
+        point.update({cle: valeur or 0 for cle, valeur in ligne.items()})
+        resultat.append(point)
+    if regroupement:
+        return resultat
+    presents = {point['date']: point for point in resultat}
+    vide = dict.fromkeys(('created', 'completed', 'overdue', 'workloadPoints', 'trackedTime'), 0)
+    return [
+        presents.get(periode.isoformat(), {'date': periode.isoformat(), **vide})
+        for periode in _periodes(debut, fin, granularite)
+    ]
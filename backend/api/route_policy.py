@@ -0,0 +1,128 @@
+"""
+Politique déclarative par route : segments UUID et rôles autorisés par méthode.
+
+Remplace UUIDValidationMiddleware (découpage du chemin et recherche linéaire
+de motifs) et RolePermissionMiddleware (resolve() répété, tests de
+sous-chaînes sur le chemin). Les déclarations ci-dessous sont compilées une
+fois, au premier usage, en un dictionnaire {nom d'URL: Route} ne contenant
+que les routes qui ont quelque chose à vérifier (table()). La table est
+indexée par view_name (nom qualifié par l'espace de noms) ; les routes de
+l'administration Django n'y figurent pas.
+
+- Segments UUID : RoutePolicyMiddleware les vérifie dans process_view,
+  c'est-à-dire après la résolution que Django fait de toute façon, sans
+  aucune analyse du chemin ni authentification.
+- Rôles : vérifiés par la permission DRF RolesDeLaRoute (api/permissions.py),
+  donc après l'authentification propre à la vue (authentication_classes).
+
+Banc d'essai : python manage.py bench_route_policy
+"""
+import uuid
+
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import JsonResponse
+from django.urls import URLPattern, URLResolver, get_resolver
+
+# Segments UUID par basename du routeur : s'appliquent à toutes ses routes (basename-*)
+SEGMENTS_UUID = {
+    'service': ('pk',),
+    'utilisateur': ('pk',),
+    'projet': ('pk',),
+    'tache': ('pk',),
+    'commentaire': ('pk',),
+    'conversation': ('pk',),
+    'conversation-messages': ('conversation_pk', 'pk'),
+    'attachment': ('pk',),
+    'pretemploye': ('pk',),
+    'modeurgence': ('pk',),
+    'notification': ('pk',),
+}
+
+# Rôles autorisés par nom d'URL et par méthode ('*' : toute méthode non listée)
+ROLES = {
+    'tache-list': {'POST': ('ADMIN', 'MANAGER')},
+    'api/analytics_data': {'*': ('ADMIN', 'MANAGER', 'DIRECTOR')},
+    'api/analytics_timeseries': {'*': ('ADMIN', 'MANAGER', 'DIRECTOR')},
+    'api/analytics_cache_stats': {'*': ('ADMIN',)},
+}
+
+
+class Route:
+    """Contrôles compilés d'une route nommée"""
+    __slots__ = ('nom', 'segments_uuid', 'roles')
+
+    def __init__(self, nom, segments_uuid=(), roles=None):
+        self.nom = nom
+        self.segments_uuid = tuple(segments_uuid)
+        self.roles = {methode: frozenset(r) for methode, r in (roles or {}).items()}
+
+    def roles_autorises(self, methode):
+        """Rôles autorisés pour la méthode, None si la route ne les restreint pas"""
+        return self.roles.get(methode, self.roles.get('*'))
+
+    def verifier(self, request, view_kwargs):
+        """Segments UUID : None si la requête peut continuer, sinon la réponse d'erreur"""
+        for segment in self.segments_uuid:
+            valeur = view_kwargs.get(segment)
+            if valeur is None:
+                continue
+            try:
+                normalise = str(uuid.UUID(valeur))
+            except ValueError:
+                return JsonResponse({
+                    'error': 'UUID invalide',
+                    'message': f"L'identifiant fourni \"{valeur}\" n'est pas un UUID valide",
+                }, status=400)
+            if normalise != valeur.lower():
+                return JsonResponse({
+                    'error': "Format d'UUID invalide",
+                    'message': 'Les UUIDs doivent être au format RFC4122 standard',
+                    'corrected_url': request.path.replace(valeur, normalise),
+                }, status=400)
+        return None
+
+
+def _routes_nommees(motifs, namespace=None):
+    for motif in motifs:
+        if isinstance(motif, URLResolver):
+            # L'administration Django gère ses propres identifiants
+            if motif.namespace != 'admin':
+                yield from _routes_nommees(motif.url_patterns, motif.namespace or namespace)
+        elif isinstance(motif, URLPattern) and motif.name and namespace is None:
+            yield motif.name, motif.pattern.regex.groupindex
+
+
+def compiler(urlconf=None):
+    """{nom d'URL: Route} des routes nommées ayant des segments UUID ou des rôles"""
+    basenames = sorted(SEGMENTS_UUID, key=len, reverse=True)
+    table = {}
+    for nom, groupes in _routes_nommees(get_resolver(urlconf).url_patterns):
+        segments = set(table[nom].segments_uuid) if nom in table else set()
+        for basename in basenames:
+            if nom.startswith(basename + '-'):
+                segments.update(s for s in SEGMENTS_UUID[basename] if s in groupes)
+                break
+        roles = ROLES.get(nom)
+        if segments or roles:
+            table[nom] = Route(nom, sorted(segments), roles)
+    return table
+
+
+
+_table = None
+
+
+def table():
+    """Table compilée de l'URLconf du projet, partagée par le middleware et RolesDeLaRoute"""
+    global _table
+    if _table is None:
+        _table = compiler()
+    return _table
+
+
+@receiver(setting_changed)
+def _reinitialiser(setting, **kwargs):
+    global _table
+    if setting == 'ROOT_URLCONF':
+        _table = None
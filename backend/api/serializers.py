@@ -1,10 +1,23 @@
+import logging
+import uuid
+
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import (
     Service, Utilisateur, Projet, Tache, Commentaire, Conversation, Message, PieceJointe, PretEmploye, ModeUrgence, Notification
 )
 from django.db import transaction
+from django.db.models import Count, Prefetch, Q
 from django.conf import settings
+from .fieldsets import ChampsSelectifsSerializerMixin
+from . import tracing
+from .attachments import PiecesJointesListSerializer, pieces_jointes_de
+from .role_permissions import (
+    PermissionsListSerializer, encoder_bits, permissions_utilisateur,
+)
+
+logger = logging.getLogger(__name__)
+
 # Remarque : Les attributs .objects et .DoesNotExist sont bien présents sur les modèles Django,
 # même si certains linters ne les détectent pas correctement.
 
@@ -123,23 +136,15 @@ class UtilisateurDetailleSerializer(serializers.ModelSerializer):
         return None
 
     def get_permissions(self, obj):
-        from api.role_permissions import build_role_permissions
-        user = getattr(obj, 'user', None)
-        perms = set()
-        # Permissions explicites de l'utilisateur
-        if user and hasattr(user, 'get_all_permissions'):
-            perms.update(user.get_all_permissions())
-        # Permissions par rôle (mapping dynamique)
-        role_permissions = build_role_permissions()
-        role_perms = set(role_permissions.get(obj.role, []))
-        perms.update(role_perms)
-        # Pour l'admin, injecter toutes les permissions du système
-        if obj.role == 'ADMIN':
-            from django.contrib.auth.models import Permission
-            all_perms = Permission.objects.values_list('codename', flat=True)
-            perms.update(all_perms)
-        # Retourner uniquement les codenames (ex: 'add_tache')
-        return list(set(p.split('.', 1)[-1] if '.' in p else p for p in perms))
+        # Permissions explicites (préchargées pour toute la liste) + carte
+        # des rôles mise en cache par version (api/role_permissions.py)
+        perms = permissions_utilisateur(obj)
+        request = self.context.get('request')
+        if getattr(request, 'query_params', {}).get('permissions_format') == 'bitset':
+            # Format compact : bits sur le catalogue GET /api/permissions/catalog/
+            version, bits = encoder_bits(perms)
+            return {'version': version, 'bits': bits}
+        return sorted(perms)
 
     class Meta:
         model = Utilisateur
@@ -148,10 +153,10 @@ class UtilisateurDetailleSerializer(serializers.ModelSerializer):
             'serviceId', 'serviceDetails', 'serviceIdInput', 'phone', 'bio', 'profilePhoto',
             'isActive', 'lastLogin', 'createdAt', 'updatedAt', 'permissions'
         ]
+        list_serializer_class = PermissionsListSerializer
 
     def update(self, instance, validated_data):
-        import logging
-        logging.warning(f"validated_data avant update: {validated_data}")
+        tracing.evenement(tracing.DEBUG, 'utilisateur.update', champs=lambda: sorted(validated_data))
         # Gérer le cas où DRF fournit un dict 'user' imbriqué
         user_data = validated_data.pop('user', None)
         user = instance.user
@@ -217,7 +222,7 @@ class PieceJointeSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['url', 'size', 'checksum', 'createdAt']
 
-class ProjetSerializer(serializers.ModelSerializer):
+class ProjetSerializer(ChampsSelectifsSerializerMixin, serializers.ModelSerializer):
     startDate = serializers.DateField(source='start_date')
     endDate = serializers.DateField(source='end_date')
     actualEndDate = serializers.DateField(source='actual_end_date', allow_null=True, required=False)
@@ -232,7 +237,7 @@ class ProjetSerializer(serializers.ModelSerializer):
     serviceId = serializers.UUIDField(source='service.id', required=False, allow_null=True)
     serviceIds = serializers.SerializerMethodField()
     serviceIds = serializers.ListField(child=serializers.UUIDField(), source='services', required=False, write_only=True)
-    attachments = PieceJointeSerializer(source='pieces_jointes', many=True, read_only=True)
+    attachments = serializers.SerializerMethodField()
     createdAt = serializers.DateTimeField(source='date_creation', read_only=True)
     updatedAt = serializers.DateTimeField(source='date_maj', read_only=True)
 
@@ -244,10 +249,25 @@ class ProjetSerializer(serializers.ModelSerializer):
             'creatorId', 'chefId', 'chefDetails', 'memberIds', 'memberDetails', 'taskCount', 'completedTaskCount',
             'serviceId', 'serviceIds', 'attachments', 'createdAt', 'updatedAt'
         ]
+        list_serializer_class = PiecesJointesListSerializer
+
+    related_to_pieces_jointes = 'project'
+
+    # Relations incluses seulement si demandées (?fields= / ?expand=)
+    champs_extensibles = ('chefDetails', 'memberDetails', 'attachments')
+    chargements = {
+        'creatorId': {'select_related': ('creator',)},
+        'chefDetails': {'select_related': ('chef__user',)},
+        'memberDetails': {'prefetch_related': ('membres__user',)},
+        'serviceId': {'select_related': ('service',)},
+        'taskCount': {'annotate': {'nb_taches': Count('taches')}},
+        'completedTaskCount': {'annotate': {
+            'nb_taches_terminees': Count('taches', filter=Q(taches__status='completed'))
+        }},
+    }
 
     def create(self, validated_data):
-        import logging
-        logging.debug(f"[PROJET CREATE] validated_data: {validated_data}")
+        tracing.evenement(tracing.DEBUG, 'projet.create', validated_data=lambda: validated_data)
         try:
             membres_ids = validated_data.pop('membres', [])
             services_ids = validated_data.pop('services', [])
@@ -269,10 +289,14 @@ class ProjetSerializer(serializers.ModelSerializer):
                 project.membres.set(membres_ids)
             if services_ids:
                 project.services.set(services_ids)
-            logging.info(f"[PROJET CREATE] Projet créé avec succès: {project}")
+            tracing.evenement(tracing.INFO, 'projet.create.ok', projet_id=project.pk)
             return project
         except Exception as e:
-            logging.error(f"[PROJET CREATE] Erreur lors de la création: {e}")
+            if isinstance(e, serializers.ValidationError):
+                logger.warning("Création de projet impossible : %s", e.detail)
+            else:
+                logger.exception("Création de projet impossible")
+            tracing.evenement(tracing.ERROR, 'projet.create.erreur', erreur=repr(e))
             raise
 
     def update(self, instance, validated_data):
@@ -299,6 +323,9 @@ class ProjetSerializer(serializers.ModelSerializer):
         instance.save()
         return instance
 
+    def get_attachments(self, obj):
+        return PieceJointeSerializer(pieces_jointes_de(obj, self.related_to_pieces_jointes), many=True, context=self.context).data
+
     def get_serviceIds(self, obj):
         # Toujours retourner un tableau d'ID de service
         ids = []
@@ -337,7 +364,17 @@ class CommentaireSerializer(serializers.ModelSerializer):
         auteur = Utilisateur.objects.get(id=auteur_id)
         return Commentaire.objects.create(tache=tache, auteur=auteur, **validated_data)
 
-class TacheSerializer(serializers.ModelSerializer):
+def _resoudre(modele, identifiant, prechargees, champ):
+    """Instance `modele` d'id `identifiant`, depuis le dictionnaire préchargé s'il est fourni"""
+    if prechargees is None:
+        return modele.objects.get(id=identifiant)
+    try:
+        return prechargees[uuid.UUID(str(identifiant))]
+    except (KeyError, ValueError):
+        raise serializers.ValidationError({champ: f'{modele.__name__} introuvable : {identifiant}'})
+
+
+class TacheSerializer(ChampsSelectifsSerializerMixin, serializers.ModelSerializer):
     """API serializer for the Tache (Task) model."""
     type = serializers.CharField(required=True)
     priority = serializers.CharField()
@@ -366,7 +403,7 @@ class TacheSerializer(serializers.ModelSerializer):
     
     isOverdue = serializers.BooleanField(source='est_en_retard', read_only=True)
     
-    attachments = PieceJointeSerializer(source='pieces_jointes', many=True, read_only=True)
+    attachments = serializers.SerializerMethodField()
     comments = CommentaireSerializer(source='commentaires', many=True, read_only=True)
     
     createdAt = serializers.DateTimeField(source='date_creation', read_only=True)
@@ -383,11 +420,29 @@ class TacheSerializer(serializers.ModelSerializer):
             'attachments', 'comments', 'createdAt', 'updatedAt', 'completionDate'
         ]
         read_only_fields = ['creatorId', 'creatorDetails', 'assigneeDetails', 'serviceId', 'serviceDetails', 'isOverdue', 'attachments', 'comments', 'createdAt', 'updatedAt', 'completionDate']
+        list_serializer_class = PiecesJointesListSerializer
+
+    related_to_pieces_jointes = 'task'
+
+    # Relations incluses seulement si demandées (?fields= / ?expand=).
+    # Les pièces jointes sont chargées par PiecesJointesListSerializer.
+    champs_extensibles = ('creatorDetails', 'assigneeDetails', 'serviceDetails', 'attachments', 'comments')
+    chargements = {
+        'creatorId': {'select_related': ('creator',)},
+        'creatorDetails': {'select_related': ('creator__user',)},
+        'assigneeDetails': {'prefetch_related': ('assignees__user',)},
+        'serviceId': {'prefetch_related': ('project__services',)},
+        'serviceDetails': {'prefetch_related': (Prefetch(
+            'service',
+            queryset=Service.objects.select_related('chef__user').annotate(nb_membres=Count('utilisateurs')),
+        ),)},
+        'projectId': {'select_related': ('project',)},
+        'comments': {'prefetch_related': ('commentaires__auteur__user',)},
+    }
 
     def validate(self, data):
-        import logging
-        logging.debug(f"[TACHE VALIDATE] data: {data}")
-        
+        tracing.evenement(tracing.DEBUG, 'tache.validate', data=lambda: data)
+
         # Validation du type et cohérence des relations
         t_type = data.get('type')
         project = data.get('project', None)
@@ -397,18 +452,18 @@ class TacheSerializer(serializers.ModelSerializer):
         service_id = self.get_uuid_from_context('serviceIdInput')
         project_id = self.get_uuid_from_context('projectId')
         
-        logging.debug(f"[TACHE VALIDATE] type: {t_type}")
-        logging.debug(f"[TACHE VALIDATE] service_id: {service_id}")
-        logging.debug(f"[TACHE VALIDATE] project_id: {project_id}")
-        
+        tracing.evenement(
+            tracing.DEBUG, 'tache.validate.relations',
+            type=t_type, service_id=service_id, project_id=project_id,
+            current_type=self.instance.type if self.instance else None,
+        )
+
         # Si c'est une mise à jour (instance existe), vérifier si le type change
         if hasattr(self, 'instance') and self.instance:
             current_type = self.instance.type
-            logging.debug(f"[TACHE VALIDATE] current_type: {current_type}")
-            
+
             # Si le type ne change pas, ne pas valider les relations
             if t_type == current_type:
-                logging.debug(f"[TACHE VALIDATE] Type unchanged, skipping relation validation")
                 return data
         
         # Validation pour création ou changement de type
@@ -425,89 +480,89 @@ class TacheSerializer(serializers.ModelSerializer):
         return data
 
     def get_uuid_from_context(self, name):
-        import logging
-        logging.debug(f"[TACHE SERIALIZER] get_uuid_from_context - name: {name}")
-        logging.debug(f"[TACHE SERIALIZER] initial_data: {getattr(self, 'initial_data', None)}")
-        logging.debug(f"[TACHE SERIALIZER] request.data: {self.context.get('request').data if self.context.get('request') else None}")
-        
         # Vérifier dans initial_data d'abord
         if hasattr(self, 'initial_data') and self.initial_data and name in self.initial_data:
             value = self.initial_data[name]
-            logging.debug(f"[TACHE SERIALIZER] Found in initial_data: {value}")
+            tracing.evenement(tracing.DEBUG, 'tache.contexte', name=name, source='initial_data', value=value)
             return value
         
         # Vérifier dans request.data
         if self.context.get('request') and name in self.context['request'].data:
             value = self.context['request'].data.get(name)
-            logging.debug(f"[TACHE SERIALIZER] Found in request.data: {value}")
+            tracing.evenement(tracing.DEBUG, 'tache.contexte', name=name, source='request.data', value=value)
             return value
         
-        logging.debug(f"[TACHE SERIALIZER] Not found: {name}")
+        tracing.evenement(tracing.DEBUG, 'tache.contexte', name=name, source=None)
         return None
 
+    def preparer_creation(self, validated_data, services=None, projets=None):
+        """
+        Résout le type, le service et le projet de la tâche à créer, sans rien
+        enregistrer. Retourne (champs du modèle, ids des assignés).
+        `services` / `projets` : dictionnaires {id: instance} préchargés pour
+        une création groupée ; à défaut, lecture unitaire.
+        """
+        service_id = self.get_uuid_from_context('serviceIdInput')
+        project_id = self.get_uuid_from_context('projectId')
+        t_type = validated_data.get('type')
+
+        tracing.evenement(tracing.DEBUG, 'tache.preparer_creation', type=t_type, service_id=service_id, project_id=project_id)
+        if t_type == 'service':
+            if not service_id:
+                raise serializers.ValidationError({'serviceIdInput': 'Ce champ est requis pour une tâche de service'})
+            validated_data['service'] = _resoudre(Service, service_id, services, 'serviceIdInput')
+            validated_data['project'] = None
+        elif t_type == 'projet':
+            if not project_id:
+                raise serializers.ValidationError({'projectId': 'Ce champ est requis pour une tâche de projet'})
+            validated_data['project'] = _resoudre(Projet, project_id, projets, 'projectId')
+            validated_data['service'] = None
+        elif t_type == 'personnel':
+            validated_data['service'] = None
+            validated_data['project'] = None
+        if 'creator' in validated_data:
+            validated_data.pop('creator')
+        # Filtrer les champs qui ne sont pas dans le modèle Tache
+        model_fields = {k: v for k, v in validated_data.items()
+                        if k not in ['assigneeIds', 'serviceIdInput', 'projectId']}
+        return model_fields, validated_data.get('assigneeIds', [])
+
     def create(self, validated_data):
-        import logging
-        logging.debug(f"[TACHE CREATE] validated_data: {validated_data}")
+        tracing.evenement(tracing.DEBUG, 'tache.create.donnees', validated_data=lambda: validated_data)
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
-            logging.error("[TACHE CREATE] Utilisateur non authentifié")
             raise serializers.ValidationError("Utilisateur non authentifié")
         creator = request.user.utilisateur
         try:
-            service_id = self.get_uuid_from_context('serviceIdInput')
-            project_id = self.get_uuid_from_context('projectId')
-            t_type = validated_data.get('type')
-            
-            logging.debug(f"[TACHE CREATE] service_id: {service_id}")
-            logging.debug(f"[TACHE CREATE] project_id: {project_id}")
-            logging.debug(f"[TACHE CREATE] type: {t_type}")
-            if t_type == 'service':
-                if not service_id:
-                    logging.error("[TACHE CREATE] serviceIdInput manquant pour tâche de service")
-                    raise serializers.ValidationError({'serviceIdInput': 'Ce champ est requis pour une tâche de service'})
-                validated_data['service'] = Service.objects.get(id=service_id)
-                validated_data['project'] = None
-            elif t_type == 'projet':
-                if not project_id:
-                    logging.error("[TACHE CREATE] projectId manquant pour tâche de projet")
-                    raise serializers.ValidationError({'projectId': 'Ce champ est requis pour une tâche de projet'})
-                validated_data['project'] = Projet.objects.get(id=project_id)
-                validated_data['service'] = None
-            elif t_type == 'personnel':
-                validated_data['service'] = None
-                validated_data['project'] = None
-            if 'creator' in validated_data:
-                validated_data.pop('creator')
-            # Filtrer les champs qui ne sont pas dans le modèle Tache
-            model_fields = {k: v for k, v in validated_data.items() 
-                          if k not in ['assigneeIds', 'serviceIdInput', 'projectId']}
-            
+            model_fields, assignee_ids = self.preparer_creation(validated_data)
             tache = Tache.objects.create(
                 creator=creator,
                 **model_fields
             )
-            assignee_ids = validated_data.get('assigneeIds', [])
             if assignee_ids:
                 assignees = Utilisateur.objects.filter(id__in=assignee_ids)
                 tache.assignees.set(assignees)
-            logging.info(f"[TACHE CREATE] Tâche créée avec succès: {tache}")
+            tracing.evenement(tracing.INFO, 'tache.create.ok', tache_id=tache.pk)
             return tache
         except Exception as e:
-            logging.error(f"[TACHE CREATE] Erreur lors de la création: {e}")
+            if isinstance(e, serializers.ValidationError):
+                logger.warning("Création de tâche impossible : %s", e.detail)
+            else:
+                logger.exception("Création de tâche impossible")
+            tracing.evenement(tracing.ERROR, 'tache.create.erreur', erreur=repr(e))
             raise
 
     def update(self, instance, validated_data):
-        import logging
-        logging.debug(f"[TACHE UPDATE] validated_data: {validated_data}")
-        
         service_id = self.get_uuid_from_context('serviceIdInput')
         project_id = self.get_uuid_from_context('projectId')
         t_type = validated_data.get('type')
-        
-        logging.debug(f"[TACHE UPDATE] service_id: {service_id}")
-        logging.debug(f"[TACHE UPDATE] project_id: {project_id}")
-        logging.debug(f"[TACHE UPDATE] type: {t_type}")
-        logging.debug(f"[TACHE UPDATE] instance.type: {instance.type}")
+
+        tracing.evenement(
+            tracing.DEBUG, 'tache.update',
+            tache_id=instance.pk, type=t_type, instance_type=instance.type,
+            service_id=service_id, project_id=project_id,
+            validated_data=lambda: validated_data,
+        )
         
         # Si le type change, vérifier les nouvelles relations
         if t_type and t_type != instance.type:
@@ -541,14 +596,20 @@ class TacheSerializer(serializers.ModelSerializer):
         instance.save()
         return instance
 
+    def get_attachments(self, obj):
+        return PieceJointeSerializer(pieces_jointes_de(obj, self.related_to_pieces_jointes), many=True, context=self.context).data
+
     def get_assigneeIds(self, obj):
         return [str(u.id) for u in obj.assignees.all()]  # type: ignore[attr-defined]
 
     def get_serviceId(self, obj):
-        if obj.service:
-            return str(obj.service.id)
-        elif obj.project and obj.project.services.exists():
-            return str(obj.project.services.first().id)
+        if obj.service_id:
+            return str(obj.service_id)
+        elif obj.project_id:
+            # .all() profite du prefetch ; le premier service par pk, comme .first()
+            services = list(obj.project.services.all())
+            if services:
+                return str(min(services, key=lambda s: s.pk).id)
         return None
 
 # --- Auth & User Management Serializers ---
@@ -740,6 +801,35 @@ class NotificationSerializer(serializers.ModelSerializer):
         model = Notification
         fields = '__all__'
 
+class NotificationFiltreSerializer(serializers.Serializer):
+    """Sélection de notifications pour les opérations groupées (mark-read, bulk-delete)"""
+    ids = serializers.ListField(child=serializers.UUIDField(), required=False, max_length=1000)
+    type = serializers.CharField(required=False, max_length=50)
+    relatedId = serializers.UUIDField(source='related_id', required=False)
+    olderThan = serializers.DateTimeField(source='older_than', required=False)
+    isRead = serializers.BooleanField(source='est_lue', required=False)
+    all = serializers.BooleanField(required=False, default=False)
+    # mark-read uniquement : état à appliquer
+    read = serializers.BooleanField(required=False, default=True)
+
+    def filtrer(self, queryset):
+        donnees = self.validated_data
+        if 'ids' in donnees:
+            queryset = queryset.filter(id__in=donnees['ids'])
+        if 'type' in donnees:
+            queryset = queryset.filter(type=donnees['type'])
+        if 'related_id' in donnees:
+            queryset = queryset.filter(related_id=donnees['related_id'])
+        if 'older_than' in donnees:
+            queryset = queryset.filter(date_creation__lt=donnees['older_than'])
+        if 'est_lue' in donnees:
+            queryset = queryset.filter(est_lue=donnees['est_lue'])
+        return queryset
+
+    @property
+    def sans_filtre(self):
+        return not (set(self.validated_data) - {'all', 'read'})
+
 class ServiceManagerCreateSerializer(serializers.Serializer):
     # Champs pour le service
     service_name = serializers.CharField(max_length=100)
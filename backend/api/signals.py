@@ -2,9 +2,12 @@
 # Fichier pour définir les signaux personnalisés de l'application API
 # Utilisez ce fichier pour connecter des signaux aux modèles si nécessaire
 
-from django.db.models.signals import post_save, pre_save
+from django.contrib.auth.models import Group, Permission
+from django.db.models.signals import post_save, pre_save, post_delete, pre_delete, m2m_changed, post_migrate
 from django.dispatch import receiver
 from .models import User  # Remplacez par le nom réel de votre modèle
+from .models import Tache, Projet, Service, Utilisateur, Notification, PretEmploye
+from . import analytics, authentication, capacity, login, notification_counters, role_permissions, visibility, workload
 
 # Exemple de signal : exécuter une action après la sauvegarde d'une instance de YourModel
 @receiver(post_save, sender=User)
@@ -28,3 +31,283 @@ def after_save_user(sender, instance, created, **kwargs):
     def __str__(self):
         return self.username
 
+
+# --- Index de visibilité des tâches (voir api/visibility.py) ---
+
+
+@receiver(post_save, sender=Tache)
+def visibilite_tache_enregistree(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created or instance.champs_modifies():
+        visibility.synchroniser_taches([instance.pk])
+
+
+@receiver(post_save, sender=Projet)
+def visibilite_projet_enregistre(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    if instance.champs_modifies():
+        visibility.synchroniser_taches_projets([instance.pk])
+
+
+@receiver(post_save, sender=Utilisateur)
+def visibilite_utilisateur_enregistre(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created or 'service_id' in instance.champs_modifies():
+        visibility.synchroniser_utilisateurs([instance.pk])
+
+
+@receiver(m2m_changed, sender=Tache.assignees.through)
+def visibilite_assignes_modifies(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        visibility.synchroniser_taches([instance.pk])
+    elif pk_set:
+        visibility.synchroniser_taches(pk_set)
+    else:
+        visibility.synchroniser_utilisateurs([instance.pk])
+
+
+@receiver(m2m_changed, sender=Projet.membres.through)
+@receiver(m2m_changed, sender=Projet.services.through)
+def visibilite_membres_projet_modifies(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        visibility.synchroniser_taches_projets([instance.pk])
+    elif pk_set:
+        visibility.synchroniser_taches_projets(pk_set)
+    elif isinstance(instance, Utilisateur):
+        visibility.synchroniser_utilisateurs([instance.pk])
+    else:
+        # Service retiré de tous ses projets : resynchroniser ses membres
+        visibility.synchroniser_utilisateurs(instance.utilisateurs.values_list('id', flat=True))
+
+
+# Les suppressions de Service / Projet passent les FK à NULL par UPDATE
+# (sans signal post_save) : mémoriser les entités impactées avant suppression.
+
+@receiver(pre_delete, sender=Service)
+def visibilite_service_avant_suppression(sender, instance, **kwargs):
+    instance._visibilite_taches = list(
+        Tache.objects.filter(service=instance).values_list('id', flat=True)
+    )
+    instance._visibilite_utilisateurs = list(instance.utilisateurs.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Service)
+def visibilite_service_supprime(sender, instance, **kwargs):
+    visibility.synchroniser_taches(getattr(instance, '_visibilite_taches', []))
+    visibility.synchroniser_utilisateurs(getattr(instance, '_visibilite_utilisateurs', []))
+
+
+@receiver(pre_delete, sender=Projet)
+def visibilite_projet_avant_suppression(sender, instance, **kwargs):
+    instance._visibilite_taches = list(instance.taches.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Projet)
+def visibilite_projet_supprime(sender, instance, **kwargs):
+    visibility.synchroniser_taches(getattr(instance, '_visibilite_taches', []))
+
+
+# --- Compteurs de notifications non lues (voir api/notification_counters.py) ---
+
+
+@receiver(pre_save, sender=Notification)
+def compteurs_notification_avant_enregistrement(sender, instance, raw=False, update_fields=None, **kwargs):
+    if not raw:
+        notification_counters.verrouiller_instance(instance, update_fields)
+
+
+@receiver(post_save, sender=Notification)
+def compteurs_notification_enregistree(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        notification_counters.ajuster_instance(instance, created)
+
+
+# --- Carte des permissions par rôle mise en cache (voir api/role_permissions.py) ---
+
+
+@receiver([post_save, post_delete], sender=Permission)
+@receiver([post_save, post_delete], sender=Group)
+@receiver(m2m_changed, sender=Group.permissions.through)
+@receiver(post_migrate)
+def permissions_modifiees(sender, **kwargs):
+    # post_migrate : create_permissions() passe par bulk_create, sans post_save
+    role_permissions.invalider()
+
+
+# --- Révocation des jetons d'accès à revendications (voir api/authentication.py) ---
+
+CHAMPS_JETON_UTILISATEUR = {'role', 'service_id', 'est_actif', 'is_admin'}
+CHAMPS_JETON_USER = ('is_active', 'is_superuser', 'password')
+
+
+@receiver(post_save, sender=Utilisateur)
+def jetons_utilisateur_modifie(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    if instance.champs_modifies() & CHAMPS_JETON_UTILISATEUR:
+        authentication.revoquer_jetons([instance.user_id])
+
+
+@receiver(pre_save, sender=User)
+def jetons_user_avant_enregistrement(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._revoquer_jetons = False
+    if raw or instance.pk is None:
+        return
+    # Seuls les champs chargés et enregistrés sont comparés (User issu d'un jeton : champs différés)
+    champs = [
+        champ for champ in CHAMPS_JETON_USER
+        if champ in instance.__dict__ and (update_fields is None or champ in update_fields)
+    ]
+    if not champs:
+        return
+    ancien = User.objects.filter(pk=instance.pk).values(*champs).first()
+    instance._revoquer_jetons = ancien is not None and any(
+        ancien[champ] != instance.__dict__[champ] for champ in champs
+    )
+
+
+@receiver(post_save, sender=User)
+def jetons_user_enregistre(sender, instance, created, **kwargs):
+    if getattr(instance, '_revoquer_jetons', False):
+        instance._revoquer_jetons = False
+        authentication.revoquer_jetons([instance.pk])
+
+
+def users_concernes(instance, action, reverse, pk_set):
+    """User.id touchés par un m2m_changed de User.groups / User.user_permissions (None : action ignorée)"""
+    if action in ('post_add', 'post_remove'):
+        return list(pk_set) if reverse else [instance.pk]
+    if action == 'pre_clear':
+        return list(instance.user_set.values_list('pk', flat=True)) if reverse else [instance.pk]
+    return None
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def jetons_groupes_modifies(sender, instance, action, reverse, pk_set, **kwargs):
+    user_ids = users_concernes(instance, action, reverse, pk_set)
+    if user_ids:
+        authentication.revoquer_jetons(user_ids)
+
+
+@receiver(pre_delete, sender=Group)
+def jetons_groupe_supprime(sender, instance, **kwargs):
+    authentication.revoquer_jetons(list(instance.user_set.values_list('pk', flat=True)))
+
+
+# --- Permissions et groupes mis en cache pour la connexion (voir api/login.py) ---
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=User.groups.through)
+def droits_connexion_modifies(sender, instance, action, reverse, pk_set, **kwargs):
+    user_ids = users_concernes(instance, action, reverse, pk_set)
+    if user_ids:
+        login.invalider_droits(user_ids)
+
+
+# --- Versions du cache des indicateurs analytiques (voir api/analytics.py) ---
+
+
+def _services_initial_et_courant(instance):
+    return {instance.service_id, getattr(instance, '_etat_initial', {}).get('service_id')}
+
+
+@receiver([post_save, post_delete], sender=Tache)
+def analytics_tache_modifiee(sender, instance, raw=False, **kwargs):
+    if not raw:
+        analytics.invalider(_services_initial_et_courant(instance))
+
+
+@receiver(m2m_changed, sender=Tache.assignees.through)
+def analytics_assignes_modifies(sender, instance, action, reverse, **kwargs):
+    # Performances par utilisateur assigné
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        analytics.invalider([] if reverse else [instance.service_id])
+
+
+@receiver(post_save, sender=Projet)
+def analytics_projet_enregistre(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    services = _services_initial_et_courant(instance)
+    if not created:
+        services.update(instance.services.values_list('id', flat=True))
+    analytics.invalider(services)
+
+
+@receiver(pre_delete, sender=Projet)
+def analytics_projet_avant_suppression(sender, instance, **kwargs):
+    analytics.invalider({instance.service_id, *instance.services.values_list('id', flat=True)})
+
+
+@receiver(m2m_changed, sender=Projet.services.through)
+def analytics_services_projet_modifies(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove'):
+        analytics.invalider([instance.pk] if reverse else pk_set)
+    elif action == 'pre_clear':
+        analytics.invalider([instance.pk] if reverse else instance.services.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Service)
+def analytics_service_supprime(sender, instance, **kwargs):
+    analytics.invalider([instance.pk])
+
+
+# --- Compteurs de charge de travail (voir api/workload.py) ---
+
+
+@receiver([post_save, post_delete], sender=Tache)
+def charge_tache_modifiee(sender, instance, raw=False, **kwargs):
+    if not raw:
+        workload.synchroniser_taches([instance.pk])
+
+
+@receiver(m2m_changed, sender=Tache.assignees.through)
+def charge_assignes_modifies(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        workload.synchroniser_taches([instance.pk])
+    elif pk_set:
+        workload.synchroniser_taches(pk_set)
+    elif action == 'post_clear':
+        workload.synchroniser_taches(workload.taches_des_contributions(utilisateur_id=instance.pk))
+
+
+# Suppressions en cascade / SET_NULL sans signal sur Tache ni sur les assignés
+
+@receiver(pre_delete, sender=Utilisateur)
+def charge_utilisateur_avant_suppression(sender, instance, **kwargs):
+    instance._charge_taches = workload.taches_des_contributions(utilisateur_id=instance.pk)
+
+
+@receiver(post_delete, sender=Utilisateur)
+def charge_utilisateur_supprime(sender, instance, **kwargs):
+    workload.synchroniser_taches(getattr(instance, '_charge_taches', []))
+
+
+@receiver(pre_delete, sender=Service)
+def charge_service_avant_suppression(sender, instance, **kwargs):
+    instance._charge_taches = workload.taches_des_contributions(service_id=instance.pk)
+
+
+@receiver(post_delete, sender=Service)
+def charge_service_supprime(sender, instance, **kwargs):
+    workload.synchroniser_taches(getattr(instance, '_charge_taches', []))
+
+
+# --- Capacité effective des services (voir api/capacity.py) ---
+
+
+@receiver([post_save, post_delete], sender=PretEmploye)
+@receiver([post_save, post_delete], sender=Service)
+def capacite_modifiee(sender, raw=False, **kwargs):
+    if not raw:
+        capacity.invalider()
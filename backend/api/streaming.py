@@ -0,0 +1,183 @@
+"""
+Flux Server-Sent Events : GET /api/events/stream/
+
+Pousse aux utilisateurs connectés les nouvelles notifications et les
+changements de statut des tâches qu'ils voient (api/broker.py), à la place
+du rafraîchissement périodique côté client.
+
+- Authentification par jeton d'accès JWT (?token=..., EventSource ne permet
+  pas d'en-tête Authorization) ou en-tête Authorization: Bearer ;
+- chaque notification porte un id d'événement (curseur keyset sur
+  (date_creation, id), le plus grand déjà émis) : à la reconnexion, le
+  navigateur renvoie Last-Event-ID et les notifications manquées sont
+  rejouées ;
+- date_creation est horodatée avant la validation : une transaction peut
+  valider après une autre plus récente. Chaque relecture repart donc de
+  CHEVAUCHEMENT avant la position et écarte les notifications déjà émises
+  (par id) : une notification validée en retard de moins de CHEVAUCHEMENT
+  est livrée. À la reconnexion, celles de la fenêtre antérieures à
+  Last-Event-ID sont tenues pour livrées ;
+- commentaire de maintien de connexion toutes les HEARTBEAT secondes.
+
+Vue asynchrone : elle ne monopolise pas de thread pendant l'attente, mais
+doit être servie par un serveur ASGI (gptc_oddl.asgi:application, par
+exemple uvicorn) ; sous WSGI le flux resterait bloqué en mémoire tampon.
+"""
+import asyncio
+import json
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from .broker import broker, configuration
+from .models import Notification
+from .pagination import decoder_curseur, encoder_curseur, filtre_apres
+from .serializers import NotificationSerializer
+
+ORDRE = ('date_creation', 'id')
+LIMITE_REPRISE = 200
+CHEVAUCHEMENT = timedelta(seconds=30)
+
+
+def formater(evenement, donnees, identifiant=None):
+    lignes = []
+    if identifiant is not None:
+        lignes.append(f'id: {identifiant}')
+    lignes.append(f'event: {evenement}')
+    lignes.append('data: ' + json.dumps(donnees, cls=JSONEncoder, separators=(',', ':')))
+    return '\n'.join(lignes) + '\n\n'
+
+
+def authentifier(request):
+    """Profil Utilisateur du jeton d'accès, ou None"""
+    jeton = request.GET.get('token')
+    if not jeton:
+        entete = request.headers.get('Authorization', '').split()
+        if len(entete) == 2 and entete[0] == 'Bearer':
+            jeton = entete[1]
+    if not jeton:
+        return None
+    authentification = JWTAuthentication()
+    try:
+        user = authentification.get_user(authentification.get_validated_token(jeton))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+    return getattr(user, 'utilisateur', None)
+
+
+def _vues_jusqu_a(utilisateur, position):
+    """{id: date_creation} des notifications de la fenêtre de relecture, jusqu'à la position incluse"""
+    return dict(
+        Notification.objects.filter(utilisateur=utilisateur, date_creation__gte=position[0] - CHEVAUCHEMENT)
+        .exclude(filtre_apres(ORDRE, position))
+        .values_list('id', 'date_creation')
+    )
+
+
+def position_initiale(utilisateur, dernier_id):
+    """
+    (position, notifications déjà vues) de reprise : Last-Event-ID, sinon la
+    notification la plus récente.
+    """
+    position = None
+    if dernier_id:
+        try:
+            position = decoder_curseur(dernier_id, Notification, ORDRE)[0]
+        except ValueError:
+            pass
+    if position is None:
+        derniere = (
+            Notification.objects.filter(utilisateur=utilisateur)
+            .order_by('-date_creation', '-id')
+            .values_list(*ORDRE)
+            .first()
+        )
+        position = list(derniere) if derniere else None
+    return position, _vues_jusqu_a(utilisateur, position) if position else {}
+
+
+def notifications_apres(utilisateur, position, vues=None, limite=LIMITE_REPRISE):
+    """
+    Notifications pas encore vues à partir de CHEVAUCHEMENT avant la
+    position, dans l'ordre ; vues ({id: date_creation}) est mis à jour.
+    Retourne ([(curseur, données sérialisées)], nouvelle position) : la
+    position (et le curseur de chaque événement) est la plus grande émise.
+    """
+    vues = {} if vues is None else vues
+    queryset = Notification.objects.filter(utilisateur=utilisateur)
+    if position is not None:
+        queryset = queryset.filter(date_creation__gte=position[0] - CHEVAUCHEMENT).exclude(id__in=list(vues))
+    lot = []
+    for n in queryset.order_by(*ORDRE)[:limite]:
+        vues[n.id] = n.date_creation
+        if position is None or (n.date_creation, n.id) > tuple(position):
+            position = [n.date_creation, n.id]
+        lot.append((encoder_curseur(position), NotificationSerializer(n).data))
+    if position is not None:
+        for id_vue in [i for i, date_creation in vues.items() if date_creation < position[0] - CHEVAUCHEMENT]:
+            del vues[id_vue]
+    return lot, position
+
+
+async def _rattraper(utilisateur, position, vues):
+    """Émet toutes les notifications pas encore vues depuis la position"""
+    while True:
+        lot, position = await sync_to_async(notifications_apres)(utilisateur, position, vues)
+        for curseur, donnees in lot:
+            yield formater('notification', donnees, curseur), position
+        if len(lot) < LIMITE_REPRISE:
+            return
+
+
+async def flux(utilisateur, dernier_id):
+    config = configuration()
+    # S'abonner avant de relire la base : rien ne peut passer entre les deux
+    abonnement = broker().abonner(utilisateur.id)
+    try:
+        yield f'retry: {config["RETRY_MS"]}\n\n'
+        position, vues = await sync_to_async(position_initiale)(utilisateur, dernier_id)
+        async for bloc, position in _rattraper(utilisateur, position, vues):
+            yield bloc
+        yield formater('ready', {})
+        while True:
+            try:
+                type_evenement, donnees = await asyncio.wait_for(abonnement.file.get(), config['HEARTBEAT'])
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            if abonnement.debordement:
+                # Événements perdus : le client recharge ses données
+                abonnement.debordement = False
+                yield formater('resync', {})
+            if type_evenement != 'notification':
+                yield formater(type_evenement, donnees)
+                continue
+            # Regrouper les réveils en attente : une seule relecture
+            autres = []
+            while not abonnement.file.empty():
+                suivant = abonnement.file.get_nowait()
+                if suivant[0] != 'notification':
+                    autres.append(suivant)
+            async for bloc, position in _rattraper(utilisateur, position, vues):
+                yield bloc
+            for type_evenement, donnees in autres:
+                yield formater(type_evenement, donnees)
+    finally:
+        broker().desabonner(abonnement)
+
+
+async def flux_evenements(request):
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    utilisateur = await sync_to_async(authentifier)(request)
+    if utilisateur is None:
+        return JsonResponse({'detail': "Jeton d'authentification absent ou invalide."}, status=401)
+    dernier_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    reponse = StreamingHttpResponse(flux(utilisateur, dernier_id), content_type='text/event-stream')
+    reponse['Cache-Control'] = 'no-cache'
+    reponse['X-Accel-Buffering'] = 'no'
+    return reponse
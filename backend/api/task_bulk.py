@@ -0,0 +1,351 @@
+"""
+Opérations groupées sur les tâches : POST /api/tasks/bulk/
+
+    {
+      "atomic": false,
+      "operations": [
+        {"op": "create", "data": {...même corps que POST /api/tasks/...}},
+        {"op": "update", "id": "<uuid>", "data": {"status": "completed"}},
+        {"op": "assign", "id": "<uuid>", "assigneeIds": ["<uuid>"], "mode": "set"},
+        {"op": "delete", "id": "<uuid>"}
+      ]
+    }
+
+Déroulement :
+1. validation de chaque élément, avec chargement groupé des tâches, services,
+   projets et utilisateurs référencés et contrôle d'accès ensembliste
+   (index de visibilité) ;
+2. application des éléments valides dans une seule transaction
+   (bulk_create / bulk_update / delete groupé) ;
+3. notifications insérées en une fois, visibilité resynchronisée
+   explicitement (les opérations groupées ne déclenchent pas les signaux).
+
+La réponse donne un résultat par élément. Avec "atomic": true, rien n'est
+appliqué si un élément est invalide. Une même tâche ne peut apparaître
+qu'une fois par lot.
+"""
+import uuid
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import analytics, visibility, workload
+from .access import ACCES_TACHES
+from .broker import publier_statuts_taches
+from .identity import identite
+from .models import Projet, Service, Tache, Utilisateur
+from .notifications import LotNotifications, notifier_assignation, notifier_changement_statut
+from .serializers import TacheSerializer
+
+TAILLE_MAX_LOT = 500
+OPERATIONS = ('create', 'update', 'delete', 'assign')
+MODES_ASSIGNATION = ('set', 'add', 'remove')
+ROLES_CREATION = ('ADMIN', 'MANAGER')
+# Champs modifiables par "update" ; type, service, projet et assignés passent
+# par PATCH /api/tasks/<id>/ ou par l'opération "assign".
+CHAMPS_MODIFIABLES = {
+    'title', 'description', 'status', 'priority', 'deadline', 'tags',
+    'estimatedTime', 'trackedTime', 'workloadPoints',
+}
+
+TacheAssignees = Tache.assignees.through
+
+
+class ErreurElement(Exception):
+    def __init__(self, code, erreurs):
+        super().__init__(erreurs)
+        self.code = code
+        self.erreurs = erreurs
+
+
+def _uuid(valeur, champ='id'):
+    try:
+        return uuid.UUID(str(valeur))
+    except (TypeError, ValueError, AttributeError):
+        raise ErreurElement(400, {champ: f'UUID invalide : {valeur}'})
+
+
+def _uuids(valeurs, champ):
+    if not isinstance(valeurs, list):
+        raise ErreurElement(400, {champ: 'Une liste est attendue.'})
+    return [_uuid(v, champ) for v in valeurs]
+
+
+def taches_modifiables(contexte, tache_ids):
+    """
+    Version ensembliste de IsTaskOwnerOrManagerOrAdmin (politique api/access.py) :
+    retourne (ids visibles, ids visibles mais interdits).
+    """
+    return ACCES_TACHES.classer(contexte, tache_ids)
+
+
+class LotTaches:
+    def __init__(self, operations, request):
+        self.operations = operations
+        self.request = request
+        self.utilisateur = identite(request).utilisateur
+        self.contexte = {'request': request}
+        self.resultats = [None] * len(operations)
+        self.creations = []      # (index, Tache, ids des assignés)
+        self.mises_a_jour = []   # (index, Tache, champs modifiés, ancien statut)
+        self.assignations = []   # (index, Tache, mode, ids des assignés)
+        self.suppressions = []   # (index, Tache)
+
+    # --- Validation ---
+
+    def valider(self):
+        elements = []
+        for index, operation in enumerate(self.operations):
+            try:
+                elements.append((index, self._analyser(operation)))
+            except ErreurElement as e:
+                self._echec(index, operation, e)
+
+        tache_ids = {el['id'] for _, el in elements if el.get('id')}
+        self.taches = Tache.objects.in_bulk(tache_ids)
+        self.visibles, self.interdites = taches_modifiables(identite(self.request), tache_ids)
+        self._precharger_references(elements)
+
+        vues = set()
+        for index, element in elements:
+            try:
+                if element.get('id'):
+                    if element['id'] in vues:
+                        raise ErreurElement(400, {'id': 'Tâche déjà présente dans ce lot.'})
+                    vues.add(element['id'])
+                getattr(self, f"_valider_{element['op']}")(index, element)
+            except ErreurElement as e:
+                self._echec(index, self.operations[index], e)
+
+    def _analyser(self, operation):
+        if not isinstance(operation, dict):
+            raise ErreurElement(400, {'non_field_errors': 'Un objet est attendu.'})
+        op = operation.get('op')
+        if op not in OPERATIONS:
+            raise ErreurElement(400, {'op': f"Opération inconnue, attendu : {', '.join(OPERATIONS)}."})
+        element = {'op': op, 'data': operation.get('data') or {}}
+        if not isinstance(element['data'], dict):
+            raise ErreurElement(400, {'data': 'Un objet est attendu.'})
+        if op == 'create':
+            if self.utilisateur.role not in ROLES_CREATION:
+                raise ErreurElement(403, {'detail': "Vous n'avez pas la permission de créer une tâche."})
+            element['assignees'] = _uuids(element['data'].get('assigneeIds', []), 'assigneeIds')
+            for champ, valeur in (('serviceIdInput', element['data'].get('serviceIdInput')),
+                                  ('projectId', element['data'].get('projectId'))):
+                if valeur:
+                    element[champ] = _uuid(valeur, champ)
+            return element
+        element['id'] = _uuid(operation.get('id'))
+        if op == 'assign':
+            element['mode'] = operation.get('mode', 'set')
+            if element['mode'] not in MODES_ASSIGNATION:
+                raise ErreurElement(400, {'mode': f"Attendu : {', '.join(MODES_ASSIGNATION)}."})
+            element['assignees'] = _uuids(operation.get('assigneeIds'), 'assigneeIds')
+        return element
+
+    def _precharger_references(self, elements):
+        services, projets, utilisateurs = set(), set(), set()
+        for _, element in elements:
+            if element.get('serviceIdInput'):
+                services.add(element['serviceIdInput'])
+            if element.get('projectId'):
+                projets.add(element['projectId'])
+            utilisateurs.update(element.get('assignees', ()))
+        self.services = Service.objects.in_bulk(services)
+        self.projets = Projet.objects.in_bulk(projets)
+        self.utilisateurs_existants = set(
+            Utilisateur.objects.filter(id__in=utilisateurs).values_list('id', flat=True)
+        )
+
+    def _tache_autorisee(self, element):
+        tache_id = element['id']
+        if tache_id not in self.visibles or tache_id not in self.taches:
+            raise ErreurElement(404, {'detail': 'Tâche introuvable.'})
+        if tache_id in self.interdites:
+            raise ErreurElement(403, {'detail': "Vous n'avez pas la permission de modifier cette tâche."})
+        return self.taches[tache_id]
+
+    def _verifier_assignes(self, ids):
+        inconnus = [str(i) for i in ids if i not in self.utilisateurs_existants]
+        if inconnus:
+            raise ErreurElement(400, {'assigneeIds': f"Utilisateurs introuvables : {', '.join(inconnus)}"})
+
+    def _valider_create(self, index, element):
+        self._verifier_assignes(element['assignees'])
+        serializer = TacheSerializer(data=element['data'], context=self.contexte)
+        try:
+            serializer.is_valid(raise_exception=True)
+            model_fields, _ = serializer.preparer_creation(
+                dict(serializer.validated_data), services=self.services, projets=self.projets
+            )
+            tache = Tache(creator=self.utilisateur, **model_fields)
+            tache.clean()
+        except serializers.ValidationError as e:
+            raise ErreurElement(400, e.detail)
+        except DjangoValidationError as e:
+            raise ErreurElement(400, {'non_field_errors': e.messages})
+        self.creations.append((index, tache, element['assignees']))
+
+    def _valider_update(self, index, element):
+        tache = self._tache_autorisee(element)
+        non_modifiables = set(element['data']) - CHAMPS_MODIFIABLES
+        if non_modifiables:
+            raise ErreurElement(400, {
+                champ: 'Non modifiable en lot.' for champ in sorted(non_modifiables)
+            })
+        serializer = TacheSerializer(tache, data=element['data'], partial=True, context=self.contexte)
+        if not serializer.is_valid():
+            raise ErreurElement(400, serializer.errors)
+        ancien_statut = tache.status
+        for attr, valeur in serializer.validated_data.items():
+            setattr(tache, attr, valeur)
+        self.mises_a_jour.append((index, tache, list(serializer.validated_data), ancien_statut))
+
+    def _valider_assign(self, index, element):
+        tache = self._tache_autorisee(element)
+        self._verifier_assignes(element['assignees'])
+        self.assignations.append((index, tache, element['mode'], element['assignees']))
+
+    def _valider_delete(self, index, element):
+        self.suppressions.append((index, self._tache_autorisee(element)))
+
+    def _echec(self, index, operation, erreur):
+        self.resultats[index] = {
+            'index': index,
+            'op': operation.get('op') if isinstance(operation, dict) else None,
+            'id': operation.get('id') if isinstance(operation, dict) else None,
+            'status': 'error',
+            'code': erreur.code,
+            'errors': erreur.erreurs,
+        }
+
+    def _succes(self, index, op, tache_id):
+        self.resultats[index] = {'index': index, 'op': op, 'id': str(tache_id), 'status': 'ok'}
+
+    @property
+    def echecs(self):
+        return sum(1 for r in self.resultats if r is not None)
+
+    # --- Application ---
+
+    def appliquer(self):
+        lot = LotNotifications()
+        a_synchroniser = []
+        with transaction.atomic():
+            if self.suppressions:
+                Tache.objects.filter(id__in=[t.id for _, t in self.suppressions]).delete()
+                for index, tache in self.suppressions:
+                    self._succes(index, 'delete', tache.id)
+
+            if self.creations:
+                Tache.objects.bulk_create([t for _, t, _ in self.creations], batch_size=TAILLE_MAX_LOT)
+                TacheAssignees.objects.bulk_create([
+                    TacheAssignees(tache_id=tache.id, utilisateur_id=u)
+                    for _, tache, assignes in self.creations for u in set(assignes)
+                ], ignore_conflicts=True)
+                for index, tache, assignes in self.creations:
+                    notifier_assignation(lot, tache, set(assignes) - {tache.creator_id})
+                    a_synchroniser.append(tache.id)
+                    self._succes(index, 'create', tache.id)
+
+            if self.mises_a_jour:
+                maintenant = timezone.now()
+                champs = {'date_maj'}
+                for _, tache, modifies, _ in self.mises_a_jour:
+                    tache.date_maj = maintenant
+                    champs.update(modifies)
+                Tache.objects.bulk_update([t for _, t, _, _ in self.mises_a_jour], sorted(champs), batch_size=TAILLE_MAX_LOT)
+                changees = [(t, ancien) for _, t, _, ancien in self.mises_a_jour if t.status != ancien]
+                assignes = self._assignes_par_tache([t.id for t, _ in changees])
+                for tache, _ in changees:
+                    notifier_changement_statut(lot, tache, (assignes[tache.id] | {tache.creator_id}) - {None})
+                publier_statuts_taches([tache for tache, _ in changees])
+                for index, tache, _, _ in self.mises_a_jour:
+                    self._succes(index, 'update', tache.id)
+
+            if self.assignations:
+                a_synchroniser.extend(self._appliquer_assignations(lot))
+
+            if a_synchroniser:
+                visibility.synchroniser_taches(a_synchroniser)
+            # bulk_create / bulk_update n'émettent pas de signaux (suppressions : post_delete)
+            if a_synchroniser or self.mises_a_jour:
+                workload.synchroniser_taches([*a_synchroniser, *(t.id for _, t, _, _ in self.mises_a_jour)])
+            if self.creations or self.mises_a_jour:
+                analytics.invalider(
+                    {t.service_id for _, t, _ in self.creations}
+                    | {s for _, t, _, _ in self.mises_a_jour for s in (t.service_id, t._etat_initial.get('service_id'))}
+                )
+            lot.envoyer()
+
+    def _assignes_par_tache(self, tache_ids):
+        assignes = {tache_id: set() for tache_id in tache_ids}
+        for tache_id, utilisateur_id in TacheAssignees.objects.filter(
+            tache_id__in=tache_ids
+        ).values_list('tache_id', 'utilisateur_id'):
+            assignes[tache_id].add(utilisateur_id)
+        return assignes
+
+    def _appliquer_assignations(self, lot):
+        actuels = self._assignes_par_tache([t.id for _, t, _, _ in self.assignations])
+        a_creer, a_retirer = [], []
+        for index, tache, mode, ids in self.assignations:
+            ids = set(ids)
+            avant = actuels[tache.id]
+            if mode == 'set':
+                apres = ids
+            elif mode == 'add':
+                apres = avant | ids
+            else:
+                apres = avant - ids
+            a_creer.extend(TacheAssignees(tache_id=tache.id, utilisateur_id=u) for u in apres - avant)
+            a_retirer.extend((tache.id, u) for u in avant - apres)
+            notifier_assignation(lot, tache, apres - avant - {tache.creator_id})
+            self._succes(index, 'assign', tache.id)
+        if a_retirer:
+            tache_ids = {t for t, _ in a_retirer}
+            retraits = set(a_retirer)
+            pks = [
+                pk for pk, t, u in TacheAssignees.objects.filter(tache_id__in=tache_ids)
+                .values_list('pk', 'tache_id', 'utilisateur_id') if (t, u) in retraits
+            ]
+            TacheAssignees.objects.filter(pk__in=pks).delete()
+        if a_creer:
+            TacheAssignees.objects.bulk_create(a_creer, ignore_conflicts=True)
+        return [tache.id for _, tache, _, _ in self.assignations]
+
+
+def executer(request):
+    """Valide puis applique un lot d'opérations. Retourne (code HTTP, corps)."""
+    if not isinstance(request.data, dict):
+        return 400, {'error': 'Corps de requête invalide.'}
+    try:
+        atomic = serializers.BooleanField().to_internal_value(request.data.get('atomic', False))
+    except serializers.ValidationError:
+        return 400, {'error': "Le champ 'atomic' doit être un booléen."}
+    operations = request.data.get('operations')
+    if not isinstance(operations, list) or not operations:
+        return 400, {'error': "Le champ 'operations' doit être une liste non vide."}
+    if len(operations) > TAILLE_MAX_LOT:
+        return 400, {'error': f'Au plus {TAILLE_MAX_LOT} opérations par lot.'}
+
+    if identite(request).utilisateur is None:
+        return 403, {'error': 'Profil utilisateur non trouvé.'}
+
+    lot = LotTaches(operations, request)
+    lot.valider()
+    echecs = lot.echecs
+    if atomic and echecs:
+        resultats = [r for r in lot.resultats if r is not None]
+        return 400, {'applied': False, 'succeeded': 0, 'failed': echecs, 'results': resultats}
+
+    lot.appliquer()
+    corps = {
+        'applied': True,
+        'succeeded': len(operations) - echecs,
+        'failed': echecs,
+        'results': lot.resultats,
+    }
+    return (207 if echecs else 200), corps
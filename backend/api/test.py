@@ -29,5 +29,5 @@ class NotificationReceptionTest(APITestCase):
         response = self.client.get(url)
         self.assertEqual(response.status_code, 200)
         # Vérifie que la notification est bien présente dans la réponse
-        notif_ids = [n['id'] for n in response.data]
+        notif_ids = [n['id'] for n in response.data['results']]
         self.assertIn(str(notif.id), notif_ids)
\ No newline at end of file
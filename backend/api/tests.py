@@ -1,3 +1,1786 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import timedelta
 
-# Create your tests here.
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError, connection
+from django.db.models import Sum
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, resolve, reverse
+from django.utils import timezone
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase, force_authenticate
+
+from .models import (
+    Utilisateur, Notification, Service, Projet, Tache, PieceJointe, StatistiqueRequetesVue,
+    EvenementNotification, CompteurNotifications, StatistiqueTachesJour, ChargeJour, ContributionCharge, PretEmploye,
+)
+from . import (
+    analytics, broker, capacity, login, notification_counters, outbox, query_accounting, rollups, route_policy, tracing,
+    visibility, workload,
+)
+from .access import ACCES_TACHES
+from .authentication import ClaimsJWTAuthentication
+from .identity import identite
+from .notifications import LotNotifications
+from .permissions import IsAdminOrManager, IsAdminUser, IsChefServiceOrReadOnly, IsEmployeeUser, RolesDeLaRoute
+from .role_permissions import (
+    build_role_permissions, decoder_bits, encoder_bits, permissions_du_role, permissions_utilisateur,
+)
+from .serializers import TacheSerializer
+from .streaming import flux, notifications_apres, position_initiale
+from .views import CustomTokenObtainPairView
+from .write_behind import EcrivainDiffere
+
+
+def creer_utilisateur(username, role='EMPLOYEE', service=None):
+    user = User.objects.create_user(username=username, password='test123')
+    return Utilisateur.objects.create(user=user, role=role, service=service)
+
+
+class KeysetPaginationTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='employe', password='test123')
+        self.utilisateur = Utilisateur.objects.create(user=self.user, role='EMPLOYEE')
+        self.client.force_authenticate(user=self.user)
+        self.notifications = [
+            Notification.objects.create(
+                utilisateur=self.utilisateur,
+                type='test',
+                titre=f'Notification {i}',
+                message='Ceci est un test',
+                priorite='low'
+            )
+            for i in range(7)
+        ]
+
+    def test_parcours_complet_par_curseur(self):
+        url = reverse('notification-list')
+        response = self.client.get(url, {'page_size': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.data['previous'])
+        self.assertNotIn('count', response.data)
+
+        ids = [n['id'] for n in response.data['results']]
+        next_url = response.data['next']
+        while next_url:
+            response = self.client.get(next_url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 3)
+            ids += [n['id'] for n in response.data['results']]
+            next_url = response.data['next']
+
+        # Toutes les notifications, sans doublon, de la plus récente à la plus ancienne
+        attendus = [str(n.id) for n in sorted(self.notifications, key=lambda n: (n.date_creation, n.id), reverse=True)]
+        self.assertEqual(ids, attendus)
+
+        # Revenir en arrière depuis la dernière page
+        previous = self.client.get(response.data['previous'])
+        self.assertEqual([n['id'] for n in previous.data['results']], attendus[3:6])
+
+    def test_tri_demande(self):
+        url = reverse('notification-list')
+        titres, suivante = [], url + '?ordering=titre&page_size=3'
+        while suivante:
+            response = self.client.get(suivante)
+            self.assertEqual(response.status_code, 200)
+            titres += [n['titre'] for n in response.data['results']]
+            suivante = response.data['next']
+        self.assertEqual(titres, [f'Notification {i}' for i in range(7)])
+        # Champ nullable : pas de keyset possible
+        self.assertEqual(self.client.get(url, {'ordering': 'related_id'}).status_code, 400)
+
+    def test_taille_de_page_plafonnee_et_curseur_invalide(self):
+        url = reverse('notification-list')
+        response = self.client.get(url, {'page_size': 10000})
+        self.assertEqual(len(response.data['results']), 7)
+        response = self.client.get(url, {'cursor': 'pas-un-curseur'})
+        self.assertEqual(response.status_code, 404)
+
+
+class JeuTachesMixin:
+    """Services, projets et tâches couvrant chaque raison de visibilité"""
+
+    def setUp(self):
+        self.service_a = Service.objects.create(name='Service A')
+        self.service_b = Service.objects.create(name='Service B')
+        self.manager = creer_utilisateur('manager', 'MANAGER', self.service_a)
+        self.e1 = creer_utilisateur('e1', service=self.service_a)
+        self.e2 = creer_utilisateur('e2', service=self.service_b)
+        self.e3 = creer_utilisateur('e3')
+        debut = timezone.now().date()
+        self.projet_p = Projet.objects.create(
+            name='P', start_date=debut, end_date=debut, service=self.service_b, chef=self.e3
+        )
+        self.projet_q = Projet.objects.create(name='Q', start_date=debut, end_date=debut)
+        self.projet_q.services.add(self.service_a)
+        self.projet_q.membres.add(self.e3)
+        echeance = timezone.now() + timedelta(days=3)
+        self.t_service = Tache.objects.create(
+            title='service', type='service', service=self.service_a, creator=self.manager, deadline=echeance
+        )
+        self.t_projet_p = Tache.objects.create(
+            title='projet P', type='projet', project=self.projet_p, creator=self.manager, deadline=echeance
+        )
+        self.t_projet_q = Tache.objects.create(
+            title='projet Q', type='projet', project=self.projet_q, creator=self.manager, deadline=echeance
+        )
+        self.t_perso = Tache.objects.create(
+            title='perso', type='personnel', creator=self.manager, deadline=echeance
+        )
+        self.t_perso.assignees.add(self.e3)
+
+
+class TacheVisibiliteTest(JeuTachesMixin, APITestCase):
+    def assertIndexCoherent(self):
+        manquantes, en_trop, _, _ = visibility.verifier_coherence()
+        self.assertEqual((manquantes, en_trop), (0, 0))
+        for utilisateur in Utilisateur.objects.all():
+            attendues = set(visibility.taches_visibles_reference(utilisateur).values_list('id', flat=True))
+            indexees = set(utilisateur.visibilites_taches.values_list('tache_id', flat=True))
+            self.assertEqual(attendues, indexees, utilisateur.user.username)
+
+    def test_index_maintenu_incrementalement(self):
+        self.assertIndexCoherent()
+
+        self.e2.service = self.service_a
+        self.e2.save()
+        self.assertIndexCoherent()
+
+        self.projet_p.membres.add(self.e1)
+        self.projet_p.chef = None
+        self.projet_p.save()
+        self.t_perso.assignees.clear()
+        self.e1.projets_participes.remove(self.projet_p)
+        self.service_a.projets.remove(self.projet_q)
+        self.assertIndexCoherent()
+
+        self.t_service.type = 'projet'
+        self.t_service.service = None
+        self.t_service.project = self.projet_p
+        self.t_service.save()
+        self.service_b.delete()
+        self.projet_q.delete()
+        self.assertIndexCoherent()
+
+        self.assertEqual(visibility.reconstruire_tout(), visibility.TacheVisibilite.objects.count())
+        self.assertIndexCoherent()
+
+    def test_liste_des_taches_par_utilisateur(self):
+        self.client.force_authenticate(user=self.e3.user)
+        response = self.client.get(reverse('tache-list'))
+        self.assertEqual(response.status_code, 200)
+        ids = {t['id'] for t in response.data['results']}
+        self.assertEqual(ids, {str(self.t_projet_p.id), str(self.t_projet_q.id), str(self.t_perso.id)})
+
+
+class ChampsSelectifsTest(APITestCase):
+    def setUp(self):
+        self.service = Service.objects.create(name='Service')
+        self.manager = creer_utilisateur('manager', 'MANAGER', self.service)
+        self.employe = creer_utilisateur('employe', service=self.service)
+        self.client.force_authenticate(user=self.manager.user)
+        self.creer_taches(3)
+
+    def creer_taches(self, nombre):
+        for i in range(nombre):
+            tache = Tache.objects.create(
+                title=f'tâche {i}', type='service', service=self.service, creator=self.manager,
+                deadline=timezone.now() + timedelta(days=1)
+            )
+            tache.assignees.add(self.employe)
+            tache.commentaires.create(auteur=self.employe, contenu='ok')
+
+    def compter_requetes(self, params):
+        with CaptureQueriesContext(connection) as contexte:
+            response = self.client.get(reverse('tache-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return len(contexte.captured_queries), response.data['results']
+
+    def test_fields_restreint_la_forme(self):
+        _, taches = self.compter_requetes({'fields': 'title,status,priority,deadline'})
+        self.assertEqual(set(taches[0]), {'id', 'title', 'status', 'priority', 'deadline'})
+
+    def test_relations_exclues_sauf_expand(self):
+        _, complet = self.compter_requetes({})
+        self.assertIn('comments', complet[0])
+        self.assertIn('serviceDetails', complet[0])
+
+        _, leger = self.compter_requetes({'expand': ''})
+        self.assertNotIn('comments', leger[0])
+        self.assertNotIn('creatorDetails', leger[0])
+        self.assertIn('creatorId', leger[0])
+
+        _, etendu = self.compter_requetes({'expand': 'comments'})
+        self.assertEqual(len(etendu[0]['comments']), 1)
+        self.assertNotIn('assigneeDetails', etendu[0])
+
+    def test_nombre_de_requetes_constant(self):
+        requetes_board, _ = self.compter_requetes({'fields': 'title,status,priority,deadline'})
+        requetes_completes, complet = self.compter_requetes({})
+        self.assertLess(requetes_board, requetes_completes)
+        self.assertEqual(complet[0]['serviceDetails']['memberCount'], 2)
+
+        self.creer_taches(5)
+        self.assertEqual(self.compter_requetes({'fields': 'title,status,priority,deadline'})[0], requetes_board)
+        self.assertEqual(self.compter_requetes({})[0], requetes_completes)
+
+
+class PiecesJointesGroupeesTest(APITestCase):
+    def setUp(self):
+        self.service = Service.objects.create(name='Service')
+        self.manager = creer_utilisateur('manager', 'MANAGER', self.service)
+        self.client.force_authenticate(user=self.manager.user)
+        debut = timezone.now().date()
+        for i in range(12):
+            tache = Tache.objects.create(
+                title=f'tâche {i}', type='service', service=self.service, creator=self.manager,
+                deadline=timezone.now() + timedelta(days=1)
+            )
+            projet = Projet.objects.create(name=f'projet {i}', start_date=debut, end_date=debut, service=self.service)
+            for related_to, related_id in (('task', tache.id), ('project', projet.id), ('project', projet.id)):
+                PieceJointe.objects.create(
+                    name='doc.pdf', file='attachments/doc.pdf', type_mime='application/pdf', size=10,
+                    checksum='0' * 64, related_to=related_to, related_id=related_id, telecharge_par=self.manager
+                )
+
+    def requetes_par_taille_de_page(self, url):
+        comptes = []
+        for taille in (2, 6, 12):
+            with CaptureQueriesContext(connection) as contexte:
+                response = self.client.get(url, {'page_size': taille, 'expand': 'attachments'})
+            self.assertEqual(len(response.data['results']), taille)
+            comptes.append(len(contexte.captured_queries))
+        return comptes, response.data['results']
+
+    def test_taches_nombre_de_requetes_constant(self):
+        comptes, taches = self.requetes_par_taille_de_page(reverse('tache-list'))
+        self.assertEqual(len(set(comptes)), 1, comptes)
+        self.assertTrue(all(len(t['attachments']) == 1 for t in taches))
+        self.assertEqual(taches[0]['attachments'][0]['uploadedById'], str(self.manager.id))
+
+    def test_projets_nombre_de_requetes_constant(self):
+        comptes, projets = self.requetes_par_taille_de_page(reverse('projet-list'))
+        self.assertEqual(len(set(comptes)), 1, comptes)
+        self.assertTrue(all(len(p['attachments']) == 2 for p in projets))
+
+    def test_pieces_jointes_non_demandees(self):
+        response = self.client.get(reverse('tache-list'), {'fields': 'title'})
+        self.assertNotIn('attachments', response.data['results'][0])
+        response = self.client.get(reverse('tache-detail', args=[Tache.objects.first().id]))
+        self.assertEqual(len(response.data['attachments']), 1)
+
+
+@override_settings(QUERY_ACCOUNTING={'ENABLED': True, 'HEADERS': True, 'FLUSH_EVERY': 10000, 'FLUSH_INTERVAL': 3600})
+class QueryAccountingTest(APITestCase):
+    def setUp(self):
+        query_accounting.agregat.extraire()
+        self.admin = creer_utilisateur('admin', 'ADMIN')
+        self.client.force_authenticate(user=self.admin.user)
+        for i in range(3):
+            Service.objects.create(name=f'service {i}')
+
+    def test_forme_sql(self):
+        self.assertEqual(
+            query_accounting.forme_sql("SELECT * FROM t WHERE id IN (%s, %s, %s) AND x = 'a''b'  LIMIT 21"),
+            'SELECT * FROM t WHERE id IN (...) AND x = ? LIMIT ?'
+        )
+
+    def test_entetes_et_rapport(self):
+        # memberCount compte les membres de chaque service : doublons attendus
+        response = self.client.get(reverse('service-list'))
+        self.assertGreater(int(response['X-Query-Count']), 0)
+        self.assertGreaterEqual(int(response['X-Query-Duplicates']), 2)
+        self.assertIn('X-Query-Top', response)
+
+        # Écriture différée, hors de la requête
+        self.assertFalse(StatistiqueRequetesVue.objects.exists())
+        self.assertEqual(query_accounting.agregat.flush(), 1)
+        stats = StatistiqueRequetesVue.objects.get(vue='GET service-list')
+        self.assertEqual(stats.nombre_appels, 1)
+        self.assertEqual(stats.total_requetes, int(response['X-Query-Count']))
+
+        sortie = StringIO()
+        call_command('query_budget_report', stdout=sortie)
+        self.assertIn('GET service-list', sortie.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('query_budget_report', budget=1, stdout=StringIO())
+
+    def test_echec_d_ecriture_sans_effet_sur_la_requete(self):
+        panne = mock.patch.object(StatistiqueRequetesVue.objects, 'select_for_update', side_effect=DatabaseError('verrou'))
+        with panne, override_settings(QUERY_ACCOUNTING={'ENABLED': True, 'FLUSH_EVERY': 1}), \
+                mock.patch.object(query_accounting.ecrivain, 'demarrer'):
+            self.assertEqual(self.client.get(reverse('service-list')).status_code, 200)
+            with self.assertLogs('api.write_behind', 'ERROR'):
+                query_accounting.ecrivain.executer()
+        # Lot remis en mémoire puis écrit au flush suivant
+        self.assertEqual(query_accounting.agregat.flush(), 1)
+        self.assertEqual(StatistiqueRequetesVue.objects.get(vue='GET service-list').nombre_appels, 1)
+
+    def test_ecriture_periodique_sans_nouvelle_requete(self):
+        class Tampon:
+            def __init__(self):
+                self.elements, self.ecrits, self.debut = [], [], time.monotonic()
+                self.ecrit = threading.Event()
+
+            def flush_necessaire(self, config):
+                return bool(self.elements) and (
+                    len(self.elements) >= config['FLUSH_EVERY']
+                    or time.monotonic() - self.debut >= config['FLUSH_INTERVAL']
+                )
+
+            def flush(self):
+                self.ecrits, self.elements = self.ecrits + self.elements, []
+                self.ecrit.set()
+
+        config = {'FLUSH_EVERY': 100, 'FLUSH_INTERVAL': 0.5}
+        tampon = Tampon()
+        ecrivain = EcrivainDiffere('test-ecriture', tampon, lambda: config)
+        tampon.elements.append('dernier')
+        # Écriture non due au signalement : c'est l'échéance du thread qui l'écrit
+        ecrivain.signaler()
+        self.assertEqual(tampon.ecrits, [])
+        self.assertTrue(tampon.ecrit.wait(5))
+        self.assertEqual(tampon.ecrits, ['dernier'])
+        config['FLUSH_INTERVAL'] = 3600
+
+
+class OperationsGroupeesTachesTest(APITestCase):
+    def setUp(self):
+        self.service = Service.objects.create(name='Service')
+        self.manager = creer_utilisateur('manager', 'MANAGER', self.service)
+        self.employe = creer_utilisateur('employe', service=self.service)
+        self.remplacant = creer_utilisateur('remplacant')
+        self.client.force_authenticate(user=self.manager.user)
+        self.taches = [
+            Tache.objects.create(
+                title=f'tâche {i}', type='service', service=self.service, creator=self.manager,
+                deadline=timezone.now() + timedelta(days=1)
+            )
+            for i in range(4)
+        ]
+        for tache in self.taches:
+            tache.assignees.add(self.employe)
+        self.url = reverse('tache-bulk')
+
+    def test_lot_mixte_avec_echec_partiel(self):
+        t0, t1, t2, t3 = self.taches
+        response = self.client.post(self.url, {'operations': [
+            {'op': 'update', 'id': str(t0.id), 'data': {'status': 'completed'}},
+            {'op': 'update', 'id': str(t1.id), 'data': {'status': 'in_progress', 'priority': 'high'}},
+            {'op': 'assign', 'id': str(t2.id), 'assigneeIds': [str(self.remplacant.id)]},
+            {'op': 'delete', 'id': str(t3.id)},
+            {'op': 'create', 'data': {
+                'title': 'nouvelle', 'type': 'service', 'priority': 'low', 'serviceIdInput': str(self.service.id),
+                'deadline': (timezone.now() + timedelta(days=2)).isoformat(),
+                'assigneeIds': [str(self.employe.id)],
+            }},
+            {'op': 'update', 'id': str(t0.id), 'data': {'status': 'todo'}},
+            {'op': 'delete', 'id': '00000000-0000-0000-0000-000000000000'},
+            {'op': 'update', 'id': str(t1.id.hex), 'data': {'type': 'personnel'}},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual((response.data['succeeded'], response.data['failed']), (5, 3))
+        statuts = [r['status'] for r in response.data['results']]
+        self.assertEqual(statuts, ['ok'] * 5 + ['error'] * 3)
+        self.assertEqual(response.data['results'][6]['code'], 404)
+
+        t0.refresh_from_db()
+        t1.refresh_from_db()
+        self.assertEqual(t0.status, 'completed')
+        self.assertEqual((t1.status, t1.priority), ('in_progress', 'high'))
+        self.assertGreater(t1.date_maj, t1.date_creation)
+        self.assertEqual(list(t2.assignees.all()), [self.remplacant])
+        self.assertFalse(Tache.objects.filter(id=t3.id).exists())
+        nouvelle = Tache.objects.get(id=response.data['results'][4]['id'])
+        self.assertEqual(nouvelle.creator, self.manager)
+        self.assertEqual(list(nouvelle.assignees.all()), [self.employe])
+
+        # Statut : employé + créateur pour t0 et t1 ; assignation : remplaçant ; création : employé
+        self.assertEqual(Notification.objects.filter(type='status_update').count(), 4)
+        self.assertEqual(Notification.objects.filter(type='task_assigned', utilisateur=self.remplacant).count(), 1)
+        self.assertEqual(Notification.objects.filter(type='task_assigned', utilisateur=self.employe).count(), 1)
+        # Les opérations groupées resynchronisent l'index de visibilité
+        self.assertEqual(visibility.verifier_coherence()[:2], (0, 0))
+
+    def test_lot_atomique(self):
+        response = self.client.post(self.url, {'atomic': True, 'operations': [
+            {'op': 'update', 'id': str(self.taches[0].id), 'data': {'status': 'completed'}},
+            {'op': 'update', 'id': str(self.taches[1].id), 'data': {'status': 'inconnu'}},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.data['applied'])
+        self.taches[0].refresh_from_db()
+        self.assertEqual(self.taches[0].status, 'todo')
+
+    def test_indicateur_atomic_analyse(self):
+        operations = [
+            {'op': 'update', 'id': str(self.taches[0].id), 'data': {'status': 'completed'}},
+            {'op': 'update', 'id': str(self.taches[1].id), 'data': {'status': 'inconnu'}},
+        ]
+        response = self.client.post(self.url, {'atomic': 'false', 'operations': operations}, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertTrue(response.data['applied'])
+        response = self.client.post(self.url, {'atomic': 'peut-être', 'operations': operations}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.client.force_authenticate(user=User.objects.create_user(username='sans_profil', password='x'))
+        self.assertEqual(self.client.post(self.url, {'operations': operations}, format='json').status_code, 403)
+
+    def test_employe_ne_peut_pas_creer(self):
+        self.client.force_authenticate(user=self.employe.user)
+        response = self.client.post(self.url, {'operations': [
+            {'op': 'create', 'data': {'title': 'x', 'type': 'personnel', 'priority': 'low',
+                                      'deadline': timezone.now().isoformat()}},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['results'][0]['code'], 403)
+
+
+@override_settings(NOTIFICATION_OUTBOX={'MODE': 'outbox', 'MAX_ATTEMPTS': 2})
+class OutboxNotificationsTest(APITestCase):
+    def setUp(self):
+        self.service = Service.objects.create(name='Service')
+        self.manager = creer_utilisateur('manager', 'MANAGER', self.service)
+        self.employes = [creer_utilisateur(f'employe{i}', service=self.service) for i in range(5)]
+        self.tache = Tache.objects.create(
+            title='tâche', type='service', service=self.service, creator=self.manager,
+            deadline=timezone.now() + timedelta(days=1)
+        )
+        self.tache.assignees.set(self.employes)
+        self.client.force_authenticate(user=self.manager.user)
+
+    def test_un_evenement_puis_diffusion(self):
+        response = self.client.patch(
+            reverse('tache-detail', args=[self.tache.id]), {'status': 'review'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(EvenementNotification.objects.count(), 1)
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(outbox.statistiques()['pending'], 1)
+
+        self.assertEqual(outbox.vider(), (1, 6, 0))
+        self.assertEqual(Notification.objects.filter(type='status_update').count(), 6)
+        self.assertEqual(EvenementNotification.objects.get().statut, 'done')
+        self.assertEqual(outbox.vider(), (0, 0, 0))
+        self.assertEqual(outbox.statistiques()['delivered_last_window'], 1)
+
+    def test_evenement_defaillant_isole_et_replanifie(self):
+        EvenementNotification.objects.create(type='x', titre='x', message='x', destinataires=['pas-un-uuid'])
+        EvenementNotification.objects.create(
+            type='y', titre='y', message='y', destinataires=[str(self.employes[0].id)]
+        )
+        self.assertEqual(outbox.traiter_lot(), (1, 1, 1))
+        defaillant = EvenementNotification.objects.get(type='x')
+        self.assertEqual((defaillant.statut, defaillant.tentatives), ('pending', 1))
+        self.assertGreater(defaillant.prochaine_tentative, timezone.now())
+
+        EvenementNotification.objects.filter(id=defaillant.id).update(prochaine_tentative=timezone.now())
+        self.assertEqual(outbox.traiter_lot(), (0, 0, 1))
+        self.assertEqual(EvenementNotification.objects.get(type='x').statut, 'failed')
+
+
+@override_settings(EVENT_BROKER={'BACKEND': 'memory', 'HEARTBEAT': 5})
+class FluxEvenementsTest(APITestCase):
+    def setUp(self):
+        broker.reinitialiser()
+        self.addCleanup(broker.reinitialiser)
+        self.service = Service.objects.create(name='Service')
+        self.manager = creer_utilisateur('manager', 'MANAGER', self.service)
+        self.employe = creer_utilisateur('employe', service=self.service)
+        self.externe = creer_utilisateur('externe', service=Service.objects.create(name='Autre'))
+        self.tache = Tache.objects.create(
+            title='tâche', type='personal', creator=self.manager,
+            deadline=timezone.now() + timedelta(days=1)
+        )
+        self.tache.assignees.set([self.employe])
+
+    def notifier(self, *destinataires, titre='n'):
+        with self.captureOnCommitCallbacks(execute=True):
+            lot = LotNotifications()
+            lot.ajouter(destinataires, type='info', titre=titre, message=titre)
+            lot.envoyer()
+
+    def test_jeton_obligatoire(self):
+        response = self.client.get('/api/events/stream/')
+        self.assertEqual(response.status_code, 401)
+        response = self.client.get('/api/events/stream/', {'token': 'invalide'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_reprise_apres_dernier_identifiant(self):
+        for titre in ('a', 'b', 'c'):
+            self.notifier(self.employe, titre=titre)
+        lot, _ = notifications_apres(self.employe, None)
+        premier = lot[0][0]
+
+        async def lire():
+            generateur = flux(self.employe, premier)
+            blocs = [await generateur.__anext__() for _ in range(4)]
+            await generateur.aclose()
+            return blocs
+
+        blocs = async_to_sync(lire)()
+        self.assertTrue(blocs[0].startswith('retry:'))
+        self.assertIn('"titre":"b"', blocs[1])
+        self.assertIn(f'id: {lot[1][0]}', blocs[1])
+        self.assertIn('"titre":"c"', blocs[2])
+        self.assertIn('event: ready', blocs[3])
+
+    def test_notification_validee_en_retard(self):
+        self.notifier(self.employe, titre='a')
+        self.notifier(self.employe, titre='b')
+        vues = {}
+        lot, position = notifications_apres(self.employe, None, vues)
+        self.assertEqual(len(lot), 2)
+        # Horodatée avant 'b' mais validée après la lecture
+        self.notifier(self.employe, titre='tardive')
+        b = Notification.objects.get(titre='b')
+        Notification.objects.filter(titre='tardive').update(date_creation=b.date_creation - timedelta(seconds=1))
+        tardive, nouvelle_position = notifications_apres(self.employe, position, vues)
+        self.assertEqual([d['titre'] for _, d in tardive], ['tardive'])
+        # Curseur : la plus grande position émise, inchangée
+        self.assertEqual((tardive[0][0], nouvelle_position), (lot[-1][0], position))
+        self.assertEqual(notifications_apres(self.employe, position, vues)[0], [])
+        # Reconnexion : la fenêtre antérieure à Last-Event-ID est tenue pour livrée
+        position, vues = position_initiale(self.employe, lot[-1][0])
+        self.assertEqual(notifications_apres(self.employe, position, vues)[0], [])
+
+    def test_poussee_notifications_et_statuts(self):
+        self.notifier(self.employe, titre='ancienne')
+
+        async def lire():
+            generateur = flux(self.employe, None)
+            debut = [await generateur.__anext__() for _ in range(2)]
+            await sync_to_async(self.notifier)(self.employe, self.externe, titre='nouvelle')
+            notification = await generateur.__anext__()
+            await sync_to_async(self.changer_statut)()
+            # Notification de changement de statut (assigné) puis événement 'task'
+            statut = [await generateur.__anext__() for _ in range(2)]
+            await generateur.aclose()
+            return debut, notification, statut
+
+        debut, notification, statut = async_to_sync(lire)()
+        # Première connexion : pas de rejeu de l'historique
+        self.assertIn('event: ready', debut[1])
+        self.assertIn('"titre":"nouvelle"', notification)
+        self.assertIn('"type":"status_update"', statut[0])
+        self.assertIn('event: task', statut[1])
+        self.assertIn(f'"id":"{self.tache.id}","status":"review"', statut[1])
+        self.assertEqual(broker.broker().connectes(), set())
+
+    def changer_statut(self):
+        self.client.force_authenticate(user=self.manager.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse('tache-detail', args=[self.tache.id]), {'status': 'review'}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_statut_livre_aux_seuls_utilisateurs_qui_voient_la_tache(self):
+        recus = {}
+
+        async def abonner():
+            return {u.pk: broker.broker().abonner(u.pk) for u in (self.employe, self.externe)}
+
+        async def vider(abonnements):
+            await asyncio.sleep(0)
+            for pk, abonnement in abonnements.items():
+                recus[pk] = []
+                while not abonnement.file.empty():
+                    recus[pk].append(abonnement.file.get_nowait())
+
+        boucle = asyncio.new_event_loop()
+        self.addCleanup(boucle.close)
+        abonnements = boucle.run_until_complete(abonner())
+        self.tache.status = 'completed'
+        with self.captureOnCommitCallbacks(execute=True):
+            broker.publier_statuts_taches([self.tache])
+        boucle.run_until_complete(vider(abonnements))
+        self.assertEqual(recus[self.employe.pk], [('task', {'id': str(self.tache.id), 'status': 'completed'})])
+        self.assertEqual(recus[self.externe.pk], [])
+
+    def test_decoupage_messages_notify(self):
+        ids = [str(i) * 36 for i in range(1000)]
+        charges = broker.decouper({'k': 'notification', 'u': ids})
+        self.assertGreater(len(charges), 1)
+        self.assertTrue(all(len(c) <= broker.TAILLE_MAX_MESSAGE for c in charges))
+        self.assertEqual([i for c in charges for i in json.loads(c)['u']], ids)
+
+
+class CompteursNotificationsTest(APITestCase):
+    def setUp(self):
+        self.service = Service.objects.create(name='Service')
+        self.utilisateur = creer_utilisateur('employe', service=self.service)
+        self.autre = creer_utilisateur('autre', service=self.service)
+        self.client.force_authenticate(user=self.utilisateur.user)
+
+    def creer(self, nombre, type='info', priorite='medium', utilisateur=None):
+        return Notification.objects.bulk_create([
+            Notification(
+                utilisateur=utilisateur or self.utilisateur, type=type, titre='t', message='m', priorite=priorite
+            )
+            for _ in range(nombre)
+        ])
+
+    def resume(self):
+        response = self.client.get(reverse('notification-summary'))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_resume_par_type_et_priorite(self):
+        self.creer(3, 'task_assigned', 'high')
+        self.creer(2, 'status_update')
+        self.creer(4, utilisateur=self.autre)
+        Notification.objects.create(
+            utilisateur=self.utilisateur, type='status_update', titre='t', message='m', priorite='low', est_lue=True
+        )
+        with CaptureQueriesContext(connection) as requetes:
+            resume = self.resume()
+        self.assertEqual(resume, {
+            'unread': 5,
+            'by_type': {'task_assigned': 3, 'status_update': 2},
+            'by_priority': {'high': 3, 'medium': 2},
+        })
+        # Compteurs seuls : pas de lecture de la table des notifications
+        self.assertFalse(any('api_notification' in q['sql'] for q in requetes.captured_queries))
+
+    def test_lecture_et_suppression_unitaires(self):
+        premiere, seconde = self.creer(2)
+        response = self.client.patch(
+            reverse('notification-detail', args=[premiere.id]), {'isRead': True}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.resume()['unread'], 1)
+        # Relecture sans changement : pas de double décrément
+        self.client.patch(reverse('notification-detail', args=[premiere.id]), {'isRead': True}, format='json')
+        self.assertEqual(self.resume()['unread'], 1)
+
+        response = self.client.delete(reverse('notification-detail', args=[seconde.id]))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.resume()['unread'], 0)
+        self.client.delete(reverse('notification-detail', args=[premiere.id]))
+        self.assertEqual(self.resume()['unread'], 0)
+
+    def test_instances_perimees(self):
+        notification = self.creer(1)[0]
+        # Deux requêtes lisent la notification non lue puis la marquent lue
+        a, b = Notification.objects.get(pk=notification.pk), Notification.objects.get(pk=notification.pk)
+        a.est_lue = b.est_lue = True
+        a.save()
+        b.save()
+        self.assertEqual(notification_counters.verifier(), (0, []))
+        # Instance lue avant un marquage groupé concurrent, enregistrée ensuite avec son ancien est_lue
+        perimee = Notification.objects.get(pk=notification.pk)
+        Notification.objects.filter(pk=notification.pk).update(est_lue=False)
+        perimee.titre = 'modifiée'
+        perimee.save()
+        self.assertEqual(notification_counters.verifier(), (0, []))
+        self.assertEqual(self.resume()['unread'], 0)
+
+    def test_ecritures_groupees_et_reconstruction(self):
+        self.creer(5, 'a')
+        self.creer(3, 'b', 'high', utilisateur=self.autre)
+        self.assertEqual(Notification.objects.filter(type='a').update(est_lue=True), 5)
+        self.assertEqual(Notification.objects.filter(type='a').update(est_lue=True), 0)
+        Notification.objects.filter(id=Notification.objects.filter(type='b').first().id).update(priorite='low')
+        self.assertEqual(Notification.objects.filter(type='a').update(est_lue=False), 5)
+        deux = Notification.objects.filter(type='a').values_list('id', flat=True)[:2]
+        self.assertEqual(Notification.objects.filter(id__in=list(deux)).delete()[0], 2)
+        self.assertEqual(notification_counters.verifier(), (0, []))
+        self.assertEqual(self.resume()['unread'], 3)
+
+        CompteurNotifications.objects.all().delete()
+        self.assertEqual(notification_counters.verifier()[0], 3)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_notification_counters', '--check', stdout=StringIO())
+        call_command('rebuild_notification_counters', stdout=StringIO())
+        self.assertEqual(notification_counters.verifier(), (0, []))
+
+
+class OperationsGroupeesNotificationsTest(APITestCase):
+    def setUp(self):
+        self.service = Service.objects.create(name='Service')
+        self.utilisateur = creer_utilisateur('employe', service=self.service)
+        self.autre = creer_utilisateur('autre', service=self.service)
+        self.tache_id = uuid.uuid4()
+        self.notifications = Notification.objects.bulk_create(
+            [
+                Notification(utilisateur=self.utilisateur, type='task_assigned', titre='t', message='m',
+                             priorite='medium', related_id=self.tache_id)
+                for _ in range(30)
+            ] + [
+                Notification(utilisateur=self.utilisateur, type='status_update', titre='t', message='m', priorite='high')
+                for _ in range(20)
+            ] + [
+                Notification(utilisateur=self.autre, type='task_assigned', titre='t', message='m', priorite='medium')
+                for _ in range(10)
+            ]
+        )
+        self.client.force_authenticate(user=self.utilisateur.user)
+
+    def unread(self):
+        return self.client.get(reverse('notification-summary')).json()['unread']
+
+    def test_marquer_lues_en_une_requete(self):
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.post(reverse('notification-mark-read'), {'type': 'task_assigned'}, format='json')
+        self.assertEqual(response.json(), {'updated': 30})
+        self.assertEqual(sum('api_notification' in q['sql'] for q in requetes.captured_queries), 1)
+        self.assertEqual(self.unread(), 20)
+
+        response = self.client.post(reverse('notification-mark-read'), {}, format='json')
+        self.assertEqual(response.json(), {'updated': 20})
+        self.assertEqual(self.unread(), 0)
+        # Les notifications des autres utilisateurs ne sont pas touchées
+        self.assertEqual(Notification.objects.filter(utilisateur=self.autre, est_lue=False).count(), 10)
+
+        ids = [str(n.id) for n in self.notifications[:5]]
+        response = self.client.post(reverse('notification-mark-read'), {'ids': ids, 'read': False}, format='json')
+        self.assertEqual(response.json(), {'updated': 5})
+        self.assertEqual(self.unread(), 5)
+
+    def test_suppression_par_filtre(self):
+        response = self.client.post(reverse('notification-bulk-delete'), {}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(
+            reverse('notification-bulk-delete'), {'relatedId': str(self.tache_id)}, format='json'
+        )
+        self.assertEqual(response.json(), {'deleted': 30})
+        response = self.client.post(
+            reverse('notification-bulk-delete'),
+            {'olderThan': (timezone.now() + timedelta(minutes=1)).isoformat(), 'isRead': True}, format='json'
+        )
+        self.assertEqual(response.json(), {'deleted': 0})
+        self.assertEqual(self.unread(), 20)
+
+        response = self.client.post(reverse('notification-bulk-delete'), {'all': True}, format='json')
+        self.assertEqual(response.json(), {'deleted': 20})
+        self.assertEqual(self.unread(), 0)
+        self.assertEqual(Notification.objects.filter(utilisateur=self.autre).count(), 10)
+        self.assertEqual(notification_counters.verifier(), (0, []))
+
+
+class IdentiteRequeteTest(APITestCase):
+    def setUp(self):
+        self.service = Service.objects.create(name='Service')
+        self.manager = creer_utilisateur('manager', 'MANAGER', self.service)
+        self.manager.user.groups.add(Group.objects.get_or_create(name='MANAGER')[0])
+        self.debut = timezone.now().date()
+        self.projet = Projet.objects.create(
+            name='Projet', service=self.service, chef=self.manager, start_date=self.debut, end_date=self.debut
+        )
+
+    def requete(self, user, methode='post'):
+        brute = getattr(APIRequestFactory(), methode)('/')
+        # Nouvel objet User : aucun profil en cache
+        user = User.objects.get(pk=user.pk)
+        force_authenticate(brute, user=user)
+        return Request(brute)
+
+    def test_permissions_sans_requete_apres_premier_acces(self):
+        request = self.requete(self.manager.user)
+        permissions = [IsAdminUser(), IsAdminOrManager(), IsChefServiceOrReadOnly(), IsEmployeeUser()]
+        with CaptureQueriesContext(connection) as premieres:
+            resultats = [p.has_permission(request, None) for p in permissions]
+            contexte = identite(request)
+            self.assertEqual(contexte.service_id, self.service.id)
+            self.assertEqual(contexte.utilisateur.service.name, 'Service')
+        self.assertEqual(resultats, [False, True, True, False])
+        # Profil + service en une requête, groupes en une requête
+        self.assertEqual(len(premieres), 2)
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                [p.has_permission(request, None) for p in permissions]
+            self.assertIs(identite(request), contexte)
+            self.assertEqual(request.user.utilisateur.role, 'MANAGER')
+
+    def test_projets_charges_une_fois(self):
+        employe = creer_utilisateur('employe', service=self.service)
+        externe = creer_utilisateur('externe')
+        autre = Projet.objects.create(name='Autre', start_date=self.debut, end_date=self.debut)
+        autre.membres.add(externe)
+        request = self.requete(employe.user, 'get')
+        with self.assertNumQueries(2):
+            self.assertEqual(identite(request).projets, {self.projet.id})
+            self.assertEqual(identite(request).projets, {self.projet.id})
+        self.assertEqual(identite(self.requete(externe.user, 'get')).projets, {autre.id})
+        # Le manager devient chef de son service à la création du profil
+        self.assertEqual(identite(self.requete(self.manager.user)).services_diriges, {self.service.id})
+
+
+class PermissionsRolesCacheTest(APITestCase):
+    def setUp(self):
+        self.admin = creer_utilisateur('admin', 'ADMIN')
+        self.client.force_authenticate(self.admin.user)
+
+    def compter_requetes_liste(self):
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(reverse('utilisateur-list'), {'page_size': 100})
+        self.assertEqual(response.status_code, 200)
+        return len(requetes), response
+
+    def test_nombre_de_requetes_independant_du_nombre_d_utilisateurs(self):
+        for i in range(3):
+            creer_utilisateur(f'employe{i}')
+        self.compter_requetes_liste()  # carte des rôles construite une fois
+        avant, _ = self.compter_requetes_liste()
+        for i in range(3, 10):
+            creer_utilisateur(f'employe{i}').user.user_permissions.add(Permission.objects.get(codename='view_tache'))
+        apres, response = self.compter_requetes_liste()
+        self.assertEqual(avant, apres)
+        resultats = response.data.get('results', response.data)
+        employe = next(u for u in resultats if u['username'] == 'employe0')
+        self.assertIn('add_tache', employe['permissions'])
+        self.assertNotIn('delete_tache', employe['permissions'])
+
+    def test_identique_a_get_all_permissions(self):
+        employe = creer_utilisateur('employe')
+        employe.user.user_permissions.add(Permission.objects.get(codename='delete_tache'))
+        employe = Utilisateur.objects.get(pk=employe.pk)
+        attendu = {p.split('.', 1)[1] for p in employe.user.get_all_permissions()}
+        attendu |= permissions_du_role('EMPLOYEE')
+        self.assertEqual(permissions_utilisateur(employe), attendu)
+
+    def test_invalidation_par_version(self):
+        self.assertNotIn('archiver_tache', permissions_du_role('ADMIN'))
+        type_tache = ContentType.objects.get_for_model(Tache)
+        with self.captureOnCommitCallbacks(execute=True):
+            Permission.objects.create(codename='archiver_tache', name='Archiver', content_type=type_tache)
+        self.assertIn('archiver_tache', permissions_du_role('ADMIN'))
+        with self.assertNumQueries(0):
+            permissions_du_role('MANAGER')
+
+    def test_format_bitset(self):
+        response = self.client.get(reverse('utilisateur-me'), {'permissions_format': 'bitset'})
+        self.assertEqual(response.status_code, 200)
+        permissions = response.data['permissions']
+        catalogue = self.client.get(reverse('api/permissions_catalog')).data
+        self.assertEqual(permissions['version'], catalogue['version'])
+        self.assertEqual(decoder_bits(permissions['bits']), set(catalogue['codenames']))
+
+    def test_version_et_bits_du_meme_instantane(self):
+        # Invalidation concurrente simulée : le numéro change à chaque lecture
+        versions = iter(range(1, 100))
+        with mock.patch('api.cache_versions.version', side_effect=lambda nom: next(versions)) as lecture:
+            version, bits = encoder_bits({'view_tache'})
+        self.assertEqual(lecture.call_count, 1)
+        self.assertEqual(version, 1)
+        self.assertEqual(decoder_bits(bits), {'view_tache'})
+
+
+class JetonRevendicationsTest(APITestCase):
+    def setUp(self):
+        self.service = Service.objects.create(name='Service')
+        self.employe = creer_utilisateur('employe', service=self.service)
+
+    def obtenir_jetons(self):
+        response = self.client.post(
+            reverse('token_obtain_pair'), {'username': 'employe', 'password': 'test123'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data['access'], response.data['refresh']
+
+    def authentifier(self, acces, methode='get'):
+        brute = getattr(APIRequestFactory(), methode)('/', HTTP_AUTHORIZATION=f'Bearer {acces}')
+        request = Request(brute, authenticators=[ClaimsJWTAuthentication()])
+        request.user  # déclenche l'authentification
+        return request
+
+    def test_lecture_sans_requete(self):
+        acces, _ = self.obtenir_jetons()
+        with self.assertNumQueries(0):
+            request = self.authentifier(acces)
+            contexte = identite(request)
+            self.assertEqual(request.user.pk, self.employe.user_id)
+            self.assertEqual(contexte.role, 'EMPLOYEE')
+            self.assertEqual(contexte.service_id, self.service.id)
+            self.assertEqual(contexte.utilisateur_id, self.employe.id)
+            self.assertTrue(IsEmployeeUser().has_permission(request, None))
+            self.assertFalse(IsAdminOrManager().has_permission(request, None))
+        # Profil complet chargé à la demande
+        self.assertEqual(contexte.utilisateur, self.employe)
+
+    def test_changement_de_role_applique_au_rafraichissement(self):
+        acces, refresh = self.obtenir_jetons()
+        self.employe.role = 'DIRECTOR'
+        self.employe.save()
+        # Lecture : le jeton fait foi jusqu'au rafraîchissement
+        self.assertEqual(identite(self.authentifier(acces)).role, 'EMPLOYEE')
+        # Écriture : jeton périmé refusé
+        with self.assertRaises(AuthenticationFailed) as erreur:
+            self.authentifier(acces, 'post')
+        self.assertEqual(erreur.exception.get_codes()['code'], 'token_stale')
+        response = self.client.post(reverse('token_refresh'), {'refresh': refresh}, format='json')
+        self.assertEqual(response.status_code, 200)
+        request = self.authentifier(response.data['access'], 'post')
+        self.assertEqual(identite(request).role, 'DIRECTOR')
+        self.assertIn('DIRECTOR', identite(request).groupes)
+
+    def test_version_inchangee_sans_modification_des_droits(self):
+        version = Utilisateur.objects.get(pk=self.employe.pk).version_jeton
+        self.employe.bio = 'Nouvelle bio'
+        self.employe.save()
+        self.employe.user.last_login = timezone.now()
+        self.employe.user.save(update_fields=['last_login'])
+        self.assertEqual(Utilisateur.objects.get(pk=self.employe.pk).version_jeton, version)
+        self.employe.user.set_password('autre456')
+        self.employe.user.save()
+        self.assertEqual(Utilisateur.objects.get(pk=self.employe.pk).version_jeton, version + 1)
+
+    def test_requete_api_avec_authentification_par_revendications(self):
+        acces, _ = self.obtenir_jetons()
+        authentification = {
+            **settings.REST_FRAMEWORK,
+            'DEFAULT_AUTHENTICATION_CLASSES': ['api.authentication.ClaimsJWTAuthentication'],
+        }
+        with override_settings(REST_FRAMEWORK=authentification):
+            self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {acces}')
+            response = self.client.get(reverse('utilisateur-me'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['username'], 'employe')
+
+
+class SynchroPermissionsRolesTest(APITestCase):
+    def setUp(self):
+        self.service = Service.objects.create(name='Service')
+        self.employes = [creer_utilisateur(f'employe{i}', service=self.service) for i in range(4)]
+        self.manager = creer_utilisateur('manager', 'MANAGER', self.service)
+        # Permission hors rôle, à retirer
+        self.employes[0].user.user_permissions.add(Permission.objects.get(codename='delete_tache'))
+
+    def codenames(self, utilisateur):
+        return set(utilisateur.user.user_permissions.values_list('codename', flat=True))
+
+    def synchroniser(self, *args):
+        sortie = StringIO()
+        call_command('sync_role_permissions', *args, stdout=sortie)
+        return sortie.getvalue()
+
+    def test_synchronisation_par_difference(self):
+        attendues = set(build_role_permissions()['EMPLOYEE'])
+        self.synchroniser()
+        for employe in self.employes:
+            self.assertEqual(self.codenames(employe), attendues)
+        self.assertEqual(self.codenames(self.manager), set(build_role_permissions()['MANAGER']))
+        # Deuxième passage : rien à écrire, nombre de requêtes indépendant du nombre d'utilisateurs
+        with CaptureQueriesContext(connection) as requetes:
+            sortie = self.synchroniser('--chunk-size', '2')
+        self.assertIn('0 ajoutée(s), 0 supprimée(s)', sortie)
+        self.assertLessEqual(len(requetes), 2 + 2 * 3 + 1)
+
+    def test_simulation_et_filtre_de_role(self):
+        sortie = self.synchroniser('--dry-run', '--role', 'EMPLOYEE')
+        self.assertIn('[simulation]', sortie)
+        self.assertIn('pour 4 utilisateurs', sortie)
+        self.assertEqual(self.codenames(self.employes[1]), set())
+        self.synchroniser('--role', 'MANAGER')
+        self.assertEqual(self.codenames(self.employes[1]), set())
+        self.assertIn('delete_tache', self.codenames(self.employes[0]))
+        self.assertIn('change_tache', self.codenames(self.manager))
+
+    @override_settings(LOGIN_THROUGHPUT={'FLUSH_EVERY': 10000, 'FLUSH_INTERVAL': 3600})
+    def test_droits_de_connexion_et_profil_rafraichis(self):
+        def connecter():
+            requete = APIRequestFactory().post(
+                '/api/token/', {'username': 'employe0', 'password': 'test123'}, format='json'
+            )
+            return json.loads(async_to_sync(login.connexion)(requete).content)
+
+        versions = Utilisateur.objects.filter(pk__in=[e.pk for e in self.employes]).order_by('pk')
+        avant = list(versions.values_list('version_jeton', flat=True))
+        cache.clear()
+        self.assertIn('api.delete_tache', connecter()['permissions'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.synchroniser()
+        apres = connecter()
+        self.assertNotIn('api.delete_tache', apres['permissions'])
+        self.assertIn('api.view_tache', apres['permissions'])
+        # Jetons à revendications émis avant la synchronisation : périmés
+        self.assertEqual(list(versions.values_list('version_jeton', flat=True)), [v + 1 for v in avant])
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {apres['access']}")
+        profil = self.client.get(reverse('api/me_profile')).data
+        self.assertNotIn('delete_tache', profil['permissions'])
+        self.assertIn('view_tache', profil['permissions'])
+
+
+class ImportUtilisateursTest(APITestCase):
+    def setUp(self):
+        self.service = Service.objects.create(name='Informatique')
+        self.admin = creer_utilisateur('admin', 'ADMIN')
+
+    def test_commande_csv(self):
+        tache = Tache.objects.create(
+            title='Tâche du service', type='service', service=self.service, creator=self.admin,
+            deadline=timezone.now() + timedelta(days=3),
+        )
+        contenu = (
+            'username,email,password,first_name,last_name,role,service\n'
+            'alice,alice@example.com,secret123,Alice,A,EMPLOYEE,informatique\n'
+            f'bob,bob@example.com,secret456,Bob,B,MANAGER,{self.service.id}\n'
+            'admin,doublon@example.com,x,,,EMPLOYEE,\n'
+            'carol,pas-un-email,x,,,INCONNU,\n'
+            'dave,,,,,,\n'
+        )
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as fichier:
+            fichier.write(contenu)
+        self.addCleanup(os.unlink, fichier.name)
+        sortie = StringIO()
+        call_command('import_users', fichier.name, '--workers', '2', '--batch-size', '2', stdout=sortie)
+        self.assertIn('3 compte(s) importé(s), 2 ligne(s) en erreur', sortie.getvalue())
+        self.assertIn('ligne 4 (admin)', sortie.getvalue())
+
+        alice = Utilisateur.objects.get(user__username='alice')
+        self.assertTrue(alice.user.check_password('secret123'))
+        self.assertEqual(alice.service, self.service)
+        self.assertEqual(list(alice.user.groups.values_list('name', flat=True)), ['EMPLOYEE'])
+        self.assertTrue(visibility.TacheVisibilite.objects.filter(tache=tache, utilisateur=alice, reason='service').exists())
+        bob = Utilisateur.objects.get(user__username='bob')
+        self.service.refresh_from_db()
+        self.assertEqual(self.service.chef, bob)
+        self.assertFalse(Utilisateur.objects.get(user__username='dave').user.has_usable_password())
+
+    def test_endpoint_admin_jsonl_et_simulation(self):
+        lignes = '\n'.join(json.dumps(ligne) for ligne in [
+            {'username': 'eve', 'password': 'secret789', 'role': 'employee'},
+            {'username': 'frank', 'role': 'MANAGER'},
+        ]).encode()
+        self.client.force_authenticate(self.admin.user)
+        url = reverse('utilisateur-import-users')
+        fichier = SimpleUploadedFile('comptes.jsonl', lignes)
+        response = self.client.post(url, {'file': fichier, 'dry_run': 'true'}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['errors'][0]['line'], 2)
+        self.assertFalse(User.objects.filter(username='eve').exists())
+
+        response = self.client.post(url, {'users': [{'username': 'eve', 'password': 'secret789'}]}, format='json')
+        self.assertEqual(response.data['created'], 1)
+        self.assertTrue(User.objects.get(username='eve').check_password('secret789'))
+
+        self.client.force_authenticate(creer_utilisateur('employe').user)
+        response = self.client.post(url, {'users': []}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class PolitiqueAccesTachesTest(JeuTachesMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.admin = creer_utilisateur('admin', 'ADMIN')
+        self.t_perso.assignees.add(self.admin)
+        echeance = timezone.now() + timedelta(days=3)
+        self.t_perso_admin = Tache.objects.create(
+            title='perso admin', type='personnel', creator=self.admin, deadline=echeance
+        )
+
+    def requete(self, utilisateur):
+        brute = APIRequestFactory().get('/')
+        force_authenticate(brute, user=utilisateur.user)
+        return Request(brute)
+
+    def test_parite_sql_index_python(self):
+        taches = list(Tache.objects.prefetch_related('assignees'))
+        for utilisateur in Utilisateur.objects.select_related('user'):
+            contexte = identite(self.requete(utilisateur))
+            python = {t.id for t in taches if ACCES_TACHES.evaluer(contexte, t)}
+            nom = utilisateur.user.username
+            self.assertEqual(set(ACCES_TACHES.queryset(contexte).values_list('id', flat=True)), python, nom)
+            self.assertEqual(set(ACCES_TACHES.queryset(contexte, index=False).values_list('id', flat=True)), python, nom)
+            self.assertEqual({t.id for t in taches if ACCES_TACHES.autorise(contexte, t)}, python, nom)
+        # L'admin assigné à la tâche personnelle d'autrui ne la voit ni en liste ni en détail
+        contexte = identite(self.requete(self.admin))
+        self.assertEqual(
+            ACCES_TACHES.classer(contexte, [self.t_perso.id, self.t_perso_admin.id]),
+            ({self.t_perso.id, self.t_perso_admin.id}, {self.t_perso.id}),
+        )
+
+    def test_detail_une_requete_quelle_que_soit_la_taille_du_projet(self):
+        for i in range(30):
+            self.projet_q.membres.add(creer_utilisateur(f'membre{i}'))
+        contexte = identite(self.requete(self.e3))
+        with self.assertNumQueries(1):
+            self.assertTrue(ACCES_TACHES.autorise(contexte, self.t_projet_q))
+
+        self.client.force_authenticate(self.e2.user)
+        self.assertEqual(self.client.get(reverse('tache-detail', args=[self.t_projet_q.id])).status_code, 404)
+        self.client.force_authenticate(self.admin.user)
+        self.assertEqual(self.client.get(reverse('tache-detail', args=[self.t_perso.id])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('tache-detail', args=[self.t_perso_admin.id])).status_code, 200)
+
+    def test_banc_d_essai(self):
+        sortie = StringIO()
+        call_command('bench_task_access', '--users', '3', '--tasks', '5', stdout=sortie)
+        self.assertIn("0 écart(s)", sortie.getvalue())
+
+
+class TracageTest(JeuTachesMixin, APITestCase):
+    def evenements(self, journal):
+        return [json.loads(message.split(':', 2)[2]) for message in journal.output]
+
+    def test_identifiant_de_correlation(self):
+        self.client.force_authenticate(self.e3.user)
+        response = self.client.get(reverse('tache-list'))
+        self.assertRegex(response['X-Request-ID'], r'^[0-9a-f]{32}$')
+        response = self.client.get(reverse('tache-list'), HTTP_X_REQUEST_ID='abc-123')
+        self.assertEqual(response['X-Request-ID'], 'abc-123')
+        response = self.client.get(reverse('tache-list'), HTTP_X_REQUEST_ID='pas valide !')
+        self.assertNotEqual(response['X-Request-ID'], 'pas valide !')
+
+    @override_settings(TRACING={'ENABLED': False})
+    def test_desactive_sans_evaluation(self):
+        appels = []
+        jetons, trace = tracing.debuter()
+        try:
+            self.assertIsNone(trace)
+            tracing.evenement(tracing.ERROR, 'test', couteux=lambda: appels.append(1))
+            with tracing.span('test'):
+                pass
+        finally:
+            tracing.terminer(jetons)
+        self.assertEqual(appels, [])
+
+    @override_settings(TRACING={'ENABLED': True, 'LEVEL': 'INFO', 'SAMPLE_RATE': 1})
+    def test_niveau_et_evaluation_paresseuse(self):
+        appels = []
+        jetons, trace = tracing.debuter('req-1')
+        try:
+            with self.assertLogs('api.trace', 'DEBUG') as journal:
+                tracing.evenement(tracing.DEBUG, 'ignore', couteux=lambda: appels.append(1))
+                tracing.evenement(tracing.INFO, 'emis', valeur=lambda: 42)
+        finally:
+            tracing.terminer(jetons)
+        self.assertEqual(appels, [])
+        self.assertEqual(self.evenements(journal), [{'correlation_id': 'req-1', 'event': 'emis', 'valeur': 42}])
+
+    @override_settings(TRACING={'ENABLED': True, 'LEVEL': 'DEBUG', 'SAMPLE_RATE': 1})
+    def test_spans_de_la_requete(self):
+        self.client.force_authenticate(self.e3.user)
+        with self.assertLogs('api.trace', 'DEBUG') as journal:
+            response = self.client.get(reverse('tache-list'), HTTP_X_REQUEST_ID='req-2')
+        self.assertEqual(response.status_code, 200)
+        requete = [e for e in self.evenements(journal) if e['event'] == 'requete'][-1]
+        self.assertEqual((requete['correlation_id'], requete['status']), ('req-2', 200))
+        self.assertLessEqual({'permissions', 'queryset', 'serialisation'}, set(requete['spans']))
+        self.assertTrue(requete['spans_detail'])
+
+    @override_settings(TRACING={'ENABLED': False})
+    def test_erreurs_journalisees_sans_tracage(self):
+        requete = APIRequestFactory().post('/api/taches/')
+        requete.user = self.manager.user
+        serialiseur = TacheSerializer(context={'request': requete})
+        with mock.patch.object(serialiseur, 'preparer_creation', side_effect=RuntimeError('panne')):
+            with self.assertLogs('api.serializers', 'ERROR') as journal, self.assertRaises(RuntimeError):
+                serialiseur.create({})
+        self.assertIn('Création de tâche impossible', journal.output[0])
+
+    @override_settings(TRACING={'ENABLED': True, 'SAMPLE_RATE': 0})
+    def test_requete_non_echantillonnee(self):
+        self.client.force_authenticate(self.e3.user)
+        with self.assertNoLogs('api.trace', 'DEBUG'):
+            response = self.client.get(reverse('tache-detail', args=[self.t_perso.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('X-Request-ID', response)
+
+
+class PolitiqueRoutesTest(APITestCase):
+    def setUp(self):
+        self.service = Service.objects.create(name='Service')
+        self.manager = creer_utilisateur('manager', 'MANAGER', self.service)
+        self.employe = creer_utilisateur('employe', service=self.service)
+
+    def test_table_compilee(self):
+        table = route_policy.compiler()
+        self.assertEqual(table['tache-detail'].segments_uuid, ('pk',))
+        self.assertEqual(table['conversation-messages-detail'].segments_uuid, ('conversation_pk', 'pk'))
+        self.assertEqual(table['tache-list'].roles_autorises('GET'), None)
+        self.assertEqual(table['api/analytics_data'].roles_autorises('GET'), {'ADMIN', 'MANAGER', 'DIRECTOR'})
+        self.assertNotIn('api/check_username', table)
+
+    def test_segments_uuid(self):
+        self.client.force_authenticate(self.employe.user)
+        response = self.client.get('/api/tasks/pas-un-uuid/')
+        self.assertEqual((response.status_code, response.json()['error']), (400, 'UUID invalide'))
+        identifiant = uuid.uuid4()
+        response = self.client.get(f'/api/tasks/{identifiant.hex}/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['corrected_url'], f'/api/tasks/{identifiant}/')
+        self.assertEqual(self.client.get(f'/api/tasks/{str(identifiant).upper()}/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/tasks/{identifiant}/').status_code, 404)
+
+    def test_roles_par_methode_avec_jeton(self):
+        def jeton(nom):
+            response = self.client.post(
+                reverse('token_obtain_pair'), {'username': nom, 'password': 'test123'}, format='json'
+            )
+            return f"Bearer {response.data['access']}"
+
+        employe, manager = jeton('employe'), jeton('manager')
+        response = self.client.post(reverse('tache-list'), {}, format='json', HTTP_AUTHORIZATION=employe)
+        self.assertEqual((response.status_code, response.json()['error']), (403, 'Permission refusée'))
+        self.assertEqual(self.client.get(reverse('tache-list'), HTTP_AUTHORIZATION=employe).status_code, 200)
+        self.assertEqual(self.client.get(reverse('api/analytics_data'), HTTP_AUTHORIZATION=employe).status_code, 403)
+        # Authentifié une fois, par la vue : la permission des rôles réutilise utilisateur et profil
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(reverse('api/analytics_data'), HTTP_AUTHORIZATION=manager)
+        self.assertEqual(response.status_code, 200)
+        sql = [q['sql'] for q in requetes.captured_queries]
+        self.assertEqual(sum('FROM "auth_user" WHERE "auth_user"."id"' in q for q in sql), 1)
+        self.assertEqual(sum(q.startswith('SELECT "api_utilisateur"."id"') for q in sql), 1)
+        # Sans authentification, la vue répond elle-même
+        self.assertEqual(self.client.post(reverse('tache-list'), {}, format='json').status_code, 401)
+
+    def test_roles_verifies_apres_l_authentification_de_la_vue(self):
+        # Authentification propre au client de test, sans jeton : seule la vue la connaît
+        self.client.force_authenticate(self.employe.user)
+        response = self.client.post(reverse('tache-list'), {}, format='json')
+        self.assertEqual((response.status_code, response.json()['error']), (403, 'Permission refusée'))
+        self.client.force_authenticate(self.manager.user)
+        self.assertEqual(self.client.get(reverse('api/analytics_data')).status_code, 200)
+
+    def test_routes_a_roles_protegees_par_leur_vue(self):
+        for nom in route_policy.ROLES:
+            self.assertIn(RolesDeLaRoute, resolve(reverse(nom)).func.cls.permission_classes, nom)
+
+    def test_banc_d_essai(self):
+        sortie = StringIO()
+        call_command('bench_route_policy', '--iterations', '10', stdout=sortie)
+        self.assertIn('µs/requête', sortie.getvalue())
+
+
+# Routes de test : vue de connexion asynchrone, quel que soit LOGIN_THROUGHPUT
+urlpatterns = [path('api/token/', login.connexion)]
+
+
+@override_settings(LOGIN_THROUGHPUT={'FLUSH_EVERY': 10000, 'FLUSH_INTERVAL': 3600})
+class ConnexionDebitTest(APITestCase):
+    def setUp(self):
+        self.service = Service.objects.create(name='Service')
+        self.manager = creer_utilisateur('manager', 'MANAGER', self.service)
+        login.connexions.extraire()
+
+    def connecter(self, username='manager', password='test123'):
+        requete = APIRequestFactory().post(
+            '/api/token/', {'username': username, 'password': password}, format='json'
+        )
+        reponse = async_to_sync(login.connexion)(requete)
+        return reponse.status_code, json.loads(reponse.content)
+
+    def test_meme_reponse_que_la_vue_drf(self):
+        code, corps = self.connecter()
+        self.assertEqual(code, 200)
+        reference = CustomTokenObtainPairView.as_view()(APIRequestFactory().post(
+            '/api/token/', {'username': 'manager', 'password': 'test123'}, format='json'
+        )).data
+        self.assertEqual(set(corps), set(reference))
+        for cle in ('user_id', 'role', 'service_id', 'service_nom', 'permissions', 'groups', 'is_staff'):
+            self.assertEqual(corps[cle], sorted(reference[cle]) if isinstance(reference[cle], list) else reference[cle], cle)
+        self.assertEqual(ClaimsJWTAuthentication().get_validated_token(corps['access'])['role'], 'MANAGER')
+
+        self.assertEqual(self.connecter(password='faux')[1]['code'], 'no_active_account')
+        self.assertEqual(self.connecter(username='inconnu')[0], 401)
+        self.assertEqual(self.connecter(password='')[0], 400)
+
+    @override_settings(ROOT_URLCONF='api.tests')
+    def test_sans_jeton_csrf(self):
+        reponse = Client(enforce_csrf_checks=True).post(
+            '/api/token/', {'username': 'manager', 'password': 'test123'}, content_type='application/json'
+        )
+        self.assertEqual(reponse.status_code, 200)
+
+    def test_dates_de_connexion_differees(self):
+        self.connecter()
+        self.manager.refresh_from_db()
+        self.manager.user.refresh_from_db()
+        self.assertIsNone(self.manager.user.last_login)
+        self.assertEqual(login.connexions.flush(), 1)
+        self.manager.refresh_from_db()
+        self.manager.user.refresh_from_db()
+        self.assertIsNotNone(self.manager.user.last_login)
+        self.assertEqual(self.manager.derniere_connexion, self.manager.user.last_login)
+
+    def test_droits_en_cache_et_invalidation(self):
+        self.connecter()
+        with CaptureQueriesContext(connection) as requetes:
+            self.assertEqual(self.connecter()[0], 200)
+        self.assertEqual(len(requetes), 1)
+        self.manager.user.user_permissions.add(Permission.objects.get(codename='view_service'))
+        self.assertIn('api.view_service', self.connecter()[1]['permissions'])
+
+        # Écriture directe dans la table de liaison (hors m2m_changed)
+        cle = login.PREFIXE_DROITS + str(self.manager.user_id)
+        ancien = cache.get(cle)
+        with self.captureOnCommitCallbacks(execute=True):
+            User.user_permissions.through.objects.filter(user_id=self.manager.user_id).delete()
+            login.invalider_droits([self.manager.user_id])
+            # Connexion concurrente avant la validation : état d'avant remis en cache
+            cache.set(cle, ancien)
+        self.assertNotIn('api.view_service', self.connecter()[1]['permissions'])
+
+    def test_pool_sature(self):
+        with override_settings(LOGIN_THROUGHPUT={'MAX_PENDING': 0}):
+            self.assertEqual(self.connecter()[0], 503)
+
+    def test_banc_d_essai(self):
+        sortie = StringIO()
+        call_command('bench_login', '--users', '2', '--logins', '4', '--concurrency', '2', stdout=sortie)
+        self.assertIn('connexions/s', sortie.getvalue())
+        self.assertFalse(User.objects.filter(username__startswith='bench_login_').exists())
+
+
+class AnalytiquesAgregeesTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = creer_utilisateur('admin', 'ADMIN')
+        self.service_a = Service.objects.create(name='A', capacity_charge=20)
+        self.service_b = Service.objects.create(name='B', capacity_charge=30)
+        self.client.force_authenticate(user=self.admin.user)
+        maintenant = timezone.now()
+        self.a_temps = self.tache(self.service_a, 'completed', 'urgent', maintenant + timedelta(days=1), points=5)
+        self.a_temps.completion_date = maintenant
+        self.a_temps.save()
+        self.tache(self.service_a, 'in_progress', 'high', maintenant - timedelta(days=1), points=8)
+        self.tache(self.service_b, 'todo', 'urgent', maintenant + timedelta(days=2), points=12)
+        en_retard = self.tache(self.service_b, 'completed', 'low', maintenant + timedelta(days=2))
+        en_retard.completion_date = maintenant + timedelta(days=3)
+        en_retard.save()
+        # Hors période : créée il y a plus d'un an
+        ancienne = self.tache(self.service_a, 'todo', 'urgent', maintenant - timedelta(days=400), points=10)
+        Tache.objects.filter(pk=ancienne.pk).update(date_creation=maintenant - timedelta(days=400))
+
+    def tache(self, service, statut, priorite, echeance, points=0):
+        return Tache.objects.create(
+            title=f'{statut} {priorite}', type='service', service=service, creator=self.admin,
+            status=statut, priority=priorite, deadline=echeance, workload_points=points,
+        )
+
+    def test_indicateurs_calcules(self):
+        response = self.client.get(reverse('api/analytics_data'), {'period': 'year'})
+        self.assertEqual(response.status_code, 200)
+        principal = response.data['main_metrics']
+        self.assertEqual(
+            (principal['totalTasks'], principal['completedTasks'], principal['urgentTasks'], principal['overdueTasks']),
+            (4, 2, 2, 1),
+        )
+        self.assertEqual((principal['completionRate'], principal['globalEfficiency']), (50, 50))
+        self.assertEqual(response.data['status_breakdown'], {'completed': 2, 'in_progress': 1, 'todo': 1})
+        services = {s['name']: s for s in response.data['service_performance']}
+        self.assertEqual((services['A']['totalTasks'], services['A']['efficiency']), (2, 100))
+        self.assertEqual((services['B']['totalTasks'], services['B']['efficiency']), (2, 0))
+        # Charge en cours : tâches ouvertes, période comprise ou non
+        self.assertEqual(services['A']['load'], 90)
+        self.assertEqual(response.data['system_metrics']['systemLoad'], 60)
+
+    def test_filtres_periode_et_service(self):
+        maintenant = timezone.now()
+        self.assertEqual(analytics.indicateurs('year', maintenant=maintenant)['main_metrics']['totalTasks'], 4)
+        ancien = analytics.indicateurs('year', maintenant=maintenant - timedelta(days=400))
+        self.assertEqual(ancien['main_metrics']['totalTasks'], 5)
+        donnees = analytics.indicateurs('year', self.service_b.id)
+        self.assertEqual(donnees['main_metrics']['totalTasks'], 2)
+        self.assertEqual([s['name'] for s in donnees['service_performance']], ['B'])
+        self.assertEqual(analytics.debut_periode('quarter', maintenant).month % 3, 1)
+        self.assertEqual(self.client.get(reverse('api/analytics_data'), {'period': 'decade'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api/analytics_data'), {'service_id': 'x'}).status_code, 400)
+
+    def test_nombre_de_requetes_constant(self):
+        with self.assertNumQueries(5):
+            analytics.indicateurs('month')
+        for i in range(10):
+            service = Service.objects.create(name=f'S{i}')
+            self.tache(service, 'todo', 'medium', timezone.now() + timedelta(days=1))
+        with self.assertNumQueries(5):
+            donnees = analytics.indicateurs('month')
+        self.assertEqual(len(donnees['service_performance']), 12)
+
+
+class RollupsTachesTest(APITestCase):
+    def setUp(self):
+        self.admin = creer_utilisateur('admin', 'ADMIN')
+        self.service = Service.objects.create(name='A')
+        self.client.force_authenticate(user=self.admin.user)
+        maintenant = timezone.now()
+        self.taches = [
+            Tache.objects.create(
+                title=f't{i}', type='service', service=self.service, creator=self.admin,
+                priority='high', deadline=maintenant + timedelta(days=2), workload_points=i, tracked_time=10,
+            )
+            for i in range(3)
+        ]
+        # Échéance passée, non terminée : en retard
+        self.en_retard = Tache.objects.create(
+            title='retard', type='personnel', creator=self.admin, deadline=maintenant - timedelta(days=2),
+        )
+
+    def ligne(self, jour, **filtres):
+        return StatistiqueTachesJour.objects.filter(jour=jour, **filtres).aggregate(
+            crees=Sum('crees'), terminees=Sum('terminees'), en_retard=Sum('en_retard'), points=Sum('points'),
+        )
+
+    def test_mise_a_jour_incrementale(self):
+        aujourdhui = timezone.localdate()
+        self.assertEqual(rollups.mettre_a_jour()['taches'], 4)
+        self.assertEqual(rollups.verifier(), (0, []))
+        self.assertEqual(
+            self.ligne(aujourdhui, service_id=self.service.id),
+            {'crees': 3, 'terminees': 0, 'en_retard': 0, 'points': 3},
+        )
+        self.assertEqual(self.ligne(aujourdhui - timedelta(days=2))['en_retard'], 1)
+
+        # Seules les tâches modifiées sont réintégrées ; suppression retranchée
+        self.taches[0].marquer_comme_terminee()
+        self.en_retard.delete()
+        resultat = rollups.mettre_a_jour()
+        self.assertEqual((resultat['taches'], resultat['supprimees']), (1, 1))
+        self.assertEqual(rollups.verifier(), (0, []))
+        self.assertEqual(self.ligne(aujourdhui)['terminees'], 1)
+        self.assertFalse(StatistiqueTachesJour.objects.filter(jour=aujourdhui - timedelta(days=2)).exists())
+        # Rejouer sans modification ne change rien
+        self.assertEqual(rollups.mettre_a_jour()['taches'], 0)
+        self.assertEqual(rollups.verifier(), (0, []))
+
+    def test_commande(self):
+        sortie = StringIO()
+        call_command('rollup_task_stats', stdout=sortie)
+        self.assertIn('4 tâche(s) intégrée(s)', sortie.getvalue())
+        StatistiqueTachesJour.objects.update(crees=7)
+        with self.assertRaises(CommandError):
+            call_command('rollup_task_stats', '--check', stdout=StringIO())
+        call_command('rollup_task_stats', '--rebuild', stdout=StringIO())
+        call_command('rollup_task_stats', '--check', stdout=StringIO())
+
+    def test_serie_sans_lire_les_taches(self):
+        rollups.mettre_a_jour()
+        with CaptureQueriesContext(connection) as requetes:
+            response = self.client.get(reverse('api/analytics_timeseries'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('"api_tache"' in q['sql'] for q in requetes.captured_queries))
+        serie = response.data['series']
+        self.assertEqual(len(serie), 365)
+        self.assertEqual((serie[-1]['date'], serie[-1]['created']), (timezone.localdate().isoformat(), 4))
+        self.assertEqual(serie[-3]['overdue'], 1)
+
+        response = self.client.get(reverse('api/analytics_timeseries'), {
+            'granularity': 'month', 'group_by': 'type', 'service_id': str(self.service.id),
+        })
+        self.assertEqual(
+            [(p['type'], p['created'], p['workloadPoints']) for p in response.data['series']],
+            [('service', 3, 3)],
+        )
+        for params in ({'granularity': 'hour'}, {'group_by': 'title'}, {'start': '2026-13-01'},
+                       {'start': '2026-02-01', 'end': '2026-01-01'}):
+            self.assertEqual(self.client.get(reverse('api/analytics_timeseries'), params).status_code, 400)
+        # Fenêtre démesurée : refusée plutôt que remplie de zéros
+        self.assertEqual(self.client.get(reverse('api/analytics_timeseries'), {
+            'start': '0001-01-01', 'end': '9999-12-31',
+        }).status_code, 400)
+        response = self.client.get(reverse('api/analytics_timeseries'), {
+            'start': '2020-01-01', 'end': '2026-12-31', 'granularity': 'month',
+        })
+        self.assertEqual((response.status_code, len(response.data['series'])), (200, 84))
+
+
+class CacheAnalytiquesTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = creer_utilisateur('admin', 'ADMIN')
+        self.service_a = Service.objects.create(name='A')
+        self.service_b = Service.objects.create(name='B')
+        self.manager = creer_utilisateur('manager', 'MANAGER', self.service_b)
+        self.tache = Tache.objects.create(
+            title='t', type='service', service=self.service_a, creator=self.admin,
+            deadline=timezone.now() + timedelta(days=1),
+        )
+
+    def test_version_par_service(self):
+        self.assertEqual(analytics.indicateurs_en_cache('month')['main_metrics']['totalTasks'], 1)
+        analytics.indicateurs_en_cache('month', self.service_b.id)
+        with self.assertNumQueries(0):
+            analytics.indicateurs_en_cache('month')
+            analytics.indicateurs_en_cache('month', self.service_b.id)
+
+        # Écriture sur le service A : version globale et version de A, pas celle de B
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tache.status = 'completed'
+            self.tache.save()
+        with self.assertNumQueries(0):
+            analytics.indicateurs_en_cache('month', self.service_b.id)
+        self.assertEqual(analytics.indicateurs_en_cache('month')['main_metrics']['completedTasks'], 1)
+
+        # Changement de service : ancien et nouveau service invalidés
+        analytics.indicateurs_en_cache('month', self.service_b.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tache.service = self.service_b
+            self.tache.save()
+        self.assertEqual(
+            analytics.indicateurs_en_cache('month', self.service_b.id)['main_metrics']['totalTasks'], 1
+        )
+
+        stats = analytics.statistiques()
+        self.assertEqual((stats['hits'], stats['misses'], stats['recomputes']), (4, 4, 4))
+        self.assertEqual(stats['hitRatio'], 0.5)
+        self.assertIsNotNone(stats['avgRecomputeMs'])
+
+    def test_invalidation_projet_et_operations_groupees(self):
+        analytics.indicateurs_en_cache('month', self.service_b.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            projet = Projet.objects.create(
+                name='P', start_date=timezone.now().date(), end_date=timezone.now().date(), status='active',
+            )
+            projet.services.add(self.service_b)
+        self.assertEqual(
+            analytics.indicateurs_en_cache('month', self.service_b.id)['main_metrics']['activeProjects'], 1
+        )
+
+        self.client.force_authenticate(user=self.admin.user)
+        analytics.indicateurs_en_cache('month', self.service_a.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('tache-bulk'), {'operations': [
+                {'op': 'update', 'id': str(self.tache.id), 'data': {'status': 'completed'}},
+            ]}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(
+            analytics.indicateurs_en_cache('month', self.service_a.id)['main_metrics']['completedTasks'], 1
+        )
+
+    @override_settings(ANALYTICS_CACHE={'WAIT': 0.1})
+    def test_recalcul_unique(self):
+        analytics.indicateurs_en_cache('month')
+        cle = f"analytics:reponse:month:{analytics.debut_periode('month').date().isoformat()}:all:organisation"
+        cache.add(cle + ':recalcul', 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tache.delete()
+        # Recalcul en cours ailleurs : réponse précédente, sans requête
+        with self.assertNumQueries(0):
+            self.assertEqual(analytics.indicateurs_en_cache('month')['main_metrics']['totalTasks'], 1)
+        self.assertEqual(analytics.statistiques()['staleServed'], 1)
+        # Sans réponse précédente, attente bornée puis recalcul
+        cache.delete(cle)
+        self.assertEqual(analytics.indicateurs_en_cache('month')['main_metrics']['totalTasks'], 0)
+
+    def test_statistiques_reservees_aux_administrateurs(self):
+        self.client.force_authenticate(user=self.manager.user)
+        self.assertEqual(self.client.get(reverse('api/analytics_cache_stats')).status_code, 403)
+        self.client.force_authenticate(user=self.admin.user)
+        self.client.get(reverse('api/analytics_data'))
+        response = self.client.get(reverse('api/analytics_cache_stats'))
+        self.assertEqual((response.status_code, response.data['misses']), (200, 1))
+
+
+class PerformancesLivraisonTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = creer_utilisateur('admin', 'ADMIN')
+        self.service = Service.objects.create(name='A')
+        self.e1 = creer_utilisateur('e1', service=self.service)
+        self.projet = Projet.objects.create(name='P', start_date=timezone.now().date(), end_date=timezone.now().date())
+        maintenant = timezone.now()
+        # Temps de cycle de 10, 20, 30 et 40 heures ; les deux derniers après l'échéance
+        for heures, estime, passe in ((10, 60, 60), (20, 60, 90), (30, 0, 0), (40, 100, 50)):
+            tache = Tache.objects.create(
+                title=f'{heures}h', type='service', service=self.service, project=self.projet, creator=self.admin,
+                status='completed', deadline=maintenant - timedelta(hours=25),
+                estimated_time=estime, tracked_time=passe,
+            )
+            Tache.objects.filter(pk=tache.pk).update(
+                date_creation=maintenant - timedelta(hours=heures + 20), completion_date=maintenant - timedelta(hours=20),
+            )
+            if heures <= 20:
+                tache.assignees.add(self.e1)
+        Tache.objects.filter(title__in=['10h', '20h']).update(deadline=maintenant)
+
+    def test_mesures_par_portee_en_une_requete(self):
+        with self.assertNumQueries(1):
+            resultat = analytics.performances(timezone.now() - timedelta(days=1))
+        total = resultat['global']
+        self.assertEqual(total['completed'], 4)
+        self.assertEqual(total['cycleTimeHours'], {'p50': 25.0, 'p75': 32.5, 'p90': 37.0})
+        self.assertEqual(total['onTimeRate'], 50.0)
+        # |90-60|/60 -> 0.5, |50-100|/100 -> 0.5, 60/60 -> 1 ; moyenne 2/3
+        self.assertEqual(total['estimateAccuracy'], 66.7)
+        self.assertEqual(total['estimateRatio'], 1.0)
+        self.assertEqual(resultat['services'][str(self.service.id)]['completed'], 4)
+        self.assertEqual([(p['name'], p['completed']) for p in resultat['projects']], [('P', 4)])
+        self.assertEqual(
+            [(u['name'], u['completed'], u['onTimeRate']) for u in resultat['users']], [('e1', 2, 100.0)]
+        )
+        # Terminées avant la période : exclues
+        self.assertEqual(analytics.performances(timezone.now())['global']['completed'], 0)
+
+    def test_reponse_analytique(self):
+        self.client.force_authenticate(user=self.admin.user)
+        donnees = self.client.get(reverse('api/analytics_data'), {'period': 'year'}).data
+        self.assertEqual(donnees['main_metrics']['globalEfficiency'], 50.0)
+        service = donnees['service_performance'][0]
+        self.assertEqual((service['efficiency'], service['cycleTimeHours']['p50']), (50.0, 25.0))
+        self.assertEqual(donnees['delivery_metrics']['users'][0]['name'], 'e1')
+
+
+class ChargeTravailTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = creer_utilisateur('admin', 'ADMIN')
+        self.service = Service.objects.create(name='A', capacity_charge=3)
+        self.autre = Service.objects.create(name='B', capacity_charge=5)
+        self.manager = creer_utilisateur('manager', 'MANAGER', self.autre)
+        self.e1 = creer_utilisateur('e1', service=self.service)
+        self.e2 = creer_utilisateur('e2', service=self.service)
+        self.aujourdhui = timezone.localdate()
+        # 10 points sur 5 jours : 2 par jour pour le service, 1 par jour pour chaque assigné
+        self.tache = Tache.objects.create(
+            title='t', type='service', service=self.service, creator=self.admin, workload_points=10,
+            deadline=timezone.now() + timedelta(days=4),
+        )
+        self.tache.assignees.add(self.e1, self.e2)
+
+    def charge(self, cle, jours=7):
+        return workload.charges(self.aujourdhui, self.aujourdhui + timedelta(days=jours - 1)).get(cle)
+
+    def test_compteurs_incrementaux(self):
+        service, e1 = (str(self.service.id), None), (None, str(self.e1.id))
+        self.assertEqual(self.charge(service), [2, 2, 2, 2, 2, 0, 0])
+        self.assertEqual(self.charge(e1), [1, 1, 1, 1, 1, 0, 0])
+        # Une écriture ne touche que deux lignes par cible
+        self.assertEqual(ChargeJour.objects.count(), 6)
+
+        self.tache.assignees.remove(self.e2)
+        self.assertEqual(self.charge(e1), [2, 2, 2, 2, 2, 0, 0])
+        self.tache.deadline = timezone.now() + timedelta(days=1)
+        self.tache.service = self.autre
+        self.tache.save()
+        self.assertIsNone(self.charge(service))
+        self.assertEqual(self.charge((str(self.autre.id), None)), [5, 5, 0, 0, 0, 0, 0])
+        self.assertEqual(workload.verifier(), (0, []))
+
+        self.tache.status = 'completed'
+        self.tache.save()
+        self.assertFalse(ChargeJour.objects.exists())
+        self.tache.status = 'todo'
+        self.tache.save()
+        self.e1.delete()
+        self.assertEqual(workload.verifier(), (0, []))
+        self.tache.delete()
+        self.assertFalse(ChargeJour.objects.exists() or ContributionCharge.objects.exists())
+
+    def test_operations_groupees(self):
+        self.client.force_authenticate(user=self.admin.user)
+        response = self.client.post(reverse('tache-bulk'), {'operations': [
+            {'op': 'update', 'id': str(self.tache.id), 'data': {'status': 'completed'}},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertFalse(ChargeJour.objects.exists())
+        self.assertEqual(workload.verifier(), (0, []))
+
+    def test_rapport(self):
+        self.client.force_authenticate(user=self.admin.user)
+        for i in range(5):
+            Service.objects.create(name=f'S{i}')
+        workload.rapport(self.aujourdhui, self.aujourdhui + timedelta(days=6))
+        # Capacité effective en cache : 3 requêtes
+        with self.assertNumQueries(3):
+            workload.rapport(self.aujourdhui, self.aujourdhui + timedelta(days=6))
+        response = self.client.get(reverse('service-load'), {'end': (self.aujourdhui + timedelta(days=6)).isoformat()})
+        self.assertEqual(response.status_code, 200)
+        services = {s['name']: s for s in response.data['services']}
+        self.assertEqual(len(services), 7)
+        self.assertEqual((services['A']['peakLoad'], services['A']['overloadedDays']), (2, 0))
+        self.assertEqual(services['A']['days'][0], {
+            'date': self.aujourdhui.isoformat(), 'load': 2, 'capacity': 3, 'utilization': 66.7,
+        })
+        # Capacité d'un utilisateur : part égale de celle de son service
+        self.assertEqual(
+            [(u['username'], u['days'][0]['capacity'], u['overloadedDays']) for u in response.data['users']],
+            [('e1', 1.5, 0), ('e2', 1.5, 0)],
+        )
+
+        self.client.force_authenticate(user=self.manager.user)
+        response = self.client.get(reverse('service-load'))
+        self.assertEqual((len(response.data['services']), response.data['users']), (7, []))
+        self.assertEqual(self.client.get(reverse('service-load'), {'start': '2026-01-02', 'end': '2026-01-01'}).status_code, 400)
+
+    def test_commande(self):
+        ChargeJour.objects.update(delta=1)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_workload', '--check', stdout=StringIO())
+        call_command('rebuild_workload', stdout=StringIO())
+        call_command('rebuild_workload', '--check', stdout=StringIO())
+
+
+class CapaciteEffectiveTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = creer_utilisateur('admin', 'ADMIN')
+        self.source = Service.objects.create(name='A', capacity_charge=10)
+        self.destination = Service.objects.create(name='B', capacity_charge=4)
+        self.autre = Service.objects.create(name='C', capacity_charge=7)
+        self.employe = creer_utilisateur('e1', service=self.source)
+        self.debut = timezone.localdate()
+        self.fin = self.debut + timedelta(days=6)
+
+    def preter(self, jours, impact, statut='approved', destination=None):
+        return PretEmploye.objects.create(
+            employe=self.employe, service_source=self.source, service_destination=destination or self.destination,
+            date_debut=self.debut + timedelta(days=jours[0]), date_fin=self.debut + timedelta(days=jours[1]),
+            raison='renfort', statut=statut, impact_charge=impact,
+        )
+
+    def test_balayage(self):
+        self.preter((-3, 1), 2)
+        self.preter((1, 3), 3, statut='active')
+        self.preter((5, 20), 1, destination=self.autre)
+        self.preter((0, 6), 5, statut='pending')
+        self.preter((0, 6), 5, statut='rejected')
+        capacites = capacity.calculer(self.debut, self.fin)
+        self.assertEqual(capacites[str(self.source.id)]['capacity'], [8, 5, 7, 7, 10, 9, 9])
+        self.assertEqual(capacites[str(self.destination.id)]['capacity'], [6, 9, 7, 7, 4, 4, 4])
+        self.assertEqual(capacites[str(self.autre.id)]['capacity'], [7, 7, 7, 7, 7, 8, 8])
+        # Hors horizon : capacité de base
+        self.assertEqual(capacity.calculer(self.debut + timedelta(days=30), self.debut + timedelta(days=31))[str(self.source.id)]['capacity'], [10, 10])
+
+    def test_cache_et_invalidation(self):
+        with self.assertNumQueries(2):
+            capacity.capacites(self.debut, self.fin)
+        with self.assertNumQueries(0):
+            capacity.capacites(self.debut, self.fin)
+        with self.captureOnCommitCallbacks(execute=True):
+            pret = self.preter((0, 6), 2)
+        self.assertEqual(capacity.capacites(self.debut, self.fin)[str(self.destination.id)]['capacity'], [6] * 7)
+        with self.captureOnCommitCallbacks(execute=True):
+            pret.statut = 'completed'
+            pret.save()
+        self.assertEqual(capacity.capacites(self.debut, self.fin)[str(self.destination.id)]['capacity'], [4] * 7)
+        with self.captureOnCommitCallbacks(execute=True):
+            Service.objects.filter(pk=self.autre.pk).get().delete()
+        self.assertNotIn(str(self.autre.id), capacity.capacites(self.debut, self.fin))
+
+    def test_charge_et_endpoint(self):
+        self.preter((0, 2), 4)
+        rapport = {s['name']: s for s in workload.rapport(self.debut, self.fin)['services']}
+        self.assertEqual([j['capacity'] for j in rapport['B']['days']], [8, 8, 8, 4, 4, 4, 4])
+
+        self.client.force_authenticate(user=self.admin.user)
+        response = self.client.get(reverse('service-capacity'), {'end': self.fin.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        services = {s['name']: s for s in response.data['services']}
+        self.assertEqual(
+            (services['A']['baseCapacity'], services['A']['minCapacity'], services['A']['maxCapacity']), (10, 6, 10),
+        )
+        self.assertEqual(self.client.get(reverse('service-capacity'), {'start': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('service-capacity'), {'start': '2026-01-01', 'end': '2028-01-01'}).status_code, 400)
@@ -0,0 +1,242 @@
+"""
+Traces structurées des requêtes HTTP, remplaçant les print() de débogage.
+
+CorrelationIdMiddleware attribue à chaque requête un identifiant de
+corrélation (en-tête X-Request-ID reçu s'il est valide, sinon généré), renvoyé
+dans la réponse et ajouté aux journaux par FiltreCorrelation. Si le traçage
+est actif et que la requête est échantillonnée, une Trace est attachée au
+contexte (contextvars) :
+- evenement(niveau, message, **champs) : événement filtré par niveau ; les
+  champs appelables ne sont évalués qu'à l'émission (requêtes SQL comprises) ;
+- span(nom) : mesure d'une section (permissions, queryset, sérialisation),
+  résumée dans l'événement de fin de requête.
+Sans trace (traçage désactivé ou requête non échantillonnée), evenement() et
+span() se réduisent à une lecture de ContextVar : rien n'est formaté ni évalué.
+
+Émission : une ligne JSON par événement sur le logger 'api.trace'.
+
+Configuration (settings.TRACING) :
+    ENABLED      active le traçage
+    LEVEL        niveau minimal des événements (DEBUG, INFO, WARNING, ERROR)
+    SAMPLE_RATE  fraction des requêtes tracées (0 à 1)
+    MAX_SPANS    nombre de spans conservés par requête
+"""
+import json
+import logging
+import random
+import re
+import time
+import uuid
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework.response import Response
+
+DEBUG, INFO, WARNING, ERROR = logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR
+
+DEFAULTS = {
+    'ENABLED': False,
+    'LEVEL': 'INFO',
+    'SAMPLE_RATE': 1.0,
+    'MAX_SPANS': 100,
+}
+
+ENTETE = 'X-Request-ID'
+_ID_VALIDE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+logger = logging.getLogger('api.trace')
+
+_correlation = ContextVar('correlation_id', default=None)
+_trace = ContextVar('trace', default=None)
+_config = None
+
+
+def configuration():
+    global _config
+    if _config is None:
+        config = {**DEFAULTS, **getattr(settings, 'TRACING', {})}
+        niveau = config['LEVEL']
+        config['LEVEL'] = niveau if isinstance(niveau, int) else logging.getLevelName(str(niveau).upper())
+        _config = config
+    return _config
+
+
+@receiver(setting_changed)
+def _reinitialiser(setting, **kwargs):
+    global _config
+    if setting == 'TRACING':
+        _config = None
+
+
+def correlation_id():
+    return _correlation.get()
+
+
+def trace_courante():
+    return _trace.get()
+
+
+def actif(niveau=DEBUG):
+    """Vrai si un événement de ce niveau serait émis (pour garder un bloc entier)"""
+    trace = _trace.get()
+    return trace is not None and niveau >= trace.niveau
+
+
+def evenement(niveau, message, **champs):
+    trace = _trace.get()
+    if trace is None or niveau < trace.niveau:
+        return
+    trace.emettre(niveau, message, champs)
+
+
+class Trace:
+    """Trace d'une requête échantillonnée"""
+
+    def __init__(self, correlation, niveau, max_spans):
+        self.correlation = correlation
+        self.niveau = niveau
+        self.max_spans = max_spans
+        self.debut = time.perf_counter()
+        self.spans = []
+        self.spans_ignores = 0
+
+    def emettre(self, niveau, message, champs):
+        donnees = {'correlation_id': self.correlation, 'event': message}
+        for nom, valeur in champs.items():
+            if callable(valeur):
+                try:
+                    valeur = valeur()
+                except Exception as e:  # une trace ne doit jamais faire échouer la requête
+                    valeur = f'<erreur : {e!r}>'
+            donnees[nom] = valeur
+        logger.log(niveau, json.dumps(donnees, default=str, ensure_ascii=False))
+
+    def ajouter_span(self, nom, debut, duree):
+        if len(self.spans) >= self.max_spans:
+            self.spans_ignores += 1
+            return
+        self.spans.append({
+            'name': nom,
+            'start_ms': round((debut - self.debut) * 1000, 3),
+            'ms': round(duree * 1000, 3),
+        })
+
+    def resume(self):
+        """Durée totale par nom de span"""
+        totaux = {}
+        for span in self.spans:
+            total = totaux.setdefault(span['name'], {'count': 0, 'ms': 0.0})
+            total['count'] += 1
+            total['ms'] = round(total['ms'] + span['ms'], 3)
+        return totaux
+
+
+class _SpanNul:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_SPAN_NUL = _SpanNul()
+
+
+class _Span:
+    __slots__ = ('trace', 'nom', 'debut')
+
+    def __init__(self, trace, nom):
+        self.trace = trace
+        self.nom = nom
+
+    def __enter__(self):
+        self.debut = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.ajouter_span(self.nom, self.debut, time.perf_counter() - self.debut)
+        return False
+
+
+def span(nom):
+    """Gestionnaire de contexte mesurant une section ; sans trace, objet nul partagé"""
+    trace = _trace.get()
+    return _SPAN_NUL if trace is None else _Span(trace, nom)
+
+
+def debuter(request_id=None):
+    """
+    Ouvre le contexte d'une requête : (jetons à passer à terminer(), trace ou None).
+    Utilisé par CorrelationIdMiddleware ; utilisable hors HTTP (commandes).
+    """
+    correlation = request_id if request_id and _ID_VALIDE.match(request_id) else uuid.uuid4().hex
+    trace = None
+    config = configuration()
+    if config['ENABLED'] and (config['SAMPLE_RATE'] >= 1 or random.random() < config['SAMPLE_RATE']):
+        trace = Trace(correlation, config['LEVEL'], config['MAX_SPANS'])
+    return (_correlation.set(correlation), _trace.set(trace)), trace
+
+
+def terminer(jetons):
+    _correlation.reset(jetons[0])
+    _trace.reset(jetons[1])
+
+
+class FiltreCorrelation(logging.Filter):
+    """Ajoute record.correlation_id ('-' hors requête) pour les formats de journal"""
+
+    def filter(self, record):
+        record.correlation_id = _correlation.get() or '-'
+        return True
+
+
+class TracageVueMixin:
+    """
+    Spans des ViewSets DRF : vérifications de permissions, évaluation du
+    queryset (page ou objet) et sérialisation. Sans trace, les méthodes DRF
+    d'origine sont appelées directement.
+    """
+
+    def check_permissions(self, request):
+        with span('permissions'):
+            super().check_permissions(request)
+
+    def check_object_permissions(self, request, obj):
+        with span('permissions.objet'):
+            super().check_object_permissions(request, obj)
+
+    def paginate_queryset(self, queryset):
+        with span('queryset'):
+            return super().paginate_queryset(queryset)
+
+    def get_object(self):
+        with span('queryset.objet'):
+            return super().get_object()
+
+    def list(self, request, *args, **kwargs):
+        if _trace.get() is None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            with span('serialisation'):
+                data = serializer.data
+            return self.get_paginated_response(data)
+        serializer = self.get_serializer(queryset, many=True)
+        # Sans pagination, le queryset est évalué pendant la sérialisation
+        with span('serialisation'):
+            data = serializer.data
+        return Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        if _trace.get() is None:
+            return super().retrieve(request, *args, **kwargs)
+        serializer = self.get_serializer(self.get_object())
+        with span('serialisation'):
+            data = serializer.data
+        return Response(data)
@@ -3,6 +3,8 @@ from rest_framework.routers import DefaultRouter
 from rest_framework_nested.routers import NestedDefaultRouter
 from rest_framework_simplejwt.views import TokenRefreshView
 
+from . import login
+from .streaming import flux_evenements
 from .views import (ServiceViewSet, UtilisateurViewSet, 
                    ProjetViewSet, TacheViewSet, CommentaireViewSet,
                    ConversationViewSet, MessageViewSet, PieceJointeViewSet, PretEmployeViewSet, ModeUrgenceViewSet, NotificationViewSet, # Ajout
@@ -10,7 +12,8 @@ from .views import (ServiceViewSet, UtilisateurViewSet,
                    UserCreateAPIView, get_user_details,
                    check_username_availability, check_email_availability,
                    get_calendar_events, create_calendar_event, update_calendar_event, 
-                   delete_calendar_event, get_analytics_data, upload_profile_photo, change_password, ServiceManagerCreateAPIView, get_public_services, me_profile, DebugPermissionsView)
+                   delete_calendar_event, get_analytics_data, get_analytics_timeseries, get_analytics_cache_stats, upload_profile_photo, change_password, ServiceManagerCreateAPIView, get_public_services, me_profile, DebugPermissionsView,
+                   get_permissions_catalog)
 
 # Configurer le routeur pour les ViewSets (endpoints harmonisés en anglais)
 router = DefaultRouter()
@@ -29,9 +32,11 @@ conversations_router = NestedDefaultRouter(router, r'conversations', lookup='con
 conversations_router.register(r'messages', MessageViewSet, basename='conversation-messages')
 
 urlpatterns = [
+    path('events/stream/', flux_evenements, name='api/events_stream'),
     path('', include(router.urls)),
     path('', include(conversations_router.urls)),
-    path('token/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
+    # LOGIN_THROUGHPUT=1 : vue asynchrone à haut débit, même réponse (api/login.py)
+    path('token/', login.connexion if login.configuration()['ENABLED'] else CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('me/', me_profile, name='api/me_profile'),
     path('register/', UserCreateAPIView.as_view(), name='api/register'),
@@ -41,11 +46,14 @@ urlpatterns = [
     path('me/change-password/', change_password, name='api/change_password'),
     path('check-username/', check_username_availability, name='api/check_username'),
     path('check-email/', check_email_availability, name='api/check_email'),
+    path('permissions/catalog/', get_permissions_catalog, name='api/permissions_catalog'),
     path('calendar/events/', get_calendar_events, name='api/calendar_events'),
     path('calendar/events/create/', create_calendar_event, name='api/create_calendar_event'),
     path('calendar/events/<str:event_id>/', update_calendar_event, name='api/update_calendar_event'),
     path('calendar/events/<str:event_id>/delete/', delete_calendar_event, name='api/delete_calendar_event'),
     path('analytics/', get_analytics_data, name='api/analytics_data'),
+    path('analytics/cache-stats/', get_analytics_cache_stats, name='api/analytics_cache_stats'),
+    path('analytics/timeseries/', get_analytics_timeseries, name='api/analytics_timeseries'),
     path('public-services/', get_public_services, name='api/public_services'),
 ]
 urlpatterns += [
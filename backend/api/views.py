@@ -6,11 +6,15 @@ from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
+from django.db import transaction
 from django.db.models import Q
+from django.utils import timezone
 from django.http import HttpResponse, Http404, JsonResponse
 from django.core.exceptions import ValidationError
-from datetime import datetime
+from datetime import date, datetime, timedelta
+import logging
 import mimetypes
+import uuid
 import os
 from django.conf import settings
 from django.contrib.sites.shortcuts import get_current_site
@@ -22,114 +26,71 @@ from .serializers import (
     UserCreateSerializer, UserSerializer,
     ConversationSerializer, MessageSerializer, PieceJointeSerializer,
     PretEmployeSerializer, ModeUrgenceSerializer, NotificationSerializer,
-    ServiceManagerCreateSerializer
+    NotificationFiltreSerializer, ServiceManagerCreateSerializer
 )
-from .permissions import IsAdminUser, IsChefServiceOrReadOnly, IsAdminOrReadOnly
+from .permissions import IsAdminUser, IsChefServiceOrReadOnly, IsAdminOrReadOnly, RolesDeLaRoute
+from .access import ACCES_TACHES
+from .authentication import ajouter_revendications
+from .broker import publier_statuts_taches
+from .fieldsets import ChampsSelectifsViewSetMixin
+from .identity import identite
+from .notifications import LotNotifications, notifier_assignation, notifier_changement_statut
+from .tracing import TracageVueMixin
+from . import analytics, capacity, notification_counters, provisioning, role_permissions, rollups, task_bulk, tracing, workload
 from rest_framework.views import APIView
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
+
+logger = logging.getLogger(__name__)
 
 class IsAdminOrDirectorOrManager(BasePermission):
     def has_permission(self, request, view):
-        user = request.user
-        if not hasattr(user, 'utilisateur'):
-            return False
-        return user.utilisateur.role in ['ADMIN', 'DIRECTOR', 'MANAGER']
+        return identite(request).role in ('ADMIN', 'DIRECTOR', 'MANAGER')
 
 class IsAdminOrDirector(BasePermission):
     def has_permission(self, request, view):
-        user = request.user
-        if not hasattr(user, 'utilisateur'):
-            return False
-        return user.utilisateur.role in ['ADMIN', 'DIRECTOR']
+        return identite(request).role in ('ADMIN', 'DIRECTOR')
 
 class IsAdmin(BasePermission):
     def has_permission(self, request, view):
-        user = request.user
-        if not hasattr(user, 'utilisateur'):
-            return False
-        return user.utilisateur.role == 'ADMIN'
+        return identite(request).role == 'ADMIN'
 
 class IsManagerOrAdmin(BasePermission):
     def has_permission(self, request, view):
-        user = request.user
-        if not hasattr(user, 'utilisateur'):
-            return False
-        return user.utilisateur.role in ['ADMIN', 'MANAGER']
+        return identite(request).role in ('ADMIN', 'MANAGER')
 
 class IsTaskOwnerOrManagerOrAdmin(BasePermission):
+    """Accès aux tâches selon la politique déclarative api/access.py"""
+
     def has_permission(self, request, view):
-        """Vérifie les permissions générales avant d'accéder à l'objet"""
-        user = request.user
-        if not hasattr(user, 'utilisateur'):
-            print(f"DEBUG: User {getattr(user, 'username', 'inconnu')} has no utilisateur profile (has_permission)")
-            return False
-        
-        util = user.utilisateur
-        print(f"DEBUG: has_permission - User {getattr(user, 'username', 'inconnu')} has role {util.role}")
-        
         # Tous les utilisateurs authentifiés avec un profil peuvent accéder aux tâches
-        return True
-    
+        return bool(identite(request).utilisateur_id)
+
     def has_object_permission(self, request, view, obj):
-        user = request.user
-        if not hasattr(user, 'utilisateur'):
-            print(f"DEBUG: User {getattr(user, 'username', 'inconnu')} has no utilisateur profile")
-            return False
-        
-        util = user.utilisateur
-        print(f"DEBUG: User {getattr(user, 'username', 'inconnu')} has role {util.role}")
-        print(f"DEBUG: Task service: {obj.service}, User service: {util.service}")
-        print(f"DEBUG: Task creator: {obj.creator}, User: {util}")
-        print(f"DEBUG: User in assignees: {util in obj.assignees.all()}")
-        
-        # Admin peut accéder à tout sauf aux tâches personnelles d'autres utilisateurs
-        if util.role == 'ADMIN':
-            # Si c'est une tâche personnelle, vérifier que l'admin en est le créateur
-            if obj.type == 'personnel' and obj.creator != util:
-                print(f"DEBUG: Admin access denied for personal task of another user")
-                return False
-            print(f"DEBUG: Admin access granted for {getattr(user, 'username', 'inconnu')}")
-            return True
-        
-        # Vérifier les accès de base
-        is_creator = obj.creator == util
-        is_assignee = util in obj.assignees.all()
-        is_same_service = obj.service == util.service
-        
-        # Manager peut accéder aux tâches de son service ou qu'il a créées
-        if util.role == 'MANAGER':
-            if is_creator or is_same_service:
-                print(f"DEBUG: Manager access granted for {getattr(user, 'username', 'inconnu')}")
-                return True
-        
-        # Vérifier l'accès par projet
-        if obj.project:
-            from .models import Projet
-            try:
-                projet = Projet.objects.get(id=obj.project.id)
-                is_project_chef = projet.chef == util
-                is_project_member = util in projet.membres.all()
-                is_project_service_member = (util.service and 
-                                           (projet.service == util.service or util.service in projet.services.all()))
-                
-                if is_project_chef or is_project_member or is_project_service_member:
-                    print(f"DEBUG: Project member access granted for {getattr(user, 'username', 'inconnu')}")
-                    return True
-            except Projet.DoesNotExist:
-                pass
-        
-        # Vérifier l'accès par service
-        if obj.service and util.service == obj.service:
-            print(f"DEBUG: Service member access granted for {getattr(user, 'username', 'inconnu')}")
-            return True
-        
-        # Accès de base : créateur ou assigné
-        if is_creator or is_assignee:
-            print(f"DEBUG: Basic access granted for {getattr(user, 'username', 'inconnu')}")
-            return True
-        
-        print(f"DEBUG: Access denied for {getattr(user, 'username', 'inconnu')}")
-        return False
+        # Une seule requête EXISTS, quelle que soit la taille du projet
+        return ACCES_TACHES.autorise(identite(request), obj)
+
+def _fenetre(params, defaut_jours, maximum, vers_le_passe=False):
+    """
+    Fenêtre [start, end] (AAAA-MM-JJ) des paramètres de requête : (debut, fin),
+    ou une Response 400. Par défaut, les defaut_jours jours à partir
+    d'aujourd'hui (jusqu'à aujourd'hui si vers_le_passe) ; au plus maximum jours.
+    """
+    try:
+        if vers_le_passe:
+            fin = date.fromisoformat(params['end']) if params.get('end') else timezone.localdate()
+            debut = date.fromisoformat(params['start']) if params.get('start') else fin - timedelta(days=defaut_jours - 1)
+        else:
+            debut = date.fromisoformat(params['start']) if params.get('start') else timezone.localdate()
+            fin = date.fromisoformat(params['end']) if params.get('end') else debut + timedelta(days=defaut_jours - 1)
+    except ValueError:
+        return Response({'error': 'Dates invalides, format attendu : AAAA-MM-JJ'}, status=status.HTTP_400_BAD_REQUEST)
+    if debut > fin or (fin - debut).days >= maximum:
+        return Response(
+            {'error': f'La fenêtre doit compter de 1 à {maximum} jours'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    return debut, fin
+
 
 # ViewSets pour les opérations CRUD standard
 class ServiceViewSet(viewsets.ModelViewSet):
@@ -138,8 +99,7 @@ class ServiceViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAdminOrDirectorOrManager]
 
     def get_queryset(self):
-        user = self.request.user
-        utilisateur = getattr(user, 'utilisateur', None)
+        utilisateur = identite(self.request).utilisateur
         if not utilisateur:
             return Service.objects.none()
         if utilisateur.role == 'ADMIN' or utilisateur.role == 'DIRECTOR':
@@ -150,7 +110,35 @@ class ServiceViewSet(viewsets.ModelViewSet):
             else:
                 return Service.objects.none()
         return Service.objects.none()
-    
+
+    @action(detail=False, methods=['get'], url_path='load')
+    def load(self, request):
+        """
+        Charge de travail face à la capacité, par jour, pour tous les services
+        (et leurs utilisateurs) : compteurs incrémentaux de api/workload.py.
+        Paramètres : start / end (AAAA-MM-JJ, par défaut les 30 prochains jours).
+        Un manager voit le détail par utilisateur de son seul service.
+        """
+        fenetre = _fenetre(request.query_params, 30, workload.FENETRE_MAX)
+        if isinstance(fenetre, Response):
+            return fenetre
+        debut, fin = fenetre
+        contexte = identite(request)
+        services_detailles = None if contexte.role in ('ADMIN', 'DIRECTOR') else [contexte.service_id]
+        return Response(workload.rapport(debut, fin, services_detailles))
+
+    @action(detail=False, methods=['get'], url_path='capacity')
+    def capacity(self, request):
+        """
+        Capacité effective par service et par jour, prêts d'employés approuvés
+        ou en cours compris (api/capacity.py). Paramètres : start / end
+        (AAAA-MM-JJ, par défaut les 30 prochains jours).
+        """
+        fenetre = _fenetre(request.query_params, 30, capacity.FENETRE_MAX)
+        if isinstance(fenetre, Response):
+            return fenetre
+        return Response(capacity.rapport(*fenetre))
+
 # Garde la compatibilité avec le code existant
 ServiceViewSet = ServiceViewSet
 
@@ -159,12 +147,13 @@ class UtilisateurViewSet(viewsets.ModelViewSet):
     serializer_class = UtilisateurDetailleSerializer
 
     def get_permissions(self):
-        user = self.request.user
-        utilisateur = getattr(user, 'utilisateur', None)
+        utilisateur = identite(self.request).utilisateur
         
         # Autoriser les actions 'me' et 'upload_profile_photo' à tout utilisateur connecté
         if hasattr(self, 'action') and self.action in ['me', 'upload_profile_photo']:
             return [IsAuthenticated()]
+        if getattr(self, 'action', None) == 'import_users':
+            return [IsAdmin()]
         
         # Pour les autres actions, vérifier les permissions selon le rôle
         if not utilisateur:
@@ -184,22 +173,22 @@ class UtilisateurViewSet(viewsets.ModelViewSet):
         return [IsAdmin()]
 
     def get_queryset(self):
-        user = self.request.user
-        utilisateur = getattr(user, 'utilisateur', None)
+        utilisateur = identite(self.request).utilisateur
         if not utilisateur:
             return Utilisateur.objects.none()
+        queryset = Utilisateur.objects.select_related('user', 'service')
         if utilisateur.role == 'ADMIN' or utilisateur.role == 'DIRECTOR':
-            return Utilisateur.objects.all()
+            return queryset
         elif utilisateur.role == 'MANAGER':
             if utilisateur.service:
-                return Utilisateur.objects.filter(service=utilisateur.service)
+                return queryset.filter(service=utilisateur.service)
             else:
-                return Utilisateur.objects.filter(id=utilisateur.id)
-        return Utilisateur.objects.filter(id=utilisateur.id)
+                return queryset.filter(id=utilisateur.id)
+        return queryset.filter(id=utilisateur.id)
 
     @action(detail=False, methods=['post'], url_path='me/upload-profile-photo', permission_classes=[IsAuthenticated], parser_classes=[MultiPartParser, FormParser])
     def upload_profile_photo(self, request):
-        utilisateur = getattr(request.user, 'utilisateur', None)
+        utilisateur = identite(request).utilisateur
         if not utilisateur:
             return Response({'error': 'Profil utilisateur introuvable.'}, status=400)
         file = request.FILES.get('photo_profil')
@@ -220,20 +209,46 @@ class UtilisateurViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'], url_path='me', permission_classes=[IsAuthenticated])
     def me(self, request):
-        utilisateur = getattr(request.user, 'utilisateur', None)
+        utilisateur = identite(request).utilisateur
         if not utilisateur:
             return Response({'error': 'Profil utilisateur introuvable.'}, status=400)
         serializer = self.get_serializer(utilisateur)
         return Response(serializer.data)
 
-class ProjetViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser, FormParser, JSONParser])
+    def import_users(self, request):
+        """
+        Import en masse (api/provisioning.py) : fichier CSV / JSON lines dans
+        le champ 'file', ou liste JSON {"users": [...]} ; ?dry_run=true valide
+        sans rien créer. Les lignes en erreur sont retournées avec leur numéro.
+        """
+        simulation = str(request.data.get('dry_run', request.query_params.get('dry_run', ''))).lower() in ('1', 'true')
+        fichier = request.FILES.get('file')
+        if fichier is not None:
+            format_ = request.data.get('format') or provisioning.detecter_format(fichier.name)
+            if format_ not in provisioning.FORMATS:
+                return Response({'format': f"Format inconnu : {format_}."}, status=status.HTTP_400_BAD_REQUEST)
+            lignes = provisioning.lire_lignes(fichier.file, format_)
+        elif isinstance(request.data.get('users'), list):
+            lignes = enumerate(
+                (ligne if isinstance(ligne, dict) else None for ligne in request.data['users']), 1
+            )
+        else:
+            return Response(
+                {'error': "Fichier 'file' ou liste 'users' attendu."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        import_ = provisioning.Import(processus=provisioning.PROCESSUS_REQUETE, simulation=simulation)
+        for _ in import_.executer(lignes):
+            pass
+        return Response(import_.resultat())
+
+class ProjetViewSet(TracageVueMixin, ChampsSelectifsViewSetMixin, viewsets.ModelViewSet):
     queryset = Projet.objects.all()
     serializer_class = ProjetSerializer
     permission_classes = [IsAdminOrDirectorOrManager]
 
     def get_permissions(self):
-        user = self.request.user
-        utilisateur = getattr(user, 'utilisateur', None)
+        utilisateur = identite(self.request).utilisateur
         if not utilisateur:
             return [IsAdminOrDirectorOrManager()]
         if utilisateur.role in ['ADMIN', 'DIRECTOR', 'MANAGER']:
@@ -254,7 +269,7 @@ class ProjetViewSet(viewsets.ModelViewSet):
         if not query:
             return Response([], status=status.HTTP_200_OK)
 
-        results = self.get_queryset().filter(
+        results = self.filter_queryset(self.get_queryset()).filter(
             Q(name__icontains=query) | Q(description__icontains=query)
         )
         serializer = self.get_serializer(results, many=True)
@@ -266,137 +281,99 @@ class ProjetViewSet(viewsets.ModelViewSet):
     def perform_update(self, serializer):
         serializer.save()
 
-class TacheViewSet(viewsets.ModelViewSet):
+class TacheViewSet(TracageVueMixin, ChampsSelectifsViewSetMixin, viewsets.ModelViewSet):
     queryset = Tache.objects.all()
     serializer_class = TacheSerializer
-    permission_classes = [IsAuthenticated, IsTaskOwnerOrManagerOrAdmin]
+    permission_classes = [IsAuthenticated, RolesDeLaRoute, IsTaskOwnerOrManagerOrAdmin]
 
     def get_permissions(self):
         # Pour la création, vérifier seulement le rôle
         if self.action == 'create':
             class CanCreateTask(BasePermission):
                 def has_permission(self, request, view):
-                    user = request.user
-                    utilisateur = getattr(user, 'utilisateur', None)
-                    if not utilisateur:
-                        return False
                     # ADMIN et MANAGER peuvent créer des tâches
-                    return utilisateur.role in ['ADMIN', 'MANAGER']
-            return [IsAuthenticated(), CanCreateTask()]
+                    return identite(request).role in ['ADMIN', 'MANAGER']
+            return [IsAuthenticated(), RolesDeLaRoute(), CanCreateTask()]
         return super().get_permissions()
 
     def create(self, request, *args, **kwargs):
         user = request.user
-        utilisateur = getattr(user, 'utilisateur', None)
-        
-        # Logs de débogage
-        print(f"DEBUG: TacheViewSet.create - User: {user.username}")
-        print(f"DEBUG: TacheViewSet.create - Utilisateur: {utilisateur}")
-        print(f"DEBUG: TacheViewSet.create - Role: {getattr(utilisateur, 'role', 'None') if utilisateur else 'None'}")
-        print(f"DEBUG: TacheViewSet.create - has_perm('api.add_tache'): {user.has_perm('api.add_tache')}")
-        print(f"DEBUG: TacheViewSet.create - User permissions: {list(user.get_all_permissions())}")
-        
+        utilisateur = identite(request).utilisateur
+
+        # Champs appelables : évalués (requêtes comprises) seulement si l'événement est émis
+        tracing.evenement(
+            tracing.DEBUG, 'tache.create',
+            username=user.username,
+            role=utilisateur.role if utilisateur else None,
+            has_perm_add_tache=lambda: user.has_perm('api.add_tache'),
+            permissions=lambda: sorted(user.get_all_permissions()),
+        )
+
         if not utilisateur:
-            print("DEBUG: TacheViewSet.create - Pas de profil utilisateur")
+            tracing.evenement(tracing.INFO, 'tache.create.refus', raison='sans_profil')
             return Response({'error': "Profil utilisateur non trouvé."}, status=status.HTTP_403_FORBIDDEN)
         
         if utilisateur.role not in ['ADMIN', 'MANAGER']:
-            print(f"DEBUG: TacheViewSet.create - Rôle non autorisé: {utilisateur.role}")
+            tracing.evenement(tracing.INFO, 'tache.create.refus', raison='role', role=utilisateur.role)
             return Response({'error': "Vous n'avez pas la permission de créer une tâche."}, status=status.HTTP_403_FORBIDDEN)
         
         # Simplifier : si c'est un ADMIN ou MANAGER, autoriser la création
         # La vérification de permission Django peut être problématique
-        print("DEBUG: TacheViewSet.create - Autorisation accordée")
         return super().create(request, *args, **kwargs)
 
     def get_queryset(self):
-        user = self.request.user
-        utilisateur = getattr(user, 'utilisateur', None)
-        if not utilisateur:
+        # Même politique que le contrôle d'accès au détail (api/access.py) :
+        # semi-jointure sur l'index de visibilité, moins les refus par rôle
+        contexte = identite(self.request)
+        if not contexte.utilisateur_id:
             return Tache.objects.none()
-        
-        # Construire la requête de base
-        queryset = Tache.objects.none()
-        
-        # Tâches créées par l'utilisateur (tous types)
-        queryset |= Tache.objects.filter(creator=utilisateur)
-        
-        # Tâches assignées à l'utilisateur (tous types)
-        queryset |= Tache.objects.filter(assignees=utilisateur)
-        
-        # Tâches de service : si l'utilisateur est membre du service
-        if utilisateur.service:
-            queryset |= Tache.objects.filter(service=utilisateur.service)
-        
-        # Tâches de projet : si l'utilisateur est membre du projet
-        # Récupérer tous les projets où l'utilisateur est membre
-        from .models import Projet
-        projet_filters = Q(chef=utilisateur) | Q(membres=utilisateur)  # Chef ou membre direct
-        
-        # Ajouter le filtre service si l'utilisateur a un service
-        if utilisateur.service:
-            projet_filters |= Q(service=utilisateur.service) | Q(services=utilisateur.service)
-        
-        projets_membre = Projet.objects.filter(projet_filters)
-        if projets_membre.exists():
-            queryset |= Tache.objects.filter(project__in=projets_membre)
-        
-        # Pour les managers, ajouter les tâches de leur service
-        if utilisateur.role == 'MANAGER' and utilisateur.service:
-            queryset |= Tache.objects.filter(service=utilisateur.service)
-        
-        return queryset.distinct()
+        return ACCES_TACHES.queryset(contexte)
 
     def perform_create(self, serializer):
         """
         Assigne l'utilisateur courant comme créateur de la tâche
         """
-        utilisateur = getattr(self.request.user, 'utilisateur', None)
-        tache = serializer.save(creator=utilisateur)
-        # Notifier tous les assignés sauf le créateur
-        assignes = tache.assignees.exclude(id=tache.creator.id) if tache.creator else tache.assignees.all()
-        for user in assignes:
-            Notification.objects.create(
-                utilisateur=user,
-                type='task_assigned',
-                titre='Nouvelle tâche assignée',
-                message=f'La tâche "{tache.title}" vous a été assignée.',
-                priorite='medium',
-                related_id=tache.id
-            )
+        utilisateur = identite(self.request).utilisateur
+        # L'événement de notification (outbox) est validé avec la tâche
+        with transaction.atomic():
+            tache = serializer.save(creator=utilisateur)
+            # Notifier tous les assignés sauf le créateur
+            assignes = tache.assignees.exclude(id=tache.creator_id) if tache.creator_id else tache.assignees.all()
+            lot = LotNotifications()
+            notifier_assignation(lot, tache, assignes)
+            lot.envoyer()
 
     def perform_update(self, serializer):
-        old_instance = self.get_object()
-        old_status = old_instance.status
-        tache = serializer.save()
-        # Si le statut a changé, notifier tous les assignés et le créateur
-        if tache.status != old_status:
-            destinataires = list(tache.assignees.all())
-            if tache.creator and tache.creator not in destinataires:
-                destinataires.append(tache.creator)
-            for user in destinataires:
-                Notification.objects.create(
-                    utilisateur=user,
-                    type='status_update',
-                    titre='Statut de tâche modifié',
-                    message=f'Le statut de la tâche "{tache.title}" est passé à {tache.status}.',
-                    priorite='medium',
-                    related_id=tache.id
-                )
+        # L'instance vient déjà de get_object() dans update() : inutile de la relire
+        old_status = serializer.instance.status
+        with transaction.atomic():
+            tache = serializer.save()
+            # Si le statut a changé, notifier tous les assignés et le créateur :
+            # un seul événement, quel que soit le nombre de destinataires
+            if tache.status != old_status:
+                destinataires = list(tache.assignees.values_list('id', flat=True)) + [tache.creator_id]
+                lot = LotNotifications()
+                notifier_changement_statut(lot, tache, destinataires)
+                lot.envoyer()
+                publier_statuts_taches([tache])
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        Opérations groupées (create / update / assign / delete) appliquées
+        en une transaction, avec un résultat par élément : voir api/task_bulk.py.
+        """
+        code, corps = task_bulk.executer(request)
+        return Response(corps, status=code)
 
     def get_object(self):
         """
-        Récupère l'objet avec des logs de débogage
+        Récupère l'objet ; échecs (404, 403) tracés avec la clé demandée
         """
-        pk = self.kwargs.get('pk')
-        print(f"DEBUG: Looking for task with pk: {pk}")
-        
         try:
-            obj = super().get_object()
-            print(f"DEBUG: Found task: {obj.title} (ID: {obj.id})")
-            return obj
+            return super().get_object()
         except Exception as e:
-            print(f"DEBUG: Error getting task with pk {pk}: {e}")
+            tracing.evenement(tracing.INFO, 'tache.get_object.echec', pk=self.kwargs.get('pk'), erreur=repr(e))
             raise
     
     def get_serializer_context(self):
@@ -415,7 +392,7 @@ class TacheViewSet(viewsets.ModelViewSet):
         if not query:
             return Response([], status=status.HTTP_200_OK)
 
-        results = self.get_queryset().filter(
+        results = self.filter_queryset(self.get_queryset()).filter(
             Q(title__icontains=query) | Q(description__icontains=query)
         )
         serializer = self.get_serializer(results, many=True)
@@ -428,36 +405,35 @@ class CommentaireViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated] # Tout utilisateur connecté peut commenter
 
     def perform_create(self, serializer):
-        commentaire = serializer.save()
-        mentions = commentaire.mentions or []
-        from .models import Utilisateur, Notification
-        for username in mentions:
-            try:
-                user = Utilisateur.objects.get(user__username=username)
-                Notification.objects.create(
-                    utilisateur=user,
-                    type='comment_mention',
-                    titre='Vous avez été mentionné',
-                    message=f'Vous avez été mentionné dans un commentaire sur la tâche "{commentaire.tache.title}".',
-                    priorite='medium',
-                    related_id=commentaire.tache.id
-                )
-            except Utilisateur.DoesNotExist:
-                continue
+        with transaction.atomic():
+            commentaire = serializer.save()
+            mentions = commentaire.mentions or []
+            if not mentions:
+                return
+            from .models import Utilisateur
+            lot = LotNotifications()
+            lot.ajouter(
+                Utilisateur.objects.filter(user__username__in=mentions),
+                type='comment_mention',
+                titre='Vous avez été mentionné',
+                message=f'Vous avez été mentionné dans un commentaire sur la tâche "{commentaire.tache.title}".',
+                priorite='medium',
+                related_id=commentaire.tache_id
+            )
+            lot.envoyer()
 
     def has_object_permission(self, request, view, obj):
-        user = request.user
-        if not hasattr(user, 'utilisateur'):
+        util = identite(request).utilisateur
+        if not util:
             return False
-        util = user.utilisateur
         # Admin peut tout faire
         if util.role == 'ADMIN':
             return True
         # Manager du service peut tout faire sur les commentaires de son service
-        if util.role == 'MANAGER' and obj.tache.service == util.service:
+        if util.role == 'MANAGER' and obj.tache.service_id == util.service_id:
             return True
         # Auteur du commentaire
-        if obj.auteur == util:
+        if obj.auteur_id == util.id:
             return True
         return False
 
@@ -475,8 +451,7 @@ class ConversationViewSet(viewsets.ModelViewSet):
         pour l'utilisateur actuellement authentifié.
         """
         # Assurer que le profil utilisateur existe
-        user = getattr(self.request, 'user', None)
-        utilisateur = getattr(user, 'utilisateur', None)
+        utilisateur = identite(self.request).utilisateur
         if utilisateur:
             return utilisateur.conversations.all()
         return Conversation.objects.none()
@@ -487,8 +462,7 @@ class ConversationViewSet(viewsets.ModelViewSet):
         automatiquement aux participants.
         """
         conversation = serializer.save()
-        user = getattr(self.request, 'user', None)
-        utilisateur = getattr(user, 'utilisateur', None)
+        utilisateur = identite(self.request).utilisateur
         if utilisateur:
             conversation.participants.add(utilisateur)
 
@@ -498,6 +472,8 @@ class MessageViewSet(viewsets.ModelViewSet):
     """
     serializer_class = MessageSerializer
     permission_classes = [IsAuthenticated]
+    # Fil de discussion : du plus ancien au plus récent
+    keyset_ordering = ('date_creation', 'id')
 
     def get_queryset(self):
         """
@@ -513,8 +489,7 @@ class MessageViewSet(viewsets.ModelViewSet):
         """
         Crée un message dans la conversation et l'associe à l'auteur.
         """
-        user = getattr(self.request, 'user', None)
-        utilisateur = getattr(user, 'utilisateur', None)
+        utilisateur = identite(self.request).utilisateur
         conversation_pk = self.kwargs.get('conversation_pk')
         if not utilisateur:
             raise serializers.ValidationError("L'utilisateur n'a pas de profil.")
@@ -575,6 +550,11 @@ class UserCreateAPIView(generics.CreateAPIView):
             }, status=status.HTTP_400_BAD_REQUEST)
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        # Rôle, service et groupes dans le jeton (ClaimsJWTAuthentication)
+        return ajouter_revendications(super().get_token(user), user)
+
     def validate(self, attrs):
         from typing import Any
         data: dict[str, Any] = super().validate(attrs)
@@ -624,7 +604,8 @@ def get_user_profile(request):
         # Exposer les permissions Django dans 'permissions'
         data['permissions'] = django_permissions
     except Exception as e:
-        print(f"Erreur lors de l'ajout des permissions: {e}")
+        logger.exception("Permissions du profil indisponibles")
+        tracing.evenement(tracing.ERROR, 'profil.permissions.erreur', erreur=repr(e))
         data['permissions'] = []
     return Response(data)
 
@@ -638,7 +619,7 @@ from .serializers import UtilisateurDetailleSerializer
 @api_view(['GET', 'PUT', 'PATCH'])
 @permission_classes([IsAuthenticated])
 def me_profile(request):
-    utilisateur = getattr(request.user, 'utilisateur', None)
+    utilisateur = identite(request).utilisateur
     if not utilisateur:
         return Response({'error': "Profil utilisateur manquant"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -672,7 +653,7 @@ def get_user_details(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def upload_profile_photo(request):
-    utilisateur = getattr(request.user, 'utilisateur', None)
+    utilisateur = identite(request).utilisateur
     if not utilisateur:
         return Response({'error': 'Profil utilisateur introuvable.'}, status=400)
     file = request.FILES.get('photo_profil')
@@ -727,6 +708,16 @@ def check_email_availability(request):
     exists = User.objects.filter(email=email).exists()
     return Response({'available': not exists})
 
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_permissions_catalog(request):
+    """Catalogue versionné des codenames, référence du format ?permissions_format=bitset."""
+    version, codenames = role_permissions.catalogue()
+    response = Response({'version': version, 'codenames': codenames})
+    response['Cache-Control'] = 'private, max-age=300'
+    return response
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_calendar_events(request):
@@ -968,75 +959,73 @@ def delete_calendar_event(request, event_id):
         return Response({'error': str(e)}, status=400)
 
 @api_view(['GET'])
-@permission_classes([IsAdminOrDirectorOrManager])
+@permission_classes([RolesDeLaRoute, IsAdminOrDirectorOrManager])
 def get_analytics_data(request):
     """
     Endpoint pour récupérer les données analytiques pour le tableau de bord.
+    Paramètres : period (week, month, quarter, year) et service_id optionnel.
     """
-    try:
-        # Période de temps (par défaut, le mois dernier)
-        period = request.query_params.get('period', 'month')
-        # ID de service pour le filtrage
-        service_id = request.query_params.get('service_id')
-
-        # Logique pour définir les dates de début et de fin en fonction de la période
-        # (à implémenter)
-
-        # Métriques générales
-        total_tasks = Tache.objects.count()
-        completed_tasks = Tache.objects.filter(status='completed').count()
-        urgent_tasks = Tache.objects.filter(priority='urgent').count()
-        overdue_tasks = Tache.objects.filter(deadline__lt=datetime.now()).exclude(status='completed').count()
-        completion_rate = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
-
-        # Projets
-        active_projects = Projet.objects.filter(status='active').count()
-        planning_projects = Projet.objects.filter(status='planning').count()
-
-        # Performance par service
-        service_metrics = []
-        services = Service.objects.all()
-        for service in services:
-            service_tasks = Tache.objects.filter(service=service)
-            total_service_tasks = service_tasks.count()
-            completed_service_tasks = service_tasks.filter(status='completed').count()
-            service_completion_rate = (completed_service_tasks / total_service_tasks * 100) if total_service_tasks > 0 else 0
-            service_metrics.append({
-                'id': str(service.id),
-                'name': service.name,
-                'totalTasks': total_service_tasks,
-                'completedTasks': completed_service_tasks,
-                'completionRate': service_completion_rate,
-                'efficiency': 85,  # Mock data, to be calculated
-            })
+    period = request.query_params.get('period', 'month')
+    if period not in analytics.PERIODES:
+        return Response(
+            {'error': f"Période invalide, valeurs possibles : {', '.join(analytics.PERIODES)}"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    service_id = request.query_params.get('service_id') or None
+    if service_id:
+        try:
+            service_id = uuid.UUID(service_id)
+        except ValueError:
+            return Response({'error': 'service_id invalide'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(analytics.indicateurs_en_cache(period, service_id, analytics.portee(identite(request))))
 
-        # Métriques système
-        system_analytics = {
-            'activeUsers': User.objects.filter(is_active=True).count(),
-            'totalUsers': User.objects.count(),
-            'uptime': 99.9, # Mock data
-            'systemLoad': 45, # Mock data
-        }
-
-        data = {
-            'main_metrics': {
-                'totalTasks': total_tasks,
-                'completedTasks': completed_tasks,
-                'urgentTasks': urgent_tasks,
-                'overdueTasks': overdue_tasks,
-                'completionRate': completion_rate,
-                'activeProjects': active_projects,
-                'planningProjects': planning_projects,
-                'globalEfficiency': 92, # Mock data
-            },
-            'service_performance': service_metrics,
-            'system_metrics': system_analytics,
-        }
 
-        return Response(data)
+@api_view(['GET'])
+@permission_classes([RolesDeLaRoute, IsAdmin])
+def get_analytics_cache_stats(request):
+    """Statistiques du cache des indicateurs analytiques (hit ratio, temps de recalcul)"""
+    return Response(analytics.statistiques())
 
-    except Exception as e:
-        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+@api_view(['GET'])
+@permission_classes([RolesDeLaRoute, IsAdminOrDirectorOrManager])
+def get_analytics_timeseries(request):
+    """
+    Série temporelle des tâches, lue dans les rollups quotidiens (api/rollups.py).
+    Paramètres : start / end (AAAA-MM-JJ, par défaut les 365 derniers jours ;
+    fenêtre bornée par granularité, rollups.FENETRE_MAX), granularity (day,
+    week, month), group_by (status, priority, type, service_id) et service_id
+    optionnels.
+    """
+    params = request.query_params
+    granularite = params.get('granularity', 'day')
+    if granularite not in rollups.GRANULARITES:
+        return Response(
+            {'error': f"Granularité invalide, valeurs possibles : {', '.join(rollups.GRANULARITES)}"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    fenetre = _fenetre(params, 365, rollups.FENETRE_MAX[granularite], vers_le_passe=True)
+    if isinstance(fenetre, Response):
+        return fenetre
+    debut, fin = fenetre
+    regroupement = params.get('group_by') or None
+    if regroupement and regroupement not in rollups.REGROUPEMENTS:
+        return Response(
+            {'error': f"Regroupement invalide, valeurs possibles : {', '.join(rollups.REGROUPEMENTS)}"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    service_id = params.get('service_id') or None
+    if service_id:
+        try:
+            service_id = uuid.UUID(service_id)
+        except ValueError:
+            return Response({'error': 'service_id invalide'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({
+        'start': debut.isoformat(),
+        'end': fin.isoformat(),
+        'granularity': granularite,
+        'group_by': regroupement,
+        'series': rollups.serie(debut, fin, service_id, granularite, regroupement),
+    })
 
 class PieceJointeViewSet(viewsets.ModelViewSet):
     """ViewSet pour gérer les pièces jointes"""
@@ -1045,7 +1034,7 @@ class PieceJointeViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        utilisateur = getattr(self.request.user, 'utilisateur', None)
+        utilisateur = identite(self.request).utilisateur
         if not utilisateur:
             return PieceJointe.objects.none()
         if utilisateur.role == 'ADMIN':
@@ -1071,8 +1060,7 @@ class PieceJointeViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         """Associe l'utilisateur connecté comme uploader"""
-        user = getattr(self.request, 'user', None)
-        utilisateur = getattr(user, 'utilisateur', None)
+        utilisateur = identite(self.request).utilisateur
         serializer.save(telecharge_par=utilisateur)
 
     @action(detail=False, methods=['post'], url_path='upload', parser_classes=[MultiPartParser, FormParser])
@@ -1090,7 +1078,7 @@ class PieceJointeViewSet(viewsets.ModelViewSet):
         related_to = request.data.get('related_to')
         related_id = request.data.get('related_id')
         name = request.data.get('name') or (file.name if file else None)
-        utilisateur = getattr(request.user, 'utilisateur', None)
+        utilisateur = identite(request).utilisateur
         if not file or not related_to or not related_id:
             return Response({'error': 'Champs file, related_to et related_id obligatoires.'}, status=400)
         # Vérification du type d'entité
@@ -1183,7 +1171,7 @@ class PretEmployeViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        utilisateur = getattr(self.request.user, 'utilisateur', None)
+        utilisateur = identite(self.request).utilisateur
         if not utilisateur:
             return PretEmploye.objects.none()
         if utilisateur.role == 'ADMIN':
@@ -1200,9 +1188,11 @@ class ModeUrgenceViewSet(viewsets.ModelViewSet):
     queryset = ModeUrgence.objects.all()
     serializer_class = ModeUrgenceSerializer
     permission_classes = [IsAuthenticated]
+    # ModeUrgence n'a pas de date_creation : pagination sur la date de début
+    keyset_ordering = ('-date_debut', '-id')
 
     def get_queryset(self):
-        utilisateur = getattr(self.request.user, 'utilisateur', None)
+        utilisateur = identite(self.request).utilisateur
         if not utilisateur:
             return ModeUrgence.objects.none()
         if utilisateur.role == 'ADMIN':
@@ -1217,7 +1207,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        utilisateur = getattr(self.request.user, 'utilisateur', None)
+        utilisateur = identite(self.request).utilisateur
         if not utilisateur:
             return Notification.objects.none()
         return Notification.objects.filter(utilisateur=utilisateur)
@@ -1234,6 +1224,38 @@ class NotificationViewSet(viewsets.ModelViewSet):
         self.perform_update(serializer)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['post'], url_path='mark-read')
+    def mark_read(self, request):
+        """
+        Marque lues (ou non lues avec {"read": false}) les notifications
+        sélectionnées, en une instruction. Sans filtre : toutes.
+        """
+        filtre = NotificationFiltreSerializer(data=request.data)
+        filtre.is_valid(raise_exception=True)
+        nombre = filtre.filtrer(self.get_queryset()).update(est_lue=filtre.validated_data['read'])
+        return Response({'updated': nombre})
+
+    @action(detail=False, methods=['post'], url_path='bulk-delete')
+    def bulk_delete(self, request):
+        """Supprime les notifications sélectionnées ; tout supprimer exige {"all": true}"""
+        filtre = NotificationFiltreSerializer(data=request.data)
+        filtre.is_valid(raise_exception=True)
+        if filtre.sans_filtre and not filtre.validated_data['all']:
+            return Response(
+                {'error': 'Précisez un filtre (ids, type, relatedId, olderThan, isRead) ou "all": true.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        nombre, _ = filtre.filtrer(self.get_queryset()).delete()
+        return Response({'deleted': nombre})
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """Non lues par type et par priorité, lues dans CompteurNotifications (badge)"""
+        utilisateur = identite(request).utilisateur
+        if not utilisateur:
+            return Response({'unread': 0, 'by_type': {}, 'by_priority': {}})
+        return Response(notification_counters.resume(utilisateur))
+
 class ServiceManagerCreateAPIView(APIView):
     """API pour créer un service et un manager associé en une seule opération atomique."""
     permission_classes = []  # Contrôle via admin_code
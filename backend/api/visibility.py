@@ -0,0 +1,261 @@
+"""
+Index de visibilité des tâches.
+
+Une tâche est visible par un utilisateur s'il en est :
+- le créateur (raison 'creator') ;
+- un assigné ('assignee') ;
+- membre du service responsable ('service') ;
+- membre du projet associé ('project') : chef, membre direct, ou membre du
+  service principal ou d'un service secondaire du projet.
+
+Ces règles sont matérialisées dans TacheVisibilite pour que
+TacheViewSet.get_queryset se réduise à une semi-jointure indexée.
+"""
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import Projet, Tache, TacheVisibilite, Utilisateur
+
+TAILLE_LOT = 500
+
+TacheAssignees = Tache.assignees.through
+ProjetMembres = Projet.membres.through
+ProjetServices = Projet.services.through
+
+
+def taches_visibles_reference(utilisateur):
+    """
+    Définition de référence (OR de jointures) des tâches visibles.
+    Coûteuse : utilisée uniquement pour les vérifications de cohérence.
+    """
+    filtres = Q(creator=utilisateur) | Q(assignees=utilisateur)
+    projets = Q(chef=utilisateur) | Q(membres=utilisateur)
+    if utilisateur.service_id:
+        filtres |= Q(service_id=utilisateur.service_id)
+        projets |= Q(service_id=utilisateur.service_id) | Q(services=utilisateur.service_id)
+    filtres |= Q(project__in=Projet.objects.filter(projets))
+    return Tache.objects.filter(filtres).distinct()
+
+
+def _membres_par_service(service_ids):
+    membres = defaultdict(set)
+    if service_ids:
+        for service_id, utilisateur_id in Utilisateur.objects.filter(
+            service_id__in=service_ids
+        ).values_list('service_id', 'id'):
+            membres[service_id].add(utilisateur_id)
+    return membres
+
+
+def _membres_par_projet(projet_ids):
+    """Retourne {projet_id: {utilisateur_id}} selon les règles d'appartenance au projet"""
+    membres = defaultdict(set)
+    if not projet_ids:
+        return membres
+    services_par_projet = defaultdict(set)
+    for projet_id, chef_id, service_id in Projet.objects.filter(
+        id__in=projet_ids
+    ).values_list('id', 'chef_id', 'service_id'):
+        if chef_id:
+            membres[projet_id].add(chef_id)
+        if service_id:
+            services_par_projet[projet_id].add(service_id)
+    for projet_id, utilisateur_id in ProjetMembres.objects.filter(
+        projet_id__in=projet_ids
+    ).values_list('projet_id', 'utilisateur_id'):
+        membres[projet_id].add(utilisateur_id)
+    for projet_id, service_id in ProjetServices.objects.filter(
+        projet_id__in=projet_ids
+    ).values_list('projet_id', 'service_id'):
+        services_par_projet[projet_id].add(service_id)
+
+    tous_services = set().union(*services_par_projet.values()) if services_par_projet else set()
+    membres_services = _membres_par_service(tous_services)
+    for projet_id, service_ids in services_par_projet.items():
+        for service_id in service_ids:
+            membres[projet_id] |= membres_services[service_id]
+    return membres
+
+
+def _lignes_pour_taches(taches):
+    """
+    Calcule les lignes attendues {(tache_id, utilisateur_id, reason)} à partir
+    de tuples (id, creator_id, service_id, project_id).
+    """
+    lignes = set()
+    tache_ids = [t[0] for t in taches]
+    for tache_id, creator_id, _service_id, _project_id in taches:
+        lignes.add((tache_id, creator_id, 'creator'))
+    for tache_id, utilisateur_id in TacheAssignees.objects.filter(
+        tache_id__in=tache_ids
+    ).values_list('tache_id', 'utilisateur_id'):
+        lignes.add((tache_id, utilisateur_id, 'assignee'))
+
+    membres_services = _membres_par_service({t[2] for t in taches if t[2]})
+    membres_projets = _membres_par_projet({t[3] for t in taches if t[3]})
+    for tache_id, _creator_id, service_id, project_id in taches:
+        if service_id:
+            for utilisateur_id in membres_services[service_id]:
+                lignes.add((tache_id, utilisateur_id, 'service'))
+        if project_id:
+            for utilisateur_id in membres_projets[project_id]:
+                lignes.add((tache_id, utilisateur_id, 'project'))
+    return lignes
+
+
+def _appliquer_diff(attendues, existantes):
+    """Insère les lignes manquantes et supprime les lignes obsolètes"""
+    a_supprimer = [pk for ligne, pk in existantes.items() if ligne not in attendues]
+    a_creer = [
+        TacheVisibilite(tache_id=t, utilisateur_id=u, reason=r)
+        for (t, u, r) in attendues if (t, u, r) not in existantes
+    ]
+    if a_supprimer:
+        TacheVisibilite.objects.filter(pk__in=a_supprimer).delete()
+    if a_creer:
+        TacheVisibilite.objects.bulk_create(a_creer, batch_size=TAILLE_LOT, ignore_conflicts=True)
+    return len(a_creer), len(a_supprimer)
+
+
+def synchroniser_taches(tache_ids):
+    """Recalcule les lignes de visibilité des tâches données"""
+    tache_ids = list(set(tache_ids))
+    crees = supprimees = 0
+    for i in range(0, len(tache_ids), TAILLE_LOT):
+        lot = tache_ids[i:i + TAILLE_LOT]
+        with transaction.atomic():
+            taches = list(Tache.objects.filter(id__in=lot).values_list('id', 'creator_id', 'service_id', 'project_id'))
+            attendues = _lignes_pour_taches(taches)
+            existantes = {
+                (t, u, r): pk for pk, t, u, r in TacheVisibilite.objects.filter(
+                    tache_id__in=lot
+                ).values_list('pk', 'tache_id', 'utilisateur_id', 'reason')
+            }
+            c, s = _appliquer_diff(attendues, existantes)
+            crees += c
+            supprimees += s
+    return crees, supprimees
+
+
+def synchroniser_taches_projets(projet_ids):
+    """Recalcule la visibilité de toutes les tâches des projets donnés"""
+    projet_ids = [p for p in projet_ids if p]
+    if projet_ids:
+        synchroniser_taches(Tache.objects.filter(project_id__in=projet_ids).values_list('id', flat=True))
+
+
+def synchroniser_utilisateurs(utilisateur_ids):
+    """
+    Recalcule toutes les lignes de visibilité des utilisateurs donnés
+    (ex. changement de service, qui modifie les raisons 'service' et 'project').
+    """
+    utilisateur_ids = list(set(utilisateur_ids))
+    if not utilisateur_ids:
+        return 0, 0
+    with transaction.atomic():
+        service_par_utilisateur = dict(
+            Utilisateur.objects.filter(id__in=utilisateur_ids).values_list('id', 'service_id')
+        )
+        service_ids = {s for s in service_par_utilisateur.values() if s}
+        attendues = set()
+
+        for tache_id, creator_id in Tache.objects.filter(
+            creator_id__in=utilisateur_ids
+        ).values_list('id', 'creator_id'):
+            attendues.add((tache_id, creator_id, 'creator'))
+        for tache_id, utilisateur_id in TacheAssignees.objects.filter(
+            utilisateur_id__in=utilisateur_ids
+        ).values_list('tache_id', 'utilisateur_id'):
+            attendues.add((tache_id, utilisateur_id, 'assignee'))
+
+        utilisateurs_par_service = defaultdict(set)
+        for utilisateur_id, service_id in service_par_utilisateur.items():
+            if service_id:
+                utilisateurs_par_service[service_id].add(utilisateur_id)
+        if service_ids:
+            for tache_id, service_id in Tache.objects.filter(
+                service_id__in=service_ids
+            ).values_list('id', 'service_id'):
+                for utilisateur_id in utilisateurs_par_service[service_id]:
+                    attendues.add((tache_id, utilisateur_id, 'service'))
+
+        filtre_projets = Q(chef_id__in=utilisateur_ids) | Q(membres__in=utilisateur_ids)
+        if service_ids:
+            filtre_projets |= Q(service_id__in=service_ids) | Q(services__in=service_ids)
+        projet_ids = set(Projet.objects.filter(filtre_projets).values_list('id', flat=True))
+        membres_projets = _membres_par_projet(projet_ids)
+        if projet_ids:
+            concernes = set(utilisateur_ids)
+            for tache_id, project_id in Tache.objects.filter(
+                project_id__in=projet_ids
+            ).values_list('id', 'project_id'):
+                for utilisateur_id in membres_projets[project_id] & concernes:
+                    attendues.add((tache_id, utilisateur_id, 'project'))
+
+        existantes = {
+            (t, u, r): pk for pk, t, u, r in TacheVisibilite.objects.filter(
+                utilisateur_id__in=utilisateur_ids
+            ).values_list('pk', 'tache_id', 'utilisateur_id', 'reason')
+        }
+        return _appliquer_diff(attendues, existantes)
+
+
+def _sql_lignes_attendues():
+    """Requête SQL produisant l'ensemble complet (tache_id, utilisateur_id, reason)"""
+    noms = {
+        'tache': Tache._meta.db_table,
+        'assignees': TacheAssignees._meta.db_table,
+        'utilisateur': Utilisateur._meta.db_table,
+        'projet': Projet._meta.db_table,
+        'membres': ProjetMembres._meta.db_table,
+        'services': ProjetServices._meta.db_table,
+    }
+    return """
+        SELECT t.id, t.creator_id, 'creator' FROM {tache} t
+        UNION
+        SELECT a.tache_id, a.utilisateur_id, 'assignee' FROM {assignees} a
+        UNION
+        SELECT t.id, u.id, 'service' FROM {tache} t
+            JOIN {utilisateur} u ON u.service_id = t.service_id
+        UNION
+        SELECT t.id, pm.utilisateur_id, 'project' FROM {tache} t
+            JOIN (
+                SELECT p.id AS projet_id, p.chef_id AS utilisateur_id FROM {projet} p WHERE p.chef_id IS NOT NULL
+                UNION
+                SELECT m.projet_id, m.utilisateur_id FROM {membres} m
+                UNION
+                SELECT p.id, u.id FROM {projet} p JOIN {utilisateur} u ON u.service_id = p.service_id
+                UNION
+                SELECT s.projet_id, u.id FROM {services} s JOIN {utilisateur} u ON u.service_id = s.service_id
+            ) pm ON pm.projet_id = t.project_id
+    """.format(**noms)
+
+
+def reconstruire_tout():
+    """Reconstruit entièrement l'index en une seule instruction INSERT ... SELECT"""
+    table = TacheVisibilite._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table}')
+        cursor.execute(f'INSERT INTO {table} (tache_id, utilisateur_id, reason) {_sql_lignes_attendues()}')
+        return cursor.rowcount
+
+
+def verifier_coherence(limite=20):
+    """
+    Compare l'index à la définition de référence.
+    Retourne (nb_manquantes, nb_en_trop, exemples_manquantes, exemples_en_trop).
+    """
+    table = TacheVisibilite._meta.db_table
+    attendues = _sql_lignes_attendues()
+    actuelles = f'SELECT tache_id, utilisateur_id, reason FROM {table}'
+    resultats = []
+    with connection.cursor() as cursor:
+        for requete in (f'({attendues}) EXCEPT ({actuelles})', f'({actuelles}) EXCEPT ({attendues})'):
+            cursor.execute(f'SELECT COUNT(*) FROM ({requete}) d')
+            total = cursor.fetchone()[0]
+            cursor.execute(f'{requete} LIMIT %s', [limite])
+            resultats.append((total, cursor.fetchall()))
+    (manquantes, ex_manquantes), (en_trop, ex_en_trop) = resultats
+    return manquantes, en_trop, ex_manquantes, ex_en_trop
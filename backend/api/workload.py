@@ -0,0 +1,303 @@
+"""
+Charge de travail des services et des utilisateurs, comparée à leur capacité.
+
+Les points de charge (workload_points) d'une tâche ouverte sont répartis
+uniformément sur les jours de sa création à son échéance (le jour même si
+l'échéance précède la création) :
+- sur son service (service_id) ;
+- sur ses assignés, à parts égales.
+Les tâches terminées ne comptent pas.
+
+Compteurs incrémentaux : ChargeJour est un tableau de différences par service
+ou utilisateur (+taux au premier jour, -taux au lendemain du dernier), en
+milli-points par jour. Une écriture sur une tâche ne touche donc que deux
+lignes par cible, quelle que soit la durée de la tâche. La dernière
+contribution de chaque tâche (ContributionCharge) est retranchée avant
+d'ajouter la nouvelle. Mis à jour dans la transaction de l'écriture :
+api/signals.py (save / delete de Tache, assignés, suppressions de services
+et d'utilisateurs) et les opérations groupées de api/task_bulk.py.
+
+Lecture (GET /api/services/load/) : une requête pour les compteurs, ramenés
+au premier jour de la fenêtre pour ce qui le précède, puis sommes cumulées en
+Python sur la fenêtre. Capacité journalière : Service.capacity_charge, en
+points par jour, corrigée des prêts d'employés (api/capacity.py, en cache) ;
+celle d'un utilisateur est la part égale de la capacité de son service.
+
+Initialisation (après migration) / contrôle : manage.py rebuild_workload.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, DateField, Sum, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import capacity
+from .models import ChargeJour, ContributionCharge, Service, Tache, Utilisateur
+
+TAILLE_LOT = 500
+MILLI = 1000
+FENETRE_MAX = 366
+
+TacheAssignees = Tache.assignees.through
+
+
+def contribution(tache, assignes):
+    """ContributionCharge (non enregistrée) d'une tâche, None si elle ne charge personne"""
+    if tache['status'] == 'completed' or not tache['workload_points']:
+        return None
+    debut = timezone.localdate(tache['date_creation'])
+    return ContributionCharge(
+        tache_id=tache['id'],
+        service_id=tache['service_id'],
+        utilisateurs=sorted(str(u) for u in assignes),
+        debut=debut,
+        fin=max(debut, timezone.localdate(tache['deadline'])),
+        points=tache['workload_points'],
+    )
+
+
+def _valeurs(c):
+    return (c.service_id, list(c.utilisateurs), c.debut, c.fin, c.points)
+
+
+def cumuler(deltas, c, signe=1):
+    """Ajoute (retranche) une contribution aux deltas {(service_id, utilisateur_id, jour): milli-points}"""
+    jours = (c.fin - c.debut).days + 1
+    lendemain = c.fin + timedelta(days=1)
+    cibles = []
+    if c.service_id:
+        cibles.append(((str(c.service_id), None), c.points * MILLI // jours))
+    for utilisateur_id in c.utilisateurs:
+        cibles.append(((None, utilisateur_id), c.points * MILLI // (jours * len(c.utilisateurs))))
+    for cible, taux in cibles:
+        deltas[(*cible, c.debut)] += signe * taux
+        deltas[(*cible, lendemain)] -= signe * taux
+
+
+def _ordre(element):
+    (service_id, utilisateur_id, jour), _ = element
+    return (service_id or '', utilisateur_id or '', jour)
+
+
+def appliquer(deltas):
+    """Applique les deltas (INSERT ... ON CONFLICT additif), puis supprime les lignes revenues à zéro"""
+    lignes = sorted(((cle, d) for cle, d in deltas.items() if d), key=_ordre)
+    if not lignes:
+        return 0
+    table = ChargeJour._meta.db_table
+    with connection.cursor() as cursor:
+        # Ordre de clés constant : pas d'interblocage entre transactions concurrentes
+        for debut in range(0, len(lignes), TAILLE_LOT):
+            lot = lignes[debut:debut + TAILLE_LOT]
+            cursor.execute(
+                f'INSERT INTO {table} (service_id, utilisateur_id, jour, delta) '
+                f'VALUES {", ".join(["(%s, %s, %s, %s)"] * len(lot))} '
+                f'ON CONFLICT (service_id, utilisateur_id, jour) DO UPDATE SET delta = {table}.delta + EXCLUDED.delta',
+                [v for cle, d in lot for v in (*cle, d)],
+            )
+    ChargeJour.objects.filter(jour__in={cle[2] for cle, _ in lignes}, delta=0).delete()
+    return len(lignes)
+
+
+def synchroniser_taches(tache_ids):
+    """Remplace la contribution des tâches données (supprimées comprises) par leur état courant"""
+    tache_ids = list(set(tache_ids))
+    ajustees = 0
+    for i in range(0, len(tache_ids), TAILLE_LOT):
+        lot = tache_ids[i:i + TAILLE_LOT]
+        with transaction.atomic():
+            anciennes = ContributionCharge.objects.select_for_update().in_bulk(lot)
+            assignes = defaultdict(list)
+            for tache_id, utilisateur_id in TacheAssignees.objects.filter(
+                tache_id__in=lot
+            ).values_list('tache_id', 'utilisateur_id'):
+                assignes[tache_id].append(utilisateur_id)
+            nouvelles = {}
+            for tache in Tache.objects.filter(id__in=lot).values(
+                'id', 'service_id', 'status', 'workload_points', 'date_creation', 'deadline'
+            ):
+                c = contribution(tache, assignes[tache['id']])
+                if c is not None:
+                    nouvelles[tache['id']] = c
+
+            deltas = defaultdict(int)
+            a_enregistrer, a_supprimer = [], []
+            for tache_id in lot:
+                ancienne, nouvelle = anciennes.get(tache_id), nouvelles.get(tache_id)
+                if ancienne is not None and nouvelle is not None and _valeurs(ancienne) == _valeurs(nouvelle):
+                    continue
+                if ancienne is not None:
+                    cumuler(deltas, ancienne, -1)
+                    if nouvelle is None:
+                        a_supprimer.append(tache_id)
+                if nouvelle is not None:
+                    cumuler(deltas, nouvelle)
+                    a_enregistrer.append(nouvelle)
+            if a_supprimer:
+                ContributionCharge.objects.filter(tache_id__in=a_supprimer).delete()
+            if a_enregistrer:
+                ContributionCharge.objects.bulk_create(
+                    a_enregistrer, update_conflicts=True, unique_fields=['tache_id'],
+                    update_fields=['service_id', 'utilisateurs', 'debut', 'fin', 'points'],
+                )
+            appliquer(deltas)
+            ajustees += len(a_enregistrer) + len(a_supprimer)
+    return ajustees
+
+
+def taches_des_contributions(service_id=None, utilisateur_id=None):
+    """Tâches dont la contribution mémorisée vise ce service / cet utilisateur (avant sa suppression)"""
+    contributions = ContributionCharge.objects.all()
+    if service_id:
+        contributions = contributions.filter(service_id=service_id)
+    if utilisateur_id:
+        contributions = contributions.filter(utilisateurs__contains=[str(utilisateur_id)])
+    return list(contributions.values_list('tache_id', flat=True))
+
+
+def _attendus():
+    deltas = defaultdict(int)
+    contributions = []
+    taches = Tache.objects.exclude(status='completed').filter(workload_points__gt=0)
+    assignes = defaultdict(list)
+    for tache_id, utilisateur_id in TacheAssignees.objects.filter(
+        tache__in=taches
+    ).values_list('tache_id', 'utilisateur_id'):
+        assignes[tache_id].append(utilisateur_id)
+    for tache in taches.values('id', 'service_id', 'status', 'workload_points', 'date_creation', 'deadline'):
+        c = contribution(tache, assignes[tache['id']])
+        contributions.append(c)
+        cumuler(deltas, c)
+    return contributions, deltas
+
+
+def reconstruire():
+    """Recalcule compteurs et contributions à partir des tâches ouvertes"""
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE {ContributionCharge._meta.db_table} IN EXCLUSIVE MODE')
+        ChargeJour.objects.all().delete()
+        ContributionCharge.objects.all().delete()
+        contributions, deltas = _attendus()
+        ContributionCharge.objects.bulk_create(contributions, batch_size=TAILLE_LOT)
+        return appliquer(deltas)
+
+
+def verifier(limite=20):
+    """Compteurs en écart avec les tâches : (nombre, exemples (clé, attendu, actuel))"""
+    _, attendus = _attendus()
+    attendus = {cle: d for cle, d in attendus.items() if d}
+    actuels = {
+        (str(s) if s else None, str(u) if u else None, jour): d
+        for s, u, jour, d in ChargeJour.objects.values_list('service_id', 'utilisateur_id', 'jour', 'delta')
+    }
+    ecarts = [
+        (cle, attendus.get(cle, 0), actuels.get(cle, 0))
+        for cle in set(attendus) | set(actuels)
+        if attendus.get(cle, 0) != actuels.get(cle, 0)
+    ]
+    return len(ecarts), sorted(ecarts, key=lambda e: _ordre((e[0], None)))[:limite]
+
+
+# --- Lecture ---
+
+
+def charges(debut, fin):
+    """{(service_id, utilisateur_id): [charge du jour en points, de debut à fin]}"""
+    nb_jours = (fin - debut).days + 1
+    lignes = (
+        ChargeJour.objects.filter(jour__lte=fin)
+        .annotate(j=Greatest('jour', Value(debut, output_field=DateField())))
+        .values('service_id', 'utilisateur_id', 'j').annotate(d=Sum('delta'))
+        .order_by('service_id', 'utilisateur_id', 'j')
+    )
+    differences = defaultdict(lambda: [0] * nb_jours)
+    for ligne in lignes:
+        cle = (str(ligne['service_id']) if ligne['service_id'] else None,
+               str(ligne['utilisateur_id']) if ligne['utilisateur_id'] else None)
+        differences[cle][(ligne['j'] - debut).days] += ligne['d']
+    resultat = {}
+    for cle, diffs in differences.items():
+        courant, jours = 0, []
+        for d in diffs:
+            courant += d
+            jours.append(round(courant / MILLI, 2))
+        if any(jours):
+            resultat[cle] = jours
+    return resultat
+
+
+def _resume(jours, charge, capacite):
+    """Indicateurs d'une série journalière de charge face à une série de capacité"""
+    details = [
+        {
+            'date': jour.isoformat(),
+            'load': valeur,
+            'capacity': round(cap, 2),
+            'utilization': round(100 * valeur / cap, 1) if cap else None,
+        }
+        for jour, valeur, cap in zip(jours, charge, capacite)
+    ]
+    return {
+        'peakLoad': max(charge, default=0),
+        'averageLoad': round(sum(charge) / len(charge), 2) if charge else 0,
+        'overloadedDays': sum(1 for valeur, cap in zip(charge, capacite) if valeur > cap),
+        'days': details,
+    }
+
+
+def rapport(debut, fin, services_detailles=None):
+    """
+    Charge et capacité par service (tous) et par utilisateur (services de
+    services_detailles, tous si None) sur [debut, fin].
+    """
+    jours = [debut + timedelta(days=i) for i in range((fin - debut).days + 1)]
+    series = charges(debut, fin)
+    services = list(
+        Service.objects.annotate(nb_membres=Count('utilisateurs')).order_by('name')
+        .values('id', 'name', 'capacity_charge', 'nb_membres')
+    )
+    effectives = capacity.capacites(debut, fin)
+    capacite_services = {
+        str(s['id']): effectives[str(s['id'])]['capacity'] if str(s['id']) in effectives
+        else [s['capacity_charge']] * len(jours)
+        for s in services
+    }
+    vide = [0] * len(jours)
+
+    resultat_services = []
+    for service in services:
+        service_id = str(service['id'])
+        resultat_services.append({
+            'id': service_id,
+            'name': service['name'],
+            'capacity': service['capacity_charge'],
+            'members': service['nb_membres'],
+            **_resume(jours, series.get((service_id, None), vide), capacite_services[service_id]),
+        })
+
+    membres = {str(s['id']): s['nb_membres'] for s in services}
+    utilisateurs = Utilisateur.objects.filter(id__in=[u for s, u in series if u])
+    if services_detailles is not None:
+        utilisateurs = utilisateurs.filter(service_id__in=services_detailles)
+    resultat_utilisateurs = []
+    for utilisateur in utilisateurs.order_by('user__username').values('id', 'service_id', 'user__username'):
+        service_id = str(utilisateur['service_id']) if utilisateur['service_id'] else None
+        capacite = [
+            c / membres[service_id] for c in capacite_services[service_id]
+        ] if service_id and membres.get(service_id) else [0] * len(jours)
+        resultat_utilisateurs.append({
+            'id': str(utilisateur['id']),
+            'username': utilisateur['user__username'],
+            'service_id': service_id,
+            **_resume(jours, series[(None, str(utilisateur['id']))], capacite),
+        })
+
+    return {
+        'start': debut.isoformat(),
+        'end': fin.isoformat(),
+        'services': resultat_services,
+        'users': resultat_utilisateurs,
+    }
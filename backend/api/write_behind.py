@@ -0,0 +1,68 @@
+"""
+Écriture différée (write-behind) d'un tampon en mémoire, par un thread dédié.
+
+Le tampon (AgregatVues de api/query_accounting.py, DernieresConnexions de
+api/login.py) expose flush_necessaire(config) et flush(). Le chemin de la
+requête se contente d'appeler signaler() après avoir rempli le tampon ;
+l'écriture en base se fait dans un thread démon, jamais dans la requête :
+- réveillé tout de suite quand le tampon atteint FLUSH_EVERY éléments ;
+- sinon toutes les FLUSH_INTERVAL secondes, même sans nouvelle requête : un
+  processus inactif écrit quand même ses derniers éléments ;
+- une erreur d'écriture est journalisée (le tampon remet le lot en file) ;
+- un dernier flush est tenté à l'arrêt normal du processus (atexit). Un
+  processus tué perd au plus FLUSH_INTERVAL secondes de données.
+"""
+import atexit
+import logging
+import threading
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class EcrivainDiffere:
+    def __init__(self, nom, tampon, configuration):
+        self.nom = nom
+        self.tampon = tampon
+        self.configuration = configuration
+        self._reveil = threading.Event()
+        self._verrou = threading.Lock()
+        self._thread = None
+        atexit.register(self._flush_a_l_arret)
+
+    def signaler(self):
+        """Après un ajout au tampon : démarre le thread, le réveille si l'écriture est due"""
+        self.demarrer()
+        if self.tampon.flush_necessaire(self.configuration()):
+            self._reveil.set()
+
+    def demarrer(self):
+        with self._verrou:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._boucle, name=self.nom, daemon=True)
+                self._thread.start()
+
+    def _boucle(self):
+        while True:
+            self._reveil.wait(self.configuration()['FLUSH_INTERVAL'])
+            self._reveil.clear()
+            # Configuration relue à chaque tour : l'échéance peut avoir changé pendant l'attente
+            if self.tampon.flush_necessaire(self.configuration()):
+                self.executer()
+
+    def executer(self):
+        try:
+            self.tampon.flush()
+        except Exception:
+            logger.exception("%s : écriture différée impossible, nouvel essai au prochain flush", self.nom)
+        finally:
+            # Connexions à la base propres au thread d'écriture
+            if threading.current_thread() is self._thread:
+                connections.close_all()
+
+    def _flush_a_l_arret(self):
+        try:
+            self.tampon.flush()
+        except Exception:
+            pass
@@ -49,12 +49,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.CorrelationIdMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.QueryAccountingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.RoutePolicyMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -78,6 +81,8 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'gptc_oddl.wsgi.application'
+# Le flux SSE (/api/events/stream/) nécessite un serveur ASGI
+ASGI_APPLICATION = 'gptc_oddl.asgi.application'
 
 
 # Database
@@ -95,6 +100,17 @@ DATABASES = {
 }
 
 
+# Cache partagé : numéros de version des données mises en cache (api/cache_versions.py).
+# Avec plusieurs processus, utiliser un cache commun (Redis, Memcached) pour
+# que l'invalidation soit vue par tous.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'gptc-oddl',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -164,11 +180,17 @@ CORS_ALLOW_HEADERS = [
 
 # Configuration de REST Framework
 REST_FRAMEWORK = {
+    # JWT_CLAIMS_AUTH=1 : utilisateur reconstruit depuis les revendications du
+    # jeton, sans requête sur les lectures (api/authentication.py)
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.ClaimsJWTAuthentication'
+        if os.environ.get('JWT_CLAIMS_AUTH') == '1'
+        else 'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
+    # Rôles par route déclarés dans api/route_policy.py (ROLES)
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
+        'api.permissions.RolesDeLaRoute',
     ],
     'DEFAULT_PARSER_CLASSES': [
         'rest_framework.parsers.JSONParser',
@@ -178,6 +200,90 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
+    # Pagination keyset (curseur opaque) sur (date_creation, id) : ni OFFSET ni COUNT(*)
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
+}
+
+# Comptabilité des requêtes SQL par vue (api/query_accounting.py),
+# activée avec QUERY_ACCOUNTING=1 ; rapport : manage.py query_budget_report
+QUERY_ACCOUNTING = {
+    'ENABLED': os.environ.get('QUERY_ACCOUNTING') == '1',
+    'HEADERS': DEBUG,
+    'FLUSH_EVERY': 200,
+    'FLUSH_INTERVAL': 60,
+    'TOP_DUPLICATES': 3,
+}
+
+# Traces structurées des requêtes (api/tracing.py), activées avec TRACING=1 ;
+# identifiant de corrélation X-Request-ID renvoyé dans tous les cas
+TRACING = {
+    'ENABLED': os.environ.get('TRACING') == '1',
+    'LEVEL': os.environ.get('TRACING_LEVEL', 'DEBUG' if DEBUG else 'INFO'),
+    'SAMPLE_RATE': float(os.environ.get('TRACING_SAMPLE_RATE', '1.0' if DEBUG else '0.01')),
+    'MAX_SPANS': 100,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'correlation': {'()': 'api.tracing.FiltreCorrelation'},
+    },
+    'formatters': {
+        'trace': {'format': '%(message)s'},
+        'correlation': {'format': '%(asctime)s %(levelname)s [%(correlation_id)s] %(name)s: %(message)s'},
+    },
+    'handlers': {
+        'trace': {'class': 'logging.StreamHandler', 'formatter': 'trace'},
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'correlation', 'filters': ['correlation']},
+    },
+    'loggers': {
+        'api.trace': {'handlers': ['trace'], 'level': 'DEBUG', 'propagate': False},
+        'api': {'handlers': ['console'], 'level': 'WARNING'},
+    },
+}
+
+# Connexion à haut débit (api/login.py), activée avec LOGIN_THROUGHPUT=1 :
+# vue asynchrone à servir en ASGI ; banc d'essai : manage.py bench_login
+LOGIN_THROUGHPUT = {
+    'ENABLED': os.environ.get('LOGIN_THROUGHPUT') == '1',
+    'WORKERS': int(os.environ.get('LOGIN_WORKERS', '4')),
+    'MAX_PENDING': 64,
+    'FLUSH_EVERY': 200,
+    'FLUSH_INTERVAL': 10,
+    'PERMISSIONS_TIMEOUT': 3600,
+}
+
+# Cache des indicateurs analytiques (api/analytics.py), invalidé par version
+# à chaque écriture sur les tâches et projets ; statistiques : /api/analytics/cache-stats/
+ANALYTICS_CACHE = {
+    'ENABLED': os.environ.get('ANALYTICS_CACHE', '1') == '1',
+    'TTL': 60,
+    'LOCK_TIMEOUT': 30,
+    'WAIT': 2.0,
+}
+
+# Outbox des notifications (api/notifications.py, api/outbox.py) :
+# en 'outbox', lancer `manage.py notification_worker` pour la diffusion
+NOTIFICATION_OUTBOX = {
+    'MODE': os.environ.get('NOTIFICATION_OUTBOX_MODE', 'inline' if DEBUG else 'outbox'),
+    'BATCH_SIZE': 100,
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_BASE': 2,   # délai de nouvelle tentative : BASE ** tentatives secondes
+    'BACKOFF_MAX': 300,
+    'POLL_INTERVAL': 1.0,
+}
+
+# Flux temps réel /api/events/stream/ (api/streaming.py, api/broker.py).
+# 'postgres' (LISTEN/NOTIFY) dès que plusieurs processus publient ou servent
+# les flux (workers ASGI, notification_worker) ; 'memory' : processus unique.
+EVENT_BROKER = {
+    'BACKEND': os.environ.get('EVENT_BROKER_BACKEND', 'memory' if DEBUG else 'postgres'),
+    'CHANNEL': 'gptc_events',
+    'HEARTBEAT': 20,     # secondes entre deux commentaires de maintien
+    'RETRY_MS': 3000,    # délai de reconnexion suggéré au navigateur
+    'QUEUE_SIZE': 256,
 }
 
 # Configuration JWT
@@ -189,6 +295,8 @@ SIMPLE_JWT = {
     'UPDATE_LAST_LOGIN': True,
     'AUTH_HEADER_TYPES': ('Bearer',),
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
+    # Revendications (rôle, service, groupes) relues en base à chaque rafraîchissement
+    'TOKEN_REFRESH_SERIALIZER': 'api.authentication.ClaimsTokenRefreshSerializer',
 }
 
 # Configuration des rôles et permissions
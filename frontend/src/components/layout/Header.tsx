@@ -19,14 +19,16 @@ function getProfilePhotoUrl(url?: string) {
 
 export function Header() {
   const { user, logout } = useAuth();
-  const { notifications, searchTerm, setSearchTerm, urgencyModes } = useData();
+  const { notifications, notificationSummary, searchTerm, setSearchTerm, urgencyModes } = useData();
   const { isDark, toggleTheme } = useTheme();
   const [showNotifications, setShowNotifications] = useState(false);
   const [showTaskModal, setShowTaskModal] = useState(false);
   const [showUserMenu, setShowUserMenu] = useState(false);
   const { isAdmin } = usePermissions();
   
-  const unreadCount = notifications.filter(n => !n.isRead && n.userId === user?.id).length;
+  // Compteur maintenu côté serveur ; repli sur la liste tant que le résumé n'est pas chargé
+  const unreadCount = notificationSummary?.unread
+    ?? notifications.filter(n => !n.isRead && n.userId === user?.id).length;
   const activeUrgencyMode = urgencyModes.find(mode => mode.isActive);
   const { t } = useTranslation();
   const navigate = useNavigate();
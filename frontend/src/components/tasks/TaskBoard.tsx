@@ -7,8 +7,9 @@ import { TaskColumn } from './TaskColumn';
 import { TaskModal } from '@/components/modals/TaskModal';
 import { Button } from '@/components/common/Button';
 import { useTranslation } from 'react-i18next';
-import { apiService } from '@/services/api';
+import { apiService, TASK_BOARD_FIELDS } from '@/services/api';
 import { transformTask } from '@/utils/dataTransformers';
+import { subscribeToEvents } from '@/services/eventStream';
 
 // Composant principal du tableau Kanban des tâches, avec filtres et gestion du mode urgence
 export function TaskBoard() {
@@ -21,24 +22,32 @@ export function TaskBoard() {
   const [filterPriority, setFilterPriority] = useState('all');
   const [filterAssignee, setFilterAssignee] = useState('all');
   const [filterTaskType, setFilterTaskType] = useState('all');
-  // State local pour le polling
+  // State local : chargé une fois, puis tenu à jour par le flux d'événements
   const [localTasks, setLocalTasks] = useState<Task[]>([]);
 
   useEffect(() => {
     let isMounted = true;
     const fetchTasks = async () => {
       try {
-        const data = await apiService.getTasks();
+        const data = await apiService.getTasks({ fields: TASK_BOARD_FIELDS });
         if (isMounted) setLocalTasks((data || []).map(transformTask));
       } catch (error) {
         if (isMounted) console.error('Erreur lors du rafraîchissement des tâches:', error);
       }
     };
     fetchTasks();
-    const interval = setInterval(fetchTasks, 2000);
+    const unsubscribe = subscribeToEvents((event) => {
+      if (event.type === 'task') {
+        setLocalTasks(prev => prev.map(task =>
+          task.id === event.data.id ? { ...task, status: event.data.status as Task['status'] } : task
+        ));
+      } else if (event.type === 'resync') {
+        fetchTasks();
+      }
+    });
     return () => {
       isMounted = false;
-      clearInterval(interval);
+      unsubscribe();
     };
   }, []);
 
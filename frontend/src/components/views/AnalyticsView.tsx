@@ -17,6 +17,16 @@ import { getUserPermissions } from '@/utils/permissions';
 import { useTranslation } from 'react-i18next';
 import { usePermissions } from '@/hooks/usePermissions';
 
+// Durée depuis le démarrage du serveur (ex. « 3 j 4 h », « 12 min »)
+function formatDuree(secondes: number): string {
+  const jours = Math.floor(secondes / 86400);
+  const heures = Math.floor((secondes % 86400) / 3600);
+  const minutes = Math.floor((secondes % 3600) / 60);
+  if (jours > 0) return `${jours} j ${heures} h`;
+  if (heures > 0) return `${heures} h ${minutes} min`;
+  return `${minutes} min`;
+}
+
 export default function AnalyticsView() {
   const { services } = useData();
   const { user } = useAuth();
@@ -193,7 +203,7 @@ export default function AnalyticsView() {
             <div>
               <p className="text-sm font-medium text-gray-600 dark:text-gray-400">Efficacité Globale</p>
               <p className="text-3xl font-bold text-gray-900 dark:text-white mt-2">
-                {Math.round(mainMetrics.globalEfficiency)}%
+                {mainMetrics.globalEfficiency === null ? '—' : `${Math.round(mainMetrics.globalEfficiency)}%`}
               </p>
               <p className="text-sm mt-1 text-gray-600 dark:text-gray-400">
                 → Stable
@@ -231,7 +241,10 @@ export default function AnalyticsView() {
                 
                 <div className="flex items-center justify-between text-sm text-gray-600 dark:text-gray-400">
                   <span>{dept.completedTasks}/{dept.totalTasks} tâches</span>
-                  <span>Efficacité: {Math.round(dept.efficiency)}%</span>
+                  {dept.cycleTimeHours.p50 !== null && (
+                    <span>Cycle médian: {Math.round(dept.cycleTimeHours.p50)} h</span>
+                  )}
+                  <span>Efficacité: {dept.efficiency === null ? '—' : `${Math.round(dept.efficiency)}%`}</span>
                 </div>
               </div>
             ))}
@@ -296,7 +309,7 @@ export default function AnalyticsView() {
           
           <div className="text-center">
             <div className="text-3xl font-bold text-gray-900 dark:text-white mb-2">
-              {Math.round(systemMetrics.uptime)}%
+              {formatDuree(systemMetrics.uptimeSeconds)}
             </div>
             <p className="text-sm text-gray-600 dark:text-gray-400">Disponibilité Système</p>
           </div>
@@ -4,6 +4,7 @@ import { useAuth } from '../../contexts/AuthContext';
 import { useData } from '../../contexts/DataContext';
 import { Conversation, Message, User } from '../../types';
 import apiClient from '../../services/apiClient';
+import { fetchAllPages } from '../../services/api';
 import { useTranslation } from 'react-i18next';
 import { Tooltip } from '@mui/material';
 import { motion } from 'framer-motion';
@@ -38,8 +39,8 @@ export function MessagesView({ directUser, onClose }: MessagesViewProps) {
       try {
         // Affiche le spinner uniquement si conversations.length === 0 ET loading est true
         if (loading && conversations.length === 0) setLoading(true);
-        const response = await apiClient.get('/api/conversations/');
-        const enrichedConversations = response.data.map((conv: any) => ({
+        const conversationsData = await fetchAllPages<any>(apiClient, '/api/conversations/');
+        const enrichedConversations = conversationsData.map((conv: any) => ({
           ...conv,
           lastMessage: conv.lastMessage?.content || 'No recent messages',
           lastMessageTime: conv.lastMessage?.createdAt ? new Date(conv.lastMessage.createdAt) : new Date(),
@@ -99,9 +100,9 @@ export function MessagesView({ directUser, onClose }: MessagesViewProps) {
     let isMounted = true;
     const fetchMessages = async () => {
       try {
-        const response = await apiClient.get(`/api/conversations/${selectedConversation.id}/messages/`);
+        const messagesData = await fetchAllPages<any>(apiClient, `/api/conversations/${selectedConversation.id}/messages/`);
         if (isMounted) {
-          setMessages(response.data.map((m: any) => transformMessage(m, users)));
+          setMessages(messagesData.map((m: any) => transformMessage(m, users)));
         }
       } catch (err) {
         if (isMounted) setError('Impossible de charger les messages pour cette conversation.');
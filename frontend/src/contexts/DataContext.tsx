@@ -1,5 +1,5 @@
 import { createContext, useContext, useState, ReactNode, useEffect, useRef } from 'react';
-import { Task, Project, Service, User, Notification, EmployeeLoan, UrgencyMode, Comment, Attachment } from '../types';
+import { Task, Project, Service, User, Notification, NotificationSummary, EmployeeLoan, UrgencyMode, Comment, Attachment } from '../types';
 import { isValidUUID } from '../utils/uuid-helpers';
 import { getToken, refreshTokenIfNeeded } from '@/utils/auth';
 import { useAuth } from '@/contexts/AuthContext';
@@ -17,6 +17,7 @@ import {
   transformTaskToBackend
 } from '../utils/dataTransformers';
 import { apiService } from '@/services/api';
+import { subscribeToEvents } from '@/services/eventStream';
 
 interface DataContextType {
   tasks: Task[];
@@ -24,6 +25,7 @@ interface DataContextType {
   services: Service[];
   users: User[]; // Ajout des utilisateurs
   notifications: Notification[];
+  notificationSummary: NotificationSummary | null;
   employeeLoans: EmployeeLoan[];
   urgencyModes: UrgencyMode[];
   searchTerm: string;
@@ -80,6 +82,7 @@ const DataProvider = ({ children }: { children: ReactNode }) => {
   const [services, setServices] = useState<Service[]>([]);
   const [users, setUsers] = useState<User[]>([]);
   const [notifications, setNotifications] = useState<Notification[]>([]);
+  const [notificationSummary, setNotificationSummary] = useState<NotificationSummary | null>(null);
   const [employeeLoans, setEmployeeLoans] = useState<EmployeeLoan[]>([]);
   const [urgencyModes, setUrgencyModes] = useState<UrgencyMode[]>([]);
   const [searchTerm, setSearchTerm] = useState('');
@@ -97,7 +100,27 @@ const DataProvider = ({ children }: { children: ReactNode }) => {
     }
   }, [user]);
 
-  // Polling global toutes les 2 secondes pour rafraîchir toutes les entités principales
+  // Mises à jour poussées par le serveur (flux SSE) au lieu d'un rafraîchissement périodique
+  useEffect(() => {
+    if (!user) return;
+    return subscribeToEvents((event) => {
+      if (event.type === 'notification') {
+        const notification = transformNotification(event.data);
+        setNotifications(prev =>
+          prev.some(n => n.id === notification.id) ? prev : [notification, ...prev]
+        );
+        loadNotificationSummary();
+      } else if (event.type === 'task') {
+        setTasks(prev => prev.map(task =>
+          task.id === event.data.id ? { ...task, status: event.data.status as Task['status'] } : task
+        ));
+      } else if (event.type === 'resync') {
+        loadTasks();
+        loadNotifications();
+        loadNotificationSummary();
+      }
+    });
+  }, [user]);
 
   // Toast automatique pour chaque nouvelle notification non lue
   const notifiedIds = useRef<Set<string>>(new Set());
@@ -133,6 +156,7 @@ const DataProvider = ({ children }: { children: ReactNode }) => {
         loadTasks(),
         loadProjects(),
         loadNotifications(),
+        loadNotificationSummary(),
         loadEmployeeLoans(),
         loadUrgencyModes(),
         loadUsers(),
@@ -187,6 +211,14 @@ const DataProvider = ({ children }: { children: ReactNode }) => {
     }
   };
 
+  const loadNotificationSummary = async () => {
+    try {
+      setNotificationSummary(await apiService.getNotificationSummary());
+    } catch (error) {
+      console.error('Erreur lors du chargement du résumé des notifications:', error);
+    }
+  };
+
   const loadEmployeeLoans = async () => {
     try {
       const data = await apiService.getEmployeeLoans();
@@ -392,6 +424,7 @@ const DataProvider = ({ children }: { children: ReactNode }) => {
       setNotifications(prev => prev.map(notif => 
         notif.id === id ? { ...notif, isRead: true } : notif
       ));
+      loadNotificationSummary();
     } catch (error) {
       throw new Error('Impossible de marquer la notification comme lue');
     }
@@ -429,6 +462,7 @@ const DataProvider = ({ children }: { children: ReactNode }) => {
   const deleteNotification = async (id: string) => {
     await apiService.deleteNotification(id);
     setNotifications((prev) => prev.filter((n) => n.id !== id));
+    loadNotificationSummary();
   };
 
   // === PRÊTS D'EMPLOYÉS ===
@@ -526,9 +560,9 @@ const DataProvider = ({ children }: { children: ReactNode }) => {
   // === NOTIFICATIONS AVANCÉES ===
   const markAllNotificationsAsRead = async () => {
     try {
-      // Utiliser la méthode existante pour marquer toutes les notifications comme lues
-      const promises = notifications.map(notif => markNotificationAsRead(notif.id));
-      await Promise.all(promises);
+      await apiService.markNotificationsRead({ isRead: false });
+      setNotifications(prev => prev.map(notif => notif.isRead ? notif : { ...notif, isRead: true }));
+      loadNotificationSummary();
     } catch (error) {
       throw new Error('Impossible de marquer toutes les notifications comme lues');
     }
@@ -651,6 +685,7 @@ const DataProvider = ({ children }: { children: ReactNode }) => {
       services,
       users,
       notifications,
+      notificationSummary,
       employeeLoans,
       urgencyModes,
       searchTerm,
@@ -1,13 +1,75 @@
 import axios, { AxiosInstance, AxiosRequestConfig, AxiosResponse } from 'axios';
 import { isValidUUID } from '@/utils/uuid-helpers';
+import { getToken, refreshTokenIfNeeded } from '@/utils/auth';
 import { 
   Task, Project, Service, Notification, EmployeeLoan, UrgencyMode, 
-  Comment, Attachment, User 
+  Comment, Attachment, User, NotificationSummary, NotificationFilter
 } from '@/types';
 
 // Configuration de l'API
 // IMPORTANT : VITE_API_URL ne doit PAS contenir /api à la fin !
-const API_BASE_URL = (import.meta.env.VITE_API_URL || 'http://localhost:8000').replace(/\/?api\/?$/, '');
+export const API_BASE_URL = (import.meta.env.VITE_API_URL || 'http://localhost:8000').replace(/\/?api\/?$/, '');
+
+// Résultat d'un import de comptes (POST /api/users/import/)
+export interface UserImportResult {
+  created: number;
+  errors: { line: number; username: string | null; errors: Record<string, string> }[];
+  dry_run: boolean;
+}
+
+// Réponse paginée par curseur (pagination keyset du backend)
+export interface CursorPage<T> {
+  next: string | null;
+  previous: string | null;
+  results: T[];
+}
+
+// Forme de réponse demandée (?fields= / ?expand=) pour les tâches et projets
+export interface FieldSelection {
+  fields?: string[];
+  expand?: string[];
+}
+
+// Champs suffisants pour le tableau Kanban : aucune relation imbriquée
+export const TASK_BOARD_FIELDS = [
+  'title', 'description', 'status', 'priority', 'deadline', 'type', 'tags',
+  'creatorId', 'serviceId', 'projectId', 'estimatedTime', 'workloadPoints',
+  'createdAt', 'updatedAt',
+];
+
+function fieldSelectionParams(selection?: FieldSelection): Record<string, string> {
+  const params: Record<string, string> = {};
+  if (selection?.fields) params.fields = selection.fields.join(',');
+  if (selection?.expand) params.expand = selection.expand.join(',');
+  return params;
+}
+
+/**
+ * Parcourt toutes les pages d'une liste paginée en suivant les curseurs `next`.
+ * Accepte aussi les endpoints non paginés (tableau brut).
+ */
+export async function fetchAllPages<T>(
+  client: AxiosInstance,
+  url: string,
+  pageSize = 200,
+  extraParams: Record<string, string> = {},
+): Promise<T[]> {
+  const items: T[] = [];
+  let next: string | null = url;
+  let params: Record<string, unknown> | undefined = { ...extraParams, page_size: pageSize };
+  while (next) {
+    const response: AxiosResponse<CursorPage<T> | T[]> = await client.get(next, { params });
+    const data = response.data;
+    if (Array.isArray(data)) {
+      return data;
+    }
+    items.push(...data.results);
+    next = data.next;
+    // L'URL `next` contient déjà le curseur et la taille de page
+    params = undefined;
+  }
+  return items;
+}
 
 // Instance Axios configurée
 class ApiService {
@@ -38,7 +100,16 @@ class ApiService {
     // Intercepteur de réponse pour gérer les erreurs
     this.api.interceptors.response.use(
       (response) => response,
-      (error) => {
+      async (error) => {
+        const config = error.config;
+        // Rôle ou service modifié depuis l'émission du jeton : rafraîchir et rejouer une fois
+        if (error.response?.data?.code === 'token_stale' && config && !config._staleRetry) {
+          config._staleRetry = true;
+          if (await refreshTokenIfNeeded(true)) {
+            config.headers.Authorization = `Bearer ${getToken()}`;
+            return this.api(config);
+          }
+        }
         if (error.response?.status === 401) {
           // Token expiré ou invalide
           localStorage.removeItem('authToken');
@@ -60,6 +131,15 @@ class ApiService {
     }
   }
 
+  private async requestAll<T>(url: string, selection?: FieldSelection): Promise<T[]> {
+    try {
+      return await fetchAllPages<T>(this.api, url, 200, fieldSelectionParams(selection));
+    } catch (error) {
+      console.error('API Request Error:', error);
+      throw error;
+    }
+  }
+
   private validateUUID(id: string, resource: string): void {
     if (!isValidUUID(id)) {
       throw new Error(`Invalid UUID for ${resource}: ${id}`);
@@ -68,10 +148,7 @@ class ApiService {
 
   // === SERVICES ===
   async getServices(): Promise<Service[]> {
-    return this.request<Service[]>({
-      method: 'GET',
-      url: '/api/services/',
-    });
+    return this.requestAll<Service>('/api/services/');
   }
 
   async getService(id: string): Promise<Service> {
@@ -109,10 +186,7 @@ class ApiService {
 
   // === UTILISATEURS ===
   async getUsers(): Promise<User[]> {
-    return this.request<User[]>({
-      method: 'GET',
-      url: '/api/users/',
-    });
+    return this.requestAll<User>('/api/users/');
   }
 
   async getMe(): Promise<User> {
@@ -147,6 +221,19 @@ class ApiService {
     return response.data;
   }
 
+  // Import en masse (admin) : CSV ou JSON lines, lignes en erreur retournées
+  async importUsers(file: File, dryRun = false): Promise<UserImportResult> {
+    const formData = new FormData();
+    formData.append('file', file);
+    formData.append('dry_run', String(dryRun));
+    return this.request<UserImportResult>({
+      method: 'POST',
+      url: '/api/users/import/',
+      data: formData,
+      headers: { 'Content-Type': 'multipart/form-data' },
+    });
+  }
+
   async changePassword(currentPassword: string, newPassword: string): Promise<{ success: boolean }> {
     return this.request<{ success: boolean }>({
       method: 'POST',
@@ -159,11 +246,8 @@ class ApiService {
   }
 
   // === PROJETS ===
-  async getProjects(): Promise<Project[]> {
-    return this.request<Project[]>({
-      method: 'GET',
-      url: '/api/projects/',
-    });
+  async getProjects(selection?: FieldSelection): Promise<Project[]> {
+    return this.requestAll<Project>('/api/projects/', selection);
   }
 
   async getProject(id: string): Promise<Project> {
@@ -200,11 +284,8 @@ class ApiService {
   }
 
   // === TÂCHES ===
-  async getTasks(): Promise<Task[]> {
-    return this.request<Task[]>({
-      method: 'GET',
-      url: '/api/tasks/',
-    });
+  async getTasks(selection?: FieldSelection): Promise<Task[]> {
+    return this.requestAll<Task>('/api/tasks/', selection);
   }
 
   async getTask(id: string): Promise<Task> {
@@ -268,9 +349,13 @@ class ApiService {
 
   // === NOTIFICATIONS ===
   async getNotifications(): Promise<Notification[]> {
-    return this.request<Notification[]>({
+    return this.requestAll<Notification>('/api/notifications/');
+  }
+
+  async getNotificationSummary(): Promise<NotificationSummary> {
+    return this.request<NotificationSummary>({
       method: 'GET',
-      url: '/api/notifications/',
+      url: '/api/notifications/summary/',
     });
   }
 
@@ -283,6 +368,23 @@ class ApiService {
     });
   }
 
+  // Une seule requête (UPDATE côté serveur) quel que soit le nombre de notifications
+  async markNotificationsRead(filter: NotificationFilter = {}, read = true): Promise<{ updated: number }> {
+    return this.request<{ updated: number }>({
+      method: 'POST',
+      url: '/api/notifications/mark-read/',
+      data: { ...filter, read },
+    });
+  }
+
+  async deleteNotifications(filter: NotificationFilter): Promise<{ deleted: number }> {
+    return this.request<{ deleted: number }>({
+      method: 'POST',
+      url: '/api/notifications/bulk-delete/',
+      data: filter,
+    });
+  }
+
   async createNotification(notification: Omit<Notification, 'id' | 'createdAt'>): Promise<Notification> {
     return this.request<Notification>({
       method: 'POST',
@@ -301,10 +403,7 @@ class ApiService {
 
   // === PRÊTS D'EMPLOYÉS ===
   async getEmployeeLoans(): Promise<EmployeeLoan[]> {
-    return this.request<EmployeeLoan[]>({
-      method: 'GET',
-      url: '/api/employee-loans/',
-    });
+    return this.requestAll<EmployeeLoan>('/api/employee-loans/');
   }
 
   async createEmployeeLoan(loan: Omit<EmployeeLoan, 'id'>): Promise<EmployeeLoan> {
@@ -326,10 +425,7 @@ class ApiService {
 
   // === MODES D'URGENCE ===
   async getUrgencyModes(): Promise<UrgencyMode[]> {
-    return this.request<UrgencyMode[]>({
-      method: 'GET',
-      url: '/api/urgencies/',
-    });
+    return this.requestAll<UrgencyMode>('/api/urgencies/');
   }
 
   async activateUrgencyMode(mode: Omit<UrgencyMode, 'id'>): Promise<UrgencyMode> {
@@ -368,10 +464,7 @@ class ApiService {
 
   // === PIÈCES JOINTES ===
   async getAttachments(): Promise<Attachment[]> {
-    return this.request<Attachment[]>({
-      method: 'GET',
-      url: '/api/attachments/',
-    });
+    return this.requestAll<Attachment>('/api/attachments/');
   }
 
   async uploadAttachment(formData: FormData): Promise<Attachment> {
@@ -0,0 +1,89 @@
+import { API_BASE_URL } from './api';
+import { getToken, refreshTokenIfNeeded } from '@/utils/auth';
+
+// Événements poussés par le backend (GET /api/events/stream/, Server-Sent Events)
+export type StreamEvent =
+  | { type: 'notification'; data: any }
+  | { type: 'task'; data: { id: string; status: string } }
+  | { type: 'ready' }
+  | { type: 'resync' };
+
+type Listener = (event: StreamEvent) => void;
+
+const RECONNECT_DELAY_MS = 5000;
+
+// Une seule connexion partagée par tous les abonnés de l'onglet
+const listeners = new Set<Listener>();
+let source: EventSource | null = null;
+let lastEventId: string | null = null;
+let reconnectTimer: ReturnType<typeof setTimeout> | null = null;
+let connected = false;
+
+function emit(event: StreamEvent) {
+  listeners.forEach((listener) => listener(event));
+}
+
+function connect() {
+  const token = getToken();
+  if (!token || listeners.size === 0) return;
+  const params = new URLSearchParams({ token });
+  // EventSource renvoie Last-Event-ID seul lors de ses reconnexions automatiques ;
+  // après une nouvelle connexion (jeton renouvelé) le curseur est passé en paramètre
+  if (lastEventId) params.set('last_event_id', lastEventId);
+  source = new EventSource(`${API_BASE_URL}/api/events/stream/?${params.toString()}`);
+
+  source.addEventListener('notification', (e) => {
+    const message = e as MessageEvent;
+    if (message.lastEventId) lastEventId = message.lastEventId;
+    emit({ type: 'notification', data: JSON.parse(message.data) });
+  });
+  source.addEventListener('task', (e) => {
+    emit({ type: 'task', data: JSON.parse((e as MessageEvent).data) });
+  });
+  source.addEventListener('ready', () => {
+    // Après une coupure, les changements de tâches ont pu être manqués
+    emit({ type: connected ? 'resync' : 'ready' });
+    connected = true;
+  });
+  source.addEventListener('resync', () => emit({ type: 'resync' }));
+  source.onerror = () => {
+    // Connexion refusée (jeton expiré) : le navigateur abandonne, on relance nous-mêmes
+    if (source && source.readyState === EventSource.CLOSED) {
+      source = null;
+      scheduleReconnect();
+    }
+  };
+}
+
+function scheduleReconnect() {
+  if (reconnectTimer || listeners.size === 0) return;
+  reconnectTimer = setTimeout(async () => {
+    reconnectTimer = null;
+    await refreshTokenIfNeeded();
+    connect();
+  }, RECONNECT_DELAY_MS);
+}
+
+function disconnect() {
+  if (reconnectTimer) {
+    clearTimeout(reconnectTimer);
+    reconnectTimer = null;
+  }
+  source?.close();
+  source = null;
+  connected = false;
+  lastEventId = null;
+}
+
+/**
+ * S'abonne au flux d'événements ; retourne la fonction de désabonnement.
+ * La connexion est ouverte au premier abonné et fermée au dernier départ.
+ */
+export function subscribeToEvents(listener: Listener): () => void {
+  listeners.add(listener);
+  if (!source && !reconnectTimer) connect();
+  return () => {
+    listeners.delete(listener);
+    if (listeners.size === 0) disconnect();
+  };
+}
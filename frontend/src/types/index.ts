@@ -116,6 +116,23 @@ export interface Notification {
   expiresAt?: Date;
 }
 
+// Compteurs de non lues (GET /api/notifications/summary/)
+export interface NotificationSummary {
+  unread: number;
+  by_type: Record<string, number>;
+  by_priority: Record<string, number>;
+}
+
+// Sélection pour les opérations groupées sur les notifications
+export interface NotificationFilter {
+  ids?: string[];
+  type?: string;
+  relatedId?: string;
+  olderThan?: string;
+  isRead?: boolean;
+  all?: boolean;
+}
+
 export interface EmployeeLoan {
   id: string;
   employeeId: string;
@@ -233,7 +250,10 @@ export interface MainMetrics {
   completionRate: number;
   activeProjects: number;
   planningProjects: number;
-  globalEfficiency: number;
+  // Taux de livraison dans les délais (null sans tâche terminée)
+  globalEfficiency: number | null;
+  workloadPoints: number;
+  trackedTime: number;
 }
 
 export interface ServicePerformance {
@@ -242,13 +262,22 @@ export interface ServicePerformance {
   totalTasks: number;
   completedTasks: number;
   completionRate: number;
-  efficiency: number;
+  efficiency: number | null;
+  cycleTimeHours: CycleTimePercentiles;
+  estimateAccuracy: number | null;
+  load: number;
+}
+
+export interface CycleTimePercentiles {
+  p50: number | null;
+  p75: number | null;
+  p90: number | null;
 }
 
 export interface SystemMetrics {
   activeUsers: number;
   totalUsers: number;
-  uptime: number;
+  uptimeSeconds: number;
   systemLoad: number;
 }
 
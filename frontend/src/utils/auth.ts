@@ -78,9 +78,10 @@ export function isTokenExpired(): boolean {
 
 /**
  * Rafraîchit le token JWT si nécessaire
+ * @param {boolean} force - Rafraîchir même si le jeton n'expire pas bientôt (droits modifiés)
  * @returns {Promise<boolean>} true si le token a été rafraîchi avec succès, false sinon
  */
-export async function refreshTokenIfNeeded(): Promise<boolean> {
+export async function refreshTokenIfNeeded(force = false): Promise<boolean> {
   // Si pas de token ou pas expiré, pas besoin de rafraîchir
   if (!hasToken()) return false;
   
@@ -101,7 +102,7 @@ export async function refreshTokenIfNeeded(): Promise<boolean> {
     const currentTime = Date.now();
     const fiveMinutesInMs = 5 * 60 * 1000;
     
-    if (expirationTime - currentTime > fiveMinutesInMs) {
+    if (!force && expirationTime - currentTime > fiveMinutesInMs) {
       // Pas besoin de rafraîchir
       return true;
     }